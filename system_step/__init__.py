@@ -8,6 +8,20 @@ A step for working with the molecular/crystal system in SEAMM
 # Bring up the classes so that they appear to be directly in
 # the system_step package.
 
+from system_step.atoms import AtomTable  # noqa: F401, E501
+from system_step.binary import BinaryWriter, read_binary, write_binary  # noqa: F401, E501
+from system_step.bonds import BondTable  # noqa: F401, E501
+from system_step.cache import DerivedCache  # noqa: F401, E501
+from system_step.cell import Cell  # noqa: F401, E501
+from system_step.hashing import content_hash, content_hashes, graph_hashes  # noqa: F401, E501
+from system_step.hashing import iter_content_hashes, molecule_hashes, topology_hash  # noqa: F401, E501
+from system_step.molecular_system import MolecularSystem  # noqa: F401, E501
+from system_step.packing import pack, water  # noqa: F401, E501
+from system_step.readers import iter_file, read_file  # noqa: F401, E501
+from system_step.selection import compile_selection, select  # noqa: F401, E501
+from system_step.slab import SlabBuilder, miller_indices  # noqa: F401, E501
+from system_step.store import SystemStore  # noqa: F401, E501
+from system_step.supercell import make_supercell  # noqa: F401, E501
 from system_step.system import System  # noqa: F401, E501
 from system_step.system_parameters import SystemParameters  # noqa: F401, E501
 from system_step.system_step import SystemStep  # noqa: F401, E501
@@ -0,0 +1,518 @@
+# -*- coding: utf-8 -*-
+
+"""A columnar, NumPy-backed table of atoms.
+
+The atoms are stored as a structure of arrays: each property of the atoms,
+such as the element or the coordinates, is a single NumPy array with one row
+per atom. This keeps the memory for large systems compact and lets
+operations on all the atoms be written as vectorized NumPy expressions.
+
+Tables can share columns, copy-on-write, so that the configurations of a
+system, e.g. the frames of a trajectory, hold only their own coordinates.
+Shared columns are returned as read-only views, and are copied the first
+time the table changes them.
+
+Each column has a version, from a global counter, that changes whenever the
+column does, so that values derived from the atoms can be cached until the
+columns they depend on change.
+"""
+
+import logging
+
+import numpy as np
+
+from system_step.cache import origin, restamp, tick
+from system_step import elements
+
+logger = logging.getLogger(__name__)
+
+
+class AtomTable(object):
+    """The atoms in a system, stored as a structure of arrays.
+
+    Each column is a NumPy array whose first dimension runs over the atoms.
+    The arrays are allocated with spare capacity so that atoms can be
+    appended in bulk without reallocating each time, and the columns
+    returned are views of the first ``len(table)`` rows, so no data is
+    copied when accessing them.
+
+    Assigning to a column, adding or deleting atoms and the other methods
+    that change the table update the versions of the columns changed. The
+    columns returned are read-only views, so a column can only be changed in
+    place through :meth:`mutable`, which updates its version.
+
+    The standard columns are always present:
+
+        atno : int16
+            The atomic number, used as the element code. 0 is a dummy atom.
+        coordinates : float64, shape (3,)
+            The Cartesian coordinates in Å, a contiguous Nx3 array.
+        charge : float64
+            The partial charge on the atom.
+
+    Attributes
+    ----------
+    standard_columns : dict
+        The dtype and shape of the standard columns.
+    """
+
+    standard_columns = {
+        'atno': (np.int16, ()),
+        'coordinates': (np.float64, (3,)),
+        'charge': (np.float64, ()),
+    }
+
+    def __init__(self, capacity=0):
+        """Create an empty table of atoms.
+
+        Parameters
+        ----------
+        capacity : int = 0
+            The number of atoms to allocate space for initially.
+
+        Returns
+        -------
+        None
+        """
+        self._n = 0
+        self._capacity = capacity
+        self._columns = {}
+        self._defaults = {}
+        # The columns whose arrays are shared with other tables
+        self._shared = set()
+        # The version of each column, including any removed
+        self._versions = {}
+        for name, (dtype, shape) in AtomTable.standard_columns.items():
+            self._columns[name] = np.zeros((capacity, *shape), dtype=dtype)
+            self._defaults[name] = 0
+        self.modified()
+
+    def __len__(self):
+        return self._n
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __getitem__(self, name):
+        """The column as a read-only view of the rows in use.
+
+        Assign to the column, ``table[name] = values``, or change it in
+        place through :meth:`mutable`, so that its version is updated.
+        """
+        values = self._columns[name][0:self._n]
+        values.flags.writeable = False
+        return values
+
+    def __setitem__(self, name, values):
+        """Set the values of an existing column, or create a new column."""
+        values = np.asarray(values)
+        if name not in self._columns:
+            self.add_column(
+                name, dtype=values.dtype, shape=values.shape[1:]
+            )
+        self._own(name)
+        self._columns[name][0:self._n] = values
+        self.modified(name)
+
+    def __repr__(self):
+        return 'AtomTable({} atoms, columns={})'.format(
+            self._n, list(self._columns)
+        )
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_origin'] = origin()
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        source = state.pop('_origin', None)
+        self.__dict__.update(state)
+        self._versions = {
+            name: restamp(source, version)
+            for name, version in self._versions.items()
+        }
+
+    @classmethod
+    def from_arrays(cls, atno, coordinates=None, **columns):
+        """Create a table that uses the given arrays as its columns.
+
+        The arrays are used directly, without copying, if they already
+        have the right dtype and are C-contiguous. This is the fast path
+        used by the file readers.
+
+        Parameters
+        ----------
+        atno : array_like of int
+            The atomic numbers of the atoms.
+        coordinates : array_like = None
+            The Nx3 Cartesian coordinates, defaulting to zero.
+        columns : dict(str, array_like)
+            Any other columns, keyed by name.
+
+        Returns
+        -------
+        AtomTable
+            The new table.
+        """
+        n = len(atno)
+        table = cls(capacity=0)
+        table._n = n
+        table._capacity = n
+        table._columns['atno'] = np.ascontiguousarray(atno, dtype=np.int16)
+        if coordinates is None:
+            table._columns['coordinates'] = np.zeros((n, 3))
+        else:
+            table._columns['coordinates'] = np.ascontiguousarray(
+                coordinates, dtype=np.float64
+            ).reshape(n, 3)
+        if 'charge' not in columns:
+            table._columns['charge'] = np.zeros(n)
+        for name, values in columns.items():
+            dtype, _ = cls.standard_columns.get(name, (None, None))
+            values = np.ascontiguousarray(values, dtype=dtype)
+            if len(values) != n:
+                raise ValueError(
+                    "Column '{}' has {} rows, not {}".format(
+                        name, len(values), n
+                    )
+                )
+            table._columns[name] = values
+            table._defaults.setdefault(name, _default_for(values.dtype))
+        table.modified()
+        return table
+
+    @property
+    def capacity(self):
+        """The number of atoms that can be held without reallocating."""
+        return self._capacity
+
+    @property
+    def columns(self):
+        """The names of the columns."""
+        return list(self._columns)
+
+    @property
+    def atno(self):
+        """The atomic numbers of the atoms."""
+        return self['atno']
+
+    @property
+    def coordinates(self):
+        """The Nx3 Cartesian coordinates, as a view into the table."""
+        return self['coordinates']
+
+    @property
+    def shared_columns(self):
+        """The names of the columns shared with other tables."""
+        return [name for name in self._columns if name in self._shared]
+
+    @property
+    def symbols(self):
+        """The element symbols of the atoms."""
+        return elements.to_symbols(self.atno)
+
+    @property
+    def masses(self):
+        """The atomic masses of the atoms in g/mol."""
+        return elements.masses[self.atno]
+
+    @property
+    def nbytes(self):
+        """The number of bytes used by the columns."""
+        return sum(values.nbytes for values in self._columns.values())
+
+    def add_column(self, name, dtype=np.float64, shape=(), default=None):
+        """Add a new column to the table.
+
+        Parameters
+        ----------
+        name : str
+            The name of the column.
+        dtype : numpy.dtype = numpy.float64
+            The type of the data in the column.
+        shape : tuple = ()
+            The shape of the data for each atom, e.g. (3,) for a vector.
+        default : scalar = None
+            The value for existing atoms and for atoms added later without a
+            value for this column. Defaults to zero or the empty string.
+
+        Returns
+        -------
+        None
+        """
+        if name in self._columns:
+            raise KeyError("Column '{}' already exists".format(name))
+        dtype = np.dtype(dtype)
+        if default is None:
+            default = _default_for(dtype)
+        self._columns[name] = np.full(
+            (self._capacity, *shape), default, dtype=dtype
+        )
+        self._defaults[name] = default
+        self.modified(name)
+
+    def remove_column(self, name):
+        """Remove a column from the table.
+
+        Parameters
+        ----------
+        name : str
+            The name of the column.
+
+        Returns
+        -------
+        None
+        """
+        if name in AtomTable.standard_columns:
+            raise KeyError(
+                "The standard column '{}' cannot be removed".format(name)
+            )
+        del self._columns[name]
+        del self._defaults[name]
+        self._shared.discard(name)
+        self._versions[name] = tick()
+
+    def reserve(self, capacity):
+        """Make sure there is room for at least `capacity` atoms.
+
+        Parameters
+        ----------
+        capacity : int
+            The number of atoms needed.
+
+        Returns
+        -------
+        None
+        """
+        if capacity <= self._capacity:
+            return
+        for name, values in self._columns.items():
+            new = np.empty((capacity, *values.shape[1:]), dtype=values.dtype)
+            new[0:self._n] = values[0:self._n]
+            new[self._n:] = self._defaults[name]
+            self._columns[name] = new
+        self._capacity = capacity
+        self._shared.clear()
+
+    def append(self, atno, coordinates=None, **columns):
+        """Append atoms to the table in bulk.
+
+        Parameters
+        ----------
+        atno : array_like of int
+            The atomic numbers of the new atoms.
+        coordinates : array_like = None
+            The Nx3 Cartesian coordinates of the new atoms.
+        columns : dict(str, array_like)
+            Values for other columns. Columns that do not exist are created.
+
+        Returns
+        -------
+        numpy.ndarray
+            The indices of the new atoms.
+        """
+        atno = np.atleast_1d(np.asarray(atno))
+        n = len(atno)
+        start = self._n
+        end = start + n
+        if end > self._capacity:
+            self.reserve(max(end, 2 * self._capacity, 16))
+        else:
+            self._own()
+        for name, values in columns.items():
+            if name not in self._columns:
+                values = np.asarray(values)
+                self.add_column(
+                    name, dtype=values.dtype, shape=values.shape[1:]
+                )
+        self._columns['atno'][start:end] = atno
+        if coordinates is not None:
+            self._columns['coordinates'][start:end] = np.reshape(
+                coordinates, (n, 3)
+            )
+        for name, values in columns.items():
+            self._columns[name][start:end] = values
+        self._n = end
+        self.modified()
+        return np.arange(start, end)
+
+    def delete(self, indices):
+        """Delete atoms from the table.
+
+        Parameters
+        ----------
+        indices : array_like of int or bool
+            The indices of the atoms to delete, or a boolean mask.
+
+        Returns
+        -------
+        numpy.ndarray
+            For each original atom its new index, or -1 if deleted.
+        """
+        keep = np.ones(self._n, dtype=bool)
+        keep[indices] = False
+        n = int(np.count_nonzero(keep))
+        self._own()
+        for name, values in self._columns.items():
+            values[0:n] = values[0:self._n][keep]
+            values[n:self._n] = self._defaults[name]
+        self._n = n
+        self.modified()
+        mapping = np.full(len(keep), -1, dtype=np.int64)
+        mapping[keep] = np.arange(n)
+        return mapping
+
+    def take(self, indices):
+        """Create a new table holding a subset of the atoms.
+
+        Parameters
+        ----------
+        indices : array_like of int or bool
+            The indices of the atoms to take, or a boolean mask.
+
+        Returns
+        -------
+        AtomTable
+            The new table.
+        """
+        columns = {name: self[name][indices] for name in self._columns}
+        return AtomTable.from_arrays(**columns)
+
+    def copy(self):
+        """Return a copy of the table, without spare capacity."""
+        columns = {name: self[name].copy() for name in self._columns}
+        return AtomTable.from_arrays(**columns)
+
+    def share(self, copy=(), **columns):
+        """Create a table that shares the columns of this one.
+
+        The shared columns are copy-on-write: both tables see the same
+        arrays until either changes a column, e.g. by assigning to it or by
+        adding or deleting atoms, when that table copies it first. Creating
+        the table is O(N) only in the columns that are copied or given.
+
+        Parameters
+        ----------
+        copy : [str] = ()
+            The columns to copy rather than share.
+        columns : dict(str, array_like)
+            New values for columns, used directly if possible, rather than
+            sharing or copying them.
+
+        Returns
+        -------
+        AtomTable
+            The new table, without spare capacity.
+        """
+        n = self._n
+        table = AtomTable(capacity=0)
+        table._n = table._capacity = n
+        table._defaults = dict(self._defaults)
+        # The columns shared or copied hold the same data, so keep their
+        # versions.
+        table._versions = dict(self._versions)
+        for name, values in self._columns.items():
+            if name in columns:
+                table._columns[name] = np.ascontiguousarray(
+                    columns[name], dtype=values.dtype
+                )
+            elif name in copy:
+                table._columns[name] = values[0:n].copy()
+            else:
+                table._columns[name] = values[0:n]
+                table._shared.add(name)
+                self._shared.add(name)
+        for name, values in columns.items():
+            if name not in self._columns:
+                values = np.ascontiguousarray(values)
+                table._columns[name] = values
+                table._defaults[name] = _default_for(values.dtype)
+            if len(table._columns[name]) != n:
+                raise ValueError(
+                    "Column '{}' has {} rows, not {}".format(
+                        name, len(table._columns[name]), n
+                    )
+                )
+        if len(columns) > 0:
+            table.modified(*columns)
+        return table
+
+    def mutable(self, name):
+        """A writable view of a column, to change it in place.
+
+        The column is copied first if it is shared with another table, and
+        its version is updated. Values cached from the system while it is
+        being changed are not recomputed, so finish the changes first, or
+        call :meth:`modified` afterwards.
+
+        Parameters
+        ----------
+        name : str
+            The column.
+
+        Returns
+        -------
+        numpy.ndarray
+            The writable view of the rows in use.
+        """
+        self._own(name)
+        self.modified(name)
+        return self._columns[name][0:self._n]
+
+    def version(self, *names):
+        """The version of columns, which increases whenever they change.
+
+        Parameters
+        ----------
+        names : str
+            The columns, by default all of them.
+
+        Returns
+        -------
+        int
+            The latest version of the columns, or 0 for a column that has
+            never existed.
+        """
+        if len(names) == 0:
+            return max(self._versions.values())
+        return max(self._versions.get(name, 0) for name in names)
+
+    def modified(self, *names):
+        """Record that columns have changed, e.g. in place.
+
+        Parameters
+        ----------
+        names : str
+            The columns, by default all of them.
+
+        Returns
+        -------
+        None
+        """
+        version = tick()
+        for name in (names if len(names) > 0 else self._columns):
+            self._versions[name] = version
+
+    def _own(self, name=None):
+        """Copy a shared or read-only column, or all of them, before changing
+        it."""
+        names = list(self._columns) if name is None else [name]
+        for name in names:
+            values = self._columns[name]
+            if name in self._shared or not values.flags.writeable:
+                self._columns[name] = values.copy()
+                self._shared.discard(name)
+
+
+def _default_for(dtype):
+    """The default value for a column of the given type."""
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'SU':
+        return ''
+    if dtype.kind == 'O':
+        return None
+    return 0
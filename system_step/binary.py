@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+
+"""The native binary format for systems.
+
+Text formats are slow to write and to parse, which dominates the time of
+small jobs that pass systems from one flowchart to the next. The binary
+format stores the columns of the atom and bond tables as raw arrays, so a
+system is written and read with a few bulk calls, one per column.
+
+The layout of a file is
+
+    8 bytes     the magic number, b'SEAMMSYS'
+    4 bytes     the version of the format, a little-endian uint32
+    4 bytes     the length of the header, a little-endian uint32
+    header      UTF-8 encoded JSON describing the systems and their arrays
+    arrays      the raw data of each array, starting on a 64-byte boundary
+
+The header has a list of the systems, each with its name, cell, and the
+dtype, shape and offset of each column of its atoms and bonds. Offsets are
+from the start of the arrays, which is the first 64-byte boundary after
+the header. Systems may refer to the same arrays: the configurations of a
+trajectory share the arrays of the atoms and bonds of its topology, which
+are written once, and only their coordinates and velocities are written
+for each. They are read back as configurations sharing one topology.
+
+Since every array is aligned, the file can instead be mapped into memory,
+so that the columns are paged in from the file as they are used rather
+than read up front. This suits analyses that touch a small part of a very
+large system. The mapping is copy-on-write: the arrays can be modified, but
+the changes are private to the process and never written to the file.
+
+Files may be compressed, e.g. 'frames.sbin.gz', in which case they are read
+and written as streams and cannot be mapped into memory.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+
+from system_step.atoms import AtomTable
+from system_step.bonds import BondTable
+from system_step.cell import Cell
+from system_step import compression
+from system_step.molecular_system import configuration_columns
+from system_step.molecular_system import MolecularSystem
+
+logger = logging.getLogger(__name__)
+
+_magic = b'SEAMMSYS'
+_version = 1
+_preamble = struct.Struct('<8sII')
+_alignment = 64
+
+# The size of the blocks in which spooled arrays are copied to the file.
+_copy_size = 2**24
+
+# The columns of the bond table, in the order of BondTable.from_arrays.
+_bond_columns = ('i', 'j', 'order', 'shift')
+
+
+def write_binary(path, systems):
+    """Write systems to a file in the native binary format.
+
+    The file is written under a temporary name and renamed when complete,
+    so readers never see a partial file. It is compressed if its extension
+    is that of a compression, e.g. '.gz'.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The file to write.
+    systems : MolecularSystem or iterable of MolecularSystem
+        The system, or systems, e.g. the frames of a trajectory. They are
+        written as they are iterated over, so may come from a generator.
+
+    Returns
+    -------
+    None
+    """
+    if isinstance(systems, MolecularSystem):
+        systems = [systems]
+    with BinaryWriter(path) as writer:
+        for system in systems:
+            writer.write(system)
+
+
+class BinaryWriter(object):
+    """Write systems to a file in the native binary format one at a time.
+
+    The header at the start of the file describes every system, so the
+    descriptions and the arrays are spooled to temporary files, in the
+    directory of the file, as the systems are written. Closing the writer
+    copies them into the file. Nothing is held in memory, so trajectories
+    larger than memory can be written.
+
+    Columns that have not changed since the previous system, such as the
+    atoms and bonds that configurations share, are not written again; the
+    system refers to the arrays already written instead.
+
+    The writer is a context manager, which closes it on leaving the block,
+    or discards the file if there was an exception.
+
+    Attributes
+    ----------
+    path : pathlib.Path
+        The file being written.
+    n_systems : int
+        The number of systems written so far.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.n_systems = 0
+        self._size = 0
+        self._header_size = 0
+        self._header = tempfile.TemporaryFile(dir=self.path.parent)
+        self._spool = tempfile.TemporaryFile(dir=self.path.parent)
+        # The arrays of the previous system, with their versions and layout
+        self._previous = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def __repr__(self):
+        return "BinaryWriter('{}', {} systems)".format(
+            self.path, self.n_systems
+        )
+
+    def write(self, system):
+        """Add a system to the file.
+
+        Parameters
+        ----------
+        system : MolecularSystem
+            The system.
+
+        Returns
+        -------
+        None
+        """
+        entry = {
+            'name': system.name,
+            'cell': (
+                None if system.cell is None else
+                [float(x) for x in system.cell.parameters]
+            ),
+            'atoms': {},
+            'bonds': {},
+        }
+        arrays = []
+        for column in system.atoms.columns:
+            arrays.append(
+                (
+                    'atoms', column, system.atoms[column],
+                    system.atoms.version(column)
+                )
+            )
+        for column in _bond_columns:
+            arrays.append(
+                (
+                    'bonds', column, getattr(system.bonds, column),
+                    system.bonds.version
+                )
+            )
+        for _, column, values, _ in arrays:
+            if values.dtype.hasobject:
+                raise ValueError(
+                    "The column '{}' of the system '{}' holds Python "
+                    'objects, which cannot be written.'.format(
+                        column, system.name
+                    )
+                )
+        previous = self._previous
+        self._previous = {}
+        for table_name, column, values, version in arrays:
+            # The same version of the same memory has the same values.
+            key = (
+                version, values.__array_interface__['data'][0],
+                values.dtype.str, values.shape, values.strides
+            )
+            last = previous.get((table_name, column))
+            if last is not None and last[0] == key:
+                entry[table_name][column] = last[1]
+                self._previous[table_name, column] = last
+                continue
+            contiguous = np.ascontiguousarray(values)
+            offset = _aligned(self._size)
+            entry[table_name][column] = {
+                'dtype': contiguous.dtype.str,
+                'shape': list(contiguous.shape),
+                'offset': offset,
+            }
+            self._spool.write(bytes(offset - self._size))
+            self._spool.write(contiguous.data)
+            self._size = offset + contiguous.nbytes
+            # Holding the array keeps its memory from being reused.
+            self._previous[table_name, column] = (
+                key, entry[table_name][column], values
+            )
+        text = json.dumps(entry).encode('utf-8')
+        if self.n_systems > 0:
+            text = b', ' + text
+        self._header.write(text)
+        self._header_size += len(text)
+        self.n_systems += 1
+
+    def close(self):
+        """Write the header and the arrays, and move the file into place."""
+        if self._spool is None:
+            return
+        head = b'{"systems": ['
+        tail = b']}'
+        length = len(head) + self._header_size + len(tail)
+        start = _aligned(_preamble.size + length)
+
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        try:
+            with compression.open_file(
+                tmp_path, 'wb',
+                compression.compression_from_extension(self.path)
+            ) as fd:
+                fd.write(_preamble.pack(_magic, _version, length))
+                fd.write(head)
+                self._header.seek(0)
+                shutil.copyfileobj(self._header, fd, _copy_size)
+                fd.write(tail)
+                fd.write(bytes(start - _preamble.size - length))
+                self._spool.seek(0)
+                shutil.copyfileobj(self._spool, fd, _copy_size)
+            os.replace(tmp_path, self.path)
+        finally:
+            self.discard()
+
+    def discard(self):
+        """Stop writing, without creating the file."""
+        if self._spool is not None:
+            self._header.close()
+            self._spool.close()
+            self._spool = None
+            self._previous = {}
+
+
+def read_binary(path, memory_map=False):
+    """Read the first system in a file in the native binary format.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The file.
+    memory_map : bool = False
+        Whether to map the file into memory rather than read it.
+
+    Returns
+    -------
+    MolecularSystem
+        The system.
+    """
+    for system in iter_binary(path, stop=1, memory_map=memory_map):
+        return system
+    raise ValueError("There is no system in '{}'.".format(path))
+
+
+def iter_binary(path, start=0, stop=None, step=1, memory_map=False):
+    """Read the systems in a file in the native binary format.
+
+    The systems are selected like a slice of a list, starting from 0. Each
+    array is read directly into a new NumPy array, without conversion, or
+    with `memory_map` is a copy-on-write view of the file.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The file.
+    start : int = 0
+        The first system to read.
+    stop : int = None
+        The system to stop before, or None to read to the end.
+    step : int = 1
+        Read every `step`'th system.
+    memory_map : bool = False
+        Whether to map the file into memory rather than read it. Compressed
+        files are always read.
+
+    Yields
+    ------
+    MolecularSystem
+        Each selected system in the file.
+    """
+    if start < 0 or step < 1 or (stop is not None and stop < 0):
+        raise ValueError(
+            'Invalid system selection {}:{}:{}'.format(start, stop, step)
+        )
+    if memory_map and compression.is_compressed(path):
+        logger.debug(
+            "The compressed file '{}' cannot be memory-mapped.".format(path)
+        )
+        memory_map = False
+    with compression.open_file(path) as fd:
+        entries, data_start = _read_header(fd, path)
+        # Mode 'c' is copy-on-write; the file itself is opened read-only.
+        data = np.memmap(fd, dtype=np.uint8, mode='c') if memory_map else None
+        topology = None
+        for entry in entries[start:stop:step]:
+            if topology is not None and _same_topology(topology[0], entry):
+                # Only the configuration is read for systems that share the
+                # arrays of the topology.
+                columns = {
+                    column: _array(
+                        fd, data, data_start, entry['atoms'][column], path
+                    )
+                    for column in configuration_columns
+                    if column in entry['atoms']
+                }
+                cell = entry['cell']
+                yield topology[1].new_configuration(
+                    cell=None if cell is None else Cell(*cell),
+                    name=entry['name'],
+                    **columns
+                )
+                continue
+            tables = []
+            for table_name in ('atoms', 'bonds'):
+                columns = {}
+                for column, layout in entry[table_name].items():
+                    columns[column] = _array(
+                        fd, data, data_start, layout, path
+                    )
+                tables.append(columns)
+            system = _system(entry, *tables)
+            topology = (entry, system)
+            yield system
+
+
+def _aligned(offset):
+    """The first offset on an alignment boundary at or after `offset`."""
+    return -(-offset // _alignment) * _alignment
+
+
+def _array(fd, data, start, layout, path):
+    """Read an array from the file, or view it in the mapped file `data`."""
+    offset = start + layout['offset']
+    dtype = np.dtype(layout['dtype'])
+    shape = tuple(layout['shape'])
+    nbytes = dtype.itemsize * int(np.prod(shape))
+    if data is None:
+        values = np.empty(shape, dtype=dtype)
+        fd.seek(offset)
+        n_read = fd.readinto(values.reshape(-1).view(np.uint8))
+    else:
+        n_read = min(nbytes, max(len(data) - offset, 0))
+        if n_read == nbytes:
+            values = np.ndarray(shape, dtype=dtype, buffer=data, offset=offset)
+    if n_read != nbytes:
+        raise ValueError(
+            "The binary system file '{}' is truncated.".format(path)
+        )
+    return values
+
+
+def _read_header(fd, path):
+    """Read and check the header of a binary system file.
+
+    Returns
+    -------
+    ([dict], int)
+        The description of each system, and the offset of the arrays.
+    """
+    preamble = fd.read(_preamble.size)
+    if len(preamble) < _preamble.size:
+        raise ValueError(
+            "'{}' is not a binary system file: it is too short.".format(path)
+        )
+    magic, version, length = _preamble.unpack(preamble)
+    if magic != _magic:
+        raise ValueError("'{}' is not a binary system file.".format(path))
+    if version > _version:
+        raise ValueError(
+            "The binary system file '{}' is version {}, newer than this "
+            'reader, version {}.'.format(path, version, _version)
+        )
+    header = json.loads(fd.read(length).decode('utf-8'))
+    return header['systems'], _aligned(_preamble.size + length)
+
+
+def _same_topology(entry, other):
+    """Whether two systems in a file refer to the same atoms and bonds."""
+    if entry['atoms'].keys() != other['atoms'].keys():
+        return False
+    for column, layout in entry['atoms'].items():
+        if (
+            column not in configuration_columns and
+            layout != other['atoms'][column]
+        ):
+            return False
+    return entry['bonds'] == other['bonds']
+
+
+def _system(entry, atoms, bonds):
+    """Create a system from its description and columns."""
+    cell = entry['cell']
+    return MolecularSystem(
+        name=entry['name'],
+        atoms=AtomTable.from_arrays(**atoms),
+        bonds=BondTable.from_arrays(*[bonds[name] for name in _bond_columns]),
+        cell=None if cell is None else Cell(*cell)
+    )
@@ -0,0 +1,480 @@
+# -*- coding: utf-8 -*-
+
+"""Columnar storage of bonds with a compressed-sparse-row adjacency index.
+
+The bonds are held as parallel arrays of the two atoms, the bond order and,
+for periodic systems, the lattice translation to the image of the second
+atom.
+Like the atom table, a bond table can share its arrays with others,
+copy-on-write, so the configurations of a system share one set of bonds.
+
+For graph walks the table lazily builds a compressed sparse row (CSR) index
+of the bonded neighbors of each atom, so that finding the neighbors of an
+atom is a slice of an array rather than a scan of the bond list.
+"""
+
+import collections
+import logging
+
+import numpy as np
+
+from system_step.cache import origin, restamp, tick
+
+logger = logging.getLogger(__name__)
+
+Adjacency = collections.namedtuple(
+    'Adjacency', ['offsets', 'neighbors', 'bonds']
+)
+Adjacency.__doc__ = """The CSR adjacency index of the bonds.
+
+The neighbors of atom k are ``neighbors[offsets[k]:offsets[k + 1]]`` and the
+bonds to them are the corresponding entries of ``bonds``.
+"""
+
+
+class BondTable(object):
+    """The bonds in a system, stored as parallel arrays.
+
+    The arrays are returned as read-only views. Change them in place only
+    through :meth:`mutable`, which updates the version of the bonds.
+
+    Attributes
+    ----------
+    i : numpy.ndarray
+        The first atom of each bond.
+    j : numpy.ndarray
+        The second atom of each bond.
+    order : numpy.ndarray
+        The bond order of each bond, with 5 for aromatic bonds.
+    shift : numpy.ndarray
+        For periodic systems, the Nx3 integer lattice translation from the
+        cell of atom i to the image of atom j that it is bonded to.
+    """
+
+    def __init__(self, capacity=0):
+        """Create an empty table of bonds.
+
+        Parameters
+        ----------
+        capacity : int = 0
+            The number of bonds to allocate space for initially.
+
+        Returns
+        -------
+        None
+        """
+        self._n = 0
+        self._capacity = capacity
+        self._i = np.zeros(capacity, dtype=np.int64)
+        self._j = np.zeros(capacity, dtype=np.int64)
+        self._order = np.zeros(capacity, dtype=np.int8)
+        self._shift = np.zeros((capacity, 3), dtype=np.int32)
+        self._adjacency = None
+        # Data derived from the bonds, such as the graph hashes of the
+        # molecules, shared with the tables that share the bonds
+        self._derived = {}
+        # Whether the arrays are shared with other tables
+        self._shared = False
+        self._version = tick()
+
+    def __len__(self):
+        return self._n
+
+    def __repr__(self):
+        return 'BondTable({} bonds)'.format(self._n)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_origin'] = origin()
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        source = state.pop('_origin', None)
+        self.__dict__.update(state)
+        self._version = restamp(source, self._version)
+
+    @classmethod
+    def from_arrays(cls, i, j, order=None, shift=None):
+        """Create a table that uses the given arrays directly.
+
+        Parameters
+        ----------
+        i, j : array_like of int
+            The atoms of each bond.
+        order : array_like of int = None
+            The bond orders, defaulting to single bonds.
+        shift : array_like of int = None
+            The Nx3 lattice translations of atom j, defaulting to zero.
+
+        Returns
+        -------
+        BondTable
+            The new table.
+        """
+        table = cls()
+        table._i = np.ascontiguousarray(i, dtype=np.int64)
+        table._j = np.ascontiguousarray(j, dtype=np.int64)
+        if order is None:
+            table._order = np.ones(len(table._i), dtype=np.int8)
+        else:
+            table._order = np.ascontiguousarray(order, dtype=np.int8)
+        if shift is None:
+            table._shift = np.zeros((len(table._i), 3), dtype=np.int32)
+        else:
+            table._shift = np.ascontiguousarray(
+                shift, dtype=np.int32
+            ).reshape(-1, 3)
+        table._n = table._capacity = len(table._i)
+        return table
+
+    @property
+    def i(self):
+        """The first atom of each bond."""
+        return self._view(self._i)
+
+    @property
+    def j(self):
+        """The second atom of each bond."""
+        return self._view(self._j)
+
+    @property
+    def order(self):
+        """The bond order of each bond."""
+        return self._view(self._order)
+
+    @property
+    def shift(self):
+        """The lattice translation of atom j of each bond."""
+        return self._view(self._shift)
+
+    @property
+    def version(self):
+        """The version of the bonds, which increases whenever they change."""
+        return self._version
+
+    @property
+    def nbytes(self):
+        """The number of bytes used by the bonds and index."""
+        total = (
+            self._i.nbytes + self._j.nbytes + self._order.nbytes +
+            self._shift.nbytes
+        )
+        if self._adjacency is not None:
+            total += sum(a.nbytes for a in self._adjacency)
+        return total
+
+    def append(self, i, j, order=1, shift=0):
+        """Add bonds to the table in bulk.
+
+        If the adjacency index has been built it is updated in place, by
+        inserting the new neighbors, rather than being rebuilt.
+
+        Parameters
+        ----------
+        i, j : array_like of int
+            The atoms of the new bonds.
+        order : int or array_like of int = 1
+            The bond orders.
+        shift : int or array_like of int = 0
+            The Nx3 lattice translations of atom j, for periodic systems.
+
+        Returns
+        -------
+        numpy.ndarray
+            The indices of the new bonds.
+        """
+        i = np.atleast_1d(np.asarray(i, dtype=np.int64))
+        j = np.atleast_1d(np.asarray(j, dtype=np.int64))
+        if i.shape != j.shape:
+            raise ValueError('The two lists of atoms must be the same length')
+        n = len(i)
+        start = self._n
+        end = start + n
+        self._own()
+        if end > self._capacity:
+            capacity = max(end, 2 * self._capacity, 16)
+            for name in ('_i', '_j', '_order', '_shift'):
+                old = getattr(self, name)
+                new = np.zeros((capacity, *old.shape[1:]), dtype=old.dtype)
+                new[0:start] = old[0:start]
+                setattr(self, name, new)
+            self._capacity = capacity
+        self._i[start:end] = i
+        self._j[start:end] = j
+        self._order[start:end] = order
+        self._shift[start:end] = shift
+        self._n = end
+        self._derived = {}
+        self._version = tick()
+
+        if self._adjacency is not None:
+            self._insert_adjacency(i, j, np.arange(start, end))
+
+        return np.arange(start, end)
+
+    def delete(self, indices):
+        """Delete bonds from the table.
+
+        Parameters
+        ----------
+        indices : array_like of int or bool
+            The indices of the bonds to delete, or a boolean mask.
+
+        Returns
+        -------
+        None
+        """
+        keep = np.ones(self._n, dtype=bool)
+        keep[indices] = False
+        n = int(np.count_nonzero(keep))
+        self._own()
+        for name in ('_i', '_j', '_order', '_shift'):
+            values = getattr(self, name)
+            values[0:n] = values[0:self._n][keep]
+        self._n = n
+        self._adjacency = None
+        self._derived = {}
+        self._version = tick()
+
+    def remap_atoms(self, mapping):
+        """Renumber the atoms after atoms have been deleted or reordered.
+
+        Bonds to atoms that map to -1 are deleted.
+
+        Parameters
+        ----------
+        mapping : numpy.ndarray
+            The new index of each atom, or -1 if it has been deleted.
+
+        Returns
+        -------
+        None
+        """
+        i = mapping[self.i]
+        j = mapping[self.j]
+        self._own()
+        self._i[0:self._n] = i
+        self._j[0:self._n] = j
+        self._adjacency = None
+        self._derived = {}
+        self._version = tick()
+        removed = (i < 0) | (j < 0)
+        if removed.any():
+            self.delete(removed)
+
+    def mutable(self, name):
+        """A writable view of one of the arrays, to change it in place.
+
+        The arrays are copied first if they are shared, and the version of
+        the bonds is updated, so finish the changes before using values
+        cached from the system, or call :meth:`modified` afterwards.
+
+        Parameters
+        ----------
+        name : str
+            The array: 'i', 'j', 'order' or 'shift'.
+
+        Returns
+        -------
+        numpy.ndarray
+            The writable view of the bonds in use.
+        """
+        if name not in ('i', 'j', 'order', 'shift'):
+            raise KeyError("The bonds have no array '{}'".format(name))
+        self._own()
+        self.modified()
+        return getattr(self, '_' + name)[0:self._n]
+
+    def modified(self):
+        """Record that the bonds have changed in place, e.g. their orders.
+
+        Returns
+        -------
+        None
+        """
+        self._derived = {}
+        self._version = tick()
+
+    def copy(self):
+        """Return a copy of the bonds, without spare capacity."""
+        return BondTable.from_arrays(
+            self.i.copy(), self.j.copy(), self.order.copy(),
+            self.shift.copy()
+        )
+
+    def share(self):
+        """Create a table that shares the bonds of this one.
+
+        The bonds are shared copy-on-write: the arrays are read-only, and
+        whichever table is changed first copies them.
+
+        Returns
+        -------
+        BondTable
+            The new table, without spare capacity.
+        """
+        table = BondTable()
+        for name in ('_i', '_j', '_order', '_shift'):
+            setattr(table, name, getattr(self, name)[0:self._n])
+        table._n = table._capacity = self._n
+        table._adjacency = self._adjacency
+        table._derived = self._derived
+        table._version = self._version
+        table._shared = self._shared = True
+        return table
+
+    def adjacency(self, n_atoms):
+        """The CSR adjacency index, built if needed.
+
+        Parameters
+        ----------
+        n_atoms : int
+            The number of atoms in the system.
+
+        Returns
+        -------
+        Adjacency
+            The offsets, neighbors and bond indices.
+        """
+        if self._adjacency is None:
+            self._adjacency = _build_adjacency(self.i, self.j, n_atoms)
+        elif len(self._adjacency.offsets) < n_atoms + 1:
+            # Atoms have been added, and have no bonds yet.
+            offsets = self._adjacency.offsets
+            extra = np.full(n_atoms + 1 - len(offsets), offsets[-1])
+            self._adjacency = self._adjacency._replace(
+                offsets=np.concatenate((offsets, extra))
+            )
+        return self._adjacency
+
+    def neighbors(self, atom, n_atoms):
+        """The atoms bonded to an atom.
+
+        Parameters
+        ----------
+        atom : int
+            The index of the atom.
+        n_atoms : int
+            The number of atoms in the system.
+
+        Returns
+        -------
+        numpy.ndarray
+            The indices of the bonded atoms, as a view into the index.
+        """
+        offsets, neighbors, _ = self.adjacency(n_atoms)
+        return neighbors[offsets[atom]:offsets[atom + 1]]
+
+    def degree(self, n_atoms):
+        """The number of bonds to each atom.
+
+        Parameters
+        ----------
+        n_atoms : int
+            The number of atoms in the system.
+
+        Returns
+        -------
+        numpy.ndarray
+            The number of bonded neighbors of each atom.
+        """
+        return np.diff(self.adjacency(n_atoms).offsets)
+
+    def _view(self, values):
+        """The rows in use of an array, read-only."""
+        values = values[0:self._n]
+        values.flags.writeable = False
+        return values
+
+    def _own(self):
+        """Copy the arrays if they are shared or read-only, before changing
+        them."""
+        names = ('_i', '_j', '_order', '_shift')
+        if self._shared or not all(
+            getattr(self, x).flags.writeable for x in names
+        ):
+            for name in names:
+                setattr(self, name, getattr(self, name).copy())
+            self._shared = False
+
+    def _insert_adjacency(self, i, j, bonds):
+        """Insert new bonds into an existing adjacency index."""
+        offsets, neighbors, bond_index = self._adjacency
+        n_atoms = len(offsets) - 1
+        top = int(max(i.max(initial=-1), j.max(initial=-1))) + 1
+        if top > n_atoms:
+            offsets = np.concatenate(
+                (offsets, np.full(top - n_atoms, offsets[-1]))
+            )
+            n_atoms = top
+        source = np.concatenate((i, j))
+        order = np.argsort(source, kind='stable')
+        source = source[order]
+        target = np.concatenate((j, i))[order]
+        bonds = np.concatenate((bonds, bonds))[order]
+        # Insert each new neighbor at the end of its atom's run of neighbors.
+        # Atoms with no neighbors share positions, hence the sort above.
+        positions = offsets[source + 1]
+        neighbors = np.insert(neighbors, positions, target)
+        bond_index = np.insert(bond_index, positions, bonds)
+        counts = np.bincount(source, minlength=n_atoms)
+        offsets = offsets + np.concatenate(([0], np.cumsum(counts)))
+        self._adjacency = Adjacency(offsets, neighbors, bond_index)
+
+
+def _build_adjacency(i, j, n_atoms):
+    """Build the CSR adjacency index from the bonds."""
+    source = np.concatenate((i, j))
+    target = np.concatenate((j, i))
+    bonds = np.tile(np.arange(len(i), dtype=np.int64), 2)
+    order = np.argsort(source, kind='stable')
+    counts = np.bincount(source, minlength=n_atoms)
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return Adjacency(offsets, target[order], bonds[order])
+
+
+def connected_components(n_atoms, i, j):
+    """Label the connected components, e.g. molecules, of a bond graph.
+
+    This uses vectorized hooking and pointer jumping, so the number of
+    passes grows with the logarithm of the size of the components rather
+    than their length, which matters for long polymer chains.
+
+    Parameters
+    ----------
+    n_atoms : int
+        The number of atoms.
+    i, j : numpy.ndarray
+        The atoms of each bond.
+
+    Returns
+    -------
+    numpy.ndarray
+        For each atom, the index of its component. Components are numbered
+        from 0 in order of their lowest atom.
+    """
+    parent = np.arange(n_atoms, dtype=np.int64)
+    i = np.asarray(i, dtype=np.int64)
+    j = np.asarray(j, dtype=np.int64)
+    while True:
+        pi = parent[i]
+        pj = parent[j]
+        differ = pi != pj
+        if not differ.any():
+            break
+        pi = pi[differ]
+        pj = pj[differ]
+        # Hook the larger root onto the smaller one
+        np.minimum.at(parent, np.maximum(pi, pj), np.minimum(pi, pj))
+        # and compress the paths to the roots.
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+        i = i[differ]
+        j = j[differ]
+    _, labels = np.unique(parent, return_inverse=True)
+    return labels.reshape(-1)
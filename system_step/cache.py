@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+"""Change counters and a cache of values derived from systems.
+
+Every change to a column of an atom table, to a bond table or to the cell
+of a system takes the next value of one global counter, so the versions
+only increase and two columns with the same version hold the same data,
+e.g. a column shared by the configurations of a system. Values derived from
+a system, such as its formula, a selection or a neighbor list, are cached
+keyed by the versions of just the columns they depend on, so changing the
+coordinates does not discard the formula, and least-recently-used entries
+are evicted to bound the memory.
+
+The counter belongs to one process, so the versions in tables pickled in
+another, e.g. systems returned by worker processes, are restamped when they
+are unpickled: each is given a new local version, the same for the same
+version from the same process, so columns shared in the worker are still
+seen as the same data. Caches are pickled empty.
+"""
+
+import collections
+import itertools
+import logging
+import os
+import uuid
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_clock = itertools.count(1)
+# The process the versions were made in, as (pid, unique token)
+_origin = None
+# The local versions given to versions from other processes, most recent last
+_restamped = collections.OrderedDict()
+_max_restamped = 2**16
+
+
+def tick():
+    """The next value of the global change counter.
+
+    Returns
+    -------
+    int
+        A version larger than any given before.
+    """
+    return next(_clock)
+
+
+def origin():
+    """A token unique to this process, for the versions made in it.
+
+    A forked process continues the counter of its parent, so the token is
+    renewed when the process id changes.
+
+    Returns
+    -------
+    str
+        The token.
+    """
+    global _origin
+    pid = os.getpid()
+    if _origin is None or _origin[0] != pid:
+        _origin = (pid, uuid.uuid4().hex)
+    return _origin[1]
+
+
+def restamp(source, version):
+    """The local version for a version made in a process.
+
+    Parameters
+    ----------
+    source : str
+        The token of the process that made the version, from
+        :func:`origin`.
+    version : int
+        The version.
+
+    Returns
+    -------
+    int
+        The version itself if it was made in this process, otherwise a new
+        version, the same each time for the same version and process while
+        it is remembered.
+    """
+    if version == 0 or source == origin():
+        return version
+    key = (source, version)
+    try:
+        result = _restamped[key]
+    except KeyError:
+        result = _restamped[key] = tick()
+        if len(_restamped) > _max_restamped:
+            _restamped.popitem(last=False)
+    else:
+        _restamped.move_to_end(key)
+    return result
+
+
+class DerivedCache(object):
+    """A least-recently-used cache of values derived from a system.
+
+    The entries are keyed by a name, e.g. 'formula' or ('neighbors', 3.0),
+    and by the versions of the data the value depends on, so an entry for
+    older data is never returned and ages out of the cache. Arrays in the
+    values are made read-only, since they are shared by every caller.
+
+    Attributes
+    ----------
+    maxsize : int
+        The largest number of entries kept.
+    hits : int
+        The number of lookups that found a value.
+    misses : int
+        The number of lookups that had to compute the value.
+    """
+
+    def __init__(self, maxsize=128):
+        """Create an empty cache.
+
+        Parameters
+        ----------
+        maxsize : int = 128
+            The largest number of entries kept.
+
+        Returns
+        -------
+        None
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def __contains__(self, entry):
+        return entry in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return 'DerivedCache({} entries, {} hits, {} misses)'.format(
+            len(self._entries), self.hits, self.misses
+        )
+
+    def __getstate__(self):
+        # The entries are keyed by the versions of this process
+        return {'maxsize': self.maxsize}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def get(self, key, versions, function):
+        """The cached value, computing and storing it if need be.
+
+        Parameters
+        ----------
+        key : hashable
+            The name of the value and any arguments it depends on.
+        versions : tuple of int
+            The versions of the data the value is derived from.
+        function : function
+            Computes the value, with no arguments, if it is not cached.
+
+        Returns
+        -------
+        object
+            The value.
+        """
+        entry = (key, versions)
+        try:
+            value = self._entries[entry]
+        except KeyError:
+            pass
+        else:
+            self._entries.move_to_end(entry)
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = _freeze(function())
+        self._entries[entry] = value
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        """Remove all the entries."""
+        self._entries.clear()
+
+
+def _freeze(value):
+    """Make the arrays in a value, or in a tuple of them, read-only."""
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, tuple):
+        for item in value:
+            if isinstance(item, np.ndarray):
+                item.flags.writeable = False
+    return value
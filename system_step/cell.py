@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+"""The periodic cell of a crystal system."""
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Cell(object):
+    """A periodic cell described by its lattice parameters.
+
+    The cell vectors are held as the rows of a 3x3 matrix in the standard
+    orientation, with a along x and b in the xy plane, so that Cartesian
+    coordinates are given by ``fractionals @ vectors``.
+
+    Attributes
+    ----------
+    parameters : numpy.ndarray
+        The lattice parameters a, b, c (Å) and alpha, beta, gamma (degrees).
+    """
+
+    def __init__(self, a, b, c, alpha=90.0, beta=90.0, gamma=90.0):
+        """Create a cell from the lattice parameters.
+
+        Parameters
+        ----------
+        a, b, c : float
+            The lengths of the cell vectors in Å.
+        alpha, beta, gamma : float
+            The angles between the cell vectors in degrees.
+
+        Returns
+        -------
+        None
+        """
+        self.parameters = np.array(
+            [a, b, c, alpha, beta, gamma], dtype=np.float64
+        )
+        self._vectors = None
+        self._inverse = None
+
+    def __repr__(self):
+        return 'Cell({:.6f}, {:.6f}, {:.6f}, {:.4f}, {:.4f}, {:.4f})'.format(
+            *self.parameters
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, Cell):
+            return NotImplemented
+        return np.allclose(self.parameters, other.parameters)
+
+    @classmethod
+    def from_vectors(cls, vectors):
+        """Create a cell from the three cell vectors.
+
+        Parameters
+        ----------
+        vectors : array_like
+            A 3x3 array whose rows are the cell vectors.
+
+        Returns
+        -------
+        Cell
+            The new cell.
+        """
+        vectors = np.asarray(vectors, dtype=np.float64).reshape(3, 3)
+        a, b, c = np.linalg.norm(vectors, axis=1)
+        alpha = np.degrees(np.arccos(np.dot(vectors[1], vectors[2]) / (b * c)))
+        beta = np.degrees(np.arccos(np.dot(vectors[0], vectors[2]) / (a * c)))
+        gamma = np.degrees(np.arccos(np.dot(vectors[0], vectors[1]) / (a * b)))
+        return cls(a, b, c, alpha, beta, gamma)
+
+    def copy(self):
+        """Return a copy of this cell."""
+        return Cell(*self.parameters)
+
+    @property
+    def a(self):
+        """The length of the first cell vector in Å."""
+        return self.parameters[0]
+
+    @property
+    def b(self):
+        """The length of the second cell vector in Å."""
+        return self.parameters[1]
+
+    @property
+    def c(self):
+        """The length of the third cell vector in Å."""
+        return self.parameters[2]
+
+    @property
+    def alpha(self):
+        """The angle between b and c in degrees."""
+        return self.parameters[3]
+
+    @property
+    def beta(self):
+        """The angle between a and c in degrees."""
+        return self.parameters[4]
+
+    @property
+    def gamma(self):
+        """The angle between a and b in degrees."""
+        return self.parameters[5]
+
+    @property
+    def is_orthorhombic(self):
+        """Whether all the cell angles are 90 degrees."""
+        return bool(np.allclose(self.parameters[3:], 90.0))
+
+    @property
+    def vectors(self):
+        """The cell vectors as the rows of a 3x3 array."""
+        if self._vectors is None:
+            a, b, c = self.parameters[0:3]
+            alpha, beta, gamma = np.radians(self.parameters[3:])
+            cos_alpha, cos_beta, cos_gamma = np.cos([alpha, beta, gamma])
+            sin_gamma = np.sin(gamma)
+            cx = c * cos_beta
+            cy = c * (cos_alpha - cos_beta * cos_gamma) / sin_gamma
+            cz = np.sqrt(max(c * c - cx * cx - cy * cy, 0.0))
+            vectors = np.array(
+                [
+                    [a, 0.0, 0.0],
+                    [b * cos_gamma, b * sin_gamma, 0.0],
+                    [cx, cy, cz],
+                ]
+            )
+            # Clean up round-off so that orthorhombic cells are exactly so.
+            vectors[np.abs(vectors) < 1.0e-12] = 0.0
+            vectors.flags.writeable = False
+            self._vectors = vectors
+        return self._vectors
+
+    @property
+    def inverse(self):
+        """The inverse of the matrix of cell vectors."""
+        if self._inverse is None:
+            inverse = np.linalg.inv(self.vectors)
+            inverse.flags.writeable = False
+            self._inverse = inverse
+        return self._inverse
+
+    @property
+    def volume(self):
+        """The volume of the cell in Å^3."""
+        return float(abs(np.linalg.det(self.vectors)))
+
+    @property
+    def widths(self):
+        """The perpendicular distances between opposite faces of the cell.
+
+        Returns
+        -------
+        numpy.ndarray
+            The three widths in Å, perpendicular to the bc, ac and ab planes.
+        """
+        return 1.0 / np.linalg.norm(self.inverse, axis=0)
+
+    def to_fractionals(self, xyz):
+        """Convert Cartesian coordinates to fractional coordinates.
+
+        Parameters
+        ----------
+        xyz : array_like
+            An Nx3 array of Cartesian coordinates in Å.
+
+        Returns
+        -------
+        numpy.ndarray
+            The Nx3 array of fractional coordinates.
+        """
+        return np.asarray(xyz, dtype=np.float64) @ self.inverse
+
+    def to_cartesians(self, uvw):
+        """Convert fractional coordinates to Cartesian coordinates.
+
+        Parameters
+        ----------
+        uvw : array_like
+            An Nx3 array of fractional coordinates.
+
+        Returns
+        -------
+        numpy.ndarray
+            The Nx3 array of Cartesian coordinates in Å.
+        """
+        return np.asarray(uvw, dtype=np.float64) @ self.vectors
@@ -0,0 +1,728 @@
+# -*- coding: utf-8 -*-
+
+"""Reading CIF and mmCIF files.
+
+Both small-molecule CIF and macromolecular mmCIF files are sequences of
+data blocks holding tagged items and `loop_` tables. The file is mapped
+into memory and the data blocks are found and parsed one at a time, so a
+library of thousands of structures is read lazily, one block per system.
+
+The single items of a block are few and are tokenized with a regular
+expression. The loops, and in particular the atom sites of a large mmCIF
+file, are not: the start and end of every whitespace-delimited token in
+the body of a loop are found with NumPy, and each column of the loop is
+gathered directly into an array of fixed-width byte strings, without
+creating a Python object per token. Loops containing quoted strings with
+embedded blanks, comments or semicolon-delimited text fields fall back to
+the regular expression.
+
+Numbers may carry a standard uncertainty in parentheses, e.g. '1.234(5)',
+which is dropped. The special values '?' and '.', unknown and not
+applicable, are treated as missing.
+
+The symmetry operations of a crystal are kept in the block, and by default
+only the atoms listed in the file, the asymmetric unit, are placed in the
+system. Optionally the asymmetric unit is expanded to the full cell with
+the operations in the file or, if there are none, its space group.
+"""
+
+import collections
+import logging
+import mmap
+from pathlib import Path
+import re
+
+import numpy as np
+
+from system_step.atoms import AtomTable
+from system_step.cell import Cell
+from system_step import compression
+from system_step import elements
+from system_step.molecular_system import MolecularSystem
+from system_step.symmetry import expand as expand_symmetry
+
+logger = logging.getLogger(__name__)
+
+Block = collections.namedtuple('Block', 'name items loops')
+Block.__doc__ = """A data block of a CIF file.
+
+Attributes
+----------
+name : str
+    The name of the block, the text after 'data_'.
+items : dict(str, str)
+    The single items, keyed by the tag in lowercase.
+loops : dict(str, numpy.ndarray)
+    The columns of the loops as arrays of byte strings, without quotes,
+    keyed by the tag in lowercase.
+"""
+
+# The start of each data block. Searching for a newline first is much
+# faster than for the start of a line.
+_data_re = re.compile(rb'\n(?i:data_)(\S*)')
+_first_data_re = re.compile(rb'(?i:data_)(\S*)')
+
+# Whitespace and comments between tokens.
+_skip_re = re.compile(rb'(?:\s+|#[^\n]*)*')
+
+# A token: a text field between lines starting with semicolons, a quoted
+# string, which ends at a quote followed by whitespace, or a bare word.
+_token_re = re.compile(
+    rb'^;(?P<text>.*?)\r?\n;'
+    rb"|'(?P<single>[^\n]*?)'(?=\s|$)"
+    rb'|"(?P<double>[^\n]*?)"(?=\s|$)'
+    rb'|(?P<bare>\S+)',
+    re.MULTILINE | re.DOTALL
+)
+
+# The line after the body of a loop, starting with a tag or a keyword.
+_loop_end_re = re.compile(
+    rb'\n[ \t]*(?:_|(?i:loop_|data_|save_|global_|stop_))'
+)
+
+_keywords = (b'loop_', b'save_', b'global_', b'stop_', b'data_')
+
+# The number of bytes of a loop to scan for tokens at a time, and the
+# number of rows to gather at a time.
+_piece_size = 2**18
+_chunk_size = 2**14
+
+# The tags of the symmetry operations, in the order of preference.
+_symmetry_tags = (
+    '_space_group_symop_operation_xyz',
+    '_space_group_symop.operation_xyz',
+    '_symmetry_equiv_pos_as_xyz',
+    '_symmetry_equiv.pos_as_xyz',
+)
+# and of the space group, used if there are no operations.
+_space_group_tags = (
+    '_space_group_name_h-m_alt',
+    '_space_group.name_h-m_alt',
+    '_symmetry_space_group_name_h-m',
+    '_symmetry.space_group_name_h-m',
+    '_space_group_it_number',
+    '_space_group.it_number',
+    '_symmetry_int_tables_number',
+    '_symmetry.int_tables_number',
+)
+
+
+def iter_blocks(path):
+    """Parse the data blocks of a CIF or mmCIF file one at a time.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The CIF file.
+
+    Yields
+    ------
+    Block
+        The tagged items and loops of each data block.
+    """
+    if compression.is_compressed(path):
+        # The text is decompressed into memory, since a map needs a file.
+        with compression.open_file(path) as fd:
+            data = fd.read()
+    else:
+        with open(path, 'rb') as fd:
+            if fd.seek(0, 2) == 0:
+                return
+            # The map is closed when it is garbage collected, which also
+            # covers arrays that are still using it if parsing fails.
+            data = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    match = _first_data_re.match(data) or _data_re.search(data)
+    while match is not None:
+        following = _data_re.search(data, match.end())
+        end = len(data) if following is None else following.start() + 1
+        name = match.group(1).decode('utf-8', 'replace')
+        yield _parse_block(data, name, match.end(), end)
+        match = following
+
+
+def iter_cif(path, start=0, stop=None, step=1, symmetry=None):
+    """Read the systems in a CIF or mmCIF file one at a time.
+
+    Each data block with atom sites is a system, except that the models of
+    a multi-model mmCIF block, e.g. from NMR, are separate systems. The
+    systems are selected like a slice of a list, starting from 0.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The CIF file.
+    start : int = 0
+        The first system to read.
+    stop : int = None
+        The system to stop before, or None to read to the end.
+    step : int = 1
+        Read every `step`'th system.
+    symmetry : str, int or [str] = None
+        Expand the asymmetric units of crystals to the full cell with the
+        symmetry in the file, 'from file', or with a space group or
+        operations, as for :func:`symmetry.operations`. By default the
+        atoms are as listed in the file.
+
+    Yields
+    ------
+    MolecularSystem
+        Each selected system in the file.
+    """
+    if start < 0 or step < 1 or (stop is not None and stop < 0):
+        raise ValueError(
+            'Invalid system selection {}:{}:{}'.format(start, stop, step)
+        )
+    path = Path(path)
+    count = 0
+    for block in iter_blocks(path):
+        for system in _systems(block, path, symmetry):
+            if stop is not None and count >= stop:
+                return
+            if count >= start and (count - start) % step == 0:
+                yield system
+            count += 1
+
+
+def symmetry_operations(block):
+    """The symmetry operations of a crystal, e.g. '-x, y+1/2, -z'.
+
+    Parameters
+    ----------
+    block : Block
+        The data block.
+
+    Returns
+    -------
+    [str]
+        The operations, or an empty list if there are none.
+    """
+    for tag in _symmetry_tags:
+        values = _values(block, tag)
+        if values is not None:
+            return [value.decode('ascii', 'replace') for value in values]
+    return []
+
+
+def space_group(block):
+    """The space group of a crystal, e.g. 'P 21/c' or '14'.
+
+    Parameters
+    ----------
+    block : Block
+        The data block.
+
+    Returns
+    -------
+    str
+        The Hermann-Mauguin symbol or number, or None if neither is given.
+    """
+    values = _first_values(block, *_space_group_tags)
+    if values is None or _missing(values[0:1])[0]:
+        return None
+    return values[0].decode('ascii', 'replace')
+
+
+def _token(data, pos, end):
+    """The next token, or None at the end of the block.
+
+    Returns
+    -------
+    (bytes, bool, int, int)
+        The value of the token, whether it is a bare word rather than a
+        quoted string or text field, and its start and end.
+    """
+    pos = _skip_re.match(data, pos, end).end()
+    if pos >= end:
+        return None
+    match = _token_re.match(data, pos, end)
+    if match is None:
+        # An unterminated text field; read the semicolon as a word.
+        return data[pos:pos + 1], True, pos, pos + 1
+    return (
+        match.group(match.lastgroup), match.lastgroup == 'bare', pos,
+        match.end()
+    )
+
+
+def _parse_block(data, name, start, end):
+    """Parse the items and loops of a data block."""
+    items = {}
+    loops = {}
+    tag = None
+    pos = start
+    while True:
+        token = _token(data, pos, end)
+        if token is None:
+            break
+        value, bare, first, pos = token
+        if tag is not None:
+            items[tag] = value.decode('utf-8', 'replace')
+            tag = None
+        elif bare and value[0:1] == b'_':
+            tag = value.decode('ascii', 'replace').lower()
+        elif bare and value[0:5].lower() == b'loop_':
+            tags = []
+            while True:
+                token = _token(data, pos, end)
+                if token is None or not token[1] or token[0][0:1] != b'_':
+                    break
+                tags.append(token[0].decode('ascii', 'replace').lower())
+                pos = token[3]
+            columns, pos = _loop(data, pos, end, len(tags))
+            loops.update(zip(tags, columns))
+        elif bare and value[0:5].lower() == b'save_':
+            # Save frames only occur in dictionaries; skip their contents.
+            pass
+        else:
+            logger.debug(
+                "Ignoring the stray value '{}' in the data block '{}'".format(
+                    value.decode('utf-8', 'replace'), name
+                )
+            )
+    if tag is not None:
+        logger.warning(
+            "The item '{}' in the data block '{}' has no value.".format(
+                tag, name
+            )
+        )
+    return Block(name, items, loops)
+
+
+def _loop(data, start, end, n_columns):
+    """Read the values of a loop into columns.
+
+    Returns
+    -------
+    ([numpy.ndarray], int)
+        The columns as arrays of byte strings, and the end of the loop.
+    """
+    match = _loop_end_re.search(data, start, end)
+    last = end if match is None else match.start() + 1
+    if n_columns > 0:
+        columns = _split_loop(
+            data, start, _trim_comments(data, start, last), n_columns
+        )
+        if columns is not None:
+            return columns, last
+    return _tokenize_loop(data, start, end, n_columns)
+
+
+def _trim_comments(data, start, end):
+    """The end of a loop without the comment lines following it."""
+    while True:
+        line = data.rfind(b'\n', start, end) + 1
+        if line < start or data[line:end].strip() == b'':
+            if line <= start:
+                return end
+            end = line - 1
+        elif data[line:end].lstrip()[0:1] == b'#':
+            end = line
+        else:
+            return end
+
+
+def _split_loop(data, start, end, n_columns):
+    """Split a loop into columns with NumPy, if it has only simple tokens.
+
+    Returns
+    -------
+    [numpy.ndarray]
+        The columns, or None if the loop has comments, text fields or
+        quoted strings containing blanks.
+    """
+    buffer = np.frombuffer(
+        data, dtype=np.uint8, count=end - start, offset=start
+    )
+    starts, ends = _token_bounds(buffer)
+    if len(starts) == 0:
+        return [np.zeros(0, dtype='S1')] * n_columns
+
+    # Comments and text fields are rare in loops, and quoted strings are
+    # mostly names like "O5'", so search for them before checking tokens.
+    if data.find(b'#', start, end) >= 0 or data.find(b'\n;', start, end) >= 0:
+        return None
+    if data.find(b"'", start, end) >= 0 or data.find(b'"', start, end) >= 0:
+        first = buffer[starts]
+        quoted = np.flatnonzero((first == ord("'")) | (first == ord('"')))
+        if np.any(
+            (buffer[ends[quoted] - 1] != first[quoted]) |
+            (ends[quoted] - starts[quoted] < 2)
+        ):
+            return None
+        starts[quoted] += 1
+        ends[quoted] -= 1
+
+    if len(starts) % n_columns != 0:
+        raise ValueError(
+            'A loop has {} values, which is not a multiple of its {} '
+            'columns.'.format(len(starts), n_columns)
+        )
+    return _gather(
+        buffer, starts.reshape(-1, n_columns), ends.reshape(-1, n_columns)
+    )
+
+
+def _token_bounds(buffer):
+    """The start and end of each whitespace-delimited token in a buffer.
+
+    Control characters are treated as blanks, like the whitespace of CIF.
+    """
+    starts = []
+    ends = []
+    previous = True
+    for first in range(0, len(buffer), _piece_size):
+        blank = buffer[first:first + _piece_size] <= 32
+        shifted = np.empty_like(blank)
+        shifted[0] = previous
+        shifted[1:] = blank[:-1]
+        # A token starts after a blank and ends at one.
+        starts.append(np.flatnonzero(shifted > blank) + first)
+        ends.append(np.flatnonzero(blank > shifted) + first)
+        previous = blank[-1]
+    if not previous:
+        ends.append(np.array([len(buffer)]))
+    return np.concatenate(starts), np.concatenate(ends)
+
+
+def _gather(buffer, starts, ends):
+    """Gather the tokens of a loop into columns of byte strings.
+
+    Each column is gathered as an array of characters as wide as its
+    longest token, with the bytes past the end of each token cleared, a few
+    thousand rows at a time to limit the memory used.
+
+    Parameters
+    ----------
+    buffer : numpy.ndarray
+        The bytes of the loop.
+    starts, ends : numpy.ndarray
+        The start and end of each token, with a column for each column of
+        the loop.
+
+    Returns
+    -------
+    [numpy.ndarray]
+        The columns.
+    """
+    n, n_columns = starts.shape
+    widths = (ends - starts).max(axis=0, initial=1)
+    columns = [np.zeros((n, int(width)), dtype=np.uint8) for width in widths]
+    for first in range(0, n, _chunk_size):
+        chunk = slice(first, first + _chunk_size)
+        for column, result in enumerate(columns):
+            offsets = starts[chunk, column, None] + np.arange(result.shape[1])
+            past = offsets >= ends[chunk, column, None]
+            # Tokens near the end of the buffer are padded from its last byte.
+            values = buffer[np.minimum(offsets, len(buffer) - 1)]
+            values[past] = 0
+            result[chunk] = values
+    return [
+        result.view('S{}'.format(result.shape[1])).reshape(n)
+        for result in columns
+    ]
+
+
+def _tokenize_loop(data, start, end, n_columns):
+    """Read the values of a loop token by token."""
+    values = []
+    pos = start
+    while True:
+        token = _token(data, pos, end)
+        if token is None:
+            break
+        value, bare, first, last = token
+        if bare and (value[0:1] == b'_' or value[0:6].lower() in _keywords):
+            break
+        values.append(value)
+        pos = last
+    if n_columns == 0 or len(values) % n_columns != 0:
+        raise ValueError(
+            'A loop has {} values, which is not a multiple of its {} '
+            'columns.'.format(len(values), n_columns)
+        )
+    if len(values) == 0:
+        return [np.zeros(0, dtype='S1')] * n_columns, pos
+    table = np.array(values, dtype=bytes).reshape(-1, n_columns)
+    return [table[:, column].copy() for column in range(n_columns)], pos
+
+
+def _values(block, tag):
+    """The values of a tag as an array of byte strings, or None."""
+    if tag in block.loops:
+        return block.loops[tag]
+    if tag in block.items:
+        return np.array([block.items[tag].encode('utf-8')])
+    return None
+
+
+def _first_values(block, *tags):
+    """The values of the first of the tags that is present, or None."""
+    for tag in tags:
+        values = _values(block, tag)
+        if values is not None:
+            return values
+    return None
+
+
+def _missing(values):
+    """Whether values are unknown, '?', or not applicable, '.'."""
+    return (values == b'?') | (values == b'.') | (values == b'')
+
+
+def _numbers(values, dtype=np.float64, default=0):
+    """Convert values to numbers, dropping standard uncertainties."""
+    try:
+        return values.astype(dtype)
+    except ValueError:
+        pass
+    values = np.char.partition(values, b'(')[:, 0]
+    missing = _missing(values)
+    values[missing] = b'0'
+    try:
+        result = values.astype(dtype)
+    except ValueError as e:
+        raise ValueError('Invalid number in a CIF file: {}'.format(e))
+    result[missing] = default
+    return result
+
+
+def _unique(values):
+    """The distinct values and, for each value, the index of its value."""
+    unique, inverse = np.unique(values, return_inverse=True)
+    return unique, inverse.reshape(-1)
+
+
+def _strings(values):
+    """Decode values to strings, once per distinct value."""
+    if len(values) == 0:
+        return np.zeros(0, dtype='U1')
+    unique, inverse = _unique(values)
+    text = [
+        '' if value in (b'?', b'.') else value.decode('utf-8', 'replace')
+        for value in unique
+    ]
+    return np.array(text)[inverse]
+
+
+def _atomic_numbers(symbols):
+    """The atomic numbers from element symbols, type symbols or labels.
+
+    Type symbols may carry an oxidation state, e.g. 'Fe3+', and labels a
+    number, e.g. 'Ca1' or 'H12A', so the element is the leading letters:
+    two if they form a symbol and otherwise one.
+    """
+    if len(symbols) == 0:
+        return np.zeros(0, dtype=np.int16)
+    unique, inverse = _unique(symbols)
+    codes = np.zeros(len(unique), dtype=np.int16)
+    for i, value in enumerate(unique):
+        letters = re.match(rb'[A-Za-z]*', value).group(0).decode('ascii')
+        for symbol in (letters[0:2], letters[0:1]):
+            try:
+                codes[i] = elements.atomic_number(symbol)
+                break
+            except ValueError:
+                pass
+        else:
+            logger.warning(
+                "Unknown element '{}' in a CIF file.".format(
+                    value.decode('utf-8', 'replace')
+                )
+            )
+    return codes[inverse]
+
+
+def _cell(block, separator):
+    """The cell from the '_cell' items, if there is one."""
+    values = []
+    for name in (
+        'length_a', 'length_b', 'length_c', 'angle_alpha', 'angle_beta',
+        'angle_gamma'
+    ):
+        value = _values(block, '_cell' + separator + name)
+        if value is None:
+            if name.startswith('angle'):
+                value = np.array([b'90'])
+            else:
+                return None
+        values.append(_numbers(value[0:1], default=np.nan)[0])
+    if np.any(np.isnan(values)):
+        return None
+    a, b, c, alpha, beta, gamma = values
+    # A unit cube is the conventional placeholder for non-crystal structures
+    if a == 1.0 and b == 1.0 and c == 1.0:
+        return None
+    return Cell(a, b, c, alpha, beta, gamma)
+
+
+def _systems(block, path, symmetry=None):
+    """Create the systems in a data block.
+
+    Yields
+    ------
+    MolecularSystem
+        The system, or one for each model of an mmCIF block.
+    """
+    name = block.name
+    if name == '':
+        name = compression.strip_extension(path).stem
+    if _values(block, '_atom_site.cartn_x') is not None:
+        yield from _mmcif_systems(block, name)
+    elif (
+        _values(block, '_atom_site_fract_x') is not None or
+        _values(block, '_atom_site_cartn_x') is not None
+    ):
+        system = _crystal_system(block, name)
+        if symmetry is not None and system.cell is not None:
+            system = _expand(block, system, symmetry)
+        yield system
+    else:
+        logger.debug(
+            "The data block '{}' of '{}' has no atoms.".format(name, path)
+        )
+
+
+def _crystal_system(block, name):
+    """Create a system from a small-molecule CIF data block."""
+    cell = _cell(block, '_')
+    labels = _values(block, '_atom_site_label')
+    symbols = _first_values(
+        block, '_atom_site_type_symbol', '_atom_site_label'
+    )
+    if symbols is None:
+        raise ValueError(
+            "The atom sites in the data block '{}' have no type symbols or "
+            'labels.'.format(name)
+        )
+    n = len(symbols)
+
+    if _values(block, '_atom_site_fract_x') is not None:
+        if cell is None:
+            raise ValueError(
+                "The data block '{}' has fractional coordinates but no "
+                'cell.'.format(name)
+            )
+        uvw = np.column_stack(
+            [
+                _numbers(_values(block, tag))
+                for tag in ('_atom_site_fract_x', '_atom_site_fract_y',
+                            '_atom_site_fract_z')
+            ]
+        )
+        xyz = cell.to_cartesians(uvw)
+    else:
+        xyz = np.column_stack(
+            [
+                _numbers(_values(block, tag))
+                for tag in ('_atom_site_cartn_x', '_atom_site_cartn_y',
+                            '_atom_site_cartn_z')
+            ]
+        )
+
+    columns = {}
+    if labels is not None:
+        columns['name'] = _strings(labels)
+    occupancy = _values(block, '_atom_site_occupancy')
+    columns['occupancy'] = (
+        np.ones(n) if occupancy is None else _numbers(occupancy, default=1.0)
+    )
+    return MolecularSystem(
+        name=name,
+        atoms=AtomTable.from_arrays(_atomic_numbers(symbols), xyz, **columns),
+        cell=cell
+    )
+
+
+def _expand(block, system, symmetry):
+    """Expand the asymmetric unit of a crystal to the full cell."""
+    if symmetry == 'from file':
+        symmetry = symmetry_operations(block)
+        if len(symmetry) == 0:
+            symmetry = space_group(block)
+        if symmetry is None:
+            logger.warning(
+                "The crystal '{}' has no symmetry operations or space "
+                'group, so is left as it is.'.format(system.name)
+            )
+            return system
+    return expand_symmetry(system, symmetry)
+
+
+def _mmcif_systems(block, name):
+    """Create the systems, one per model, from an mmCIF data block.
+
+    The author's names and numbering are used where present, as in PDB
+    files.
+    """
+    cell = _cell(block, '.')
+    xyz = np.column_stack(
+        [
+            _numbers(_values(block, tag))
+            for tag in ('_atom_site.cartn_x', '_atom_site.cartn_y',
+                        '_atom_site.cartn_z')
+        ]
+    )
+    n = len(xyz)
+    atom_names = _first_values(
+        block, '_atom_site.auth_atom_id', '_atom_site.label_atom_id'
+    )
+    symbols = _first_values(block, '_atom_site.type_symbol')
+    if symbols is None:
+        symbols = atom_names
+    if symbols is None:
+        raise ValueError(
+            "The atom sites in the data block '{}' have no type symbols or "
+            'names.'.format(name)
+        )
+
+    columns = {}
+    if atom_names is not None:
+        columns['name'] = _strings(atom_names)
+    for column, tags in (
+        (
+            'residue_name',
+            ('_atom_site.auth_comp_id', '_atom_site.label_comp_id')
+        ),
+        ('chain', ('_atom_site.auth_asym_id', '_atom_site.label_asym_id')),
+    ):
+        values = _first_values(block, *tags)
+        if values is not None:
+            columns[column] = _strings(values)
+    values = _first_values(
+        block, '_atom_site.auth_seq_id', '_atom_site.label_seq_id'
+    )
+    if values is not None:
+        columns['residue'] = _numbers(values, dtype=np.int32)
+    values = _values(block, '_atom_site.occupancy')
+    columns['occupancy'] = (
+        np.ones(n) if values is None else _numbers(values, default=1.0)
+    )
+    values = _values(block, '_atom_site.b_iso_or_equiv')
+    columns['b_factor'] = np.zeros(n) if values is None else _numbers(values)
+    values = _values(block, '_atom_site.pdbx_formal_charge')
+    if values is not None:
+        columns['formal_charge'] = _numbers(values, dtype=np.int8)
+    atno = _atomic_numbers(symbols)
+
+    values = _values(block, '_atom_site.pdbx_pdb_model_num')
+    models = None if values is None else _numbers(values, dtype=np.int64)
+    if models is None or np.all(models == models[0:1]):
+        yield MolecularSystem(
+            name=name,
+            atoms=AtomTable.from_arrays(atno, xyz, **columns),
+            cell=cell
+        )
+        return
+
+    numbers, first = np.unique(models, return_index=True)
+    for number in numbers[np.argsort(first)]:
+        rows = np.flatnonzero(models == number)
+        yield MolecularSystem(
+            name='{}:{}'.format(name, number),
+            atoms=AtomTable.from_arrays(
+                atno[rows], xyz[rows],
+                **{key: value[rows]
+                   for key, value in columns.items()}
+            ),
+            cell=cell
+        )
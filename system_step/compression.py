@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+"""Reading and writing compressed files as streams.
+
+Compressed structure files are decompressed as they are read, rather than
+to a temporary file first, which would double the disk space and the I/O.
+The compression of a file being read is recognized from its first bytes,
+so a misnamed file is still read correctly; the compression of a file
+being written is chosen by its extension.
+
+gzip, bzip2, xz and the legacy LZMA-alone format of '.lzma' files are
+handled by the standard library. Zstandard needs the optional package
+'zstandard'.
+
+Compressed streams cannot seek backwards or map into memory cheaply, so
+the readers read them from start to end and do not index their frames.
+"""
+
+import bz2
+import gzip
+import logging
+import lzma
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# The compressions, keyed by name, with their magic bytes and extensions
+compressions = {
+    'gzip': (b'\x1f\x8b', ('.gz', '.gzip')),
+    'bzip2': (b'BZh', ('.bz2',)),
+    'xz': (b'\xfd7zXZ\x00', ('.xz',)),
+    # LZMA-alone files start with the properties byte of the default
+    # lc=3, lp=0, pb=2, then a little-endian dictionary size.
+    'lzma': (b'\x5d\x00\x00', ('.lzma',)),
+    'zstd': (b'\x28\xb5\x2f\xfd', ('.zst', '.zstd')),
+}
+
+
+def compression_from_contents(path):
+    """The compression of a file from its first bytes.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The file.
+
+    Returns
+    -------
+    str or None
+        The compression, a key of `compressions`, or None if the file is
+        not compressed.
+    """
+    with open(path, 'rb') as fd:
+        start = fd.read(8)
+    for name, (magic, _) in compressions.items():
+        if start.startswith(magic):
+            return name
+    return None
+
+
+def compression_from_extension(path):
+    """The compression of a file from its extension.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The name of the file.
+
+    Returns
+    -------
+    str or None
+        The compression, a key of `compressions`, or None if the extension
+        is not that of a compressed file.
+    """
+    suffix = Path(path).suffix.lower()
+    for name, (_, extensions) in compressions.items():
+        if suffix in extensions:
+            return name
+    return None
+
+
+def strip_extension(path):
+    """The name of a file without the extension of its compression.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The name of the file, e.g. 'run.xyz.gz'.
+
+    Returns
+    -------
+    pathlib.Path
+        The name without the compression extension, e.g. 'run.xyz'.
+    """
+    path = Path(path)
+    if compression_from_extension(path) is None:
+        return path
+    return path.with_suffix('')
+
+
+def open_file(path, mode='rb', compression='detect'):
+    """Open a file, compressed or not, in binary mode.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The file.
+    mode : str = 'rb'
+        'rb' to read or 'wb' to write.
+    compression : str = 'detect'
+        The compression, a key of `compressions` or None for none. By
+        default it is found from the contents of a file being read, or the
+        extension of one being written.
+
+    Returns
+    -------
+    file
+        The file object, which decompresses or compresses as it is used.
+    """
+    if mode not in ('rb', 'wb'):
+        raise ValueError("Files can only be opened with 'rb' or 'wb'.")
+    if compression == 'detect':
+        if mode == 'rb':
+            compression = compression_from_contents(path)
+        else:
+            compression = compression_from_extension(path)
+    if compression is not None:
+        logger.debug("Opening '{}' as {}".format(path, compression))
+
+    if compression is None:
+        return open(path, mode)
+    elif compression == 'gzip':
+        return gzip.open(path, mode)
+    elif compression == 'bzip2':
+        return bz2.open(path, mode)
+    elif compression == 'xz':
+        return lzma.open(path, mode)
+    elif compression == 'lzma':
+        return lzma.open(path, mode, format=lzma.FORMAT_ALONE)
+    elif compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError(
+                "The file '{}' is compressed with Zstandard, which needs the "
+                "Python package 'zstandard'.".format(path)
+            )
+        return zstandard.open(path, mode)
+    raise ValueError("Unknown compression '{}'".format(compression))
+
+
+def is_compressed(path):
+    """Whether a file is compressed, from its first bytes.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The file.
+
+    Returns
+    -------
+    bool
+        True if the file is compressed.
+    """
+    return compression_from_contents(path) is not None
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+"""Indexes of the byte offsets of the frames in multi-frame text files.
+
+Reading frame 9000 of a trajectory without an index means scanning the
+first 8999 frames. The index records where each frame starts, so the
+readers can seek straight to it. Building the index scans the file once,
+in large binary chunks, and the index is cached on disk next to the file.
+The cache records the size and modification time of the file, and is
+rebuilt if they no longer match.
+
+Compressed files are indexed by their decompressed contents. Such an index
+gives the sizes of the frames, though the readers do not seek with it.
+"""
+
+import logging
+import os
+from pathlib import Path
+import re
+
+import numpy as np
+
+from system_step import compression
+
+logger = logging.getLogger(__name__)
+
+# Increment when the layout of the cached index changes.
+_version = 1
+
+# The lines of a PDB file that matter for the index.
+_pdb_re = re.compile(rb'^(MODEL |ATOM  |HETATM)', re.MULTILINE)
+
+
+class FrameIndex(object):
+    """The byte offsets and sizes of the frames in a file.
+
+    Attributes
+    ----------
+    offsets : numpy.ndarray
+        The byte offset of the start of each frame.
+    n_atoms : numpy.ndarray
+        The number of atoms in each frame.
+    """
+
+    def __init__(self, offsets, n_atoms):
+        """Create an index.
+
+        Parameters
+        ----------
+        offsets : array_like of int
+            The byte offset of the start of each frame.
+        n_atoms : array_like of int
+            The number of atoms in each frame.
+
+        Returns
+        -------
+        None
+        """
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.n_atoms = np.asarray(n_atoms, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __repr__(self):
+        return 'FrameIndex({} frames)'.format(len(self))
+
+
+def cache_path(path):
+    """The file that the index of a file is cached in.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The file that is indexed.
+
+    Returns
+    -------
+    pathlib.Path
+        The path of the cached index.
+    """
+    path = Path(path)
+    return path.with_name(path.name + '.index.npz')
+
+
+def get_index(path, file_type, cache=True):
+    """The index of the frames in a file, from the cache if it is current.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The file.
+    file_type : str
+        The type of the file, 'XYZ' or 'PDB'.
+    cache : bool = True
+        Whether to use and update the index cached next to the file.
+
+    Returns
+    -------
+    FrameIndex
+        The index of the frames.
+    """
+    path = Path(path)
+    stat = os.stat(path)
+    stamp = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+    index_path = cache_path(path)
+
+    if cache and index_path.exists():
+        try:
+            with np.load(index_path) as data:
+                if (
+                    int(data['version']) == _version and
+                    str(data['file_type']) == file_type and
+                    np.array_equal(data['stamp'], stamp)
+                ):
+                    return FrameIndex(data['offsets'], data['n_atoms'])
+            logger.debug("The index '{}' is stale.".format(index_path))
+        except Exception as e:
+            logger.warning(
+                "Ignoring unreadable index '{}': {}".format(index_path, e)
+            )
+
+    if file_type == 'XYZ':
+        index = index_xyz(path)
+    elif file_type == 'PDB':
+        index = index_pdb(path)
+    else:
+        raise ValueError("Cannot index files of type '{}'".format(file_type))
+
+    if cache:
+        try:
+            # Write to a temporary file and rename, so readers never see a
+            # partial index.
+            tmp_path = index_path.with_name(index_path.name + '.tmp.npz')
+            np.savez(
+                tmp_path,
+                version=_version,
+                file_type=file_type,
+                stamp=stamp,
+                offsets=index.offsets,
+                n_atoms=index.n_atoms
+            )
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            logger.debug(
+                "Could not cache the index of '{}': {}".format(path, e)
+            )
+    return index
+
+
+def _chunks(path, chunk_size):
+    """Read a file in chunks that end on a line boundary.
+
+    Yields
+    ------
+    (int, bytes)
+        The offset of the chunk in the file and its contents, complete lines
+        except possibly for the last chunk.
+    """
+    with compression.open_file(path) as fd:
+        offset = 0
+        carry = b''
+        while True:
+            data = fd.read(chunk_size)
+            if not data:
+                break
+            data = carry + data
+            end = data.rfind(b'\n') + 1
+            if end == 0:
+                carry = data
+                continue
+            yield offset, data[0:end]
+            offset += end
+            carry = data[end:]
+        if carry:
+            yield offset, carry
+
+
+def index_xyz(path, chunk_size=2**26):
+    """Index the frames of an XYZ file.
+
+    The newlines in each chunk of the file are found with NumPy, and only
+    the line with the atom count at the start of each frame is parsed.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The XYZ file.
+    chunk_size : int = 2**26
+        The number of bytes to read at a time.
+
+    Returns
+    -------
+    FrameIndex
+        The index of the frames.
+    """
+    offsets = []
+    counts = []
+    next_frame = 0  # The line number of the next frame's atom count
+    first_line = 0  # The line number of the first line in the chunk
+    for base, data in _chunks(path, chunk_size):
+        ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10)
+        if len(ends) == 0 or ends[-1] != len(data) - 1:
+            # The last line of the file, without a newline
+            ends = np.append(ends, len(data))
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        n_lines = len(ends)
+        while next_frame - first_line < n_lines:
+            line = next_frame - first_line
+            fields = data[starts[line]:ends[line]].split()
+            if len(fields) == 0:
+                # Blank lines between or after the frames
+                next_frame += 1
+                continue
+            try:
+                n_atoms = int(fields[0])
+            except ValueError:
+                raise ValueError(
+                    "Frame {} of '{}' is not XYZ: the first line should be "
+                    'the number of atoms, not "{}"'.format(
+                        len(offsets), path, fields[0].decode(errors='replace')
+                    )
+                )
+            offsets.append(base + starts[line])
+            counts.append(n_atoms)
+            next_frame += n_atoms + 2
+        first_line += n_lines
+
+    if len(offsets) > 0 and next_frame > first_line:
+        logger.warning(
+            "The last frame of '{}' is truncated and is ignored.".format(path)
+        )
+        offsets.pop()
+        counts.pop()
+    return FrameIndex(offsets, counts)
+
+
+def index_pdb(path, chunk_size=2**26):
+    """Index the models in a PDB file.
+
+    A file without MODEL records has a single frame at the start.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The PDB file.
+    chunk_size : int = 2**26
+        The number of bytes to read at a time.
+
+    Returns
+    -------
+    FrameIndex
+        The index of the models.
+    """
+    offsets = []
+    counts = []
+    n_atoms = 0
+    for base, data in _chunks(path, chunk_size):
+        for match in _pdb_re.finditer(data):
+            if match.group(1) == b'MODEL ':
+                if len(offsets) > 0:
+                    counts.append(n_atoms)
+                offsets.append(base + match.start())
+                n_atoms = 0
+            else:
+                n_atoms += 1
+    if len(offsets) == 0:
+        offsets.append(0)
+    counts.append(n_atoms)
+    return FrameIndex(offsets, counts)
@@ -0,0 +1,446 @@
+# -*- coding: utf-8 -*-
+
+"""Stable content hashes of systems, to find identical structures.
+
+Pipelines often read the same starting structures many times. A hash of
+the content of a system, its elements, coordinates, cell and bonds, finds
+the repeats without comparing the systems pairwise.
+
+The coordinates and cell vectors are rounded to a grid, by default of
+0.0001 Å, so that systems that differ only by the noise of writing and
+reading a text file hash alike. The bonds are put in a canonical order,
+with the lower-numbered atom first, so that the order in which a file
+lists them does not matter. The name of a system, and any atom columns
+other than the atomic numbers, are not part of the hash.
+
+Each step is a single NumPy operation on a whole column, and the hashing
+itself is BLAKE2b over the bytes of the resulting arrays. The hash of the
+topology, the elements and bonds, is computed once for configurations
+that share it, as the frames of a trajectory do.
+
+The graph hashes of molecules, in contrast, do not depend on the order of
+the atoms or on the coordinates, so the same species has the same hash
+however it was built. They come from Weisfeiler-Lehman refinement: each
+atom starts with a label from its element, and at each step its label is
+mixed with those of its bonded neighbors and the orders of the bonds to
+them, until the labels of the molecule divide its atoms into no more
+classes than the step before. The hash of a molecule combines the labels
+of its atoms at every step. All the molecules of many systems are refined
+together, a step being a few NumPy operations on every bond, and the
+hashes are cached with the bonds. Like any such hash it cannot tell apart
+the rare graphs that the refinement does not, such as some pairs of
+regular graphs.
+"""
+
+import hashlib
+import logging
+
+import numpy as np
+
+from system_step.bonds import connected_components
+from system_step.molecular_system import _equal
+
+logger = logging.getLogger(__name__)
+
+# The default grid, in Å, that coordinates and cell vectors are rounded to
+precision = 1.0e-4
+
+# The size of the digests in bytes; 40 hexadecimal digits
+_digest_size = 20
+
+_bond_columns = ('i', 'j', 'order', 'shift')
+
+# Constants for mixing 64-bit labels, from the SplitMix64 generator
+_mix_1 = np.uint64(0xbf58476d1ce4e5b9)
+_mix_2 = np.uint64(0x94d049bb133111eb)
+_odd = np.uint64(0x9e3779b97f4a7c15)
+
+# Seeds of the labels of elements and bonds, and of the two 64-bit halves of
+# the graph hashes
+_atom_seed = np.uint64(0x243f6a8885a308d3)
+_bond_seed = np.uint64(0x13198a2e03707344)
+_lane_seeds = (np.uint64(0xa4093822299f31d0), np.uint64(0x082efa98ec4e6c89))
+
+# The data that the hashes of the molecules depend on
+_molecule_depends = ('atno', 'bonds')
+
+
+def content_hash(system, precision=precision):
+    """The hash of the elements, coordinates, cell and bonds of a system.
+
+    Parameters
+    ----------
+    system : MolecularSystem
+        The system.
+    precision : float = 1.0e-4
+        The grid, in Å, that the coordinates and cell are rounded to.
+
+    Returns
+    -------
+    str
+        The hash as hexadecimal digits.
+    """
+    return _configuration_hash(_topology_digest(system), system, precision)
+
+
+def content_hashes(systems, precision=precision):
+    """The content hashes of several systems.
+
+    The hash of the topology is reused for successive systems that share
+    their atoms and bonds, such as the frames of a trajectory.
+
+    Parameters
+    ----------
+    systems : [MolecularSystem]
+        The systems.
+    precision : float = 1.0e-4
+        The grid, in Å, that the coordinates and cell are rounded to.
+
+    Returns
+    -------
+    [str]
+        The hash of each system, as hexadecimal digits.
+    """
+    return [x for _, x in _hashes(systems, precision)]
+
+
+def iter_content_hashes(systems, precision=precision):
+    """The content hashes of systems, computed as they are iterated over.
+
+    Like `content_hashes`, but the systems may come from a generator, and
+    are passed on with their hashes rather than held.
+
+    Parameters
+    ----------
+    systems : iterable of MolecularSystem
+        The systems.
+    precision : float = 1.0e-4
+        The grid, in Å, that the coordinates and cell are rounded to.
+
+    Yields
+    ------
+    (MolecularSystem, str)
+        Each system, and its hash as hexadecimal digits.
+    """
+    for system, (_, content_hash) in _iter_hashes(systems, precision):
+        yield system, content_hash
+
+
+def topology_hash(system):
+    """The hash of the elements and bonds of a system.
+
+    Parameters
+    ----------
+    system : MolecularSystem
+        The system.
+
+    Returns
+    -------
+    str
+        The hash as hexadecimal digits.
+    """
+    return _topology_digest(system).hex()
+
+
+def molecule_hashes(system):
+    """The graph hash of each molecule in a system.
+
+    The hash depends only on the elements of the atoms and the bonds and
+    their orders, not on the order of the atoms or their coordinates, so
+    molecules of the same species have the same hash.
+
+    Parameters
+    ----------
+    system : MolecularSystem
+        The system.
+
+    Returns
+    -------
+    numpy.ndarray of str
+        The hash of each molecule, as 32 hexadecimal digits, numbered as by
+        :meth:`MolecularSystem.molecules`.
+    """
+    return _molecule_hashes([system])[0]
+
+
+def graph_hashes(systems):
+    """The graph hash of each of several systems, such as molecules.
+
+    The molecules of all the systems are hashed together, which is much
+    faster than hashing the systems one by one. The hash of a system with
+    a single molecule is that of the molecule, otherwise it is a hash of
+    the sorted hashes of its molecules.
+
+    Parameters
+    ----------
+    systems : [MolecularSystem]
+        The systems.
+
+    Returns
+    -------
+    [str]
+        The hash of each system, as 32 hexadecimal digits.
+    """
+    result = []
+    for hashes in _molecule_hashes(systems):
+        if len(hashes) == 1:
+            result.append(str(hashes[0]))
+        else:
+            result.append(
+                hashlib.blake2b(
+                    ' '.join(sorted(hashes)).encode(), digest_size=16
+                ).hexdigest()
+            )
+    return result
+
+
+def _molecule_hashes(systems):
+    """The graph hashes of the molecules of each system.
+
+    The hashes are cached with each system, and systems that share their
+    elements and bonds, such as the frames of a trajectory, are hashed
+    once.
+    """
+    result = [None] * len(systems)
+    # The systems to hash, keyed by the versions of their elements and bonds
+    work = {}
+    for k, system in enumerate(systems):
+        if system.is_cached('molecule hashes', _molecule_depends):
+            result[k] = system.cached(
+                'molecule hashes', _molecule_depends, None
+            )
+            continue
+        versions = (system.atoms.version('atno'), system.bonds.version)
+        work.setdefault(versions, []).append(k)
+    if len(work) > 0:
+        groups = list(work.values())
+        hashes = _hash_molecules([systems[x[0]] for x in groups])
+        for indices, values in zip(groups, hashes):
+            for k in indices:
+                result[k] = systems[k].cached(
+                    'molecule hashes', _molecule_depends, lambda: values
+                )
+    return result
+
+
+def _hash_molecules(systems):
+    """Hash the molecules of the systems, all together."""
+    sizes = np.array([x.n_atoms for x in systems], dtype=np.int64)
+    offsets = np.zeros(len(systems) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    atno = np.concatenate([x.atoms.atno for x in systems])
+    i = np.concatenate(
+        [x.bonds.i + offset for x, offset in zip(systems, offsets)]
+    )
+    j = np.concatenate(
+        [x.bonds.j + offset for x, offset in zip(systems, offsets)]
+    )
+    order = np.concatenate([x.bonds.order for x in systems])
+    # The molecules are numbered in order of their lowest atom, so those
+    # of each system are numbered consecutively.
+    molecules = connected_components(len(atno), i, j)
+    _, lowest = np.unique(molecules, return_index=True)
+    first = np.searchsorted(lowest, offsets)
+    signatures = _signatures(atno, i, j, order, molecules, len(lowest))
+    text = signatures.astype('>u8').tobytes().hex()
+    hashes = np.array(
+        [text[k:k + 32] for k in range(0, len(text), 32)], dtype='U32'
+    )
+    return [hashes[first[k]:first[k + 1]] for k in range(len(systems))]
+
+
+def _signatures(atno, i, j, order, groups, n_groups):
+    """The Weisfeiler-Lehman hash of each group of atoms, e.g. molecules.
+
+    The bonds must not join atoms in different groups.
+
+    Returns
+    -------
+    numpy.ndarray
+        The hash of each group as two 64-bit halves, an Nx2 array.
+    """
+    # Put the atoms of each group together, so sums over the atoms of a
+    # group are differences of a cumulative sum.
+    permutation = np.argsort(groups, kind='stable')
+    rank = np.empty_like(permutation)
+    rank[permutation] = np.arange(len(permutation))
+    groups = groups[permutation]
+    sizes = np.bincount(groups, minlength=n_groups)
+    labels = _mix(np.asarray(atno, dtype=np.uint64)[permutation] + _atom_seed)
+    # Each bond in both directions, sorted by the first atom
+    source = np.concatenate((rank[i], rank[j]))
+    target = np.concatenate((rank[j], rank[i]))
+    bond_labels = _mix(np.tile(order, 2).astype(np.uint64) + _bond_seed)
+    by_source = np.argsort(source, kind='stable')
+    source = source[by_source]
+    target = target[by_source]
+    bond_labels = bond_labels[by_source]
+
+    result = np.zeros((n_groups, 2), dtype=np.uint64)
+    # The groups still being refined, their atoms and the classes of atoms
+    # found in each at the last step
+    active = np.arange(n_groups)
+    local = groups
+    previous = None
+    while True:
+        group_offsets = _offsets(sizes)
+        for lane, seed in enumerate(_lane_seeds):
+            result[active, lane] = _mix(
+                result[active, lane] ^
+                _segment_sums(_mix(labels ^ seed), group_offsets)
+            )
+        counts = _count_classes(labels, local, len(active))
+        if previous is not None:
+            # Refinement only ever splits classes, so a group whose number
+            # of classes has not grown is finished.
+            done = counts <= previous
+            if done.all():
+                break
+            if done.any():
+                keep = ~done[local]
+                new_index = np.cumsum(keep) - 1
+                edges = keep[source]
+                source = new_index[source[edges]]
+                target = new_index[target[edges]]
+                bond_labels = bond_labels[edges]
+                labels = labels[keep]
+                active = active[~done]
+                sizes = sizes[~done]
+                counts = counts[~done]
+                local = np.repeat(np.arange(len(active)), sizes)
+        previous = counts
+        neighbors = _segment_sums(
+            _mix(labels[target] ^ bond_labels),
+            _offsets(np.bincount(source, minlength=len(labels)))
+        )
+        labels = _mix(labels * _odd + neighbors)
+    return result
+
+
+def _count_classes(labels, groups, n_groups):
+    """The number of different labels in each group."""
+    keys = _mix(labels ^ _mix(groups.astype(np.uint64)))
+    order = np.argsort(keys)
+    keys = keys[order]
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    return np.bincount(groups[order][first], minlength=n_groups)
+
+
+def _offsets(sizes):
+    """The offsets of consecutive segments of the given sizes."""
+    offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    return offsets
+
+
+def _segment_sums(values, offsets):
+    """The sums, modulo 2**64, of consecutive segments of an array."""
+    total = np.zeros(len(values) + 1, dtype=np.uint64)
+    np.cumsum(values, out=total[1:])
+    return total[offsets[1:]] - total[offsets[:-1]]
+
+
+def _mix(values):
+    """Scramble 64-bit integers, as the finalizer of SplitMix64 does."""
+    values = (values ^ (values >> np.uint64(30))) * _mix_1
+    values = (values ^ (values >> np.uint64(27))) * _mix_2
+    return values ^ (values >> np.uint64(31))
+
+
+def _hashes(systems, precision=precision):
+    """The topology and content hashes of the systems, as pairs."""
+    return [x for _, x in _iter_hashes(systems, precision)]
+
+
+def _iter_hashes(systems, precision=precision):
+    """Each system, with its topology and content hashes as a pair."""
+    previous = None
+    for system in systems:
+        if previous is None or not _shares_topology(previous, system):
+            digest = _topology_digest(system)
+            previous = system
+        yield system, (
+            digest.hex(), _configuration_hash(digest, system, precision)
+        )
+
+
+def _topology_digest(system):
+    """The digest of the elements and bonds of a system, as bytes."""
+    h = hashlib.blake2b(digest_size=_digest_size)
+    h.update(np.array([system.n_atoms, system.n_bonds], dtype='<i8'))
+    h.update(np.ascontiguousarray(system.atoms.atno, dtype='<i2'))
+    h.update(_canonical_bonds(system.bonds))
+    return h.digest()
+
+
+def _configuration_hash(topology, system, precision):
+    """The hash of a configuration, given the digest of its topology."""
+    h = hashlib.blake2b(topology, digest_size=_digest_size)
+    if system.cell is None:
+        h.update(b'molecule')
+    else:
+        h.update(b'crystal')
+        h.update(_quantize(system.cell.vectors, precision))
+    h.update(_quantize(system.coordinates, precision))
+    return h.hexdigest()
+
+
+def _quantize(values, precision):
+    """The values rounded to the nearest multiple of the precision."""
+    # The cast to integers also turns -0.0 into 0.
+    return np.rint(np.asarray(values, dtype=np.float64) / precision).astype(
+        '<i8'
+    )
+
+
+def _canonical_bonds(bonds):
+    """The bonds as an Nx6 array in a canonical order.
+
+    Each bond runs from the lower to the higher-numbered atom, negating the
+    lattice shift if the atoms are swapped, and the bonds are sorted.
+    """
+    i = bonds.i
+    j = bonds.j
+    shift = bonds.shift
+    flip = i > j
+    # A bond from an atom to its own image is turned so that the first
+    # nonzero component of its shift is positive.
+    same = np.flatnonzero(i == j)
+    if len(same) > 0:
+        images = shift[same]
+        first = images[np.arange(len(same)), np.argmax(images != 0, axis=1)]
+        flip[same] = first < 0
+    result = np.empty((len(i), 6), dtype='<i8')
+    result[:, 0] = np.where(flip, j, i)
+    result[:, 1] = np.where(flip, i, j)
+    result[:, 2] = bonds.order
+    result[:, 3:6] = shift
+    if flip.any():
+        result[flip, 3:6] *= -1
+    if len(result) < 2:
+        return result
+    # Sort on the pair of atoms alone, which is much quicker than sorting
+    # on all the columns and suffices unless two bonds join the same atoms,
+    # as can happen in small periodic cells. Files usually list the bonds
+    # in order already.
+    key = result[:, 0] * (result[:, 1].max() + 1) + result[:, 1]
+    if np.all(key[1:] > key[:-1]):
+        return result
+    order = np.argsort(key, kind='stable')
+    key = key[order]
+    if np.all(key[1:] > key[:-1]):
+        return result[order]
+    return result[np.lexsort(result.T[::-1])]
+
+
+def _shares_topology(system, other):
+    """Whether two systems have the same elements and bonds."""
+    if not _equal(system.atoms.atno, other.atoms.atno):
+        return False
+    for column in _bond_columns:
+        if not _equal(
+            getattr(system.bonds, column), getattr(other.bonds, column)
+        ):
+            return False
+    return True
@@ -0,0 +1,466 @@
+# -*- coding: utf-8 -*-
+
+"""The molecular or crystal system produced by the System step."""
+
+import collections
+import logging
+
+import numpy as np
+
+from system_step.atoms import AtomTable
+from system_step.bonds import BondTable, connected_components
+from system_step.cache import DerivedCache, origin, restamp, tick
+from system_step import elements
+from system_step.neighbors import neighbor_pairs
+from system_step.perception import perceive_bonds
+from system_step.selection import compile_selection
+
+logger = logging.getLogger(__name__)
+
+# The columns of the atom table that belong to a configuration of a system,
+# rather than to its topology.
+configuration_columns = ('coordinates', 'velocities')
+
+
+class MolecularSystem(object):
+    """A molecular or crystal system.
+
+    The atoms are held in a columnar :class:`AtomTable`, so the coordinates
+    and other per-atom properties are contiguous NumPy arrays. Periodic
+    systems also have a :class:`Cell`.
+
+    The configurations of a system, such as conformers or the frames of a
+    trajectory, are systems that share the atom and bond tables, the
+    topology, copy-on-write, and own only their coordinates, velocities and
+    cell. See :meth:`new_configuration`.
+
+    Derived values, such as the formula, selections and neighbor lists, are
+    cached keyed by the versions of the columns they depend on, so they are
+    computed once until those columns change. The configurations of a system
+    share the cache, so values that depend only on the topology are computed
+    once for all of them. Cached arrays are read-only.
+
+    Attributes
+    ----------
+    name : str
+        A name for the system, typically from the file it was read from.
+    atoms : AtomTable
+        The atoms in the system.
+    bonds : BondTable
+        The bonds between the atoms.
+    cell : Cell
+        The periodic cell, or None for a molecular system.
+    cache : DerivedCache
+        The cache of the values derived from the system.
+    """
+
+    def __init__(self, name='', atoms=None, bonds=None, cell=None):
+        """Create a system.
+
+        Parameters
+        ----------
+        name : str = ''
+            A name for the system.
+        atoms : AtomTable = None
+            The table of atoms, by default an empty table.
+        bonds : BondTable = None
+            The table of bonds, by default an empty table.
+        cell : Cell = None
+            The periodic cell, if any.
+
+        Returns
+        -------
+        None
+        """
+        self.name = name
+        self.atoms = AtomTable() if atoms is None else atoms
+        self.bonds = BondTable() if bonds is None else bonds
+        self.cell = cell
+        self.cache = DerivedCache()
+
+    def __repr__(self):
+        return "MolecularSystem('{}', {} atoms, cell={})".format(
+            self.name, self.n_atoms, self.cell
+        )
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_origin'] = origin()
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        source = state.pop('_origin', None)
+        self.__dict__.update(state)
+        self._cell_version = restamp(source, self._cell_version)
+
+    @property
+    def cell(self):
+        """The periodic cell, or None for a molecular system."""
+        return self._cell
+
+    @cell.setter
+    def cell(self, value):
+        self._cell = value
+        self._cell_version = tick()
+
+    @property
+    def version(self):
+        """A counter that increases whenever the system changes."""
+        return max(
+            self.atoms.version(), self.bonds.version, self._cell_version
+        )
+
+    @property
+    def n_atoms(self):
+        """The number of atoms."""
+        return len(self.atoms)
+
+    @property
+    def n_bonds(self):
+        """The number of bonds."""
+        return len(self.bonds)
+
+    @property
+    def periodicity(self):
+        """The number of periodic dimensions, 0 or 3."""
+        return 0 if self.cell is None else 3
+
+    @property
+    def coordinates(self):
+        """The Nx3 Cartesian coordinates, as a view into the atom table."""
+        return self.atoms.coordinates
+
+    @property
+    def symbols(self):
+        """The element symbols of the atoms."""
+        return self.atoms.symbols
+
+    @property
+    def mass(self):
+        """The total mass of the system in g/mol."""
+        return self.cached(
+            'mass', ('atno',), lambda: float(self.atoms.masses.sum())
+        )
+
+    @property
+    def center_of_mass(self):
+        """The center of mass in Å, of the coordinates as they are."""
+
+        def center():
+            masses = self.atoms.masses
+            return masses @ self.coordinates / masses.sum()
+
+        return self.cached('center of mass', ('atno', 'coordinates'), center)
+
+    @property
+    def composition(self):
+        """The number of atoms of each element.
+
+        Returns
+        -------
+        collections.OrderedDict
+            The count of each element, keyed by symbol, in Hill order.
+        """
+        composition = self.cached(
+            'composition', ('atno',), lambda: _composition(self.atoms.atno)
+        )
+        return collections.OrderedDict(composition)
+
+    @property
+    def formula(self):
+        """The chemical formula in Hill order, e.g. 'C2H6O'."""
+        return self.cached(
+            'formula', ('atno',), lambda: _formula(self.composition)
+        )
+
+    def bonded_neighbors(self, atom):
+        """The atoms bonded to an atom.
+
+        Parameters
+        ----------
+        atom : int
+            The index of the atom.
+
+        Returns
+        -------
+        numpy.ndarray
+            The indices of the bonded atoms.
+        """
+        return self.bonds.neighbors(atom, self.n_atoms)
+
+    def molecules(self):
+        """Find the molecules, i.e. the bonded fragments, in the system.
+
+        Returns
+        -------
+        numpy.ndarray
+            The index of the molecule that each atom belongs to.
+        """
+        return self.cached(
+            'molecules', ('atno', 'bonds'), lambda: connected_components(
+                self.n_atoms, self.bonds.i, self.bonds.j
+            )
+        )
+
+    def neighbors(self, cutoff):
+        """Find all pairs of atoms within a cutoff distance.
+
+        Periodic images are included for periodic systems.
+
+        Parameters
+        ----------
+        cutoff : float
+            The cutoff distance in Å.
+
+        Returns
+        -------
+        neighbors.Pairs
+            The pairs of atoms, their distances, vectors and lattice shifts.
+        """
+        return self.cached(
+            ('neighbors', cutoff), ('coordinates', 'cell'),
+            lambda: neighbor_pairs(self.coordinates, cutoff, self.cell)
+        )
+
+    def select(self, expression):
+        """Select atoms with an expression in the selection language.
+
+        Parameters
+        ----------
+        expression : str
+            The selection, e.g. 'protein and chain A and not hydrogen'. See
+            :mod:`system_step.selection` for the language.
+
+        Returns
+        -------
+        numpy.ndarray
+            A boolean mask of the selected atoms.
+        """
+        function = compile_selection(expression)
+        return self.cached(
+            ('select', expression), function.columns,
+            lambda: function(self)
+        )
+
+    def cached(self, key, depends, function):
+        """A value derived from the system, computed once until it changes.
+
+        Parameters
+        ----------
+        key : hashable
+            The name of the value and any arguments it depends on.
+        depends : iterable of str
+            The columns of the atoms that the value depends on, and 'bonds'
+            or 'cell' if it depends on them.
+        function : function
+            Computes the value, with no arguments, if it is not cached.
+
+        Returns
+        -------
+        object
+            The value.
+        """
+        return self.cache.get(key, self._versions(depends), function)
+
+    def is_cached(self, key, depends):
+        """Whether a derived value is cached for the current data.
+
+        Parameters
+        ----------
+        key : hashable
+            The name of the value and any arguments it depends on.
+        depends : iterable of str
+            The data the value depends on, as for `cached`.
+
+        Returns
+        -------
+        bool
+            Whether `cached` would return the value without computing it.
+        """
+        return (key, self._versions(depends)) in self.cache
+
+    def _versions(self, depends):
+        """The versions of the data that a derived value depends on."""
+        versions = []
+        for name in depends:
+            if name == 'bonds':
+                versions.append(self.bonds.version)
+            elif name == 'cell':
+                versions.append(self._cell_version)
+            else:
+                versions.append(self.atoms.version(name))
+        return tuple(versions)
+
+    def perceive_bonds(self, tolerance=0.45):
+        """Replace the bonds with those found from the interatomic distances.
+
+        Parameters
+        ----------
+        tolerance : float = 0.45
+            The tolerance in Å added to the sum of the covalent radii.
+
+        Returns
+        -------
+        int
+            The number of bonds found.
+        """
+        i, j, shift = perceive_bonds(self, tolerance=tolerance)
+        self.bonds = BondTable.from_arrays(i, j, shift=shift)
+        return len(i)
+
+    def delete_atoms(self, indices):
+        """Delete atoms and any bonds to them.
+
+        Parameters
+        ----------
+        indices : array_like of int or bool
+            The indices of the atoms to delete, or a boolean mask.
+
+        Returns
+        -------
+        numpy.ndarray
+            For each original atom its new index, or -1 if deleted.
+        """
+        mapping = self.atoms.delete(indices)
+        self.bonds.remap_atoms(mapping)
+        return mapping
+
+    def new_configuration(
+        self, coordinates=None, velocities=None, cell=None, name=None
+    ):
+        """Create another configuration of the system.
+
+        The new system shares the atom and bond tables with this one,
+        copy-on-write, so only the coordinates and any velocities are
+        copied or replaced. If either system later changes the shared
+        columns or bonds, e.g. by deleting atoms, it copies them first and
+        the other is unaffected.
+
+        Parameters
+        ----------
+        coordinates : array_like = None
+            The Nx3 Cartesian coordinates, by default a copy of these.
+        velocities : array_like = None
+            The Nx3 velocities, by default a copy of these, if any.
+        cell : Cell = None
+            The periodic cell, by default a copy of this one.
+        name : str = None
+            The name of the new system, by default the name of this one.
+
+        Returns
+        -------
+        MolecularSystem
+            The new configuration.
+        """
+        columns = {}
+        if coordinates is not None:
+            columns['coordinates'] = np.reshape(coordinates, (-1, 3))
+        if velocities is not None:
+            columns['velocities'] = np.reshape(velocities, (-1, 3))
+        copy = [
+            column for column in configuration_columns
+            if column in self.atoms and column not in columns
+        ]
+        if cell is None and self.cell is not None:
+            cell = self.cell.copy()
+        configuration = MolecularSystem(
+            name=self.name if name is None else name,
+            atoms=self.atoms.share(copy=copy, **columns),
+            bonds=self.bonds.share(),
+            cell=cell
+        )
+        configuration.cache = self.cache
+        return configuration
+
+    def same_topology(self, other, bonds=True):
+        """Whether another system has the same atoms and, optionally, bonds.
+
+        The columns of the configuration, the coordinates and velocities,
+        are not compared.
+
+        Parameters
+        ----------
+        other : MolecularSystem
+            The other system.
+        bonds : bool = True
+            Whether to compare the bonds as well as the atoms.
+
+        Returns
+        -------
+        bool
+            True if the topologies are the same.
+        """
+        if (
+            self.n_atoms != other.n_atoms or
+            set(self.atoms.columns) != set(other.atoms.columns)
+        ):
+            return False
+        for column in self.atoms.columns:
+            if column not in configuration_columns and not _equal(
+                self.atoms[column], other.atoms[column]
+            ):
+                return False
+        if bonds:
+            if self.n_bonds != other.n_bonds:
+                return False
+            for column in ('i', 'j', 'order', 'shift'):
+                if not _equal(
+                    getattr(self.bonds, column), getattr(other.bonds, column)
+                ):
+                    return False
+        return True
+
+    def copy(self):
+        """Return a deep copy of the system."""
+        cell = None if self.cell is None else self.cell.copy()
+        return MolecularSystem(
+            name=self.name,
+            atoms=self.atoms.copy(),
+            bonds=self.bonds.copy(),
+            cell=cell
+        )
+
+
+def _composition(atno):
+    """The number of atoms of each element, in Hill order."""
+    counts = np.bincount(
+        np.asarray(atno, dtype=np.int64), minlength=len(elements.symbols)
+    )
+    result = {
+        elements.symbols[i]: int(count)
+        for i, count in enumerate(counts) if count > 0
+    }
+    return collections.OrderedDict(
+        (symbol, result[symbol]) for symbol in _hill_order(result)
+    )
+
+
+def _equal(a, b):
+    """Whether two arrays are equal, at once if they view the same data."""
+    if (
+        a.shape == b.shape and a.dtype == b.dtype and
+        a.strides == b.strides and
+        a.__array_interface__['data'][0] == b.__array_interface__['data'][0]
+    ):
+        return True
+    return np.array_equal(a, b)
+
+
+def _formula(composition):
+    """The chemical formula for the count of each element."""
+    text = ''
+    for symbol, count in composition.items():
+        text += symbol if count == 1 else '{}{}'.format(symbol, count)
+    return text
+
+
+def _hill_order(symbols):
+    """Sort element symbols in Hill order: C, H, then alphabetical."""
+    symbols = list(symbols)
+    if 'C' in symbols:
+        first = ['C'] + (['H'] if 'H' in symbols else [])
+    else:
+        first = []
+    rest = sorted(s for s in symbols if s not in first)
+    return first + rest
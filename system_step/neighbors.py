@@ -0,0 +1,478 @@
+# -*- coding: utf-8 -*-
+
+"""Finding pairs of atoms within a cutoff distance using cell lists.
+
+The atoms are sorted into a grid of bins whose size is at least the cutoff,
+so that only atoms in the same or adjacent bins need be checked. All of the
+work is done with NumPy array operations, one pass per neighboring bin
+offset, so the cost grows linearly with the number of atoms.
+
+Periodic systems, orthorhombic or triclinic, are binned in fractional
+coordinates with the bins wrapping around the cell, which gives the minimum
+image directly. Cells too small for at least three bins along each axis are
+handled instead by adding the periodic images of the atoms within the cutoff
+of the faces of the cell as extra 'ghost' atoms.
+"""
+
+import collections
+import itertools
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Pairs = collections.namedtuple(
+    'Pairs', ['i', 'j', 'distances', 'vectors', 'shifts']
+)
+Pairs.__doc__ = """Pairs of atoms within a cutoff distance.
+
+Each pair is given once. The vector from atom i to the image of atom j is
+``xyz[j] - xyz[i] + shifts @ cell.vectors``, where `shifts` are the integer
+lattice translations of the image, which are zero for molecular systems.
+"""
+
+# The offsets to the 27 bins around and including a bin,
+_stencil = np.array(list(itertools.product((-1, 0, 1), repeat=3)))
+# and the half of them needed when each pair is to be found once: the bin
+# itself and the 13 lexically positive offsets.
+_half_stencil = _stencil[13:]
+
+
+def neighbor_pairs(coordinates, cutoff, cell=None):
+    """Find all pairs of atoms within a cutoff distance.
+
+    Parameters
+    ----------
+    coordinates : array_like
+        The Nx3 Cartesian coordinates in Å.
+    cutoff : float
+        The cutoff distance in Å.
+    cell : Cell = None
+        The periodic cell, or None for a molecular system.
+
+    Returns
+    -------
+    Pairs
+        The pairs of atoms, their distances, vectors and lattice shifts.
+    """
+    xyz = np.ascontiguousarray(coordinates, dtype=np.float64)
+    if cutoff <= 0:
+        raise ValueError('The cutoff must be positive, not {}'.format(cutoff))
+    if cell is None:
+        return _molecular_pairs(xyz, cutoff)
+    return _periodic_pairs(xyz, cutoff, cell)
+
+
+def query_pairs(coordinates, query, cutoff, cell=None):
+    """Find the atoms within a cutoff distance of a subset of the atoms.
+
+    This is more efficient than finding all pairs when the subset is small.
+
+    Parameters
+    ----------
+    coordinates : array_like
+        The Nx3 Cartesian coordinates in Å.
+    query : array_like of int
+        The indices of the atoms whose neighbors are wanted.
+    cutoff : float
+        The cutoff distance in Å.
+    cell : Cell = None
+        The periodic cell, or None for a molecular system.
+
+    Returns
+    -------
+    Pairs
+        The pairs with i in `query` and any atom j. An atom is not its own
+        neighbor, but may be a neighbor of its own periodic images.
+    """
+    xyz = np.ascontiguousarray(coordinates, dtype=np.float64)
+    query = np.asarray(query, dtype=np.int64).reshape(-1)
+    if cutoff <= 0:
+        raise ValueError('The cutoff must be positive, not {}'.format(cutoff))
+    if cell is None:
+        k, j = _grid_pairs(xyz[query], xyz, cutoff)
+        i = query[k]
+        keep = i != j
+        i = i[keep]
+        j = j[keep]
+        vectors = xyz[j] - xyz[i]
+        distances = np.sqrt(np.einsum('ij,ij->i', vectors, vectors))
+        shifts = np.zeros((len(i), 3), np.int64)
+        return Pairs(i, j, distances, vectors, shifts)
+
+    fractionals = cell.to_fractionals(xyz)
+    home = np.floor(fractionals)
+    fractionals -= home
+    home = home.astype(np.int64)
+    wrapped = cell.to_cartesians(fractionals)
+    ghosts, images, ghost_xyz = _ghosts(fractionals, cutoff, cell)
+    k, g = _grid_pairs(wrapped[query], ghost_xyz, cutoff)
+    i = query[k]
+    j = ghosts[g]
+    image = images[g]
+    keep = (i != j) | np.any(image != 0, axis=1)
+    i = i[keep]
+    j = j[keep]
+    vectors = ghost_xyz[g[keep]] - wrapped[i]
+    distances = np.sqrt(np.einsum('ij,ij->i', vectors, vectors))
+    shifts = image[keep] - home[j] + home[i]
+    return Pairs(i, j, distances, vectors, shifts)
+
+
+def brute_force_pairs(coordinates, cutoff, cell=None):
+    """Find all pairs within a cutoff by checking every pair of atoms.
+
+    This is the O(N^2) reference for testing and benchmarking the cell
+    lists. For periodic systems it uses the minimum image convention, so
+    it is only correct if the cutoff is less than half the width of the
+    cell.
+
+    Parameters
+    ----------
+    coordinates : array_like
+        The Nx3 Cartesian coordinates in Å.
+    cutoff : float
+        The cutoff distance in Å.
+    cell : Cell = None
+        The periodic cell, or None for a molecular system.
+
+    Returns
+    -------
+    Pairs
+        The pairs of atoms, their distances, vectors and lattice shifts.
+    """
+    xyz = np.asarray(coordinates, dtype=np.float64)
+    n = len(xyz)
+    result = []
+    for i in range(n - 1):
+        delta = xyz[i + 1:] - xyz[i]
+        if cell is None:
+            shifts = np.zeros(delta.shape, dtype=np.int64)
+        else:
+            fractional = cell.to_fractionals(delta)
+            shifts = -np.round(fractional).astype(np.int64)
+            delta = delta + shifts @ cell.vectors
+        r = np.sqrt(np.einsum('ij,ij->i', delta, delta))
+        hits = np.nonzero(r <= cutoff)[0]
+        result.append(
+            (
+                np.full(len(hits), i), hits + i + 1, r[hits], delta[hits],
+                shifts[hits]
+            )
+        )
+    if len(result) == 0:
+        return _empty_pairs()
+    return Pairs(*(np.concatenate(parts) for parts in zip(*result)))
+
+
+def _empty_pairs():
+    """An empty set of pairs."""
+    return Pairs(
+        np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+        np.zeros(0), np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+    )
+
+
+def _molecular_pairs(xyz, cutoff):
+    """The pairs within the cutoff for a non-periodic system."""
+    if len(xyz) == 0:
+        return _empty_pairs()
+    origin = xyz.min(axis=0)
+    extent = xyz.max(axis=0) - origin
+    size = _bin_size(cutoff, extent)
+    dims = np.floor(extent / size).astype(np.int64) + 1
+    bins = np.floor((xyz - origin) / size).astype(np.int64)
+    i, j, _ = _bin_pairs(xyz, bins, dims, cutoff)
+    i, j = np.minimum(i, j), np.maximum(i, j)
+    vectors = xyz[j] - xyz[i]
+    distances = np.sqrt(np.einsum('ij,ij->i', vectors, vectors))
+    return Pairs(i, j, distances, vectors, np.zeros((len(i), 3), np.int64))
+
+
+def _periodic_pairs(xyz, cutoff, cell):
+    """The pairs within the cutoff for a periodic system."""
+    fractionals = cell.to_fractionals(xyz)
+    home = np.floor(fractionals)
+    fractionals -= home
+    home = home.astype(np.int64)
+    wrapped = cell.to_cartesians(fractionals)
+
+    # Bins in fractional coordinates that are at least the cutoff wide.
+    dims = np.floor(cell.widths / cutoff).astype(np.int64)
+    if np.all(dims >= 3):
+        bins = np.minimum(np.floor(fractionals * dims).astype(np.int64),
+                          dims - 1)  # yapf: disable
+        i, j, image = _bin_pairs(wrapped, bins, dims, cutoff, cell.vectors)
+        # Order each pair so that i <= j, like the ghost atom search.
+        swap = i > j
+        i[swap], j[swap] = j[swap], i[swap]
+        image[swap] *= -1
+        vectors = wrapped[j] - wrapped[i] + image @ cell.vectors
+    else:
+        i, j, image, vectors = _ghost_pairs(fractionals, cutoff, cell)
+    distances = np.sqrt(np.einsum('ij,ij->i', vectors, vectors))
+    # Express the shifts relative to the original, unwrapped coordinates.
+    shifts = image - home[j] + home[i]
+    return Pairs(i, j, distances, vectors, shifts)
+
+
+def _ghost_pairs(fractionals, cutoff, cell):
+    """The pairs in a cell too small for periodic bins, using ghost atoms.
+
+    Parameters
+    ----------
+    fractionals : numpy.ndarray
+        The fractional coordinates, wrapped into the cell.
+    cutoff : float
+        The cutoff distance.
+    cell : Cell
+        The periodic cell.
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        The atoms i and j in each pair, the lattice shift of the image of j
+        and the vector from i to the image of j.
+    """
+    wrapped = cell.to_cartesians(fractionals)
+    ghosts, images, ghost_xyz = _ghosts(fractionals, cutoff, cell)
+
+    i, k = _grid_pairs(wrapped, ghost_xyz, cutoff)
+    j = ghosts[k]
+    image = images[k]
+    # Keep each pair once: i < j, or for an atom and its own image the
+    # image with the lexically positive shift.
+    positive = (
+        (image[:, 0] > 0) | ((image[:, 0] == 0) & (image[:, 1] > 0)) |
+        ((image[:, 0] == 0) & (image[:, 1] == 0) & (image[:, 2] > 0))
+    )
+    keep = (i < j) | ((i == j) & positive)
+    vectors = ghost_xyz[k[keep]] - wrapped[i[keep]]
+    return i[keep], j[keep], image[keep], vectors
+
+
+def _ghosts(fractionals, cutoff, cell):
+    """The periodic images of the atoms within the cutoff of the cell.
+
+    Parameters
+    ----------
+    fractionals : numpy.ndarray
+        The fractional coordinates, wrapped into the cell.
+    cutoff : float
+        The cutoff distance.
+    cell : Cell
+        The periodic cell.
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        The atom, lattice shift and Cartesian coordinates of each ghost,
+        including the atoms in the cell itself with zero shift.
+    """
+    margins = cutoff / cell.widths
+    n_images = np.ceil(margins).astype(int)
+    ghosts = []
+    images = []
+    for shift in itertools.product(
+        *(range(-n, n + 1) for n in n_images)
+    ):  # yapf: disable
+        shifted = fractionals + shift
+        inside = np.all(
+            (shifted >= -margins) & (shifted < 1.0 + margins), axis=1
+        )
+        index = np.nonzero(inside)[0]
+        ghosts.append(index)
+        images.append(np.broadcast_to(shift, (len(index), 3)))
+    ghosts = np.concatenate(ghosts)
+    images = np.concatenate(images).astype(np.int64)
+    ghost_xyz = cell.to_cartesians(fractionals[ghosts] + images)
+    return ghosts, images, ghost_xyz
+
+
+def _bin_size(cutoff, extent):
+    """Bins at least as large as the cutoff, but few enough that the bin
+    keys cannot overflow."""
+    return max(cutoff, float(np.max(extent)) / 2**20)
+
+
+def _bin_pairs(points, bins, dims, cutoff, vectors=None):
+    """Find each pair of points within the cutoff once, given their bins.
+
+    Only half of the neighboring bins are searched from each bin, so each
+    pair is found exactly once without filtering.
+
+    Parameters
+    ----------
+    points : numpy.ndarray
+        The Nx3 Cartesian coordinates of the points.
+    bins : numpy.ndarray
+        The Nx3 integer indices of the bin of each point.
+    dims : numpy.ndarray
+        The number of bins along each axis.
+    cutoff : float
+        The cutoff distance.
+    vectors : numpy.ndarray = None
+        The cell vectors if the bins are periodic, which requires at least
+        3 bins along each axis.
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        The indices i and j of the points in each pair and the lattice
+        shift of the image of j.
+    """
+    keys = np.ravel_multi_index(bins.T, dims)
+    order = np.argsort(keys, kind='stable')
+    # Work with the points sorted by bin, so the gathers are local in memory
+    points = points[order]
+    bins = bins[order]
+    n_bins = int(np.prod(dims))
+    if n_bins <= 8 * len(points) + 2**20:
+        # Dense arrays of the start and count of the points in each bin
+        counts = np.bincount(keys, minlength=n_bins)
+        starts = np.cumsum(counts) - counts
+        occupied = None
+    else:
+        # or, for sparse systems, lookup of just the occupied bins.
+        occupied, starts, counts = np.unique(
+            keys[order], return_index=True, return_counts=True
+        )
+
+    cutoff2 = cutoff * cutoff
+    result_i = []
+    result_j = []
+    result_image = []
+    for offset in _half_stencil:
+        neighbors = bins + offset
+        if vectors is None:
+            valid = np.all((neighbors >= 0) & (neighbors < dims), axis=1)
+            qi = np.nonzero(valid)[0]
+            neighbors = neighbors[qi]
+            image = None
+            origin = points[qi]
+        else:
+            qi = np.arange(len(points))
+            image, neighbors = np.divmod(neighbors, dims)
+            origin = points - image @ vectors
+        position = np.ravel_multi_index(neighbors.T, dims)
+        if occupied is not None:
+            qkeys = position
+            position = np.searchsorted(occupied, qkeys)
+            position[position == len(occupied)] = 0
+            found = np.nonzero(occupied[position] == qkeys)[0]
+            qi = qi[found]
+            origin = origin[found]
+            if image is not None:
+                image = image[found]
+            position = position[found]
+        n = counts[position]
+        total = int(n.sum())
+        if total == 0:
+            continue
+        # Expand each point into one candidate per point in the other bin
+        source = np.repeat(np.arange(len(qi)), n)
+        tj = np.repeat(starts[position] - np.cumsum(n) + n, n)
+        tj += np.arange(total)
+        if not offset.any():
+            # Within a bin, each pair once and not the point with itself.
+            later = tj > qi[source]
+            source = source[later]
+            tj = tj[later]
+        delta = points[tj] - origin[source]
+        inside = np.einsum('ij,ij->i', delta, delta) <= cutoff2
+        source = source[inside]
+        result_i.append(order[qi[source]])
+        result_j.append(order[tj[inside]])
+        if image is None:
+            result_image.append(np.zeros((len(source), 3), dtype=np.int64))
+        else:
+            result_image.append(image[source])
+
+    if len(result_i) == 0:
+        return (
+            np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+            np.zeros((0, 3), dtype=np.int64)
+        )
+    return (
+        np.concatenate(result_i), np.concatenate(result_j),
+        np.concatenate(result_image)
+    )
+
+
+def _grid_pairs(query, targets, cutoff):
+    """Find the target points within the cutoff of each query point.
+
+    Parameters
+    ----------
+    query : numpy.ndarray
+        The Nx3 query points.
+    targets : numpy.ndarray
+        The Mx3 target points.
+    cutoff : float
+        The cutoff distance.
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray)
+        The indices of the query and target points in each pair.
+    """
+    if len(query) == 0 or len(targets) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    origin = np.minimum(query.min(axis=0), targets.min(axis=0))
+    extent = np.maximum(query.max(axis=0), targets.max(axis=0)) - origin
+    size = _bin_size(cutoff, extent)
+    dims = np.floor(extent / size).astype(np.int64) + 1
+
+    n_bins = int(np.prod(dims))
+    target_bins = np.floor((targets - origin) / size).astype(np.int64)
+    target_keys = np.ravel_multi_index(target_bins.T, dims)
+    order = np.argsort(target_keys, kind='stable')
+    # Sorting the targets by bin keeps the gathers below local in memory.
+    sorted_targets = targets[order]
+    if n_bins <= 8 * len(targets) + 2**20:
+        # Dense arrays of the start and count of the targets in each bin
+        counts = np.bincount(target_keys, minlength=n_bins)
+        starts = np.cumsum(counts) - counts
+        keys = None
+    else:
+        # or, for sparse systems, lookup of just the occupied bins.
+        keys, starts, counts = np.unique(
+            target_keys[order], return_index=True, return_counts=True
+        )
+
+    query_bins = np.floor((query - origin) / size).astype(np.int64)
+    cutoff2 = cutoff * cutoff
+    result_i = []
+    result_j = []
+    for offset in _stencil:
+        bins = query_bins + offset
+        valid = np.all((bins >= 0) & (bins < dims), axis=1)
+        qi = np.nonzero(valid)[0]
+        if len(qi) == 0:
+            continue
+        position = np.ravel_multi_index(bins[qi].T, dims)
+        if keys is not None:
+            qkeys = position
+            position = np.searchsorted(keys, qkeys)
+            position[position == len(keys)] = 0
+            found = keys[position] == qkeys
+            qi = qi[found]
+            position = position[found]
+        n = counts[position]
+        total = int(n.sum())
+        if total == 0:
+            continue
+        # Expand each query point into one candidate per target in the bin
+        first = np.repeat(starts[position] - np.cumsum(n) + n, n)
+        tj = first + np.arange(total)
+        qi = np.repeat(qi, n)
+        delta = sorted_targets[tj] - query[qi]
+        inside = np.einsum('ij,ij->i', delta, delta) <= cutoff2
+        result_i.append(qi[inside])
+        result_j.append(order[tj[inside]])
+
+    if len(result_i) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(result_i), np.concatenate(result_j)
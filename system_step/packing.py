@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+
+"""Packing copies of molecules into a periodic box, e.g. to solvate a solute.
+
+Molecules are inserted at random positions and orientations, and rejected
+if any atom is closer than a tolerance to an atom already in the box. The
+atoms in the box are kept in an occupancy grid: bins in fractional
+coordinates at least as wide as the tolerance, each with a fixed number of
+slots for the atoms in it, so a candidate atom is checked against only the
+atoms in the 27 bins around it, and accepted atoms are added without
+rebuilding anything. The cost of each insertion is constant, rather than
+growing with the number of molecules already placed.
+
+Candidates are generated and checked in batches with array operations. The
+candidates in a batch that clash with the box are rejected, and any clashes
+between the rest are found with the cell lists, rejecting the later
+candidate of each pair unless the earlier one was itself rejected. The
+result is the same as inserting the candidates one at a time, so it depends
+only on the random seed.
+"""
+
+import collections
+import itertools
+import logging
+import math
+
+import numpy as np
+
+from system_step.atoms import AtomTable
+from system_step.bonds import BondTable
+from system_step.cell import Cell
+from system_step.molecular_system import MolecularSystem
+from system_step.molecular_system import configuration_columns
+from system_step.neighbors import neighbor_pairs
+
+logger = logging.getLogger(__name__)
+
+# Daltons per Å^3 in 1 g/mL
+amu_per_a3 = 0.602214076
+
+# The largest number of bins in the occupancy grid
+_max_bins = 2**22
+# The smallest and largest number of candidates checked at once
+_min_batch = 64
+_max_batch = 8192
+# The offsets to the 27 bins around and including a bin
+_stencil = np.array(list(itertools.product((-1, 0, 1), repeat=3)))
+
+PackingStatistics = collections.namedtuple(
+    'PackingStatistics', ['requested', 'inserted', 'attempts', 'seed']
+)
+PackingStatistics.__doc__ = """The results of packing molecules into a box.
+
+The molecules requested and inserted, the number of trial insertions, and
+the random seed, which reproduces the packing.
+"""
+
+
+def pack(
+    molecules,
+    counts,
+    cell,
+    solute=None,
+    tolerance=1.6,
+    seed=None,
+    max_attempts=None
+):
+    """Insert copies of molecules at random into a periodic box.
+
+    Parameters
+    ----------
+    molecules : MolecularSystem or [MolecularSystem]
+        The molecules to insert.
+    counts : int or [int]
+        The number of copies of each molecule.
+    cell : Cell
+        The periodic box.
+    solute : MolecularSystem = None
+        Atoms already in the box, e.g. a protein to solvate, which are the
+        first atoms of the result.
+    tolerance : float = 1.6
+        The smallest distance in Å between atoms of different molecules.
+        Random insertion cannot reach the density of liquid water with much
+        more than 1.6 Å.
+    seed : int or numpy.random.Generator = None
+        The random seed, or a generator to draw from. By default a seed is
+        chosen at random, and reported in the statistics.
+    max_attempts : int = None
+        The largest number of trial insertions, by default 100 per molecule
+        plus 1000.
+
+    Returns
+    -------
+    (MolecularSystem, PackingStatistics)
+        The packed system, with the solute first and then the copies of
+        each molecule in turn, and the statistics of the insertions. If the
+        box is too full, fewer molecules than requested are inserted.
+    """
+    if isinstance(molecules, MolecularSystem):
+        molecules = [molecules]
+    counts = np.atleast_1d(np.asarray(counts, dtype=np.int64))
+    if len(counts) == 1 and len(molecules) > 1:
+        counts = np.repeat(counts, len(molecules))
+    if len(counts) != len(molecules):
+        raise ValueError(
+            'There are {} molecules but {} counts.'.format(
+                len(molecules), len(counts)
+            )
+        )
+    if np.any(counts < 0):
+        raise ValueError('The counts cannot be negative: {}'.format(counts))
+    if tolerance <= 0 or 2 * tolerance >= cell.widths.min():
+        raise ValueError(
+            'The tolerance, {} Å, must be positive and less than half the '
+            'width of the box.'.format(tolerance)
+        )
+    if max_attempts is None:
+        max_attempts = 100 * int(counts.sum()) + 1000
+    if isinstance(seed, np.random.Generator):
+        rng = seed
+    else:
+        if seed is None:
+            seed = int(np.random.SeedSequence().generate_state(1)[0])
+        rng = np.random.default_rng(seed)
+
+    # The atoms of each molecule about their center
+    shapes = []
+    for molecule in molecules:
+        xyz = molecule.coordinates
+        shapes.append(xyz - xyz.mean(axis=0))
+
+    grid = _OccupancyGrid(cell, tolerance)
+    if solute is not None and solute.n_atoms > 0:
+        grid.insert(cell.to_fractionals(solute.coordinates))
+
+    remaining = counts.copy()
+    placed = [[] for _ in molecules]
+    attempts = 0
+    acceptance = 1.0
+    while remaining.sum() > 0 and attempts < max_attempts:
+        n = int(math.ceil(remaining.sum() / max(acceptance, 0.01)))
+        n = min(max(n, _min_batch), _max_batch, max_attempts - attempts)
+        kinds = rng.choice(
+            len(molecules), size=n, p=remaining / remaining.sum()
+        )
+        rotations = random_rotations(n, rng)
+        centers = cell.to_cartesians(rng.random((n, 3)))
+        xyz, owner, rank = _candidates(shapes, kinds, rotations, centers)
+
+        accepted = _accept(grid, xyz, owner, rank, n, cell, tolerance)
+        # Keep only as many of each molecule as are still needed, and count
+        # the attempts up to the last candidate kept.
+        last = n
+        for kind in range(len(molecules)):
+            which = np.nonzero(accepted & (kinds == kind))[0]
+            if len(which) >= remaining[kind] and remaining[kind] > 0:
+                last = min(last, which[remaining[kind] - 1] + 1)
+        accepted[last:] = False
+        attempts += int(last)
+        acceptance = max(np.count_nonzero(accepted), 1) / last
+
+        keep = accepted[owner]
+        grid.insert(cell.to_fractionals(xyz[keep]))
+        for kind in range(len(molecules)):
+            which = np.nonzero(accepted & (kinds == kind))[0]
+            remaining[kind] -= len(which)
+            if len(which) > 0:
+                placed[kind].append(
+                    xyz[np.isin(owner, which)].reshape(
+                        len(which), *shapes[kind].shape
+                    )
+                )
+
+    if remaining.sum() > 0:
+        logger.warning(
+            'Only {} of the {} molecules fit in the box after {} '
+            'attempts.'.format(
+                int((counts - remaining).sum()), int(counts.sum()), attempts
+            )
+        )
+    system = _assemble(molecules, placed, cell, solute)
+    statistics = PackingStatistics(
+        requested=int(counts.sum()),
+        inserted=int((counts - remaining).sum()),
+        attempts=attempts,
+        seed=seed if not isinstance(seed, np.random.Generator) else None
+    )
+    return system, statistics
+
+
+def box_around(system, padding):
+    """A box around a non-periodic system, with the system centered in it.
+
+    Parameters
+    ----------
+    system : MolecularSystem
+        The system, e.g. a solute.
+    padding : float
+        The distance in Å from the atoms to each face of the box.
+
+    Returns
+    -------
+    (Cell, numpy.ndarray)
+        The orthorhombic box and the coordinates of the atoms centered in
+        it.
+    """
+    xyz = system.coordinates
+    if len(xyz) == 0:
+        low = high = np.zeros(3)
+    else:
+        low = xyz.min(axis=0)
+        high = xyz.max(axis=0)
+    lengths = high - low + 2 * padding
+    return Cell(*lengths), xyz - (low + high) / 2 + lengths / 2
+
+
+def count_for_density(molecules, cell, density, solute=None):
+    """The number of copies of molecules that give a density.
+
+    Parameters
+    ----------
+    molecules : MolecularSystem or [MolecularSystem]
+        The molecules, each of which has the same number of copies.
+    cell : Cell
+        The periodic box.
+    density : float
+        The density in g/mL of the box, including any solute.
+    solute : MolecularSystem = None
+        Atoms already in the box.
+
+    Returns
+    -------
+    int
+        The number of copies of each molecule, at least 0.
+    """
+    if isinstance(molecules, MolecularSystem):
+        molecules = [molecules]
+    mass = density * amu_per_a3 * cell.volume
+    if solute is not None:
+        mass -= solute.mass
+    return max(0, int(mass / sum(x.mass for x in molecules)))
+
+
+def random_rotations(n, rng):
+    """Rotation matrices distributed uniformly over all orientations.
+
+    Parameters
+    ----------
+    n : int
+        The number of rotations.
+    rng : numpy.random.Generator
+        The source of random numbers.
+
+    Returns
+    -------
+    numpy.ndarray
+        The nx3x3 rotation matrices, which rotate row vectors as
+        ``xyz @ R``.
+    """
+    q = rng.normal(size=(n, 4))
+    q /= np.linalg.norm(q, axis=1)[:, np.newaxis]
+    w, x, y, z = q.T
+    return np.stack(
+        [
+            1 - 2 * (y * y + z * z), 2 * (x * y + w * z), 2 * (x * z - w * y),
+            2 * (x * y - w * z), 1 - 2 * (x * x + z * z), 2 * (y * z + w * x),
+            2 * (x * z + w * y), 2 * (y * z - w * x), 1 - 2 * (x * x + y * y)
+        ],
+        axis=1
+    ).reshape(n, 3, 3)
+
+
+def water():
+    """A rigid water molecule, with the geometry of TIP3P.
+
+    Returns
+    -------
+    MolecularSystem
+        The molecule, with its two bonds.
+    """
+    r = 0.9572
+    theta = math.radians(104.52)
+    xyz = [
+        [0.0, 0.0, 0.0], [r, 0.0, 0.0],
+        [r * math.cos(theta), r * math.sin(theta), 0.0]
+    ]
+    return MolecularSystem(
+        name='water',
+        atoms=AtomTable.from_arrays([8, 1, 1], xyz),
+        bonds=BondTable.from_arrays([0, 0], [1, 2])
+    )
+
+
+class _OccupancyGrid(object):
+    """The atoms in a periodic box, binned for finding clashes.
+
+    The bins are in fractional coordinates, at least the tolerance wide,
+    and each has a row of slots holding the indices of its atoms, widened
+    when a bin fills up.
+    """
+
+    def __init__(self, cell, tolerance, slots=4):
+        self.vectors = cell.vectors
+        self.tolerance = tolerance
+        dims = np.maximum(np.floor(cell.widths / tolerance), 1)
+        n_bins = np.prod(dims)
+        if n_bins > _max_bins:
+            scale = (_max_bins / n_bins)**(1 / 3)
+            dims = np.maximum(np.floor(dims * scale), 1)
+        self.dims = dims.astype(np.int64)
+        n_bins = int(np.prod(self.dims))
+        self.slots = np.full((n_bins, slots), -1, dtype=np.int32)
+        self.counts = np.zeros(n_bins, dtype=np.int32)
+        self.fractionals = np.zeros((0, 3))
+
+    def _bins(self, fractionals):
+        return np.minimum(
+            np.floor(fractionals * self.dims).astype(np.int64), self.dims - 1
+        )
+
+    def insert(self, fractionals):
+        """Add atoms, given their fractional coordinates."""
+        fractionals = fractionals - np.floor(fractionals)
+        n_old = len(self.fractionals)
+        self.fractionals = np.concatenate((self.fractionals, fractionals))
+        keys = np.ravel_multi_index(self._bins(fractionals).T, self.dims)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        # The rank of each atom among the new ones in its bin
+        first = np.searchsorted(keys, keys, side='left')
+        slot = self.counts[keys] + np.arange(len(keys)) - first
+        width = self.slots.shape[1]
+        if len(slot) > 0 and slot.max() >= width:
+            wider = np.full(
+                (len(self.slots), max(2 * width, slot.max() + 1)),
+                -1,
+                dtype=np.int32
+            )
+            wider[:, :width] = self.slots
+            self.slots = wider
+        self.slots[keys, slot] = n_old + order
+        self.counts += np.bincount(keys, minlength=len(self.counts)).astype(
+            np.int32
+        )
+
+    def clashes(self, fractionals):
+        """Whether each point is within the tolerance of an atom."""
+        fractionals = fractionals - np.floor(fractionals)
+        bins = self._bins(fractionals)
+        neighbors = np.mod(
+            bins[:, np.newaxis, :] + _stencil[np.newaxis], self.dims
+        )
+        keys = np.ravel_multi_index(neighbors.reshape(-1, 3).T, self.dims)
+        # Gather only the filled slots of the bins
+        n = self.counts[keys]
+        total = int(n.sum())
+        point = np.repeat(np.arange(len(keys)) // len(_stencil), n)
+        slot = np.arange(total) - np.repeat(np.cumsum(n) - n, n)
+        atoms = self.slots[np.repeat(keys, n), slot]
+        delta = self.fractionals[atoms] - fractionals[point]
+        delta -= np.round(delta)
+        delta = delta @ self.vectors
+        close = np.einsum('ij,ij->i', delta, delta) < self.tolerance**2
+        result = np.zeros(len(fractionals), dtype=bool)
+        result[point[close]] = True
+        return result
+
+
+def _candidates(shapes, kinds, rotations, centers):
+    """The atoms of the candidate molecules, the candidate of each, and
+    its index in the molecule."""
+    sizes = np.array([len(x) for x in shapes])[kinds]
+    starts = np.cumsum(sizes) - sizes
+    xyz = np.empty((int(sizes.sum()), 3))
+    owner = np.repeat(np.arange(len(kinds)), sizes)
+    for kind, shape in enumerate(shapes):
+        which = np.nonzero(kinds == kind)[0]
+        if len(which) == 0:
+            continue
+        atoms = np.einsum('aj,njk->nak', shape, rotations[which])
+        atoms += centers[which, np.newaxis, :]
+        rows = starts[which][:, np.newaxis] + np.arange(len(shape))
+        xyz[rows.reshape(-1)] = atoms.reshape(-1, 3)
+    rank = np.arange(len(owner)) - starts[owner]
+    return xyz, owner, rank
+
+
+def _accept(grid, xyz, owner, rank, n, cell, tolerance):
+    """Which candidates can be inserted, in order, without clashes."""
+    accepted = np.ones(n, dtype=bool)
+    # Check the atoms in their order in the molecules, so most candidates
+    # that clash are rejected after checking only their first few atoms.
+    fractionals = cell.to_fractionals(xyz)
+    for index in range(int(rank.max()) + 1):
+        atoms = np.nonzero((rank == index) & accepted[owner])[0]
+        accepted[owner[atoms[grid.clashes(fractionals[atoms])]]] = False
+    keep = np.nonzero(accepted[owner])[0]
+    if len(keep) < 2:
+        return accepted
+    pairs = neighbor_pairs(xyz[keep], tolerance, cell)
+    first = owner[keep[pairs.i]]
+    second = owner[keep[pairs.j]]
+    clash = (first != second) & (pairs.distances < tolerance)
+    first = first[clash]
+    second = second[clash]
+    first, second = np.minimum(first, second), np.maximum(first, second)
+    # Each candidate is rejected by an earlier one only if that one was
+    # accepted, so go through the clashes in order of the later candidate.
+    for i, j in sorted(set(zip(first.tolist(), second.tolist())),
+                       key=lambda x: x[1]):  # yapf: disable
+        if accepted[i]:
+            accepted[j] = False
+    return accepted
+
+
+def _assemble(molecules, placed, cell, solute):
+    """The packed system, from the solute and the placed molecules."""
+    if solute is None:
+        system = MolecularSystem(
+            name=', '.join(
+                '{} {}'.format(sum(len(x) for x in p), m.name)
+                for m, p in zip(molecules, placed)
+            ),
+            atoms=AtomTable(),
+            bonds=BondTable(),
+            cell=cell
+        )
+    else:
+        system = solute.copy()
+        system.cell = cell
+    for molecule, blocks in zip(molecules, placed):
+        if len(blocks) == 0:
+            continue
+        coordinates = np.concatenate(blocks)
+        n_copies = len(coordinates)
+        n_atoms = molecule.n_atoms
+        columns = {}
+        for name in molecule.atoms:
+            if name not in configuration_columns and name != 'atno':
+                values = molecule.atoms[name]
+                columns[name] = np.tile(
+                    values, (n_copies,) + (1,) * (values.ndim - 1)
+                )
+        start = system.n_atoms
+        system.atoms.append(
+            np.tile(molecule.atoms.atno, n_copies),
+            coordinates.reshape(-1, 3), **columns
+        )
+        bonds = molecule.bonds
+        if len(bonds) > 0:
+            offsets = start + n_atoms * np.arange(n_copies)[:, np.newaxis]
+            system.bonds.append(
+                (offsets + bonds.i[np.newaxis]).reshape(-1),
+                (offsets + bonds.j[np.newaxis]).reshape(-1),
+                order=np.tile(bonds.order, n_copies),
+                shift=np.tile(bonds.shift, (n_copies, 1))
+            )
+    return system
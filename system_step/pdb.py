@@ -0,0 +1,597 @@
+# -*- coding: utf-8 -*-
+
+"""Reading PDB and PQR files.
+
+The ATOM and HETATM records are parsed in bulk rather than line by line.
+The file is read as bytes, the start and end of every line found with
+NumPy, and the atom records gathered into Nx80 arrays of characters, a few
+thousand records at a time to limit the memory used. Each fixed-column
+field is sliced from these as an array of bytes strings and converted
+with NumPy, e.g. `astype(float)` for the coordinates. Fields with few
+distinct values, such as the atom and residue names, are decoded once per
+distinct value. Residue numbers above 9999 may be in the hybrid-36 form
+that continues the numbering with letters, e.g. 'A000' for 10000, which
+are decoded separately when the plain conversion fails.
+
+PQR files replace the occupancy and B-factor with the charge and radius and
+are whitespace-delimited rather than fixed-column, so their atom records
+are split into tokens, again for all the atoms at once.
+
+Files with several MODEL records are read one model at a time, as frames.
+"""
+
+import io
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from system_step.atoms import AtomTable
+from system_step.cell import Cell
+from system_step import compression
+from system_step import elements
+from system_step.molecular_system import MolecularSystem
+
+logger = logging.getLogger(__name__)
+
+# The width of a PDB record.
+_width = 80
+
+# The number of records to parse at a time, which limits the size of the
+# temporary arrays.
+_chunk_size = 2**14
+
+# The record names, as compared with `_Lines.records`
+_atom = b'ATOM  '
+_hetatm = b'HETATM'
+_model = b'MODEL '
+_cryst1 = b'CRYST1'
+
+
+def iter_pdb(path, start=0, stop=None, step=1, index=None, pqr=False):
+    """Read the models in a PDB or PQR file one at a time.
+
+    The models are selected like a slice of a list, starting from 0. A file
+    without MODEL records has a single model.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The PDB or PQR file.
+    start : int = 0
+        The first model to read.
+    stop : int = None
+        The model to stop before, or None to read to the end.
+    step : int = 1
+        Read every `step`'th model.
+    index : frame_index.FrameIndex = None
+        The index of the models in the file. With an index only the
+        selected models are read from the file; otherwise the whole file is
+        read.
+    pqr : bool = False
+        Whether the file is a PQR file.
+
+    Yields
+    ------
+    MolecularSystem
+        The system in each selected model.
+    """
+    if start < 0 or step < 1 or (stop is not None and stop < 0):
+        raise ValueError(
+            'Invalid model selection {}:{}:{}'.format(start, stop, step)
+        )
+    path = Path(path)
+    with compression.open_file(path) as fd:
+        if index is not None:
+            cell = _cell(_Lines(*_read(fd, int(index.offsets[0]))))
+            n_models = len(index)
+            for model in range(n_models)[start:stop:step]:
+                fd.seek(index.offsets[model])
+                if model + 1 < n_models:
+                    size = int(index.offsets[model + 1] - index.offsets[model])
+                    lines = _Lines(*_read(fd, size))
+                else:
+                    lines = _Lines(*_read(fd))
+                yield _system(
+                    lines, np.arange(len(lines)), path, model, n_models, cell,
+                    pqr
+                )
+            return
+
+        lines = _Lines(*_read(fd))
+
+    models = np.flatnonzero(lines.records == _model)
+    if len(models) == 0:
+        boundaries = np.array([0, len(lines)])
+        cell = None
+    else:
+        boundaries = np.append(models, len(lines))
+        cell = _cell(lines, np.arange(models[0]))
+    n_models = len(boundaries) - 1
+    for model in range(n_models)[start:stop:step]:
+        rows = np.arange(boundaries[model], boundaries[model + 1])
+        yield _system(lines, rows, path, model, n_models, cell, pqr)
+
+
+def _read(fd, size=None):
+    """Read text into a buffer followed by blanks, for `_Lines`.
+
+    Parameters
+    ----------
+    fd : file
+        The file, opened in binary mode, or a stream decompressing one.
+    size : int = None
+        The number of bytes to read, or None for the rest of the file.
+
+    Returns
+    -------
+    data : bytearray
+        The text, followed by a record's width of blanks.
+    size : int
+        The length of the text.
+    """
+    if size is None:
+        if not isinstance(fd, io.BufferedReader):
+            # A stream, whose length is unknown until it has been read
+            data = bytearray(fd.read())
+            n = len(data)
+            data += b' ' * _width
+            return data, n
+        here = fd.tell()
+        size = fd.seek(0, 2) - here
+        fd.seek(here)
+    data = bytearray(size + _width)
+    with memoryview(data) as view:
+        n = fd.readinto(view[0:size])
+    if n < size:
+        del data[n:size]
+    data[n:] = b' ' * _width
+    return data, n
+
+
+class _Lines(object):
+    """The lines in a block of text, located with NumPy.
+
+    Attributes
+    ----------
+    data : bytearray
+        The text, followed by blanks so that every line can be sliced to the
+        full width of a record.
+    starts, ends : numpy.ndarray
+        The offset of the start and end of each line, excluding the newline.
+    records : numpy.ndarray
+        The record name, the first six characters, of each line as bytes.
+    """
+
+    def __init__(self, data, size):
+        """Find the lines in the text.
+
+        Parameters
+        ----------
+        data : bytearray
+            The text, followed by a record's width of blanks, from `_read`.
+        size : int
+            The length of the text.
+
+        Returns
+        -------
+        None
+        """
+        self.data = data
+        buffer = np.frombuffer(data, dtype=np.uint8, count=size)
+        # Search for the newlines a piece at a time, which is faster.
+        piece = 2**20
+        ends = [
+            np.flatnonzero(buffer[first:first + piece] == 10) + first
+            for first in range(0, size, piece)
+        ]
+        if size > 0 and buffer[-1] != 10:
+            ends.append([size])
+        self.ends = np.concatenate([[]] + ends).astype(np.int64)
+        self.starts = np.zeros_like(self.ends)
+        self.starts[1:] = self.ends[:-1] + 1
+
+        self.records = self._gather(np.arange(len(self)), 6).view('S6')
+        self.records = self.records.reshape(-1)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def block(self, rows):
+        """The selected lines as an Nx80 array of bytes, padded with blanks.
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            The indices of the lines.
+
+        Returns
+        -------
+        numpy.ndarray
+            The lines, as an array of uint8.
+        """
+        return self._gather(rows, _width)
+
+    def _gather(self, rows, width):
+        """The first `width` characters of the lines, padded with blanks."""
+        buffer = np.frombuffer(self.data, dtype=np.uint8)
+        offsets = self.starts[rows, None] + np.arange(width)
+        result = buffer[offsets]
+        result[offsets >= self.ends[rows, None]] = 32
+        # Carriage returns from Windows line endings
+        result[result == 13] = 32
+        return result
+
+    def line(self, row):
+        """The line as bytes."""
+        return bytes(self.data[self.starts[row]:self.ends[row]])
+
+    def text(self, rows):
+        """The selected lines joined into one block of bytes."""
+        data = memoryview(self.data)
+        return b'\n'.join(
+            data[s:e] for s, e in zip(self.starts[rows], self.ends[rows])
+        )
+
+
+def _field(block, first, last):
+    """A fixed-column field of the records, as an array of bytes strings.
+
+    Parameters
+    ----------
+    block : numpy.ndarray
+        The records as an Nx80 array of characters, from `_Lines.block`.
+    first, last : int
+        The columns of the field, counted from 0, like a slice.
+
+    Returns
+    -------
+    numpy.ndarray
+        The field, including any blanks, as 'S' strings of its width.
+    """
+    width = last - first
+    return np.ascontiguousarray(block[:, first:last]
+                                ).view('S{}'.format(width)).reshape(-1)
+
+
+def _unique(fields):
+    """The distinct values of the fields and the index of each one's value.
+    """
+    values, inverse = np.unique(fields, return_inverse=True)
+    return values, inverse.reshape(-1)
+
+
+def _strings(fields):
+    """Convert fields to an array of stripped strings.
+
+    Each distinct value is decoded once.
+
+    Parameters
+    ----------
+    fields : numpy.ndarray
+        The fields as bytes strings.
+
+    Returns
+    -------
+    numpy.ndarray
+        The strings.
+    """
+    if len(fields) == 0:
+        return np.zeros(0, dtype='U1')
+    values, inverse = _unique(fields)
+    text = [value.strip().decode('ascii', 'replace') for value in values]
+    return np.array(text)[inverse]
+
+
+def _numbers(fields, dtype=np.float64, default=0):
+    """Convert fields to numbers, with blanks as `default`.
+
+    Integers that are not decimal are decoded as hybrid-36.
+
+    Parameters
+    ----------
+    fields : numpy.ndarray
+        The fields as bytes strings.
+    dtype : numpy.dtype = numpy.float64
+        The type of the numbers.
+    default : int or float = 0
+        The value of blank fields.
+
+    Returns
+    -------
+    numpy.ndarray
+        The numbers.
+    """
+    width = fields.dtype.itemsize
+    blank = fields == b' ' * width
+    if np.any(blank):
+        fields = fields.copy()
+        fields[blank] = b'0'
+    try:
+        values = fields.astype(dtype)
+    except ValueError:
+        if not np.issubdtype(dtype, np.integer):
+            raise
+        # Large serial and residue numbers may be in hybrid-36
+        unique, inverse = _unique(fields)
+        decoded = [
+            _hybrid36(x.strip().decode('ascii', 'replace'), width)
+            for x in unique
+        ]
+        values = np.array(decoded, dtype=dtype)[inverse]
+    values[blank] = default
+    return values
+
+
+def _hybrid36(text, width):
+    """Decode an integer that may be in the hybrid-36 form.
+
+    Numbers too large for the width of their field continue in base 36
+    with a leading letter, first in upper case, e.g. 'A000' for 10000 in a
+    four-character residue number, and then in lower case.
+
+    Parameters
+    ----------
+    text : str
+        The text of the field, stripped of blanks.
+    width : int
+        The width of the field.
+
+    Returns
+    -------
+    int
+        The number.
+    """
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    if len(text) == width and text.isalnum() and text[0].isalpha():
+        if text.isupper():
+            return int(text, 36) - 10 * 36**(width - 1) + 10**width
+        if text.islower():
+            return int(text, 36) + 16 * 36**(width - 1) + 10**width
+    raise ValueError(
+        "'{}' is not a decimal or hybrid-36 number.".format(text)
+    )
+
+
+def _formal_charges(fields):
+    """The formal charges from the charge field, e.g. '2+' or '1-'."""
+    if len(fields) == 0:
+        return np.zeros(0, dtype=np.int8)
+    values, inverse = _unique(np.char.strip(fields))
+    charges = np.zeros(len(values), dtype=np.int8)
+    for i, value in enumerate(values):
+        if len(value) == 0:
+            continue
+        try:
+            if value[-1:] in (b'+', b'-'):
+                charges[i] = int(value[-1:] + (value[0:-1] or b'1'))
+            else:
+                charges[i] = int(value)
+        except ValueError:
+            logger.warning(
+                "Ignoring the invalid formal charge '{}'".format(
+                    value.decode('ascii', 'replace')
+                )
+            )
+    return charges[inverse]
+
+
+def _element_from_name(name, residue_name, aligned):
+    """Guess the element of an atom from its name.
+
+    In PDB files the names of atoms whose element symbol has one letter
+    start in the second column of the name, so ' CA ' is a carbon and
+    'CA  ' a calcium. PQR files do not keep this alignment, so there the
+    name is read as a two-letter element only for single-atom residues such
+    as ions, where the name is the same as the residue name.
+    """
+    if aligned:
+        if name[0:1] == b' ' or name[0:1].isdigit():
+            symbol = name[1:2]
+        elif name[0:1] == b'H' and len(name.strip()) == 4:
+            # Hydrogens with four-character names, e.g. 'HD21'
+            symbol = b'H'
+        else:
+            symbol = name[0:2]
+    else:
+        name = name.strip().lstrip(b'0123456789')
+        if name == residue_name.strip():
+            symbol = name[0:2]
+        else:
+            symbol = name[0:1]
+    symbol = symbol.decode('ascii', 'replace').strip()
+    try:
+        return elements.atomic_number(symbol)
+    except ValueError:
+        try:
+            return elements.atomic_number(symbol[0:1])
+        except ValueError:
+            raise ValueError(
+                "Cannot determine the element of atom '{}'.".format(
+                    name.decode('ascii', 'replace').strip()
+                )
+            )
+
+
+def _atomic_numbers(element, name, residue_name, aligned=True):
+    """The atomic numbers from the element field, or else the atom names.
+
+    Each distinct combination of element and name, and for PQR files the
+    residue name, is resolved once.
+
+    Parameters
+    ----------
+    element, name, residue_name : numpy.ndarray
+        The fields as bytes strings.
+    aligned : bool = True
+        Whether the names are aligned as in PDB files.
+
+    Returns
+    -------
+    numpy.ndarray
+        The atomic numbers.
+    """
+    n = len(name)
+    if n == 0:
+        return np.zeros(0, dtype=np.int16)
+    fields = [element, name]
+    if not aligned:
+        fields.append(residue_name)
+    # Number the combinations of the distinct values of the fields
+    keys = np.zeros(n, dtype=np.int64)
+    for field in fields:
+        values, inverse = _unique(field)
+        _, rows, keys = np.unique(
+            keys * len(values) + inverse,
+            return_index=True,
+            return_inverse=True
+        )
+        keys = keys.reshape(-1)
+
+    codes = np.empty(len(rows), dtype=np.int16)
+    for i, row in enumerate(rows):
+        symbol = element[row].strip()
+        if symbol != b'':
+            try:
+                codes[i] = elements.atomic_number(symbol.decode('ascii'))
+                continue
+            except ValueError:
+                pass
+        codes[i] = _element_from_name(
+            name[row], residue_name[row], aligned
+        )
+    return codes[keys]
+
+
+def _cell(lines, rows=None):
+    """The cell from the CRYST1 record, if there is one."""
+    if rows is None:
+        rows = np.arange(len(lines))
+    rows = rows[lines.records[rows] == _cryst1]
+    if len(rows) == 0:
+        return None
+    line = lines.line(rows[0])
+    try:
+        a, b, c = [float(line[k:k + 9]) for k in (6, 15, 24)]
+        alpha, beta, gamma = [float(line[k:k + 7]) for k in (33, 40, 47)]
+    except ValueError:
+        logger.warning('Ignoring the invalid CRYST1 record.')
+        return None
+    # A unit cube is the conventional placeholder for non-crystal structures
+    if a == 1.0 and b == 1.0 and c == 1.0:
+        return None
+    return Cell(a, b, c, alpha, beta, gamma)
+
+
+def _system(lines, rows, path, model, n_models, cell, pqr):
+    """Create a system from the selected lines of a PDB or PQR file."""
+    records = lines.records[rows]
+    atom_rows = rows[(records == _atom) | (records == _hetatm)]
+    model_cell = _cell(lines, rows)
+    if model_cell is not None:
+        cell = model_cell
+
+    if pqr:
+        atoms = _pqr_atoms(lines, atom_rows, path)
+    else:
+        atoms = _pdb_atoms(lines, atom_rows)
+
+    name = compression.strip_extension(path).stem
+    if n_models > 1:
+        name = '{}:{}'.format(name, model)
+    return MolecularSystem(name=name, atoms=atoms, cell=cell)
+
+
+def _pdb_atoms(lines, rows):
+    """The table of atoms from fixed-column ATOM and HETATM records.
+
+    The columns are those of the PDB format guide, counted from 0.
+    """
+    n = len(rows)
+    xyz = np.empty((n, 3))
+    residue = np.empty(n, dtype=np.int32)
+    occupancy = np.empty(n)
+    b_factor = np.empty(n)
+    name = np.empty(n, dtype='S4')
+    residue_name = np.empty(n, dtype='S3')
+    chain = np.empty(n, dtype='S1')
+    element = np.empty(n, dtype='S2')
+    charge = np.empty(n, dtype='S2')
+    for first in range(0, n, _chunk_size):
+        block = lines.block(rows[first:first + _chunk_size])
+        chunk = slice(first, first + len(block))
+        for i, column in enumerate((30, 38, 46)):
+            xyz[chunk, i] = _numbers(_field(block, column, column + 8))
+        residue[chunk] = _numbers(_field(block, 22, 26), dtype=np.int32)
+        occupancy[chunk] = _numbers(_field(block, 54, 60), default=1.0)
+        b_factor[chunk] = _numbers(_field(block, 60, 66))
+        name[chunk] = _field(block, 12, 16)
+        residue_name[chunk] = _field(block, 17, 20)
+        chain[chunk] = _field(block, 21, 22)
+        element[chunk] = _field(block, 76, 78)
+        charge[chunk] = _field(block, 78, 80)
+
+    return AtomTable.from_arrays(
+        _atomic_numbers(element, name, residue_name),
+        xyz,
+        name=_strings(name),
+        residue_name=_strings(residue_name),
+        chain=_strings(chain),
+        residue=residue,
+        occupancy=occupancy,
+        b_factor=b_factor,
+        formal_charge=_formal_charges(charge),
+    )
+
+
+def _pqr_atoms(lines, rows, path):
+    """The table of atoms from whitespace-delimited PQR atom records.
+
+    The records have the fields
+
+        ATOM serial name residue [chain] number x y z charge radius
+    """
+    n = len(rows)
+    tokens = lines.text(rows).split()
+    width = len(tokens) // n if n > 0 else 11
+    if len(tokens) == n * width and width in (10, 11):
+        fields = np.array(tokens).reshape(n, width)
+    else:
+        # Some lines have a chain and some do not.
+        fields = []
+        for row in rows:
+            values = lines.line(row).split()
+            if len(values) == 10:
+                values.insert(4, b'')
+            elif len(values) != 11:
+                raise ValueError(
+                    "Invalid PQR atom record in '{}': '{}'".format(
+                        path, lines.line(row).decode('ascii', 'replace')
+                    )
+                )
+            fields.append(values)
+        fields = np.array(fields, dtype=bytes).reshape(n, 11)
+        width = 11
+
+    name = fields[:, 2]
+    residue_name = fields[:, 3]
+    if width == 11:
+        chain = _strings(fields[:, 4])
+    else:
+        chain = np.full(n, '', dtype='U1')
+    atno = _atomic_numbers(
+        np.zeros(n, dtype='S1'), name, residue_name, aligned=False
+    )
+    return AtomTable.from_arrays(
+        atno,
+        fields[:, -5:-2].astype(np.float64),
+        charge=fields[:, -2].astype(np.float64),
+        name=_strings(name),
+        residue_name=_strings(residue_name),
+        chain=chain,
+        residue=fields[:, -6].astype(np.int32),
+        radius=fields[:, -1].astype(np.float64),
+    )
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+"""Perceiving bonds from the distances between atoms.
+
+Two atoms are bonded if they are closer than the sum of their covalent radii
+plus a tolerance. The candidate pairs come from the cell-list neighbor
+search, so the cost is linear in the number of atoms.
+
+A single cutoff large enough for the largest atoms would make the search
+for the common, small atoms needlessly expensive. Instead the search over
+all atoms uses a cutoff for the bulk of the atoms, and the few larger atoms
+are searched separately with a larger cutoff.
+"""
+
+import logging
+
+import numpy as np
+
+from system_step import elements
+from system_step.neighbors import neighbor_pairs, query_pairs
+
+logger = logging.getLogger(__name__)
+
+
+def perceive_bonds(system, tolerance=0.45, minimum=0.4):
+    """Find the bonds in a system from the distances between atoms.
+
+    Parameters
+    ----------
+    system : MolecularSystem
+        The system. Its coordinates and cell are used.
+    tolerance : float = 0.45
+        The tolerance in Å added to the sum of the covalent radii.
+    minimum : float = 0.4
+        Atoms closer than this, in Å, are not bonded; they are most likely
+        overlapping duplicates.
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+        The atoms i and j of each bond, with i <= j, and the Nx3 lattice
+        shift of the image of j. i == j only for a bond between an atom and
+        its own periodic image.
+    """
+    n_atoms = system.n_atoms
+    xyz = system.coordinates
+    cell = system.cell
+    radii = elements.covalent_radii[system.atoms.atno]
+    if n_atoms == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros((0, 3), dtype=np.int64)
+
+    # The radius that covers all but the largest 1% of the atoms.
+    r_bulk = float(np.percentile(radii, 99, method='higher'))
+    is_large = radii > r_bulk
+    large = np.nonzero(is_large)[0]
+
+    pairs = neighbor_pairs(xyz, 2 * r_bulk + tolerance, cell)
+    bonded = _bonded(pairs, radii, tolerance, minimum)
+    if len(large) > 0:
+        # Drop pairs with large atoms, which need the larger cutoff...
+        bonded &= ~is_large[pairs.i] & ~is_large[pairs.j]
+    i = pairs.i[bonded]
+    j = pairs.j[bonded]
+    shifts = pairs.shifts[bonded]
+
+    if len(large) > 0:
+        # and find all the pairs with them.
+        cutoff = float(radii[large].max() + radii.max()) + tolerance
+        pairs = query_pairs(xyz, large, cutoff, cell)
+        bonded = _bonded(pairs, radii, tolerance, minimum)
+        li = pairs.i
+        lj = pairs.j
+        # Each pair of large atoms is found twice, once from each atom.
+        once = ~is_large[lj] | (li < lj) | (
+            (li == lj) & _positive(pairs.shifts)
+        )
+        bonded &= once
+        li = li[bonded]
+        lj = lj[bonded]
+        lshifts = pairs.shifts[bonded]
+        swap = li > lj
+        li[swap], lj[swap] = lj[swap], li[swap]
+        lshifts[swap] *= -1
+        i = np.concatenate((i, li))
+        j = np.concatenate((j, lj))
+        shifts = np.concatenate((shifts, lshifts))
+    logger.debug('Perceived {} bonds for {} atoms'.format(len(i), n_atoms))
+    return i, j, shifts
+
+
+def _bonded(pairs, radii, tolerance, minimum):
+    """Which pairs are bonded, by the covalent radii criterion."""
+    bonded = pairs.distances <= radii[pairs.i] + radii[pairs.j] + tolerance
+    bonded &= pairs.distances >= minimum
+    return bonded
+
+
+def _positive(shifts):
+    """Whether lattice shifts are lexically positive."""
+    return (
+        (shifts[:, 0] > 0) | ((shifts[:, 0] == 0) & (shifts[:, 1] > 0)) |
+        ((shifts[:, 0] == 0) & (shifts[:, 1] == 0) & (shifts[:, 2] > 0))
+    )
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+"""Probing structure files for their size without reading them.
+
+Schedulers need the size of a job, the number of atoms and frames, before
+it runs. A probe finds these from the parts of a file that describe it:
+the header of a binary file, the index of the frames of an XYZ or PDB
+file, the counts lines of an SD file, or the tables of a store. The
+composition and cell come from the first frame alone, and for PDB files
+only the element and name fields of its atoms are parsed.
+"""
+
+import collections
+import logging
+import mmap
+import os
+import re
+
+import numpy as np
+
+from system_step import binary
+from system_step import cif
+from system_step.cell import Cell
+from system_step import compression
+from system_step import frame_index
+from system_step.molecular_system import _composition
+from system_step import pdb
+from system_step import readers
+from system_step import sdf
+from system_step.store import SystemStore
+
+logger = logging.getLogger(__name__)
+
+Probe = collections.namedtuple(
+    'Probe', [
+        'file_type', 'n_frames', 'n_atoms', 'total_atoms', 'cell',
+        'composition'
+    ]
+)
+Probe.__doc__ = """A summary of a structure file, found without reading it all.
+
+Attributes
+----------
+file_type : str
+    The type of the file.
+n_frames : int
+    The number of frames or systems in the file.
+n_atoms : int
+    The number of atoms in the first frame.
+total_atoms : int
+    The number of atoms in all the frames, or None for CIF files with
+    several data blocks, which would need to be parsed to count them.
+cell : Cell
+    The cell of the first frame, or None if it is not periodic.
+composition : collections.OrderedDict
+    The number of atoms of each element in the first frame, keyed by
+    symbol, in Hill order.
+"""
+
+# Indexes of files smaller than this are not cached, since they are quick to
+# rebuild, and probing a directory of small files would litter it.
+_cache_size = 2**24
+
+# The counts line of each molecule after the first in an SD file
+_sdf_counts_re = re.compile(rb'\$\$\$\$\r?\n(?:[^\n]*\n){3}([^\n]{0,6})')
+
+
+def probe_file(path, file_type='from extension'):
+    """Find the size and composition of a structure file.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The file.
+    file_type : str = 'from extension'
+        The type of the file, or 'from extension' to determine it from the
+        extension of the filename, or the contents if the extension is not
+        known.
+
+    Returns
+    -------
+    Probe
+        The summary of the file.
+    """
+    if file_type == 'from extension':
+        file_type = readers.file_type_of(path)
+    logger.debug("Probing '{}' as {}".format(path, file_type))
+    if file_type in ('XYZ', 'PDB'):
+        index = frame_index.get_index(
+            path, file_type, cache=os.path.getsize(path) > _cache_size
+        )
+        if len(index) == 0:
+            return Probe(file_type, 0, 0, 0, None, _composition([]))
+        if file_type == 'PDB':
+            end = int(index.offsets[1]) if len(index) > 1 else None
+            cell, atno = _pdb_first_model(path, end)
+        else:
+            first = readers.read_file(path, file_type)
+            cell, atno = first.cell, first.atoms.atno
+        return Probe(
+            file_type, len(index), int(index.n_atoms[0]),
+            int(index.n_atoms.sum()), cell, _composition(atno)
+        )
+    elif file_type == 'SEAMM binary':
+        return _probe_binary(path)
+    elif file_type == 'SDF':
+        return _probe_sdf(path)
+    elif file_type in ('CIF', 'mmCIF'):
+        return _probe_cif(path, file_type)
+    elif file_type == 'SEAMM store':
+        return _probe_store(path)
+    else:
+        # PQR files, whose atom names are not aligned, are simply read.
+        systems = list(readers.iter_file(path, file_type))
+        return _from_systems(file_type, systems)
+
+
+def _from_systems(file_type, systems):
+    """The probe of the systems read from a file."""
+    if len(systems) == 0:
+        return Probe(file_type, 0, 0, 0, None, _composition([]))
+    first = systems[0]
+    return Probe(
+        file_type, len(systems), first.n_atoms,
+        sum(x.n_atoms for x in systems), first.cell, first.composition
+    )
+
+
+def _pdb_first_model(path, end):
+    """The cell and atomic numbers of the first model of a PDB file.
+
+    Only the element, atom name and residue name fields are parsed.
+    """
+    with compression.open_file(path) as fd:
+        lines = pdb._Lines(*pdb._read(fd, end))
+    records = lines.records
+    rows = np.flatnonzero((records == pdb._atom) | (records == pdb._hetatm))
+    atno = np.empty(len(rows), dtype=np.int16)
+    for first in range(0, len(rows), pdb._chunk_size):
+        block = lines.block(rows[first:first + pdb._chunk_size])
+        atno[first:first + len(block)] = pdb._atomic_numbers(
+            pdb._field(block, 76, 78), pdb._field(block, 12, 16),
+            pdb._field(block, 17, 20)
+        )
+    return pdb._cell(lines), atno
+
+
+def _probe_binary(path):
+    """Probe a binary file from its header and the elements of the first."""
+    with compression.open_file(path) as fd:
+        entries, start = binary._read_header(fd, path)
+        if len(entries) == 0:
+            return Probe('SEAMM binary', 0, 0, 0, None, _composition([]))
+        first = entries[0]
+        atno = binary._array(fd, None, start, first['atoms']['atno'], path)
+    sizes = [entry['atoms']['atno']['shape'][0] for entry in entries]
+    cell = first['cell']
+    return Probe(
+        'SEAMM binary', len(entries), sizes[0], sum(sizes),
+        None if cell is None else Cell(*cell), _composition(atno)
+    )
+
+
+def _probe_sdf(path):
+    """Probe an SD file from the counts line of each molecule."""
+    for first in sdf.iter_sdf(path, stop=1):
+        break
+    else:
+        return Probe('SDF', 0, 0, 0, None, _composition([]))
+    data = _contents(path)
+    sizes = [first.n_atoms]
+    for match in _sdf_counts_re.finditer(data):
+        try:
+            sizes.append(int(match.group(1)[0:3]))
+        except ValueError:
+            # Blank lines after the last molecule
+            continue
+    return Probe(
+        'SDF', len(sizes), sizes[0], sum(sizes), None, first.composition
+    )
+
+
+def _probe_cif(path, file_type):
+    """Probe a CIF file from its first data block.
+
+    The other blocks are counted, but not parsed, so the total number of
+    atoms is only known if there is a single block.
+    """
+    for i, block in enumerate(cif.iter_blocks(path)):
+        systems = list(cif._systems(block, path))
+        if len(systems) > 0:
+            break
+    else:
+        return Probe(file_type, 0, 0, 0, None, _composition([]))
+    data = _contents(path)
+    n_blocks = len(cif._data_re.findall(data))
+    if cif._first_data_re.match(data):
+        n_blocks += 1
+    result = _from_systems(file_type, systems)
+    if n_blocks > i + 1:
+        # Count the later blocks, assuming that each holds one system.
+        result = result._replace(
+            n_frames=result.n_frames + n_blocks - i - 1, total_atoms=None
+        )
+    return result
+
+
+def _probe_store(path):
+    """Probe a store from its tables and its first configuration."""
+    with SystemStore(path) as store:
+        n_frames, total = store.connection.execute(
+            'SELECT COUNT(*), SUM(n_atoms) FROM configurations '
+            'JOIN systems ON systems.id = configurations.system'
+        ).fetchone()
+        systems = list(store.iter_configurations(stop=1))
+    result = _from_systems('SEAMM store', systems)
+    return result._replace(n_frames=n_frames, total_atoms=total or 0)
+
+
+def _contents(path):
+    """The contents of a file, mapped into memory unless compressed."""
+    if compression.is_compressed(path):
+        with compression.open_file(path) as fd:
+            return fd.read()
+    with open(path, 'rb') as fd:
+        if fd.seek(0, 2) == 0:
+            return b''
+        return mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
@@ -0,0 +1,503 @@
+# -*- coding: utf-8 -*-
+
+"""Dispatch reading of structure files to the reader for each format.
+
+Many small files, such as a library of molecules with one per file, are
+read in batches by a pool of worker processes, since parsing is bound by
+the CPU and the threads of one process cannot parse in parallel.
+"""
+
+import collections
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import glob
+import logging
+import os
+from pathlib import Path
+
+from system_step import binary
+from system_step import cif
+from system_step import compression
+from system_step import frame_index
+from system_step import pdb
+from system_step import sdf
+from system_step.store import SystemStore
+from system_step.symmetry import expand as expand_symmetry
+from system_step import xyz
+
+logger = logging.getLogger(__name__)
+
+# The file types, keyed by the name used in the parameters, with the
+# extensions recognized for each.
+file_types = {
+    'XYZ': ('.xyz',),
+    'PDB': ('.pdb', '.ent'),
+    'PQR': ('.pqr',),
+    'CIF': ('.cif',),
+    'mmCIF': ('.mmcif', '.mcif'),
+    'SDF': ('.sdf', '.sd', '.mol'),
+    'SEAMM binary': ('.sbin',),
+    'SEAMM store': ('.db', '.sqlite'),
+}
+
+# Records that identify PDB files
+_pdb_records = {
+    b'HEADER', b'TITLE', b'COMPND', b'REMARK', b'CRYST1', b'MODEL', b'ATOM',
+    b'HETATM'
+}
+
+
+def file_type_from_extension(path):
+    """Determine the type of a structure file from its extension.
+
+    The extension of any compression is ignored, so 'run.xyz.gz' is XYZ.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The name of the file.
+
+    Returns
+    -------
+    str
+        The file type, one of the keys of `file_types`.
+    """
+    suffix = compression.strip_extension(path).suffix.lower()
+    for file_type, extensions in file_types.items():
+        if suffix in extensions:
+            return file_type
+    raise ValueError(
+        "Cannot determine the type of '{}' from its extension.".format(path)
+    )
+
+
+def file_type_from_contents(path):
+    """Determine the type of a structure file from its first lines.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The file, which may be compressed.
+
+    Returns
+    -------
+    str
+        The file type, one of the keys of `file_types`.
+    """
+    with compression.open_file(path) as fd:
+        start = fd.read(4096)
+    if start.startswith(binary._magic):
+        return 'SEAMM binary'
+    if start.startswith(b'SQLite format 3\x00'):
+        return 'SEAMM store'
+    lines = start.splitlines()
+    text = [x for x in lines if x.strip() != b'' and x[0:1] != b'#']
+    if len(text) > 0 and text[0].lower().startswith(b'data_'):
+        return 'CIF'
+    if len(lines) > 0 and lines[0].strip().isdigit():
+        return 'XYZ'
+    if len(lines) > 3 and b'V2000' in lines[3]:
+        return 'SDF'
+    if any(x[0:6].rstrip() in _pdb_records for x in lines):
+        return 'PDB'
+    raise ValueError(
+        "Cannot determine the type of '{}' from its extension or "
+        'contents.'.format(path)
+    )
+
+
+def file_type_of(path):
+    """Determine the type of a structure file.
+
+    The type is found from the extension of the file if it is known, and
+    otherwise from the contents.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The file.
+
+    Returns
+    -------
+    str
+        The file type, one of the keys of `file_types`.
+    """
+    try:
+        return file_type_from_extension(path)
+    except ValueError:
+        return file_type_from_contents(path)
+
+
+def read_file(path, file_type='from extension'):
+    """Read a structure file.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The file to read.
+    file_type : str = 'from extension'
+        The type of the file, or 'from extension' to determine it from the
+        extension of the filename.
+
+    Returns
+    -------
+    MolecularSystem
+        The system in the file, or the first one if there are several.
+    """
+    for system in iter_file(path, file_type, stop=1):
+        return system
+    raise ValueError("There is no structure in '{}'.".format(path))
+
+
+def iter_file(
+    path,
+    file_type='from extension',
+    start=0,
+    stop=None,
+    step=1,
+    memory_map=False,
+    symmetry=None
+):
+    """Read the systems, or frames, in a structure file one at a time.
+
+    The systems are selected like a slice of a list, starting from 0.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The file to read.
+    file_type : str = 'from extension'
+        The type of the file, or 'from extension' to determine it from the
+        extension of the filename, or the contents if the extension is not
+        known.
+    start : int = 0
+        The first system to read.
+    stop : int = None
+        The system to stop before, or None to read to the end.
+    step : int = 1
+        Read every `step`'th system.
+    memory_map : bool = False
+        Whether to map files in the native binary format into memory, rather
+        than read them. Other formats are always read.
+    symmetry : str, int or [str] = None
+        Expand the asymmetric units of crystals to the full cell with the
+        symmetry in CIF files, 'from file', or with a space group or
+        operations, as for :func:`symmetry.operations`, which apply to the
+        periodic systems of any file.
+
+    Yields
+    ------
+    MolecularSystem
+        Each selected system in the file.
+    """
+    if file_type == 'from extension':
+        file_type = file_type_of(path)
+    logger.debug("Reading '{}' as {}".format(path, file_type))
+    if symmetry is not None and symmetry != 'from file' and file_type not in (
+        'CIF', 'mmCIF'
+    ):
+        for system in iter_file(
+            path, file_type, start, stop, step, memory_map=memory_map
+        ):
+            if system.cell is not None:
+                system = expand_symmetry(system, symmetry)
+            yield system
+        return
+    # Compressed files are read as streams, which cannot seek using an index.
+    seekable = not compression.is_compressed(path)
+    if file_type == 'XYZ':
+        # Seek using the index of the frames, unless reading from the start.
+        if (start > 0 or step > 1) and seekable:
+            index = frame_index.get_index(path, file_type)
+        else:
+            index = None
+        yield from xyz.iter_xyz(
+            path, start=start, stop=stop, step=step, index=index
+        )
+    elif file_type in ('PDB', 'PQR'):
+        # The models of PQR files are indexed like those of PDB files.
+        if (start > 0 or step > 1) and seekable:
+            index = frame_index.get_index(path, 'PDB')
+        else:
+            index = None
+        yield from pdb.iter_pdb(
+            path,
+            start=start,
+            stop=stop,
+            step=step,
+            index=index,
+            pqr=file_type == 'PQR'
+        )
+    elif file_type in ('CIF', 'mmCIF'):
+        # The reader recognizes the layout of each data block.
+        yield from cif.iter_cif(
+            path, start=start, stop=stop, step=step, symmetry=symmetry
+        )
+    elif file_type == 'SDF':
+        yield from sdf.iter_sdf(path, start=start, stop=stop, step=step)
+    elif file_type == 'SEAMM binary':
+        yield from binary.iter_binary(
+            path, start=start, stop=stop, step=step, memory_map=memory_map
+        )
+    elif file_type == 'SEAMM store':
+        with SystemStore(path) as store:
+            yield from store.iter_configurations(
+                start=start, stop=stop, step=step
+            )
+    else:
+        raise ValueError("Unknown file type '{}'".format(file_type))
+
+
+def available_cores():
+    """The number of CPU cores this process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def is_batch(path):
+    """Whether a filename is a directory or glob pattern naming many files.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The filename.
+
+    Returns
+    -------
+    bool
+        True if `path` is a directory or contains a wildcard.
+    """
+    return Path(path).is_dir() or glob.has_magic(str(path))
+
+
+def find_files(path, file_type='from extension'):
+    """The structure files in a directory or matching a glob pattern.
+
+    The files of a directory, or matched by a pattern, are kept only if
+    their extension is one of a known file type, or of `file_type` if it is
+    given. Subdirectories are not searched, unless the pattern has '**'.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The directory or glob pattern.
+    file_type : str = 'from extension'
+        The type of the files, or 'from extension' to accept any known type.
+
+    Returns
+    -------
+    [pathlib.Path]
+        The files, sorted by name.
+    """
+    path = Path(path).expanduser()
+    if path.is_dir():
+        candidates = path.iterdir()
+    else:
+        candidates = (Path(x) for x in glob.iglob(str(path), recursive=True))
+    if file_type == 'from extension':
+        extensions = {x for values in file_types.values() for x in values}
+    else:
+        extensions = set(file_types[file_type])
+    return sorted(
+        x for x in candidates
+        if compression.strip_extension(x).suffix.lower() in extensions and
+        x.is_file()
+    )
+
+
+def iter_frames(
+    path,
+    file_type='from extension',
+    start=0,
+    stop=None,
+    step=1,
+    memory_map=False,
+    perceive='never',
+    tolerance=0.45,
+    symmetry=None
+):
+    """Read the selected frames of a file one at a time, perceiving bonds.
+
+    The frames that have the same atoms and bonds as the first are made
+    configurations of it, sharing its topology. Bonds are found for the
+    frames that need them, once for the shared topology. Only the first
+    frame is held, so files larger than memory can be read.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The file to read.
+    file_type : str = 'from extension'
+        The type of the file, or 'from extension' to determine it from the
+        extension of the filename.
+    start, stop, step : int
+        The selection of frames, as for `iter_file`.
+    memory_map : bool = False
+        Whether to map files in the native binary format into memory.
+    perceive : str = 'never'
+        When to find bonds from the distances between atoms: 'never',
+        'always' or 'if none in file'.
+    tolerance : float = 0.45
+        The tolerance in Å for perceiving bonds.
+    symmetry : str, int or [str] = None
+        The symmetry to expand crystals to the full cell with, before
+        perceiving bonds, as for `iter_file`.
+
+    Yields
+    ------
+    (MolecularSystem, bool)
+        Each system, and whether its bonds were perceived.
+    """
+    first = None
+    for system in iter_file(
+        path,
+        file_type,
+        start=start,
+        stop=stop,
+        step=step,
+        memory_map=memory_map,
+        symmetry=symmetry
+    ):
+        needs_bonds = perceive == 'always' or (
+            perceive == 'if none in file' and system.n_bonds == 0
+        )
+        perceived = False
+        if (
+            first is not None and system.periodicity == first.periodicity and
+            not (needs_bonds and system.cell is not None) and
+            first.same_topology(system, bonds=not needs_bonds)
+        ):
+            # Frames of a trajectory share the atoms and bonds of the
+            # first, holding only their own coordinates.
+            if 'velocities' in system.atoms:
+                velocities = system.atoms['velocities']
+            else:
+                velocities = None
+            system = first.new_configuration(
+                system.coordinates,
+                velocities,
+                cell=system.cell,
+                name=system.name
+            )
+        elif needs_bonds:
+            system.perceive_bonds(tolerance=tolerance)
+            perceived = True
+        if first is None:
+            first = system
+        yield system, perceived
+
+
+def read_frames(path, **kwargs):
+    """Read the selected frames of a file, perceiving bonds as needed.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The file to read.
+    kwargs : dict
+        The arguments for `iter_frames`.
+
+    Returns
+    -------
+    ([MolecularSystem], bool)
+        The systems, and whether bonds were perceived for any of them.
+    """
+    systems = []
+    perceived = False
+    for system, found in iter_frames(path, **kwargs):
+        systems.append(system)
+        perceived = perceived or found
+    return systems, perceived
+
+
+def iter_files(paths, workers=None, **kwargs):
+    """Read the frames of many files in parallel, yielding them in order.
+
+    Only a few files more than there are workers are read ahead, so the
+    frames can be processed as they arrive without holding them all.
+
+    Parameters
+    ----------
+    paths : [str or pathlib.Path]
+        The files to read.
+    workers : int = None
+        The number of worker processes, as for `read_files`.
+    kwargs : dict
+        The arguments for `iter_frames`.
+
+    Yields
+    ------
+    (MolecularSystem, bool)
+        Each system, and whether its bonds were perceived.
+    """
+    for systems, perceived in _iter_results(paths, workers, kwargs):
+        for system in systems:
+            yield system, perceived
+
+
+def read_files(paths, workers=None, **kwargs):
+    """Read many files in parallel, returning the results in order.
+
+    The files are parsed by a pool of worker processes, and the systems are
+    sent back to this process. The files are handed out in chunks, so that
+    the cost of communicating is small even for many tiny files.
+
+    Parameters
+    ----------
+    paths : [str or pathlib.Path]
+        The files to read.
+    workers : int = None
+        The number of worker processes, by default the number of available
+        cores. With one worker the files are read in this process.
+    kwargs : dict
+        The arguments for `read_frames`. Memory mapping is not used by the
+        workers, since the arrays are copied back to this process.
+
+    Returns
+    -------
+    [([MolecularSystem], bool)]
+        The result of `read_frames` for each file, in the order of `paths`.
+    """
+    return list(_iter_results(paths, workers, kwargs))
+
+
+def _iter_results(paths, workers, kwargs):
+    """The result of `read_frames` for each file, read ahead by workers.
+
+    The files are handed out in chunks, with at most two chunks for each
+    worker waiting to be collected, so that the systems read but not yet
+    used are bounded however many files there are.
+    """
+    if workers is None:
+        workers = available_cores()
+    workers = max(1, min(workers, len(paths)))
+    if workers == 1:
+        for path in paths:
+            yield read_frames(path, **kwargs)
+        return
+
+    kwargs = {**kwargs, 'memory_map': False}
+    chunksize = max(1, min(100, len(paths) // (4 * workers)))
+    logger.debug(
+        'Reading {} files with {} workers, {} at a time'.format(
+            len(paths), workers, chunksize
+        )
+    )
+    chunks = (
+        paths[i:i + chunksize] for i in range(0, len(paths), chunksize)
+    )
+    read = functools.partial(_read_chunk, **kwargs)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(executor.submit(read, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while len(pending) > 0:
+            yield from pending.popleft().result()
+
+
+def _read_chunk(paths, **kwargs):
+    """Read several files in a worker, with `read_frames`."""
+    return [read_frames(path, **kwargs) for path in paths]
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""Reading MDL molfiles and SD files in the V2000 format.
+
+An SD file is a series of molfiles, each followed by optional data items
+and a line '$$$$'. The molecules are read one at a time by a generator,
+and those that are not wanted are skipped without being parsed.
+
+The fields of the atom and bond blocks are in fixed columns, which are
+sliced out of the lines rather than split on blanks, since the atom
+numbers of the bonds run together in molecules with 100 or more atoms.
+Charges on 'M  CHG' lines replace those in the atom block, as the format
+requires.
+"""
+
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from system_step.atoms import AtomTable
+from system_step.bonds import BondTable
+from system_step import compression
+from system_step import elements
+from system_step.molecular_system import MolecularSystem
+
+logger = logging.getLogger(__name__)
+
+# The formal charge for each charge code of the atom block
+_charges = np.array([0, 3, 2, 1, 0, -1, -2, -3], dtype=np.int8)
+
+
+def iter_sdf(path, start=0, stop=None, step=1):
+    """Read the molecules in a molfile or SD file one at a time.
+
+    The molecules are selected like a slice of a list, starting from 0.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The molfile or SD file.
+    start : int = 0
+        The first molecule to read.
+    stop : int = None
+        The molecule to stop before, or None to read to the end.
+    step : int = 1
+        Read every `step`'th molecule.
+
+    Yields
+    ------
+    MolecularSystem
+        The system for each selected molecule.
+    """
+    if start < 0 or step < 1 or (stop is not None and stop < 0):
+        raise ValueError(
+            'Invalid molecule selection {}:{}:{}'.format(start, stop, step)
+        )
+    path = Path(path)
+    with compression.open_file(path) as fd:
+        record = 0
+        lines = []
+        while stop is None or record < stop:
+            line = fd.readline()
+            if line == b'' or line.startswith(b'$$$$'):
+                if line == b'' and all(x.strip() == b'' for x in lines):
+                    break
+                if record >= start and (record - start) % step == 0:
+                    yield _molecule(lines, path, record)
+                if line == b'':
+                    break
+                record += 1
+                lines = []
+            elif record >= start and (record - start) % step == 0:
+                lines.append(line)
+
+
+def _molecule(lines, path, record):
+    """Create a system from the lines of one molfile."""
+    if len(lines) < 4:
+        raise ValueError(
+            "Molecule {} of '{}' is truncated.".format(record, path)
+        )
+    counts = lines[3]
+    if b'V3000' in counts:
+        raise ValueError(
+            "Molecule {} of '{}' is in the V3000 format, which is not "
+            'supported.'.format(record, path)
+        )
+    try:
+        n_atoms = int(counts[0:3])
+        n_bonds = int(counts[3:6])
+    except ValueError:
+        raise ValueError(
+            "Molecule {} of '{}' is not a molfile: the fourth line should "
+            'give the numbers of atoms and bonds, not "{}"'.format(
+                record, path,
+                counts.strip().decode('utf-8', errors='replace')
+            )
+        )
+    atom_lines = lines[4:4 + n_atoms]
+    bond_lines = lines[4 + n_atoms:4 + n_atoms + n_bonds]
+    if len(bond_lines) < n_bonds:
+        raise ValueError(
+            "Molecule {} of '{}' is truncated.".format(record, path)
+        )
+
+    xyz = np.array(
+        [(x[0:10], x[10:20], x[20:30]) for x in atom_lines]
+    ).astype(np.float64).reshape(n_atoms, 3)
+    atno = elements.to_atomic_numbers([x[31:34].strip() for x in atom_lines])
+    codes = np.array([x[36:39].strip() or b'0' for x in atom_lines])
+    codes = codes.astype(np.int64)
+    codes[(codes < 0) | (codes >= len(_charges))] = 0
+    charge = _charges[codes]
+
+    fields = np.array(
+        [(x[0:3], x[3:6], x[6:9]) for x in bond_lines]
+    ).astype(np.int64).reshape(n_bonds, 3)
+    order = fields[:, 2]
+    # Aromatic bonds are type 4 in molfiles; other query types are single.
+    order = np.where(order == 4, 5, np.where(order > 3, 1, order))
+    bonds = BondTable.from_arrays(fields[:, 0] - 1, fields[:, 1] - 1, order)
+
+    # The properties block replaces the charges in the atom block.
+    reset = True
+    for line in lines[4 + n_atoms + n_bonds:]:
+        if line.startswith(b'M  END'):
+            break
+        if line.startswith(b'M  CHG'):
+            if reset:
+                charge[:] = 0
+                reset = False
+            values = line[9:].split()
+            for atom, value in zip(values[0::2], values[1::2]):
+                charge[int(atom) - 1] = int(value)
+
+    name = lines[0].strip().decode('utf-8', errors='replace')
+    if name == '':
+        name = '{}:{}'.format(compression.strip_extension(path).stem, record)
+    return MolecularSystem(
+        name=name,
+        atoms=AtomTable.from_arrays(atno, xyz, formal_charge=charge),
+        bonds=bonds
+    )
@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+
+"""A language for selecting atoms, compiled to NumPy masks.
+
+A selection is an expression such as
+
+    protein and chain A and not hydrogen
+    resname HOH and within 3.5 of (resname LIG and element N O)
+    resid 10 to 20 35 and name CA C N O
+    b_factor > 40 or occupancy < 1
+
+made from these terms, which can be combined with 'and', 'or' and 'not'
+and grouped with parentheses:
+
+    element C N O           atoms of the elements
+    name CA C*              atoms with the names, which may contain the
+                            shell-style wildcards *, ? and [...]
+    resname ALA GLY         atoms in residues with the names, also with
+                            wildcards
+    chain A B               atoms in the chains
+    resid 10 to 20 35       atoms in the residues with the numbers, given
+                            singly or as inclusive ranges, 'to' or ':'
+    index 0 to 99           the atoms with the indices, counted from 0
+    within 5 of <term>      atoms within a distance in Å of those that the
+                            term selects, including those atoms, and their
+                            periodic images
+    <column> <op> <number>  a comparison, with <, <=, ==, !=, >= or >, of a
+                            numeric column such as charge, b_factor or
+                            occupancy, or of the coordinate x, y or z
+    hydrogen, heavy         hydrogen atoms, and all the others
+    water, protein          atoms in water molecules, and in the residues
+                            of the standard amino acids
+    all, none
+
+The keywords are not case sensitive, but names are. An expression is
+parsed once into a tree of NumPy operations, which is cached by the text
+of the expression, and is evaluated on a system as whole-column boolean
+masks, so selecting from a million atoms takes milliseconds rather than
+the seconds of a loop over the atoms in Python.
+"""
+
+import fnmatch
+import functools
+import logging
+import operator
+import re
+
+import numpy as np
+
+from system_step import elements
+from system_step.neighbors import query_pairs
+
+logger = logging.getLogger(__name__)
+
+# The tokens of an expression: parentheses, comparison operators and words
+_token_re = re.compile(r'\s*(\(|\)|[<>!=]=|[<>]|[^\s()<>=!]+)')
+
+_comparisons = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>=': operator.ge,
+    '>': operator.gt,
+}
+
+_water = ('HOH', 'WAT', 'H2O', 'SOL', 'DOD', 'TIP', 'TIP3', 'TIP4', 'SPC')
+_amino_acids = (
+    'ALA', 'ARG', 'ASN', 'ASP', 'CYS', 'GLN', 'GLU', 'GLY', 'HIS', 'ILE',
+    'LEU', 'LYS', 'MET', 'PHE', 'PRO', 'SER', 'THR', 'TRP', 'TYR', 'VAL',
+    'HID', 'HIE', 'HIP', 'HSD', 'HSE', 'HSP', 'CYX', 'ASH', 'GLH', 'LYN',
+    'SEC', 'PYL', 'MSE'
+)
+
+# The words that end a list of values
+_keywords = {
+    'and', 'or', 'not', 'within', 'of', 'element', 'name', 'resname',
+    'chain', 'resid', 'index', 'hydrogen', 'heavy', 'water', 'protein',
+    'all', 'none'
+}
+
+# The atom columns selected by the keywords for strings and numbers
+_string_columns = {'name': 'name', 'resname': 'residue_name', 'chain': 'chain'}
+_coordinates = {'x': 0, 'y': 1, 'z': 2}
+
+
+def select(system, expression):
+    """Select the atoms of a system that match an expression.
+
+    Parameters
+    ----------
+    system : MolecularSystem
+        The system.
+    expression : str
+        The selection, in the language described in this module.
+
+    Returns
+    -------
+    numpy.ndarray
+        A boolean mask of the selected atoms.
+    """
+    return compile_selection(expression)(system)
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_selection(expression):
+    """Parse a selection into a function that evaluates it.
+
+    The functions are cached by the text of the expression.
+
+    Parameters
+    ----------
+    expression : str
+        The selection, in the language described in this module.
+
+    Returns
+    -------
+    function
+        A function of a system that returns the boolean mask of the atoms
+        selected. Its attribute `columns` holds the names of the columns of
+        the atoms that the selection reads, and 'cell' if it uses the cell.
+    """
+    logger.debug("Compiling the selection '{}'".format(expression))
+    return _Parser(expression).parse()
+
+
+class _Parser(object):
+    """A recursive-descent parser of selections, building their functions.
+
+    The grammar, from the lowest to the highest precedence, is
+
+        expression := term ('or' term)*
+        term       := factor ('and' factor)*
+        factor     := 'not' factor | 'within' number 'of' factor | primary
+        primary    := '(' expression ')' | keyword values | comparison
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = []
+        position = 0
+        text = expression.rstrip()
+        while position < len(text):
+            match = _token_re.match(text, position)
+            if match is None:
+                self._error('an expression', text[position:].strip())
+            self.tokens.append(match.group(1))
+            position = match.end()
+        self.position = 0
+        # The columns read, always including the elements, whose version
+        # changes with the number of atoms
+        self.columns = {'atno'}
+
+    def parse(self):
+        """The function for the whole expression."""
+        result = self._expression()
+        if self._peek() is not None:
+            self._error("'and', 'or' or the end", self._peek())
+        result.columns = frozenset(self.columns)
+        return result
+
+    def _expression(self):
+        terms = [self._term()]
+        while self._accept('or'):
+            terms.append(self._term())
+        if len(terms) == 1:
+            return terms[0]
+        return _combine(np.logical_or, terms)
+
+    def _term(self):
+        factors = [self._factor()]
+        while self._accept('and'):
+            factors.append(self._factor())
+        if len(factors) == 1:
+            return factors[0]
+        return _combine(np.logical_and, factors)
+
+    def _factor(self):
+        if self._accept('not'):
+            inner = self._factor()
+            return lambda system: ~inner(system)
+        if self._accept('within'):
+            distance = self._number()
+            if not self._accept('of'):
+                self._error("'of'", self._peek())
+            self.columns.update(('coordinates', 'cell'))
+            return _within(distance, self._factor())
+        return self._primary()
+
+    def _primary(self):
+        token = self._next('a selection')
+        word = token.lower()
+        if token == '(':
+            result = self._expression()
+            if self._next("')'") != ')':
+                self._error("')'", self.tokens[self.position - 1])
+            return result
+        if self._peek() in _comparisons:
+            comparison = _comparisons[self._next()]
+            if word in _coordinates:
+                self.columns.add('coordinates')
+            else:
+                self.columns.add(token)
+            return _compare(token, comparison, self._number())
+        if word == 'all':
+            return lambda system: np.ones(system.n_atoms, dtype=bool)
+        if word == 'none':
+            return lambda system: np.zeros(system.n_atoms, dtype=bool)
+        if word == 'hydrogen':
+            return _elements([1])
+        if word == 'heavy':
+            hydrogen = _elements([1])
+            return lambda system: ~hydrogen(system)
+        if word in ('water', 'protein'):
+            self.columns.add('residue_name')
+        if word == 'water':
+            return _strings('residue_name', _water)
+        if word == 'protein':
+            return _strings('residue_name', _amino_acids)
+        if word == 'element':
+            values = self._values(token)
+            try:
+                numbers = [elements.atomic_number(x) for x in values]
+            except ValueError:
+                self._error('element symbols', ' '.join(values))
+            return _elements(numbers)
+        if word in _string_columns:
+            self.columns.add(_string_columns[word])
+            return _strings(_string_columns[word], self._values(token))
+        if word == 'resid':
+            self.columns.add('residue')
+            return _ranges('residue', self._ranges(token))
+        if word == 'index':
+            return _indices(self._ranges(token))
+        self._error('a selection', token)
+
+    def _values(self, keyword):
+        """The values after a keyword, up to the next keyword."""
+        values = []
+        while True:
+            token = self._peek()
+            if token is None or token in '()' or token.lower() in _keywords:
+                break
+            values.append(self._next())
+        if len(values) == 0:
+            self._error("values after '{}'".format(keyword), self._peek())
+        return values
+
+    def _ranges(self, keyword):
+        """Integers and inclusive ranges after a keyword, as pairs."""
+        values = self._values(keyword)
+        result = []
+        k = 0
+        try:
+            while k < len(values):
+                if ':' in values[k]:
+                    first, last = values[k].split(':')
+                    result.append((int(first), int(last)))
+                elif k + 1 < len(values) and values[k + 1].lower() == 'to':
+                    result.append((int(values[k]), int(values[k + 2])))
+                    k += 2
+                else:
+                    result.append((int(values[k]), int(values[k])))
+                k += 1
+        except (ValueError, IndexError):
+            self._error(
+                "numbers or ranges after '{}'".format(keyword),
+                ' '.join(values)
+            )
+        return result
+
+    def _number(self):
+        token = self._next('a number')
+        try:
+            return float(token)
+        except ValueError:
+            self._error('a number', token)
+
+    def _peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def _next(self, expected='more'):
+        token = self._peek()
+        if token is None:
+            self._error(expected, None)
+        self.position += 1
+        return token
+
+    def _accept(self, word):
+        token = self._peek()
+        if token is not None and token.lower() == word:
+            self.position += 1
+            return True
+        return False
+
+    def _error(self, expected, found):
+        raise ValueError(
+            "Invalid selection '{}': expected {} but found {}.".format(
+                self.expression, expected,
+                'the end' if found is None else "'{}'".format(found)
+            )
+        )
+
+
+def _combine(function, parts):
+    """Combine the masks of several selections."""
+
+    def evaluate(system):
+        result = parts[0](system)
+        for part in parts[1:]:
+            function(result, part(system), out=result)
+        return result
+
+    return evaluate
+
+
+def _elements(numbers):
+    """Select atoms by atomic number, with a lookup table."""
+    table = np.zeros(len(elements.symbols), dtype=bool)
+    table[numbers] = True
+    return lambda system: table[system.atoms.atno]
+
+
+def _strings(column, values):
+    """Select atoms by the value of a string column, with wildcards."""
+    patterns = [x for x in values if any(c in x for c in '*?[')]
+    exact = [x for x in values if x not in patterns]
+
+    def evaluate(system):
+        strings = _column(system, column)
+        result = np.zeros(len(strings), dtype=bool)
+        for value in exact:
+            result |= strings == value
+        if len(patterns) > 0:
+            # Match the few distinct strings rather than every atom.
+            unique, inverse = np.unique(strings, return_inverse=True)
+            matched = np.array(
+                [
+                    any(fnmatch.fnmatchcase(x, y) for y in patterns)
+                    for x in unique
+                ],
+                dtype=bool
+            )
+            result |= matched[inverse.reshape(-1)]
+        return result
+
+    return evaluate
+
+
+def _ranges(column, ranges):
+    """Select atoms by an integer column in inclusive ranges."""
+
+    def evaluate(system):
+        values = _column(system, column)
+        result = np.zeros(len(values), dtype=bool)
+        for first, last in ranges:
+            result |= (values >= first) & (values <= last)
+        return result
+
+    return evaluate
+
+
+def _indices(ranges):
+    """Select atoms by index, in inclusive ranges."""
+
+    def evaluate(system):
+        result = np.zeros(system.n_atoms, dtype=bool)
+        for first, last in ranges:
+            result[max(first, 0):max(last + 1, 0)] = True
+        return result
+
+    return evaluate
+
+
+def _compare(column, comparison, value):
+    """Select atoms by comparing a numeric column with a number."""
+
+    def evaluate(system):
+        if column.lower() in _coordinates:
+            values = system.coordinates[:, _coordinates[column.lower()]]
+        else:
+            values = _column(system, column)
+            if values.ndim != 1 or values.dtype.kind not in 'biuf':
+                raise ValueError(
+                    "The column '{}' is not numeric, so cannot be compared "
+                    'with a number.'.format(column)
+                )
+        return comparison(values, value)
+
+    return evaluate
+
+
+def _within(distance, inner):
+    """Select atoms within a distance of those selected by another."""
+
+    def evaluate(system):
+        result = inner(system)
+        query = np.flatnonzero(result)
+        if len(query) > 0 and distance > 0:
+            pairs = query_pairs(
+                system.coordinates, query, distance, system.cell
+            )
+            result[pairs.j[pairs.distances <= distance]] = True
+        return result
+
+    return evaluate
+
+
+def _column(system, column):
+    """A column of the atoms, with a clear error if it is missing."""
+    if column not in system.atoms:
+        raise ValueError(
+            "The system '{}' has no '{}' column to select on.".format(
+                system.name, column
+            )
+        )
+    return system.atoms[column]
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+"""Building surface slabs of crystals from Miller indices.
+
+The bulk cell is first re-expressed in a cell whose a and b vectors lie in
+the (hkl) plane and whose c vector spans one spacing of the planes. The
+vectors are found by generating the integer lattice vectors in a small box
+and keeping, with array masks, the shortest that lie in the plane and the
+shortest that step to the next plane. The transformation is unimodular, so
+the oriented cell has the same atoms as the bulk cell, and is built, with
+its bonds re-linked, as a supercell.
+
+A slab is then that cell, shifted along c so that one of the distinct
+planes of atoms is at the bottom, stacked as many times as needed for the
+thickness, with the bonds across the top and bottom faces removed and the c
+vector replaced by one normal to the surface that spans the vacuum. The
+possible terminations are the distinct planes of atoms in the oriented
+cell, so they are found once, and each slab costs only the stacking.
+"""
+
+import logging
+import math
+
+import numpy as np
+
+from system_step.bonds import BondTable
+from system_step.cell import Cell
+from system_step.molecular_system import MolecularSystem
+from system_step.supercell import make_supercell
+
+logger = logging.getLogger(__name__)
+
+# The distance in Å within which atoms are in the same plane
+tolerance = 0.01
+
+
+class SlabBuilder(object):
+    """Build slabs of a crystal cut along a lattice plane.
+
+    Attributes
+    ----------
+    bulk : MolecularSystem
+        The bulk crystal.
+    miller : (int, int, int)
+        The Miller indices of the surface, reduced to coprime integers.
+    matrix : numpy.ndarray
+        The unimodular transformation from the bulk cell to the oriented one.
+    unit : MolecularSystem
+        The oriented cell, with a and b in the surface plane.
+    spacing : float
+        The repeat distance in Å normal to the surface, the thickness of
+        the oriented cell.
+    terminations : numpy.ndarray
+        The height in Å of each distinct plane of atoms in the oriented
+        cell. Each gives a termination, with the plane at the bottom of the
+        slab.
+    """
+
+    def __init__(self, bulk, miller):
+        """Orient the bulk crystal for slabs along a plane.
+
+        Parameters
+        ----------
+        bulk : MolecularSystem
+            The bulk crystal, which must be periodic.
+        miller : (int, int, int) or str
+            The Miller indices, e.g. (1, 1, 0) or '1 1 0'.
+
+        Returns
+        -------
+        None
+        """
+        if bulk.cell is None:
+            raise ValueError(
+                "The system '{}' is not periodic, so cannot be cut into a "
+                'slab.'.format(bulk.name)
+            )
+        self.bulk = bulk
+        self.miller = miller_indices(miller)
+        self.matrix = surface_basis(bulk.cell, self.miller)
+        self.unit = make_supercell(bulk, self.matrix)
+        self.spacing = float(self.unit.cell.widths[2])
+
+        # The fractional heights of the atoms and the distinct planes
+        self._fractionals = self.unit.cell.to_fractionals(
+            self.unit.coordinates
+        )
+        heights = np.sort((self._fractionals[:, 2] % 1.0) * self.spacing)
+        if len(heights) == 0:
+            self.terminations = np.zeros(0)
+            return
+        gaps = np.diff(heights) > tolerance
+        planes = heights[np.concatenate(([True], gaps))]
+        # The top plane may be the bottom one, across the periodic boundary.
+        if len(planes) > 1 and planes[-1] > self.spacing - tolerance:
+            planes = planes[:-1]
+        self.terminations = planes
+
+    def __repr__(self):
+        return 'SlabBuilder({}, ({} {} {}), {} terminations)'.format(
+            self.bulk.name, *self.miller, len(self.terminations)
+        )
+
+    def layers(self, thickness):
+        """The number of repeats of the oriented cell for a thickness.
+
+        Parameters
+        ----------
+        thickness : float
+            The smallest thickness of the slab in Å.
+
+        Returns
+        -------
+        int
+            The number of repeats, at least 1.
+        """
+        return max(1, math.ceil(thickness / self.spacing - 1.0e-6))
+
+    def build(self, thickness, vacuum, termination=0):
+        """Build a slab.
+
+        Parameters
+        ----------
+        thickness : float
+            The smallest thickness of the slab in Å, rounded up to whole
+            repeats of the oriented cell.
+        vacuum : float
+            The width in Å of the vacuum between the outermost planes of
+            atoms of the periodic images of the slab.
+        termination : int = 0
+            The index of the termination, the plane of atoms at the bottom
+            of the slab.
+
+        Returns
+        -------
+        MolecularSystem
+            The slab, periodic in the surface plane, with the surface
+            normal along z and the slab centered in the cell.
+        """
+        if not 0 <= termination < len(self.terminations):
+            raise ValueError(
+                'There are {} terminations of the ({} {} {}) surface, so '
+                'there is no termination {}.'.format(
+                    len(self.terminations), *self.miller, termination + 1
+                )
+            )
+        n_layers = self.layers(thickness)
+        unit = self.unit
+
+        # Shift the chosen plane to the bottom and wrap the atoms into the
+        # cell, adjusting the lattice shifts of the bonds to match.
+        fractionals = self._fractionals.copy()
+        fractionals[:, 2] -= self.terminations[termination] / self.spacing
+        home = np.floor(fractionals + tolerance / self.spacing)
+        fractionals -= home
+        home = home.astype(np.int32)
+        bonds = unit.bonds
+        shift = bonds.shift + home[bonds.j] - home[bonds.i]
+        shifted = MolecularSystem(
+            name=unit.name,
+            atoms=unit.atoms.share(
+                coordinates=unit.cell.to_cartesians(fractionals)
+            ),
+            bonds=BondTable.from_arrays(
+                bonds.i, bonds.j, order=bonds.order, shift=shift
+            ),
+            cell=unit.cell
+        )
+
+        # Stack the layers, removing the bonds across the faces
+        stack = make_supercell(shifted, (1, 1, n_layers))
+        inside = stack.bonds.shift[:, 2] == 0
+        if not inside.all():
+            stack.bonds.delete(~inside)
+
+        # The vacuum is measured from the outermost planes of atoms.
+        coordinates = stack.coordinates.copy()
+        bottom = coordinates[:, 2].min()
+        height = coordinates[:, 2].max() - bottom
+        coordinates[:, 2] += vacuum / 2 - bottom
+        a, b, _ = stack.cell.vectors
+        cell = Cell.from_vectors([a, b, [0.0, 0.0, height + vacuum]])
+        stack.atoms['coordinates'] = coordinates
+        stack.cell = cell
+        stack.name = '{} ({}{}{}) slab'.format(
+            self.bulk.name, *_bar(self.miller)
+        )
+        return stack
+
+
+def miller_indices(value):
+    """Miller indices as coprime integers.
+
+    Parameters
+    ----------
+    value : (int, int, int) or str
+        The indices, e.g. (2, 2, 0) or '1 -1 0' or '1,1,1'.
+
+    Returns
+    -------
+    (int, int, int)
+        The indices divided by their greatest common divisor.
+    """
+    if isinstance(value, str):
+        words = value.replace(',', ' ').split()
+    else:
+        words = list(value)
+    try:
+        indices = [int(x) for x in words]
+    except (TypeError, ValueError):
+        indices = []
+    if len(indices) != 3 or indices == [0, 0, 0]:
+        raise ValueError(
+            "The Miller indices '{}' are not three integers, not all "
+            'zero.'.format(value)
+        )
+    divisor = math.gcd(*indices)
+    return tuple(x // divisor for x in indices)
+
+
+def surface_basis(cell, miller):
+    """A unimodular transformation with a and b in a lattice plane.
+
+    Parameters
+    ----------
+    cell : Cell
+        The bulk cell.
+    miller : (int, int, int)
+        The coprime Miller indices of the plane.
+
+    Returns
+    -------
+    numpy.ndarray
+        The 3x3 integer matrix, with determinant 1, whose rows are the new
+        cell vectors in terms of the old: the two shortest vectors spanning
+        the plane, and the shortest vector to the next plane.
+    """
+    miller = np.array(miller, dtype=np.int64)
+    n = int(np.abs(miller).max()) + 1
+    axis = np.arange(-n, n + 1)
+    candidates = np.stack(
+        np.meshgrid(axis, axis, axis, indexing='ij'), axis=-1
+    ).reshape(-1, 3)
+    lengths = np.linalg.norm(candidates @ cell.vectors, axis=1)
+    # Ties are broken by the order of the candidates, so the choice is
+    # deterministic.
+    order = np.lexsort((np.arange(len(lengths)), np.round(lengths, 8)))
+    candidates = candidates[order]
+    steps = candidates @ miller
+
+    in_plane = candidates[(steps == 0) & np.any(candidates != 0, axis=1)]
+    first = in_plane[0]
+    # The second vector must make, with the first, a basis of the plane.
+    crosses = np.cross(first, in_plane)
+    basis = np.all(crosses == miller, axis=1) | np.all(
+        crosses == -miller, axis=1
+    )
+    second = in_plane[np.argmax(basis)]
+    third = candidates[np.argmax(steps == 1)]
+
+    matrix = np.array([first, second, third])
+    if round(np.linalg.det(matrix)) < 0:
+        matrix = matrix[[1, 0, 2]]
+    return matrix
+
+
+def _bar(miller):
+    """The indices for a name, with negative numbers as e.g. '-1'."""
+    return tuple('{:d}'.format(x) for x in miller)
@@ -0,0 +1,936 @@
+# -*- coding: utf-8 -*-
+
+"""A persistent store of systems and their configurations in SQLite.
+
+A library of structures that many jobs add to and read from is kept in a
+single local SQLite file, with no server. The atoms and bonds of a system,
+its topology, are stored once, and each configuration holds only its
+coordinates, velocities and cell, so the frames of a trajectory or the
+conformers of a molecule cost little more than their coordinates.
+
+Like the binary format, the columns are stored as raw arrays, here as
+BLOBs, rather than a row per atom, so a system is written and read with a
+few statements whatever its size. Configurations are added in bulk with
+``executemany`` inside one transaction, reusing the prepared statements
+that the sqlite3 module caches. The database uses write-ahead logging
+(WAL), so readers are not blocked while a job adds to the library.
+
+Each system is indexed by its formula, its empirical formula, i.e. the
+formula reduced to the smallest whole numbers, its set of elements and its
+number of atoms, and each configuration by the volume of its cell, so that
+queries such as all systems with Si and O and fewer than 500 atoms are
+index lookups rather than scans of the library.
+
+Each system and configuration also records its content hash, see
+:mod:`system_step.hashing`, so that structures added again, as pipelines
+that re-ingest their starting structures do, can be found and skipped
+rather than stored twice.
+
+Optimizations and editing workflows add long series of configurations of
+a system in which most atoms do not move. A configuration in which only a
+few atoms differ from the previous configuration of its system is stored
+as a delta: the indices of the atoms that changed and their new
+coordinates and velocities. Every so often a configuration is stored in
+full, as a keyframe, so that reading any configuration replays a bounded
+number of deltas.
+
+The tables are
+
+    systems         id, name, n_atoms, n_bonds, formula, empirical_formula,
+                    element_set, hash
+                    the hash is that of the topology, the elements and bonds
+    columns         system, tbl, name, dtype, shape, data
+                    the columns of the atom ('atoms') and bond ('bonds')
+                    tables of each system, except the coordinates and
+                    velocities
+    elements        element, system, count
+                    the number of atoms of each element in each system
+    configurations  id, system, name, a, b, c, alpha, beta, gamma, volume,
+                    hash, base, depth, changed, coordinates, velocities
+                    a delta holds the id of the configuration it changes,
+                    its base, the number of deltas from the keyframe, its
+                    depth, and the indices of the atoms that changed
+                    the cell parameters are NULL for molecular systems
+"""
+
+import collections
+import json
+import logging
+import math
+import re
+from pathlib import Path
+import sqlite3
+
+import numpy as np
+
+from system_step.atoms import AtomTable
+from system_step.bonds import BondTable
+from system_step.cell import Cell
+from system_step import elements as elements_module
+from system_step import hashing
+from system_step.molecular_system import MolecularSystem
+from system_step.molecular_system import configuration_columns
+from system_step.molecular_system import (
+    _composition, _formula, _hill_order
+)
+
+logger = logging.getLogger(__name__)
+
+# Increment when the schema changes.
+_version = 1
+
+_schema = """
+CREATE TABLE IF NOT EXISTS systems (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    n_atoms INTEGER NOT NULL,
+    n_bonds INTEGER NOT NULL,
+    formula TEXT,
+    empirical_formula TEXT,
+    element_set TEXT,
+    hash TEXT
+);
+CREATE TABLE IF NOT EXISTS columns (
+    system INTEGER NOT NULL REFERENCES systems(id) ON DELETE CASCADE,
+    tbl TEXT NOT NULL,
+    name TEXT NOT NULL,
+    dtype TEXT NOT NULL,
+    shape TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (system, tbl, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS elements (
+    element INTEGER NOT NULL,
+    system INTEGER NOT NULL REFERENCES systems(id) ON DELETE CASCADE,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (element, system)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS configurations (
+    id INTEGER PRIMARY KEY,
+    system INTEGER NOT NULL REFERENCES systems(id) ON DELETE CASCADE,
+    name TEXT,
+    a REAL, b REAL, c REAL, alpha REAL, beta REAL, gamma REAL,
+    volume REAL,
+    hash TEXT,
+    base INTEGER REFERENCES configurations(id),
+    depth INTEGER NOT NULL DEFAULT 0,
+    changed BLOB,
+    coordinates BLOB NOT NULL,
+    velocities BLOB
+);
+CREATE INDEX IF NOT EXISTS configurations_system
+    ON configurations (system);
+CREATE INDEX IF NOT EXISTS configurations_volume
+    ON configurations (volume);
+CREATE INDEX IF NOT EXISTS systems_formula ON systems (formula);
+CREATE INDEX IF NOT EXISTS systems_empirical_formula
+    ON systems (empirical_formula);
+CREATE INDEX IF NOT EXISTS systems_element_set ON systems (element_set);
+CREATE INDEX IF NOT EXISTS systems_n_atoms ON systems (n_atoms);
+CREATE INDEX IF NOT EXISTS elements_system ON elements (system);
+CREATE INDEX IF NOT EXISTS systems_hash ON systems (hash);
+CREATE INDEX IF NOT EXISTS configurations_hash ON configurations (hash);
+"""
+
+_insert_system = (
+    'INSERT INTO systems (id, name, n_atoms, n_bonds, formula, '
+    'empirical_formula, element_set, hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+)
+_insert_column = (
+    'INSERT INTO columns (system, tbl, name, dtype, shape, data) '
+    'VALUES (?, ?, ?, ?, ?, ?)'
+)
+_insert_element = (
+    'INSERT INTO elements (element, system, count) VALUES (?, ?, ?)'
+)
+_insert_configuration = (
+    'INSERT INTO configurations (id, system, name, a, b, c, alpha, beta, '
+    'gamma, volume, hash, base, depth, changed, coordinates, velocities) '
+    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+_select_configuration = (
+    'SELECT c.id, c.system, c.name, c.a, c.b, c.c, c.alpha, c.beta, '
+    'c.gamma, c.base, c.depth, c.changed, c.coordinates, c.velocities '
+    'FROM configurations c'
+)
+# A configuration and the chain of deltas back to its keyframe, keyframe
+# first
+_select_chain = (
+    'WITH RECURSIVE chain(id, base, depth, changed, coordinates, '
+    'velocities) AS (SELECT id, base, depth, changed, coordinates, '
+    'velocities FROM configurations WHERE id=? UNION ALL '
+    'SELECT c.id, c.base, c.depth, c.changed, c.coordinates, c.velocities '
+    'FROM configurations c JOIN chain ON c.id = chain.base) '
+    'SELECT id, base, depth, changed, coordinates, velocities FROM chain '
+    'ORDER BY depth'
+)
+
+# The most parameters used in one statement, below SQLite's limit of 999
+_max_variables = 500
+
+# An element and its count in a formula
+_formula_re = re.compile(r'([A-Z][a-z]?)(\d*)')
+
+# The columns of the bond table, in the order of BondTable.from_arrays.
+_bond_columns = ('i', 'j', 'order', 'shift')
+
+# The coordinates and velocities of a stored configuration, and its number
+# of deltas from its keyframe
+_Frame = collections.namedtuple(
+    '_Frame', ['id', 'depth', 'coordinates', 'velocities']
+)
+
+
+class SystemStore(object):
+    """A library of systems and configurations in an SQLite file.
+
+    The store is a context manager, closing the database on exit.
+
+    Attributes
+    ----------
+    path : pathlib.Path
+        The database file.
+    connection : sqlite3.Connection
+        The connection to the database.
+    keyframe_interval : int
+        The most configurations of a system in a row that are stored as
+        deltas before one is stored in full.
+    delta_fraction : float
+        A configuration is stored as a delta only if at most this fraction
+        of its atoms changed.
+    """
+
+    def __init__(self, path, keyframe_interval=16, delta_fraction=0.5):
+        """Open a store, creating it if it does not exist.
+
+        Parameters
+        ----------
+        path : str or pathlib.Path
+            The database file.
+        keyframe_interval : int = 16
+            The most configurations of a system in a row that are stored as
+            deltas, or 0 to store every configuration in full.
+        delta_fraction : float = 0.5
+            The largest fraction of the atoms that may change for a
+            configuration to be stored as a delta.
+
+        Returns
+        -------
+        None
+        """
+        self.path = Path(path)
+        self.keyframe_interval = keyframe_interval
+        self.delta_fraction = delta_fraction
+        self.connection = sqlite3.connect(str(self.path))
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        # With WAL, NORMAL is safe against corruption and much faster.
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('PRAGMA foreign_keys=ON')
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version > _version:
+            raise ValueError(
+                "The store '{}' is version {}, newer than this code, version "
+                '{}.'.format(path, version, _version)
+            )
+        with self.connection:
+            self.connection.executescript(_schema)
+            self.connection.execute(
+                'PRAGMA user_version={}'.format(_version)
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "SystemStore('{}')".format(self.path)
+
+    @property
+    def n_systems(self):
+        """The number of systems, i.e. distinct topologies, in the store."""
+        return self._count('systems')
+
+    @property
+    def n_configurations(self):
+        """The number of configurations in the store."""
+        return self._count('configurations')
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
+
+    def add_system(self, system):
+        """Add a system, with its topology and configuration.
+
+        Parameters
+        ----------
+        system : MolecularSystem
+            The system.
+
+        Returns
+        -------
+        (int, int)
+            The ids of the system and of its configuration.
+        """
+        return self.add_systems([system])[0]
+
+    def add_systems(self, systems, deduplicate=False):
+        """Add systems in bulk, in one transaction.
+
+        Successive systems with the same topology, such as the frames of a
+        trajectory, are added as configurations of one system.
+
+        Parameters
+        ----------
+        systems : [MolecularSystem]
+            The systems.
+        deduplicate : bool = False
+            Whether to skip systems whose content hash matches that of a
+            configuration in the store or earlier in the list, and to add
+            systems whose topology is already stored as configurations of
+            the stored system.
+
+        Returns
+        -------
+        [(int, int)]
+            The ids of the system and the configuration for each. Skipped
+            systems have the ids of the configuration that they duplicate.
+        """
+        hashes = hashing._hashes(systems)
+        ids = []
+        system_rows = []
+        column_rows = []
+        element_rows = []
+        configuration_rows = []
+        with self.connection:
+            # Take the lock for writing now, so that the ids are ours.
+            self.connection.execute('BEGIN IMMEDIATE')
+            if deduplicate:
+                known = self._find_hashes([x for _, x in hashes])
+                # The topologies already found or added, by their hash
+                topologies = collections.defaultdict(list)
+            system_id = self._max_id('systems')
+            configuration_id = self._max_id('configurations')
+            # The last configuration of each system, for the deltas
+            latest = {}
+            topology = None
+            for system, (topology_hash, content_hash) in zip(systems, hashes):
+                if deduplicate and content_hash in known:
+                    ids.append(known[content_hash])
+                    continue
+                if topology is None or not topology[0].same_topology(system):
+                    stored = None
+                    if deduplicate:
+                        stored = self._find_topology(
+                            system, topology_hash, topologies[topology_hash]
+                        )
+                    if stored is None:
+                        system_id += 1
+                        stored = system_id
+                        latest[stored] = None
+                        _topology_rows(
+                            system_id, system, topology_hash, system_rows,
+                            column_rows, element_rows
+                        )
+                        if deduplicate:
+                            topologies[topology_hash].append((system, stored))
+                    topology = (system, stored)
+                configuration_id += 1
+                configuration_rows.append(
+                    self._configuration_row(
+                        configuration_id, topology[1], system, content_hash,
+                        latest
+                    )
+                )
+                ids.append((topology[1], configuration_id))
+                if deduplicate:
+                    known[content_hash] = ids[-1]
+            cursor = self.connection.cursor()
+            cursor.executemany(_insert_system, system_rows)
+            cursor.executemany(_insert_column, column_rows)
+            cursor.executemany(_insert_element, element_rows)
+            cursor.executemany(_insert_configuration, configuration_rows)
+        return ids
+
+    def add_configurations(self, system_id, systems, deduplicate=False):
+        """Add configurations to a system already in the store.
+
+        Parameters
+        ----------
+        system_id : int
+            The id of the system.
+        systems : [MolecularSystem]
+            The configurations, which must have the topology of the system.
+        deduplicate : bool = False
+            Whether to skip configurations whose content hash matches that
+            of a configuration in the store or earlier in the list.
+
+        Returns
+        -------
+        [int]
+            The ids of the configurations. Skipped configurations have the
+            id of the configuration that they duplicate.
+        """
+        row = self.connection.execute(
+            'SELECT n_atoms, hash FROM systems WHERE id=?', (system_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(
+                'There is no system {} in the store.'.format(system_id)
+            )
+        n_atoms, topology_hash = row
+        for system in systems:
+            if system.n_atoms != n_atoms:
+                raise ValueError(
+                    "The configuration '{}' has {} atoms, but system {} has "
+                    '{}.'.format(
+                        system.name, system.n_atoms, system_id, n_atoms
+                    )
+                )
+        # Hash the configurations as they will be read back, with the
+        # elements and bonds of the stored system.
+        digest = bytes.fromhex(topology_hash)
+        hashes = [
+            hashing._configuration_hash(digest, system, hashing.precision)
+            for system in systems
+        ]
+        ids = []
+        rows = []
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            known = self._find_hashes(hashes) if deduplicate else {}
+            configuration_id = self._max_id('configurations')
+            latest = {}
+            for system, content_hash in zip(systems, hashes):
+                if content_hash in known:
+                    ids.append(known[content_hash][1])
+                    continue
+                configuration_id += 1
+                rows.append(
+                    self._configuration_row(
+                        configuration_id, system_id, system, content_hash,
+                        latest
+                    )
+                )
+                ids.append(configuration_id)
+                if deduplicate:
+                    known[content_hash] = (system_id, configuration_id)
+            self.connection.executemany(_insert_configuration, rows)
+        return ids
+
+    def configuration_ids(self, system_id):
+        """The ids of the configurations of a system, in order.
+
+        Parameters
+        ----------
+        system_id : int
+            The id of the system.
+
+        Returns
+        -------
+        [int]
+            The ids of its configurations.
+        """
+        rows = self.connection.execute(
+            'SELECT id FROM configurations WHERE system=? ORDER BY id',
+            (system_id,)
+        )
+        return [row[0] for row in rows]
+
+    def get_configuration(self, configuration_id):
+        """Read a configuration as a system.
+
+        Parameters
+        ----------
+        configuration_id : int
+            The id of the configuration.
+
+        Returns
+        -------
+        MolecularSystem
+            The system in the configuration.
+        """
+        row = self.connection.execute(
+            _select_configuration + ' WHERE c.id=?', (configuration_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(
+                'There is no configuration {} in the store.'.format(
+                    configuration_id
+                )
+            )
+        return _configuration(
+            self._topology(row[1]), row, self._frame(configuration_id)
+        )
+
+    def get_configurations(self, system_id):
+        """Read all the configurations of a system.
+
+        The configurations share the atoms and bonds of the first, as the
+        frames of a trajectory do when read from a file.
+
+        Parameters
+        ----------
+        system_id : int
+            The id of the system.
+
+        Returns
+        -------
+        [MolecularSystem]
+            The configurations, in the order they were added.
+        """
+        rows = self.connection.execute(
+            _select_configuration + ' WHERE c.system=? ORDER BY c.id',
+            (system_id,)
+        )
+        result = []
+        for row, frame in self._decode(rows):
+            if len(result) == 0:
+                topology = self._topology(system_id)
+            else:
+                topology = result[0]
+            result.append(_configuration(topology, row, frame))
+        return result
+
+    def find(
+        self,
+        formula=None,
+        empirical_formula=None,
+        elements=None,
+        element_set=None,
+        min_atoms=None,
+        max_atoms=None,
+        min_volume=None,
+        max_volume=None
+    ):
+        """Find the configurations that meet all the given criteria.
+
+        Each criterion is answered from an index of the store. Formulas may
+        be given in any order of the elements, e.g. 'SiO2' or 'O2Si'.
+
+        Parameters
+        ----------
+        formula : str = None
+            The formula of the system.
+        empirical_formula : str = None
+            The formula reduced to the smallest whole numbers, e.g. 'CH' for
+            benzene.
+        elements : [str] = None
+            Elements that the system must contain, perhaps among others.
+        element_set : [str] = None
+            The elements that the system must contain, and no others.
+        min_atoms, max_atoms : int = None
+            The smallest and largest numbers of atoms allowed.
+        min_volume, max_volume : float = None
+            The smallest and largest cell volumes allowed, in Å^3. Molecular
+            systems have no volume and are excluded by either.
+
+        Returns
+        -------
+        [int]
+            The ids of the configurations, in the order they were added.
+        """
+        tables = ['configurations c JOIN systems s ON s.id = c.system']
+        conditions = []
+        arguments = []
+        for i, symbol in enumerate(elements or ()):
+            tables.append(
+                'JOIN elements e{0} ON e{0}.system = s.id AND '
+                'e{0}.element = ?'.format(i)
+            )
+            arguments.append(_atomic_number(symbol))
+        criteria = (
+            ('s.formula = ?', _normalize_formula(formula)),
+            ('s.empirical_formula = ?', _normalize_formula(empirical_formula)),
+            (
+                's.element_set = ?',
+                None if element_set is None else _element_set(
+                    elements_module.symbols[_atomic_number(x)]
+                    for x in element_set
+                )
+            ),
+            ('s.n_atoms >= ?', min_atoms),
+            ('s.n_atoms <= ?', max_atoms),
+            ('c.volume >= ?', min_volume),
+            ('c.volume <= ?', max_volume),
+        )
+        for condition, value in criteria:
+            if value is not None:
+                conditions.append(condition)
+                arguments.append(value)
+        sql = 'SELECT c.id FROM ' + ' '.join(tables)
+        if len(conditions) > 0:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY c.id'
+        logger.debug('{} {}'.format(sql, arguments))
+        return [row[0] for row in self.connection.execute(sql, arguments)]
+
+    def iter_configurations(self, start=0, stop=None, step=1):
+        """Read the configurations in the store one at a time.
+
+        The configurations, in the order they were added, are selected like
+        a slice of a list, starting from 0. Successive configurations of a
+        system share its atoms and bonds.
+
+        Parameters
+        ----------
+        start : int = 0
+            The first configuration to read.
+        stop : int = None
+            The configuration to stop before, or None to read to the end.
+        step : int = 1
+            Read every `step`'th configuration.
+
+        Yields
+        ------
+        MolecularSystem
+            Each selected configuration.
+        """
+        if start < 0 or step < 1 or (stop is not None and stop < 0):
+            raise ValueError(
+                'Invalid configuration selection {}:{}:{}'.format(
+                    start, stop, step
+                )
+            )
+        limit = -1 if stop is None else max(stop - start, 0)
+        rows = self.connection.execute(
+            _select_configuration + ' ORDER BY c.id LIMIT ? OFFSET ?',
+            (limit, start)
+        )
+        topology = None
+        for i, (row, frame) in enumerate(self._decode(rows)):
+            if i % step != 0:
+                continue
+            if topology is None or topology[0] != row[1]:
+                topology = (row[1], self._topology(row[1]))
+            yield _configuration(topology[1], row, frame)
+
+    def _count(self, table):
+        """The number of rows in a table."""
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM {}'.format(table)
+        ).fetchone()[0]
+
+    def _configuration_row(
+        self, configuration_id, system_id, system, content_hash, latest
+    ):
+        """The row of the configurations table for a system.
+
+        The configuration is stored as a delta from the last configuration
+        of its system if few enough atoms changed and the chain of deltas is
+        not too long. `latest` holds the last configuration of each system
+        added so far, or None for new systems, and is updated.
+        """
+        if system_id not in latest:
+            latest[system_id] = self._latest_frame(system_id)
+        row, latest[system_id] = _configuration_row(
+            configuration_id, system_id, system, content_hash,
+            latest[system_id], self.keyframe_interval, self.delta_fraction
+        )
+        return row
+
+    def _decode(self, rows):
+        """The coordinates and velocities of the configurations in rows.
+
+        Deltas are applied to the configuration before them if it is their
+        base, as it is when the configurations of a system are read in
+        order, otherwise the base is read from its keyframe.
+
+        Yields
+        ------
+        (tuple, _Frame)
+            Each row of the configurations table and its frame.
+        """
+        previous = None
+        for row in rows:
+            base = row[9]
+            if base is not None and (previous is None or previous.id != base):
+                previous = self._frame(base)
+            previous = _apply(previous, row[0], *row[9:])
+            yield row, previous
+
+    def _frame(self, configuration_id):
+        """The coordinates and velocities of a configuration."""
+        rows = self.connection.execute(
+            _select_chain, (configuration_id,)
+        ).fetchall()
+        if len(rows) == 0:
+            raise KeyError(
+                'There is no configuration {} in the store.'.format(
+                    configuration_id
+                )
+            )
+        frame = None
+        for row in rows:
+            frame = _apply(frame, *row)
+        return frame
+
+    def _latest_frame(self, system_id):
+        """The last configuration of a system, or None if it has none."""
+        configuration_id = self.connection.execute(
+            'SELECT MAX(id) FROM configurations WHERE system=?', (system_id,)
+        ).fetchone()[0]
+        if configuration_id is None:
+            return None
+        return self._frame(configuration_id)
+
+    def _find_hashes(self, hashes):
+        """The ids of the first stored configuration with each hash.
+
+        Returns
+        -------
+        {str: (int, int)}
+            The ids of the system and configuration, for the hashes found.
+        """
+        result = {}
+        hashes = list(set(hashes))
+        for first in range(0, len(hashes), _max_variables):
+            chunk = hashes[first:first + _max_variables]
+            rows = self.connection.execute(
+                'SELECT hash, system, id FROM configurations WHERE hash IN '
+                '({}) ORDER BY id'.format(', '.join('?' * len(chunk))), chunk
+            )
+            for content_hash, system_id, configuration_id in rows:
+                result.setdefault(content_hash, (system_id, configuration_id))
+        return result
+
+    def _find_topology(self, system, topology_hash, added):
+        """The id of a stored system with the topology of a system, or None.
+
+        Parameters
+        ----------
+        system : MolecularSystem
+            The system.
+        topology_hash : str
+            The hash of its topology.
+        added : [(MolecularSystem, int)]
+            Systems with the same hash that are being added, and their ids.
+        """
+        for other, system_id in added:
+            if other.same_topology(system):
+                return system_id
+        rows = self.connection.execute(
+            'SELECT id FROM systems WHERE hash=? ORDER BY id',
+            (topology_hash,)
+        ).fetchall()
+        for (system_id,) in rows:
+            topology = self._topology(system_id)
+            if topology.same_topology(system):
+                added.append((topology, system_id))
+                return system_id
+        return None
+
+    def _max_id(self, table):
+        """The largest id in a table, or 0 if it is empty."""
+        return self.connection.execute(
+            'SELECT COALESCE(MAX(id), 0) FROM {}'.format(table)
+        ).fetchone()[0]
+
+    def _topology(self, system_id):
+        """The system with the atoms and bonds of a stored system."""
+        row = self.connection.execute(
+            'SELECT name FROM systems WHERE id=?', (system_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(
+                'There is no system {} in the store.'.format(system_id)
+            )
+        tables = {'atoms': {}, 'bonds': {}}
+        rows = self.connection.execute(
+            'SELECT tbl, name, dtype, shape, data FROM columns WHERE system=?',
+            (system_id,)
+        )
+        for table, name, dtype, shape, data in rows:
+            tables[table][name] = np.frombuffer(data, dtype=dtype).reshape(
+                json.loads(shape)
+            ).copy()
+        bonds = tables['bonds']
+        return MolecularSystem(
+            name=row[0],
+            atoms=AtomTable.from_arrays(**tables['atoms']),
+            bonds=BondTable.from_arrays(
+                *[bonds[name] for name in _bond_columns]
+            )
+        )
+
+
+def _topology_rows(
+    system_id, system, topology_hash, systems, columns, element_counts
+):
+    """Append the rows for the topology of a system to the lists."""
+    composition = _composition(system.atoms.atno)
+    systems.append(
+        (
+            system_id, system.name, system.n_atoms, system.n_bonds,
+            *_formulas(composition), topology_hash
+        )
+    )
+    element_counts.extend(_element_rows(system_id, composition))
+    for column in system.atoms.columns:
+        if column not in configuration_columns:
+            columns.append(
+                _column_row(system_id, 'atoms', column, system.atoms[column])
+            )
+    for column in _bond_columns:
+        columns.append(
+            _column_row(
+                system_id, 'bonds', column, getattr(system.bonds, column)
+            )
+        )
+
+
+def _formulas(composition):
+    """The formula, empirical formula and element set of a composition."""
+    divisor = 0
+    for count in composition.values():
+        divisor = math.gcd(divisor, count)
+    empirical = {
+        symbol: count // divisor for symbol, count in composition.items()
+    }
+    return _formula(composition), _formula(empirical), _element_set(
+        composition
+    )
+
+
+def _element_rows(system_id, composition):
+    """The rows of the elements table for a composition."""
+    return [
+        (elements_module.atomic_number(symbol), system_id, count)
+        for symbol, count in composition.items()
+    ]
+
+
+def _normalize_formula(formula):
+    """A formula in Hill order, as stored, e.g. 'O2Si' for 'SiO2'."""
+    if formula is None:
+        return None
+    counts = collections.Counter()
+    position = 0
+    for match in _formula_re.finditer(formula):
+        if match.start() != position:
+            break
+        symbol = elements_module.symbols[_atomic_number(match.group(1))]
+        counts[symbol] += int(match.group(2) or 1)
+        position = match.end()
+    if position != len(formula) or len(counts) == 0:
+        raise ValueError("'{}' is not a chemical formula.".format(formula))
+    return _formula({symbol: counts[symbol] for symbol in _hill_order(counts)})
+
+
+def _atomic_number(symbol):
+    """The atomic number of an element symbol, or of an atomic number."""
+    if isinstance(symbol, str):
+        return elements_module.atomic_number(symbol)
+    return int(symbol)
+
+
+def _element_set(symbols):
+    """The canonical text for a set of elements, e.g. 'O Si'."""
+    return ' '.join(sorted(symbols))
+
+
+def _column_row(system_id, table, name, values):
+    """The row of the columns table for an array."""
+    values = np.ascontiguousarray(values)
+    if values.dtype.hasobject:
+        raise ValueError(
+            "The column '{}' holds Python objects, which cannot be "
+            'stored.'.format(name)
+        )
+    return (
+        system_id, table, name, values.dtype.str, json.dumps(values.shape),
+        values.tobytes()
+    )
+
+
+def _configuration_row(
+    configuration_id, system_id, system, content_hash, previous,
+    keyframe_interval, delta_fraction
+):
+    """The row of the configurations table for a system, and its frame.
+
+    The row is a delta from the previous configuration of the system, if
+    given, when at most `delta_fraction` of the atoms changed and the delta
+    would be no more than `keyframe_interval` from its keyframe.
+    """
+    if system.cell is None:
+        cell = (None,) * 7
+    else:
+        cell = tuple(float(x) for x in system.cell.parameters)
+        cell += (float(system.cell.volume),)
+    coordinates = np.ascontiguousarray(system.coordinates, dtype='<f8')
+    if 'velocities' in system.atoms:
+        velocities = np.ascontiguousarray(
+            system.atoms['velocities'], dtype='<f8'
+        )
+    else:
+        velocities = None
+    frame = _Frame(configuration_id, 0, coordinates, velocities)
+    base = None
+    changed = None
+    if (
+        previous is not None and previous.depth < keyframe_interval and
+        (velocities is None) == (previous.velocities is None)
+    ):
+        moved = np.any(coordinates != previous.coordinates, axis=1)
+        if velocities is not None:
+            moved |= np.any(velocities != previous.velocities, axis=1)
+        indices = np.flatnonzero(moved)
+        if len(indices) <= delta_fraction * len(coordinates):
+            base = previous.id
+            frame = frame._replace(depth=previous.depth + 1)
+            changed = indices.astype('<i4').tobytes()
+            coordinates = coordinates[indices]
+            if velocities is not None:
+                velocities = velocities[indices]
+    return (
+        configuration_id, system_id, system.name, *cell, content_hash, base,
+        frame.depth, changed, _blob(coordinates),
+        None if velocities is None else _blob(velocities)
+    ), frame
+
+
+def _blob(values):
+    """The bytes of an Nx3 array of float64."""
+    return np.ascontiguousarray(values, dtype='<f8').tobytes()
+
+
+def _apply(
+    previous, configuration_id, base, depth, changed, coordinates, velocities
+):
+    """The frame of a configuration, applying a delta to its base."""
+    coordinates = np.frombuffer(coordinates, dtype='<f8').reshape(-1, 3)
+    if velocities is not None:
+        velocities = np.frombuffer(velocities, dtype='<f8').reshape(-1, 3)
+    if base is None:
+        return _Frame(configuration_id, 0, coordinates, velocities)
+    if previous is None or previous.id != base:
+        raise ValueError(
+            'Configuration {} is a delta from {}, not {}.'.format(
+                configuration_id, base,
+                None if previous is None else previous.id
+            )
+        )
+    indices = np.frombuffer(changed, dtype='<i4')
+    result = previous.coordinates.copy()
+    result[indices] = coordinates
+    if velocities is not None:
+        changed_velocities = velocities
+        velocities = previous.velocities.copy()
+        velocities[indices] = changed_velocities
+    return _Frame(configuration_id, depth, result, velocities)
+
+
+def _configuration(topology, row, frame):
+    """The configuration in a row of the configurations table."""
+    name = row[2]
+    cell = row[3:9]
+    velocities = frame.velocities
+    return topology.new_configuration(
+        frame.coordinates.copy(),
+        None if velocities is None else velocities.copy(),
+        cell=None if cell[0] is None else Cell(*cell),
+        name=name
+    )
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+"""Building supercells of periodic systems.
+
+A supercell is given by an integer matrix M whose rows are the new cell
+vectors in terms of the old ones, ``new_vectors = M @ vectors``, e.g. the
+diagonal matrix (na, nb, nc) for a simple na x nb x nc replication. The
+|det M| lattice translations that lie inside the new cell are found once,
+and every column of the atoms and bonds is replicated for all of them with
+array broadcasting, each allocated once at its final size.
+
+The bonds are re-linked across the periodic boundaries exactly: a bond from
+atom i in the copy at translation t to the image of atom j at lattice shift
+s is a bond to atom j in the copy whose translation t' is equivalent to
+t + s in the supercell, with the shift in the new cell given by
+``t + s = t' + shift @ M``.
+"""
+
+import itertools
+import logging
+import re
+
+import numpy as np
+
+from system_step.atoms import AtomTable
+from system_step.bonds import BondTable
+from system_step.cell import Cell
+from system_step.molecular_system import MolecularSystem
+from system_step.molecular_system import configuration_columns
+
+logger = logging.getLogger(__name__)
+
+# The tolerance for fractional coordinates of lattice points on a face
+tolerance = 1.0e-8
+
+_corners = np.array(list(itertools.product((0, 1), repeat=3)))
+
+
+def make_supercell(system, matrix, template=None):
+    """Create a supercell of a periodic system.
+
+    The atoms of each copy of the cell are kept together, and in the same
+    order, with the copy at the origin first, so the supercell of a
+    molecular crystal keeps its molecules whole if the unit cell does. The
+    new cell is in the standard orientation, with a along x, so the
+    coordinates and velocities are rotated if the transformation is not
+    diagonal.
+
+    Parameters
+    ----------
+    system : MolecularSystem
+        The periodic system.
+    matrix : int, [int] or str
+        The transformation: na x nb x nc as a single number or three
+        numbers, or the 3x3 integer matrix whose rows are the new cell
+        vectors in terms of the old. See :func:`transformation_matrix`.
+    template : MolecularSystem = None
+        A supercell, with the same transformation, of a system with the
+        same atoms and bonds, e.g. the previous frame of a trajectory. The
+        new supercell is a configuration of it that shares its atoms and
+        bonds, so only the coordinates are computed.
+
+    Returns
+    -------
+    MolecularSystem
+        The supercell.
+    """
+    if system.cell is None:
+        raise ValueError(
+            "The system '{}' is not periodic, so has no supercells.".format(
+                system.name
+            )
+        )
+    matrix = transformation_matrix(matrix)
+    translations = lattice_points(matrix)
+    n_copies = len(translations)
+    n_atoms = system.n_atoms
+
+    cell = Cell.from_vectors(matrix @ system.cell.vectors)
+    # The rotation from the old orientation to the standard one of the new
+    # cell, which is the identity for diagonal transformations.
+    rotation = system.cell.inverse @ np.linalg.inv(matrix) @ cell.vectors
+    offsets = translations @ system.cell.vectors @ rotation
+    coordinates = np.empty((n_copies, n_atoms, 3))
+    np.add(
+        offsets[:, np.newaxis, :], (system.coordinates @ rotation)[np.newaxis],
+        out=coordinates
+    )
+    columns = {'coordinates': coordinates.reshape(-1, 3)}
+    if 'velocities' in system.atoms:
+        velocities = system.atoms['velocities'] @ rotation
+        columns['velocities'] = np.tile(velocities, (n_copies, 1))
+
+    if template is not None and template.n_atoms == n_copies * n_atoms:
+        return template.new_configuration(
+            cell=cell, name=system.name, **columns
+        )
+
+    for name in system.atoms:
+        if name not in configuration_columns:
+            values = system.atoms[name]
+            columns[name] = np.tile(
+                values, (n_copies,) + (1,) * (values.ndim - 1)
+            )
+    atoms = AtomTable.from_arrays(**columns)
+    return MolecularSystem(
+        name=system.name,
+        atoms=atoms,
+        bonds=_replicate_bonds(system.bonds, n_atoms, matrix, translations),
+        cell=cell
+    )
+
+
+def transformation_matrix(value):
+    """The integer matrix of a supercell transformation.
+
+    Parameters
+    ----------
+    value : int, [int] or str
+        A single number n for n x n x n, three numbers na, nb and nc for
+        the diagonal matrix, or nine numbers or a 3x3 array for the rows of
+        the matrix. A string may separate the numbers with spaces, commas
+        or 'x', e.g. '2x2x1' or '1 1 0, -1 1 0, 0 0 1'.
+
+    Returns
+    -------
+    numpy.ndarray
+        The 3x3 integer matrix, with a positive determinant.
+    """
+    if isinstance(value, str):
+        words = [x for x in re.split(r'[\s,;x×]+', value.strip()) if x != '']
+        try:
+            numbers = np.array([float(x) for x in words])
+        except ValueError:
+            raise ValueError(
+                "The supercell '{}' is not a list of numbers.".format(value)
+            )
+    else:
+        numbers = np.asarray(value, dtype=np.float64).ravel()
+    if numbers.size == 1:
+        matrix = np.diag(np.repeat(numbers, 3))
+    elif numbers.size == 3:
+        matrix = np.diag(numbers)
+    elif numbers.size == 9:
+        matrix = numbers.reshape(3, 3)
+    else:
+        raise ValueError(
+            'A supercell needs 1, 3 or 9 numbers, not {}.'.format(numbers.size)
+        )
+    if not np.all(matrix == np.rint(matrix)):
+        raise ValueError(
+            'The supercell transformation must be integers: {}'.format(
+                numbers.tolist()
+            )
+        )
+    matrix = np.rint(matrix).astype(np.int64)
+    if round(np.linalg.det(matrix)) <= 0:
+        raise ValueError(
+            'The supercell transformation must have a positive determinant: '
+            '{}'.format(matrix.tolist())
+        )
+    return matrix
+
+
+def lattice_points(matrix):
+    """The lattice translations inside the cell of a supercell.
+
+    Parameters
+    ----------
+    matrix : numpy.ndarray
+        The 3x3 integer transformation.
+
+    Returns
+    -------
+    numpy.ndarray
+        The det(M) x 3 integer translations, in terms of the original cell
+        vectors, with fractional coordinates in [0, 1) in the supercell,
+        starting with the origin.
+    """
+    corners = _corners @ matrix
+    low = corners.min(axis=0)
+    high = corners.max(axis=0)
+    grid = np.stack(
+        np.meshgrid(
+            *(np.arange(x, y + 1) for x, y in zip(low, high)), indexing='ij'
+        ),
+        axis=-1
+    ).reshape(-1, 3)
+    fractions = grid @ np.linalg.inv(matrix)
+    inside = np.all(
+        (fractions > -tolerance) & (fractions < 1.0 - tolerance), axis=1
+    )
+    points = grid[inside]
+    # Put the origin first, keeping the order of the others
+    origin = np.all(points == 0, axis=1)
+    points = points[np.argsort(~origin, kind='stable')]
+    n = int(round(abs(np.linalg.det(matrix))))
+    if len(points) != n:
+        raise RuntimeError(
+            'Found {} lattice points in the supercell {}, not {}.'.format(
+                len(points), matrix.tolist(), n
+            )
+        )
+    return points
+
+
+def _replicate_bonds(bonds, n_atoms, matrix, translations):
+    """The bonds of the supercell, re-linked across the boundaries."""
+    n_copies = len(translations)
+    if len(bonds) == 0:
+        return BondTable()
+    # The bonds have only a few distinct lattice shifts, so find the copy
+    # bonded to, and the shift in the supercell, for each of those.
+    shifts, kind = np.unique(bonds.shift, axis=0, return_inverse=True)
+    kind = kind.reshape(-1)
+    q = (translations[:, np.newaxis, :] + shifts[np.newaxis]
+         ) @ np.linalg.inv(matrix)
+    cells = np.floor(q + tolerance)
+    image = np.rint((q - cells) @ matrix).astype(np.int64)
+    copies = _index(translations, image.reshape(-1, 3)).reshape(n_copies, -1)
+
+    i = np.arange(n_copies, dtype=np.int64)[:, np.newaxis] * n_atoms
+    i = i + bonds.i[np.newaxis]
+    j = copies[:, kind]
+    j *= n_atoms
+    j += bonds.j[np.newaxis]
+    return BondTable.from_arrays(
+        i.reshape(-1),
+        j.reshape(-1),
+        order=np.tile(bonds.order, n_copies),
+        shift=cells.astype(np.int32)[:, kind].reshape(-1, 3)
+    )
+
+
+def _index(translations, points):
+    """The index of each point among the translations."""
+    low = translations.min(axis=0)
+    dims = translations.max(axis=0) - low + 1
+    table = np.full(int(np.prod(dims)), -1, dtype=np.int64)
+    table[np.ravel_multi_index((translations - low).T, dims)] = np.arange(
+        len(translations)
+    )
+    return table[np.ravel_multi_index((points - low).T, dims)]
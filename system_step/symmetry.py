@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+
+"""Expanding the asymmetric unit of a crystal to the full cell.
+
+A symmetry operation maps fractional coordinates x to ``R @ x + t``, with
+an integer rotation R and a translation t. The operations are given as in
+CIF files, e.g. '-x, y+1/2, -z+1/2', or by a space group, whose operations
+are generated here from the generators of its standard setting in the
+International Tables, closed under composition with batched integer matrix
+products. Translations are held exactly, in 24ths of the cell.
+
+All the operations are applied to all the atoms of the asymmetric unit at
+once, with one batched matrix multiply, and the images that land on the
+same site, i.e. atoms on special positions, are merged. The images are
+hashed into a periodic grid of bins as wide as the merging tolerance, kept
+as sorted integer keys rather than a dense grid, so only images in the same
+or neighboring bins are compared.
+"""
+
+import functools
+import itertools
+import logging
+import re
+
+import numpy as np
+
+from system_step.atoms import AtomTable
+from system_step.bonds import connected_components
+from system_step.molecular_system import MolecularSystem
+
+logger = logging.getLogger(__name__)
+
+# The distance in Å within which images of atoms of an element are merged
+tolerance = 0.1
+
+# Translations are integers in units of 1/24, which covers 1/2, 1/3, 1/4,
+# 1/6 and 1/8.
+_denominator = 24
+
+_centering = {
+    'P': ((0, 0, 0),),
+    'A': ((0, 0, 0), (0, 12, 12)),
+    'B': ((0, 0, 0), (12, 0, 12)),
+    'C': ((0, 0, 0), (12, 12, 0)),
+    'I': ((0, 0, 0), (12, 12, 12)),
+    'F': ((0, 0, 0), (0, 12, 12), (12, 0, 12), (12, 12, 0)),
+    'R': ((0, 0, 0), (16, 8, 8), (8, 16, 16)),
+}
+
+# The bin itself and the 13 lexically positive offsets of the bins around
+# it, which find each pair of neighboring bins once
+_half_stencil = np.array(list(itertools.product((-1, 0, 1), repeat=3)))[13:]
+
+_cubic = ('-x,-y,z', '-x,y,-z', 'z,x,y', 'y,x,-z', '-x,-y,-z')
+
+# The number, symbol and generators, besides the lattice centering, of the
+# space groups known, in their standard settings: the unique axis b for
+# monoclinic groups, hexagonal axes for rhombohedral groups and origin
+# choice 2, at a center of inversion, where there are two.
+_space_groups = (
+    (1, 'P1', ()),
+    (2, 'P-1', ('-x,-y,-z',)),
+    (4, 'P21', ('-x,y+1/2,-z',)),
+    (5, 'C2', ('-x,y,-z',)),
+    (7, 'Pc', ('x,-y,z+1/2',)),
+    (9, 'Cc', ('x,-y,z+1/2',)),
+    (11, 'P21/m', ('-x,y+1/2,-z', '-x,-y,-z')),
+    (12, 'C2/m', ('-x,y,-z', '-x,-y,-z')),
+    (13, 'P2/c', ('-x,y,-z+1/2', '-x,-y,-z')),
+    (14, 'P21/c', ('-x,y+1/2,-z+1/2', '-x,-y,-z')),
+    (15, 'C2/c', ('-x,y,-z+1/2', '-x,-y,-z')),
+    (18, 'P21212', ('-x,-y,z', '-x+1/2,y+1/2,-z')),
+    (19, 'P212121', ('-x+1/2,-y,z+1/2', '-x,y+1/2,-z+1/2')),
+    (29, 'Pca21', ('-x,-y,z+1/2', 'x+1/2,-y,z')),
+    (33, 'Pna21', ('-x,-y,z+1/2', 'x+1/2,-y+1/2,z')),
+    (60, 'Pbcn', ('-x+1/2,-y+1/2,z+1/2', '-x,y,-z+1/2', '-x,-y,-z')),
+    (61, 'Pbca', ('-x+1/2,-y,z+1/2', '-x,y+1/2,-z+1/2', '-x,-y,-z')),
+    (62, 'Pnma', ('-x+1/2,-y,z+1/2', '-x,y+1/2,-z', '-x,-y,-z')),
+    (
+        92, 'P41212',
+        ('-x,-y,z+1/2', '-y+1/2,x+1/2,z+1/4', '-x+1/2,y+1/2,-z+1/4')
+    ),
+    (139, 'I4/mmm', ('-x,-y,z', '-y,x,z', '-x,y,-z', '-x,-y,-z')),
+    (148, 'R-3', ('-y,x-y,z', '-x,-y,-z')),
+    (166, 'R-3m', ('-y,x-y,z', 'y,x,-z', '-x,-y,-z')),
+    (194, 'P63/mmc', ('-y,x-y,z', '-x,-y,z+1/2', 'y,x,-z', '-x,-y,-z')),
+    (
+        205, 'Pa-3',
+        ('-x+1/2,-y,z+1/2', '-x,y+1/2,-z+1/2', 'z,x,y', '-x,-y,-z')
+    ),
+    (221, 'Pm-3m', _cubic),
+    (225, 'Fm-3m', _cubic),
+    (
+        227, 'Fd-3m', (
+            '-x+3/4,-y+1/4,z+1/2', '-x+1/4,y+1/2,-z+3/4', 'z,x,y',
+            'y+3/4,x+1/4,-z+1/2', '-x,-y,-z'
+        )
+    ),
+    (229, 'Im-3m', _cubic),
+    (
+        230, 'Ia-3d', (
+            '-x+1/2,-y,z+1/2', '-x,y+1/2,-z+1/2', 'z,x,y',
+            'y+3/4,x+1/4,-z+1/4', '-x,-y,-z'
+        )
+    ),
+)
+
+_by_number = {number: (symbol, generators)
+              for number, symbol, generators in _space_groups}  # yapf: disable
+_by_symbol = {symbol.lower(): number for number, symbol, _ in _space_groups}
+
+_term_re = re.compile(r'([+-]?)([xyz]|\d+(?:\.\d*)?(?:/\d+)?|\.\d+)')
+
+
+def space_groups():
+    """The space groups known, by number.
+
+    Returns
+    -------
+    dict(int, str)
+        The Hermann-Mauguin symbol of each space group, keyed by number.
+    """
+    return {number: symbol for number, symbol, _ in _space_groups}
+
+
+def operations(symmetry):
+    """The symmetry operations of a space group, or given as text.
+
+    Parameters
+    ----------
+    symmetry : str, int or [str]
+        The Hermann-Mauguin symbol of a space group, e.g. 'P 21/c' or
+        'Fd-3m', or its number, or the operations as in CIF files, e.g.
+        ['x, y, z', '-x, y+1/2, -z'].
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray)
+        The Mx3x3 integer rotations and the Mx3 fractional translations, in
+        [0, 1), with the identity first.
+    """
+    if isinstance(symmetry, str) and ',' in symmetry:
+        symmetry = [symmetry]
+    if isinstance(symmetry, (list, tuple)):
+        rotations, translations = _closure(
+            *_parse([x.lower() for x in symmetry])
+        )
+    else:
+        rotations, translations = _space_group(_number(symmetry))
+    return rotations, translations / _denominator
+
+
+def expand(system, symmetry):
+    """Expand an asymmetric unit to the full cell.
+
+    Every operation is applied to every atom, and images of atoms of the
+    same element closer than `tolerance` to each other are merged, keeping
+    the first. The atoms are ordered by the atom of the asymmetric unit
+    they are images of, and keep its other properties, such as the name
+    and occupancy. Any bonds are dropped, since the image of a bond may
+    cross the cell; perceive them for the expanded system.
+
+    Parameters
+    ----------
+    system : MolecularSystem
+        The asymmetric unit, which must be periodic.
+    symmetry : str, int or [str]
+        The space group or operations, as for :func:`operations`.
+
+    Returns
+    -------
+    MolecularSystem
+        The system with all the atoms in the cell.
+    """
+    if system.cell is None:
+        raise ValueError(
+            "The system '{}' is not periodic, so has no space group.".format(
+                system.name
+            )
+        )
+    rotations, translations = operations(symmetry)
+    n_operations = len(rotations)
+    n_atoms = system.n_atoms
+
+    # The images, ordered by atom and then operation
+    fractionals = system.cell.to_fractionals(system.coordinates)
+    images = np.einsum('mij,nj->nmi', rotations, fractionals)
+    images += translations[np.newaxis]
+    images -= np.floor(images)
+    images = images.reshape(-1, 3)
+    source = np.repeat(np.arange(n_atoms), n_operations)
+
+    # Merge the images on the same site
+    atno = system.atoms.atno[source]
+    i, j = _same_sites(images, atno, system.cell)
+    sites = connected_components(len(images), i, j)
+    _, keep = np.unique(sites, return_index=True)
+    keep.sort()
+
+    columns = {
+        name: system.atoms[name][source[keep]]
+        for name in system.atoms
+        if name not in ('atno', 'coordinates', 'velocities')
+    }
+    logger.debug(
+        "Expanded '{}' with {} operations from {} to {} atoms.".format(
+            system.name, n_operations, n_atoms, len(keep)
+        )
+    )
+    return MolecularSystem(
+        name=system.name,
+        atoms=AtomTable.from_arrays(
+            atno[keep], system.cell.to_cartesians(images[keep]), **columns
+        ),
+        cell=system.cell.copy()
+    )
+
+
+def _same_sites(fractionals, atno, cell):
+    """The pairs of images of the same element within the tolerance.
+
+    Parameters
+    ----------
+    fractionals : numpy.ndarray
+        The Nx3 fractional coordinates, in [0, 1).
+    atno : numpy.ndarray
+        The atomic numbers.
+    cell : Cell
+        The periodic cell.
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray)
+        The images i and j of each pair, found at least once.
+    """
+    dims = np.maximum(np.floor(cell.widths / tolerance), 1).astype(np.int64)
+    bins = np.minimum(np.floor(fractionals * dims).astype(np.int64), dims - 1)
+    # Work in the order of the keys, so that the searches below are for
+    # nearly sorted keys, which is much faster.
+    keys = _keys(bins, dims)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    bins = bins[order]
+    result_i = []
+    result_j = []
+    for offset in _half_stencil:
+        # The range of the sorted images in the neighboring bin of each
+        neighbors = _keys((bins + offset) % dims, dims)
+        first = np.searchsorted(keys, neighbors, side='left')
+        counts = np.searchsorted(keys, neighbors, side='right') - first
+        total = int(counts.sum())
+        if total == 0:
+            continue
+        i = np.repeat(order, counts)
+        starts = np.cumsum(counts) - counts
+        j = order[np.arange(total) - np.repeat(starts - first, counts)]
+        # Pairs in the same bin are found both ways round.
+        keep = (i < j) if not offset.any() else (i != j)
+        keep &= atno[i] == atno[j]
+        i = i[keep]
+        j = j[keep]
+        delta = fractionals[j] - fractionals[i]
+        delta -= np.rint(delta)
+        distances = np.linalg.norm(delta @ cell.vectors, axis=1)
+        close = distances < tolerance
+        result_i.append(i[close])
+        result_j.append(j[close])
+    if len(result_i) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(result_i), np.concatenate(result_j)
+
+
+def _keys(bins, dims):
+    """The integer key of each bin of a grid."""
+    return (bins[:, 0] * dims[1] + bins[:, 1]) * dims[2] + bins[:, 2]
+
+
+def _number(symbol):
+    """The number of a space group from its symbol or number."""
+    if isinstance(symbol, (int, np.integer)):
+        number = int(symbol)
+    else:
+        key = re.sub(r'[\s_]', '', str(symbol)).lower()
+        # Drop any origin choice or setting, e.g. ':2' or ':H'
+        key = key.split(':')[0]
+        # and the 1s of the full monoclinic symbols, e.g. 'P 1 21/c 1'.
+        match = re.fullmatch(r'([pabcfir])1(.+)1', key)
+        if match is not None and key not in _by_symbol:
+            key = match.group(1) + match.group(2)
+        if key.isdigit():
+            number = int(key)
+        elif key in _by_symbol:
+            number = _by_symbol[key]
+        else:
+            raise ValueError(
+                "The space group '{}' is not known. Give the symmetry "
+                'operations instead.'.format(symbol)
+            )
+    if number not in _by_number:
+        raise ValueError(
+            'The space group {} is not known. Give the symmetry operations '
+            'instead.'.format(number)
+        )
+    return number
+
+
+@functools.lru_cache(maxsize=None)
+def _space_group(number):
+    """The operations of a space group, with translations in 24ths."""
+    symbol, generators = _by_number[number]
+    rotations, translations = _parse(('x,y,z',) + generators)
+    centering = np.array(_centering[symbol[0]])
+    rotations = np.concatenate(
+        [rotations] + [np.identity(3, dtype=np.int64)[np.newaxis]] *
+        (len(centering) - 1)
+    )
+    translations = np.concatenate((translations, centering[1:]))
+    rotations, translations = _closure(rotations, translations)
+    rotations.flags.writeable = False
+    translations.flags.writeable = False
+    return rotations, translations
+
+
+def _parse(texts):
+    """Parse operations such as '-x, y+1/2, -z' into integer arrays."""
+    rotations = np.zeros((len(texts), 3, 3), dtype=np.int64)
+    translations = np.zeros((len(texts), 3), dtype=np.int64)
+    for k, text in enumerate(texts):
+        parts = text.replace("'", '').replace(' ', '').split(',')
+        if len(parts) != 3:
+            raise ValueError(
+                "The symmetry operation '{}' is not like 'x, y, z'.".format(
+                    text
+                )
+            )
+        for row, part in enumerate(parts):
+            terms = _term_re.findall(part)
+            if len(terms) == 0 or _term_re.sub('', part) != '':
+                raise ValueError(
+                    "The symmetry operation '{}' is not like 'x, y, z'."
+                    .format(text)
+                )
+            for sign, term in terms:
+                factor = -1 if sign == '-' else 1
+                if term in 'xyz':
+                    rotations[k, row, 'xyz'.index(term)] += factor
+                else:
+                    if '/' in term:
+                        numerator, denominator = term.split('/')
+                        value = float(numerator) / float(denominator)
+                    else:
+                        value = float(term)
+                    translations[k, row] += factor * round(
+                        value * _denominator
+                    )
+    return rotations, translations % _denominator
+
+
+def _closure(rotations, translations):
+    """The group generated by operations, with translations in 24ths."""
+    identity = np.identity(3, dtype=np.int64)
+    rotations = np.concatenate((identity[np.newaxis], rotations))
+    translations = np.concatenate(
+        (np.zeros((1, 3), dtype=np.int64), translations)
+    )
+    n = 0
+    while True:
+        keys = _unique(rotations, translations)
+        rotations = rotations[keys]
+        translations = translations[keys]
+        if len(rotations) == n:
+            break
+        n = len(rotations)
+        # No space group has more than 192 operations in its cell.
+        if n > 192:
+            raise ValueError('The symmetry operations do not form a group.')
+        # All the products of pairs of operations, as a batch
+        products = np.einsum('aij,bjk->abik', rotations, rotations)
+        shifts = np.einsum('aij,bj->abi', rotations, translations)
+        shifts += translations[:, np.newaxis, :]
+        rotations = np.concatenate((rotations, products.reshape(-1, 3, 3)))
+        translations = np.concatenate(
+            (translations, shifts.reshape(-1, 3) % _denominator)
+        )
+    return rotations, translations
+
+
+def _unique(rotations, translations):
+    """The indices of the distinct operations, in order of first use."""
+    rows = np.concatenate(
+        (rotations.reshape(-1, 9), translations), axis=1
+    )
+    _, first = np.unique(rows, axis=0, return_index=True)
+    first.sort()
+    return first
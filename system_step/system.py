@@ -3,10 +3,24 @@
 """Non-graphical part of the System step in a SEAMM flowchart
 """
 
+import contextlib
 import logging
+from pathlib import Path
 import pprint  # noqa: F401
 
+import numpy as np
+
 import system_step
+from system_step import binary
+from system_step.cell import Cell
+from system_step import hashing
+from system_step.molecular_system import _formula
+from system_step import packing
+from system_step import probe
+from system_step import readers
+from system_step import slab
+from system_step import supercell
+from system_step.store import SystemStore
 import seamm
 from seamm_util import ureg, Q_  # noqa: F401
 import seamm_util.printing as printing
@@ -24,6 +38,9 @@ logger = logging.getLogger(__name__)
 job = printing.getPrinter()
 printer = printing.getPrinter('System')
 
+# The number of systems added to a store in each transaction
+_store_chunk = 1000
+
 
 class System(seamm.Node):
     """
@@ -44,6 +61,50 @@ class System(seamm.Node):
     parameters : SystemParameters
         The control parameters for System.
 
+    system : MolecularSystem
+        The system created by the last run of this step, the first frame if
+        several were read.
+
+    systems : [MolecularSystem]
+        The frames read by the last run of this step that are kept in
+        memory, all of them unless limited by the 'keep in memory'
+        parameter.
+
+    files : [pathlib.Path]
+        The files read by the last run of this step.
+
+    hashes : [str]
+        The content hash of each of the systems kept in memory.
+
+    n_read : int
+        The number of frames read by the last run of this step.
+
+    perceived : bool
+        Whether bonds were perceived for any of the frames read.
+
+    n_systems : int
+        The number of systems produced by the last run of this step.
+
+    n_duplicates : int
+        The number of systems read that duplicate an earlier one.
+
+    n_removed : int
+        The number of duplicate systems that were removed.
+
+    probes : [probe.Probe]
+        The summary of each file, if the last run only probed them.
+
+    packing : [packing.PackingStatistics]
+        The statistics of each box packed or system solvated by the last
+        run of this step.
+
+    seed : int
+        The random seed used for packing, or None if nothing was packed.
+
+    close_contact : float
+        The distance in Å below which pairs of atoms are reported as being
+        too close in the analysis.
+
     See Also
     --------
     TkSystem,
@@ -85,6 +146,19 @@ class System(seamm.Node):
         )  # yapf: disable
 
         self.parameters = system_step.SystemParameters()
+        self.system = None
+        self.systems = []
+        self.files = []
+        self.hashes = []
+        self.n_read = 0
+        self.perceived = False
+        self.n_systems = 0
+        self.n_duplicates = 0
+        self.n_removed = 0
+        self.probes = []
+        self.packing = []
+        self.seed = None
+        self.close_contact = 0.5
 
     @property
     def version(self):
@@ -116,10 +190,120 @@ class System(seamm.Node):
         if not P:
             P = self.parameters.values_to_dict()
 
-        text = (
-            'Please replace this with a short summary of the '
-            'System step, including key parameters.'
-        )
+        if P['operation'] == 'probe':
+            if readers.is_batch(P['filename']):
+                text = "Probe the structure files in or matching '{filename}'"
+            else:
+                text = "Probe the structure file '{filename}'"
+            if P['file type'] != 'from extension':
+                text += ' as {file type}'
+            text += (
+                ' for the numbers of frames and atoms, the cell and the '
+                'composition, reading as little as possible.'
+            )
+            return (
+                self.header + '\n' + __(text, **P, indent=4 * ' ').__str__()
+            )
+
+        if readers.is_batch(P['filename']):
+            text = "Read the structure files in or matching '{filename}'"
+            if P['workers'] == 'all cores':
+                text += ', in parallel on all the available cores'
+            elif str(P['workers']) != '1':
+                text += ', in parallel with {workers} processes'
+            if P['file type'] != 'from extension':
+                text += ', as {file type}'
+            text += '.'
+        elif P['file type'] == 'from extension':
+            text = "Read the structure from the file '{filename}'."
+        else:
+            text = (
+                "Read the structure from the file '{filename}' as "
+                '{file type}.'
+            )
+        if (
+            P['first frame'] != 1 or P['last frame'] != 'last' or
+            P['frame stride'] != 1
+        ):
+            text += (
+                ' If there are several frames in the file, frames '
+                '{first frame} to {last frame} with a stride of '
+                '{frame stride} will be read.'
+            )
+        if P['symmetry'] == 'expand from file':
+            text += (
+                ' The asymmetric units of crystals will be expanded to the '
+                'full cell with the symmetry in the file.'
+            )
+        elif P['symmetry'] != 'as in file':
+            text += (
+                ' The asymmetric units of crystals will be expanded to the '
+                "full cell with the space group '{symmetry}'."
+            )
+        if P['perceive bonds'] == 'always':
+            text += (
+                ' The bonds will be found from the distances between the '
+                'atoms, with a tolerance of {bond tolerance}.'
+            )
+        elif P['perceive bonds'] == 'if none in file':
+            text += (
+                ' If the file has no bonds, they will be found from the '
+                'distances between the atoms, with a tolerance of '
+                '{bond tolerance}.'
+            )
+        if P['selection'].strip() != '':
+            text += " Only the atoms matching '{selection}' will be kept."
+        if P['slab'].strip() != '':
+            text += (
+                " Periodic systems will be cut into ({slab}) slabs at least "
+                '{slab thickness} thick, with {vacuum} of vacuum'
+            )
+            if P['termination'] == 'all':
+                text += ', one for each termination.'
+            else:
+                text += ', with termination {termination}.'
+        if not _is_identity(P['supercell']):
+            text += (
+                " Periodic systems will be expanded to the supercell "
+                "'{supercell}'."
+            )
+        if P['packing'] == 'solvate':
+            text += ' The systems will be solvated with {solvent}'
+        elif P['packing'] == 'fill box':
+            text += ' The systems will be packed into a box'
+        if P['packing'] != 'none':
+            if P['number of molecules'] == 'from density':
+                text += ' to a density of {density}'
+            else:
+                text += ' with {number of molecules} copies'
+            text += ', at least {packing tolerance} apart'
+            if P['random seed'] != 'random':
+                text += ', with the random seed {random seed}'
+            text += '.'
+        if P['memory map'] in (True, 'yes'):
+            text += (
+                ' A file in the native binary format will be mapped into '
+                'memory rather than read.'
+            )
+        if P['duplicates'] == 'remove':
+            text += ' Systems identical to one read earlier will be removed.'
+        if P['save as'] != '':
+            text += (
+                " The systems will be saved in the binary file '{save as}'."
+            )
+        if P['store'] != '':
+            text += (
+                " The systems will be added to the store '{store}', except "
+                'for any already in it.'
+            )
+        if P['keep in memory'] == 'all unless saved':
+            if P['save as'] != '' or P['store'] != '':
+                text += ' Only the first system will be kept in memory.'
+        elif P['keep in memory'] != 'all':
+            text += (
+                ' Only the first {keep in memory} systems will be kept in '
+                'memory.'
+            )
 
         return self.header + '\n' + __(text, **P, indent=4 * ' ').__str__()
 
@@ -144,20 +328,157 @@ class System(seamm.Node):
         # Print what we are doing
         printer.important(__(self.description_text(P), indent=self.indent))
 
-        # Temporary code just to print the parameters. You will need to change
-        # this!
-        for key in P:
-            print('{:>15s} = {}'.format(key, P[key]))
+        filename = P['filename']
+        if filename == '':
+            raise ValueError('The System step needs a structure file.')
+        path = Path(filename).expanduser()
+
+        if readers.is_batch(path):
+            paths = readers.find_files(path, P['file type'])
+            if len(paths) == 0:
+                raise ValueError(
+                    "There are no structure files in or matching '{}'.".format(
+                        filename
+                    )
+                )
+        else:
+            paths = [path]
+        self.files = paths
+
+        if P['operation'] == 'probe':
+            self.probes = [probe.probe_file(x, P['file type']) for x in paths]
+            self.system = None
+            self.systems = []
+            self.hashes = []
+            self.n_read = 0
+            self.perceived = False
+            self.n_systems = 0
+            self.n_duplicates = 0
+            self.n_removed = 0
+            self.packing = []
+            self.seed = None
+            self.set_variable('_probes', self.probes)
+            self.analyze()
+            return next_node
+        self.probes = []
+        self.packing = []
+        self.seed = None
+
+        start = P['first frame'] - 1
+        stop = None if P['last frame'] == 'last' else P['last frame']
+        step = P['frame stride']
+        kwargs = {
+            'file_type': P['file type'],
+            'start': start,
+            'stop': stop,
+            'step': step,
+            'memory_map': P['memory map'],
+            'perceive': P['perceive bonds'],
+            'tolerance': P['bond tolerance'].to('Å').magnitude,
+            'symmetry': _symmetry(P['symmetry']),
+        }
+        if len(paths) > 1:
+            workers = None if P['workers'] == 'all cores' else P['workers']
+            frames = readers.iter_files(paths, workers=workers, **kwargs)
+        else:
+            frames = readers.iter_frames(paths[0], **kwargs)
+
+        # The systems pass through each stage one at a time, so only those
+        # kept in memory are held, however many frames there are.
+        saved = P['save as'] != '' or P['store'] != ''
+        keep = _keep(P['keep in memory'], saved)
+        self.n_read = 0
+        self.perceived = False
+        systems = self._read(frames)
+        if P['selection'].strip() != '':
+            systems = self._select(systems, P['selection'])
+        if P['slab'].strip() != '':
+            systems = self._slabs(
+                systems,
+                P['slab'],
+                P['slab thickness'].to('Å').magnitude,
+                P['vacuum'].to('Å').magnitude,
+                None if P['termination'] == 'all' else P['termination'] - 1
+            )
+        if not _is_identity(P['supercell']):
+            systems = self._supercells(systems, P['supercell'])
+        if P['packing'] != 'none':
+            systems = self._pack(systems, P)
+        systems = self._deduplicate(systems, P['duplicates'] == 'remove')
+
+        self.system = None
+        self.systems = []
+        self.hashes = []
+        self.n_systems = 0
+        n_stored = 0
+        stored_ids = set()
+        with contextlib.ExitStack() as stack:
+            writer = None
+            if P['save as'] != '':
+                writer = stack.enter_context(
+                    binary.BinaryWriter(Path(P['save as']).expanduser())
+                )
+            store = None
+            if P['store'] != '':
+                store = stack.enter_context(
+                    SystemStore(Path(P['store']).expanduser())
+                )
+                n_before = store.n_configurations
+            chunk = []
+            for system, content_hash in systems:
+                if self.system is None:
+                    self.system = system
+                if keep is None or self.n_systems < keep:
+                    self.systems.append(system)
+                    self.hashes.append(content_hash)
+                self.n_systems += 1
+                if writer is not None:
+                    writer.write(system)
+                if store is not None:
+                    chunk.append(system)
+                    if len(chunk) == _store_chunk:
+                        ids = store.add_systems(chunk, deduplicate=True)
+                        stored_ids.update(x for x, _ in ids)
+                        n_stored += len(ids)
+                        chunk = []
+            if store is not None:
+                ids = store.add_systems(chunk, deduplicate=True)
+                stored_ids.update(x for x, _ in ids)
+                n_stored += len(ids)
+                n_added = store.n_configurations - n_before
+
+        if self.n_read == 0:
+            raise ValueError(
+                "No frames were selected from '{}'.".format(filename)
+            )
+        if self.perceived:
+            self.references.cite(
+                raw=self._bibliography['cordero2008'],
+                alias='cordero2008',
+                module='system_step',
+                level=2,
+                note='The covalent radii used to perceive bonds.'
+            )
+        if store is not None:
+            text = (
+                "Added {n} configurations of {m} systems to the store "
+                "'{store}'."
+            )
+            if n_added < n_stored:
+                text += ' The other {skipped} were already in the store.'
             printer.normal(
                 __(
-                    '{key:>15s} = {value}',
-                    key=key,
-                    value=P[key],
-                    indent=4 * ' ',
-                    wrap=False,
-                    dedent=False
+                    text,
+                    n=n_added,
+                    m=len(stored_ids),
+                    skipped=n_stored - n_added,
+                    store=P['store'],
+                    indent=4 * ' '
                 )
             )
+        self.set_variable('_system', self.system)
+        self.set_variable('_systems', self.systems)
+        self.set_variable('_hashes', self.hashes)
 
         # Analyze the results
         self.analyze()
@@ -168,6 +489,321 @@ class System(seamm.Node):
 
         return next_node
 
+    def _read(self, frames):
+        """Count the frames read, and note whether bonds were perceived.
+
+        Parameters
+        ----------
+        frames : iterable of (MolecularSystem, bool)
+            The systems read, and whether their bonds were perceived.
+
+        Yields
+        ------
+        MolecularSystem
+            Each system.
+        """
+        for system, perceived in frames:
+            self.n_read += 1
+            self.perceived = self.perceived or perceived
+            yield system
+
+    def _deduplicate(self, systems, remove):
+        """Hash the systems, counting and optionally removing duplicates.
+
+        Only the hashes are remembered, not the systems.
+
+        Parameters
+        ----------
+        systems : iterable of MolecularSystem
+            The systems.
+        remove : bool
+            Whether to remove systems identical to an earlier one.
+
+        Yields
+        ------
+        (MolecularSystem, str)
+            Each system that is kept, and its content hash.
+        """
+        self.n_duplicates = 0
+        self.n_removed = 0
+        seen = set()
+        for system, content_hash in hashing.iter_content_hashes(systems):
+            if content_hash in seen:
+                self.n_duplicates += 1
+                if remove:
+                    self.n_removed += 1
+                    continue
+            else:
+                seen.add(content_hash)
+            yield system, content_hash
+
+    def _select(self, systems, expression):
+        """Keep only the selected atoms of the systems.
+
+        Frames that share the atoms and bonds of the previous one, and so
+        select the same atoms, reuse its reduced topology as a new
+        configuration rather than deleting the atoms again.
+
+        Parameters
+        ----------
+        systems : iterable of MolecularSystem
+            The systems.
+        expression : str
+            The selection.
+
+        Yields
+        ------
+        MolecularSystem
+            The systems with only the selected atoms, omitting any with none.
+        """
+        n_atoms = 0
+        n_kept = 0
+        n_systems = 0
+        previous = None
+        for system in systems:
+            n_atoms += system.n_atoms
+            mask = system.select(expression)
+            if (
+                previous is not None and system.same_topology(previous[0])
+                and np.array_equal(mask, previous[1])
+            ):
+                reduced = previous[2].new_configuration(
+                    coordinates=system.coordinates[mask],
+                    velocities=(
+                        system.atoms['velocities'][mask]
+                        if 'velocities' in system.atoms else None
+                    ),
+                    cell=None if system.cell is None else system.cell.copy(),
+                    name=system.name
+                )
+            else:
+                reduced = system.copy()
+                reduced.delete_atoms(~mask)
+            previous = (system, mask, reduced)
+            if reduced.n_atoms > 0:
+                n_kept += reduced.n_atoms
+                n_systems += 1
+                yield reduced
+        if self.n_read == 0:
+            return
+        if n_systems == 0:
+            raise ValueError(
+                "No atoms match the selection '{}'.".format(expression)
+            )
+        printer.normal(
+            __(
+                "Kept {n} of the {total} atoms, matching '{expression}'.",
+                n=n_kept,
+                total=n_atoms,
+                expression=expression,
+                indent=4 * ' '
+            )
+        )
+
+    def _slabs(self, systems, miller, thickness, vacuum, termination):
+        """Replace the periodic systems by slabs.
+
+        The bulk crystal is oriented once for each system, and shared by
+        the slabs with the different terminations.
+
+        Parameters
+        ----------
+        systems : iterable of MolecularSystem
+            The systems.
+        miller : str
+            The Miller indices of the surface.
+        thickness : float
+            The smallest thickness of the slabs in Å.
+        vacuum : float
+            The vacuum between the slabs and their images in Å.
+        termination : int or None
+            The index of the termination, or None for all of them.
+
+        Yields
+        ------
+        MolecularSystem
+            The slabs, and any molecular systems unchanged.
+        """
+        n_cut = 0
+        n_slabs = 0
+        n_terminations = set()
+        for system in systems:
+            if system.cell is None:
+                yield system
+                continue
+            builder = slab.SlabBuilder(system, miller)
+            n_terminations.add(len(builder.terminations))
+            if termination is None:
+                indices = range(len(builder.terminations))
+            else:
+                indices = [termination]
+            for index in indices:
+                yield builder.build(thickness, vacuum, index)
+                n_slabs += 1
+            n_cut += 1
+        if n_cut == 0:
+            printer.normal(
+                __(
+                    'None of the systems are periodic, so there are no '
+                    'slabs to cut.',
+                    indent=4 * ' '
+                )
+            )
+        else:
+            printer.normal(
+                __(
+                    'Cut {n_cut} periodic systems into {n_slabs} ({miller}) '
+                    'slabs. The surface has {terminations} distinct '
+                    'terminations.',
+                    n_cut=n_cut,
+                    n_slabs=n_slabs,
+                    miller=miller.strip(),
+                    terminations=' or '.join(
+                        str(x) for x in sorted(n_terminations)
+                    ),
+                    indent=4 * ' '
+                )
+            )
+
+    def _pack(self, systems, P):
+        """Solvate the systems, or pack copies of them into a box.
+
+        Filling a box takes copies of all the systems, so they are gathered
+        first; each system is solvated as it arrives.
+
+        Parameters
+        ----------
+        systems : iterable of MolecularSystem
+            The systems.
+        P : dict
+            The values of the parameters.
+
+        Yields
+        ------
+        MolecularSystem
+            The solvated systems, or the one packed box.
+        """
+        self.seed = P['random seed']
+        if self.seed == 'random':
+            self.seed = int(np.random.SeedSequence().generate_state(1)[0])
+        rng = np.random.default_rng(self.seed)
+        tolerance = P['packing tolerance'].to('Å').magnitude
+        density = P['density'].to('g/mL').magnitude
+        count = P['number of molecules']
+        box = _box(P['box'])
+        self.packing = []
+
+        if P['packing'] == 'fill box':
+            systems = list(systems)
+            if len(systems) == 0:
+                return
+            if box is None:
+                if count == 'from density':
+                    raise ValueError(
+                        'Filling a box needs the size of the box or the '
+                        'number of molecules.'
+                    )
+                mass = count * sum(x.mass for x in systems)
+                length = (mass / (density * packing.amu_per_a3))**(1 / 3)
+                box = Cell(length, length, length)
+            elif count == 'from density':
+                count = packing.count_for_density(systems, box, density)
+            system, statistics = packing.pack(
+                systems, count, box, tolerance=tolerance, seed=rng
+            )
+            self.packing.append(statistics)
+            yield system
+            return
+
+        if P['solvent'] == 'water':
+            solvent = packing.water()
+        else:
+            frames, _ = readers.read_frames(
+                Path(P['solvent']).expanduser(), stop=1,
+                perceive='if none in file'
+            )
+            solvent = frames[0]
+        for system in systems:
+            solute = system
+            cell = system.cell
+            if cell is None:
+                if box is None:
+                    cell, xyz = packing.box_around(
+                        system, P['padding'].to('Å').magnitude
+                    )
+                else:
+                    cell = box
+                    xyz = system.coordinates
+                    if len(xyz) > 0:
+                        middle = (xyz.min(axis=0) + xyz.max(axis=0)) / 2
+                        xyz = xyz - middle + cell.to_cartesians([0.5] * 3)
+                solute = system.copy()
+                solute.atoms['coordinates'] = xyz
+            if count == 'from density':
+                n = packing.count_for_density(solvent, cell, density, solute)
+            else:
+                n = count
+            solvated, statistics = packing.pack(
+                solvent, n, cell, solute=solute, tolerance=tolerance, seed=rng
+            )
+            self.packing.append(statistics)
+            yield solvated
+
+    def _supercells(self, systems, matrix):
+        """Replace the periodic systems by supercells.
+
+        Frames that share the atoms and bonds of the previous one reuse its
+        supercell as a new configuration, so only the coordinates are
+        replicated.
+
+        Parameters
+        ----------
+        systems : iterable of MolecularSystem
+            The systems.
+        matrix : str
+            The transformation, as three or nine integers.
+
+        Yields
+        ------
+        MolecularSystem
+            The supercells, and any molecular systems unchanged.
+        """
+        previous = None
+        n_built = 0
+        for system in systems:
+            if system.cell is None:
+                yield system
+                previous = None
+                continue
+            template = None
+            if previous is not None and system.same_topology(previous[0]):
+                template = previous[1]
+            expanded = supercell.make_supercell(system, matrix, template)
+            previous = (system, expanded)
+            yield expanded
+            n_built += 1
+        if n_built == 0:
+            printer.normal(
+                __(
+                    'None of the systems are periodic, so there are no '
+                    'supercells to build.',
+                    indent=4 * ' '
+                )
+            )
+        else:
+            n = supercell.lattice_points(
+                supercell.transformation_matrix(matrix)
+            ).shape[0]
+            printer.normal(
+                __(
+                    'Built the supercells of {n_built} periodic systems, each '
+                    'with {n} copies of the cell.',
+                    n_built=n_built,
+                    n=n,
+                    indent=4 * ' '
+                )
+            )
+
     def analyze(self, indent='', **kwargs):
         """Do any analysis of the output from this step.
 
@@ -179,12 +815,225 @@ class System(seamm.Node):
         indent: str
             An extra indentation for the output
         """
+        if len(self.probes) > 0:
+            self._print_probes()
+        system = self.system
+        if system is None:
+            return
+
+        text = (
+            "The system '{name}' has {n_atoms} atoms with the formula "
+            '{formula}.'
+        )
+        if system.n_bonds > 0:
+            n_molecules = int(system.molecules().max()) + 1
+            text += ' There {} {} {} and {} {}'.format(
+                'is' if system.n_bonds == 1 else 'are', system.n_bonds,
+                'bond' if system.n_bonds == 1 else 'bonds', n_molecules,
+                'molecule' if n_molecules == 1 else 'molecules'
+            )
+            if n_molecules > 1:
+                n_species = len(set(hashing.molecule_hashes(system)))
+                if n_species == 1:
+                    text += ', all of the same species'
+                else:
+                    text += ' of {} different species'.format(n_species)
+            text += '.'
+        if system.cell is not None:
+            a, b, c, alpha, beta, gamma = system.cell.parameters
+            text += (
+                ' It is periodic with the cell a={:.4f}, b={:.4f}, c={:.4f} '
+                'Å, α={:.2f}, β={:.2f}, γ={:.2f}°.'.format(
+                    a, b, c, alpha, beta, gamma
+                )
+            )
+        if len(self.files) > 1:
+            text += (
+                ' It is the first of {} systems read from {} files.'.format(
+                    self.n_systems, len(self.files)
+                )
+            )
+        elif self.n_systems > 1:
+            text += (
+                ' It is the first of {} frames read from the file.'.format(
+                    self.n_systems
+                )
+            )
+        if len(self.systems) == 1 and self.n_systems > 1:
+            text += ' Only it is kept in memory for the following steps.'
+        elif len(self.systems) < self.n_systems:
+            text += (
+                ' Only the first {} are kept in memory for the following '
+                'steps.'.format(len(self.systems))
+            )
+        n = self.n_duplicates
+        if n > 0 and self.n_removed == 0:
+            text += (
+                ' {} of the systems {} identical to {} read earlier.'.format(
+                    n, 'is' if n == 1 else 'are', 'one' if n == 1 else 'ones'
+                )
+            )
+        elif n > 0:
+            text += (
+                ' {} {} identical to {} read earlier {} removed.'.format(
+                    n, 'system' if n == 1 else 'systems',
+                    'one' if n == 1 else 'ones', 'was' if n == 1 else 'were'
+                )
+            )
+        # Check for atoms that are unphysically close, e.g. duplicates.
+        pairs = system.neighbors(self.close_contact)
+        if len(pairs.distances) > 0:
+            text += (
+                ' There are {} pairs of atoms closer than {} Å, the closest '
+                'being {:.3f} Å apart.'.format(
+                    len(pairs.distances), self.close_contact,
+                    pairs.distances.min()
+                )
+            )
         printer.normal(
             __(
-                'This is a placeholder for the results from the '
-                'System step',
+                text,
+                name=system.name,
+                n_atoms=system.n_atoms,
+                formula=system.formula,
                 indent=4 * ' ',
                 wrap=True,
                 dedent=False
             )
         )
+        if len(self.packing) > 0:
+            self._print_packing()
+
+    def _print_packing(self):
+        """Print the acceptance statistics of the random insertions."""
+        requested = sum(x.requested for x in self.packing)
+        inserted = sum(x.inserted for x in self.packing)
+        attempts = sum(x.attempts for x in self.packing)
+        text = (
+            'Inserted {inserted} of the {requested} molecules requested'
+        )
+        if len(self.packing) > 1:
+            text += ' into {n} systems'
+        text += (
+            ', in {attempts} attempts: an acceptance of {acceptance:.1%}. '
+            'The random seed was {seed}.'
+        )
+        if inserted < requested:
+            text += (
+                ' The rest did not fit; a smaller packing tolerance or a '
+                'lower density may help.'
+            )
+        printer.normal(
+            __(
+                text,
+                inserted=inserted,
+                requested=requested,
+                n=len(self.packing),
+                attempts=attempts,
+                acceptance=inserted / max(attempts, 1),
+                seed=self.seed,
+                indent=4 * ' ',
+                wrap=True,
+                dedent=False
+            )
+        )
+
+    def _print_probes(self):
+        """Print the summary of the files that were probed."""
+        if len(self.probes) == 1:
+            result = self.probes[0]
+            text = (
+                "The {} file '{{filename}}' has {} {} with {} atoms in the "
+                'first, whose formula is {}'.format(
+                    result.file_type, result.n_frames,
+                    'frame' if result.n_frames == 1 else 'frames',
+                    result.n_atoms, _formula(result.composition)
+                )
+            )
+            if result.n_frames > 1 and result.total_atoms is not None:
+                text += ', and {} atoms in all'.format(result.total_atoms)
+            text += '.'
+            if result.cell is not None:
+                a, b, c, alpha, beta, gamma = result.cell.parameters
+                text += (
+                    ' It is periodic with the cell a={:.4f}, b={:.4f}, '
+                    'c={:.4f} Å, α={:.2f}, β={:.2f}, γ={:.2f}°.'.format(
+                        a, b, c, alpha, beta, gamma
+                    )
+                )
+        else:
+            n_frames = sum(x.n_frames for x in self.probes)
+            text = (
+                'The {} files have {} frames, the largest first frame having '
+                '{} atoms.'.format(
+                    len(self.probes), n_frames,
+                    max(x.n_atoms for x in self.probes)
+                )
+            )
+            totals = [x.total_atoms for x in self.probes]
+            if None not in totals:
+                text += ' There are {} atoms in all.'.format(sum(totals))
+        printer.normal(
+            __(
+                text,
+                filename=self.files[0],
+                indent=4 * ' ',
+                wrap=True,
+                dedent=False
+            )
+        )
+
+
+def _box(value):
+    """The box to pack molecules into, or None to use the systems."""
+    value = str(value).strip()
+    if value == 'from system':
+        return None
+    try:
+        lengths = [float(x) for x in value.replace(',', ' ').split()]
+    except ValueError:
+        lengths = []
+    if len(lengths) == 1:
+        lengths *= 3
+    if len(lengths) != 3 or min(lengths) <= 0:
+        raise ValueError(
+            "The box '{}' is not one or three positive lengths.".format(value)
+        )
+    return Cell(*lengths)
+
+
+def _is_identity(matrix):
+    """Whether a supercell transformation leaves the cell as it is.
+
+    Values that are not valid transformations, such as variables not yet
+    set, are not the identity, so are reported when the step runs.
+    """
+    try:
+        matrix = supercell.transformation_matrix(matrix)
+    except ValueError:
+        return False
+    return np.array_equal(matrix, np.identity(3))
+
+
+def _keep(value, saved):
+    """The number of systems to keep in memory, or None for all of them."""
+    if value == 'all':
+        return None
+    if value == 'all unless saved':
+        return 1 if saved else None
+    value = int(value)
+    if value < 1:
+        raise ValueError(
+            'At least one system must be kept in memory, not {}.'.format(value)
+        )
+    return value
+
+
+def _symmetry(value):
+    """The symmetry to read crystals with, from the parameter."""
+    value = str(value).strip()
+    if value == 'as in file':
+        return None
+    if value == 'expand from file':
+        return 'from file'
+    return value
@@ -17,9 +17,6 @@ class SystemParameters(seamm.Parameters):
     The keys are parameters for the current plugin, which themselves
     might be dictionaries.
 
-    You need to replace the 'time' example below with one or more
-    definitions of the control parameters for your plugin and application.
-
     Attributes
     ----------
     parameters : dict(str)
@@ -72,14 +69,407 @@ class SystemParameters(seamm.Parameters):
     """
 
     parameters = {
-        "time": {
-            "default": 100.0,
+        "operation": {
+            "default": "read",
+            "kind": "enumeration",
+            "default_units": "",
+            "enumeration": (
+                "read",
+                "probe",
+            ),
+            "format_string": "s",
+            "description": "Operation:",
+            "help_text": (
+                "Read the structures, or only probe the files for the numbers "
+                "of frames and atoms, the cell and the composition, reading "
+                "as little of them as possible."
+            )
+        },
+        "filename": {
+            "default": "",
+            "kind": "string",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "s",
+            "description": "Structure file:",
+            "help_text": (
+                "The file containing the structure to read, or a directory "
+                "or wildcard pattern to read many files."
+            )
+        },
+        "file type": {
+            "default": "from extension",
+            "kind": "enumeration",
+            "default_units": "",
+            "enumeration": (
+                "from extension",
+                "XYZ",
+                "PDB",
+                "PQR",
+                "CIF",
+                "mmCIF",
+                "SDF",
+                "SEAMM binary",
+                "SEAMM store",
+            ),
+            "format_string": "s",
+            "description": "File type:",
+            "help_text": (
+                "The format of the structure file. By default it is "
+                "determined from the extension of the filename, or the "
+                "contents if the extension is not known. Files compressed "
+                "with gzip, bzip2, xz or zstd are read directly."
+            )
+        },
+        "first frame": {
+            "default": 1,
+            "kind": "integer",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "d",
+            "description": "First frame:",
+            "help_text": (
+                "The first frame to read from a file with several frames, "
+                "counting from 1."
+            )
+        },
+        "last frame": {
+            "default": "last",
+            "kind": "integer",
+            "default_units": "",
+            "enumeration": ("last",),
+            "format_string": "d",
+            "description": "Last frame:",
+            "help_text": (
+                "The last frame to read from a file with several frames, "
+                "counting from 1."
+            )
+        },
+        "frame stride": {
+            "default": 1,
+            "kind": "integer",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "d",
+            "description": "Stride:",
+            "help_text": (
+                "Read every n'th frame between the first and last frames. "
+                "The frames in between are skipped without being parsed."
+            )
+        },
+        "perceive bonds": {
+            "default": "if none in file",
+            "kind": "enumeration",
+            "default_units": "",
+            "enumeration": (
+                "if none in file",
+                "always",
+                "never",
+            ),
+            "format_string": "s",
+            "description": "Perceive bonds:",
+            "help_text": (
+                "Whether to find the bonds from the distances between the "
+                "atoms, using their covalent radii."
+            )
+        },
+        "bond tolerance": {
+            "default": 0.45,
             "kind": "float",
-            "default_units": "ps",
+            "default_units": "Å",
             "enumeration": tuple(),
-            "format_string": ".1f",
-            "description": "Simulation time:",
-            "help_text": ("The time to simulate in the dynamics run.")
+            "format_string": ".2f",
+            "description": "Bond tolerance:",
+            "help_text": (
+                "Atoms are bonded if they are closer than the sum of their "
+                "covalent radii plus this tolerance."
+            )
+        },
+        "symmetry": {
+            "default": "as in file",
+            "kind": "string",
+            "default_units": "",
+            "enumeration": ("as in file", "expand from file"),
+            "format_string": "s",
+            "description": "Crystal symmetry:",
+            "help_text": (
+                "Whether to keep the atoms of crystals as listed in the file, "
+                "or to expand the asymmetric unit to the full cell with the "
+                "symmetry operations or space group in CIF files. Give a "
+                "space group, e.g. 'P 21/c' or 14, to expand with it "
+                "instead, for any file."
+            )
+        },
+        "selection": {
+            "default": "",
+            "kind": "string",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "s",
+            "description": "Keep only atoms:",
+            "help_text": (
+                "A selection of the atoms to keep, such as 'protein and not "
+                "hydrogen' or 'within 5 of resname LIG'. The terms are "
+                "element, name, resname, chain, resid, index, within ... of, "
+                "comparisons such as 'b_factor > 40', hydrogen, heavy, water "
+                "and protein, combined with and, or, not and parentheses. "
+                "Leave blank to keep all the atoms."
+            )
+        },
+        "slab": {
+            "default": "",
+            "kind": "string",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "s",
+            "description": "Surface slab (hkl):",
+            "help_text": (
+                "Cut periodic systems into a slab with this surface, given by "
+                "the Miller indices of the bulk cell, e.g. '1 1 1'. The slab "
+                "is periodic in the surface plane, with the surface normal "
+                "along z. Leave blank to keep the bulk crystal."
+            )
+        },
+        "slab thickness": {
+            "default": 10.0,
+            "kind": "float",
+            "default_units": "Å",
+            "enumeration": tuple(),
+            "format_string": ".2f",
+            "description": "Slab thickness:",
+            "help_text": (
+                "The smallest thickness of the slab, which is rounded up to "
+                "whole repeats of the crystal normal to the surface."
+            )
+        },
+        "vacuum": {
+            "default": 15.0,
+            "kind": "float",
+            "default_units": "Å",
+            "enumeration": tuple(),
+            "format_string": ".2f",
+            "description": "Vacuum:",
+            "help_text": (
+                "The width of the vacuum between the slab and its periodic "
+                "images along the surface normal."
+            )
+        },
+        "termination": {
+            "default": 1,
+            "kind": "integer",
+            "default_units": "",
+            "enumeration": ("all",),
+            "format_string": "d",
+            "description": "Termination:",
+            "help_text": (
+                "Which of the distinct planes of atoms is at the bottom of "
+                "the slab, counting from 1, or 'all' for a slab with each "
+                "termination."
+            )
+        },
+        "supercell": {
+            "default": "1 1 1",
+            "kind": "string",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "s",
+            "description": "Supercell:",
+            "help_text": (
+                "Replace periodic systems by a supercell: three numbers, "
+                "na nb nc, to replicate the cell along each vector, or nine "
+                "for the rows of an integer matrix giving the new cell "
+                "vectors in terms of the old, e.g. '1 1 0  -1 1 0  0 0 1'. "
+                "Bonds across the cell boundaries are re-linked. Molecular "
+                "systems are left as they are."
+            )
+        },
+        "packing": {
+            "default": "none",
+            "kind": "enumeration",
+            "default_units": "",
+            "enumeration": ("none", "solvate", "fill box"),
+            "format_string": "s",
+            "description": "Packing:",
+            "help_text": (
+                "Insert copies of molecules at random, without overlaps: "
+                "'solvate' surrounds each system with the solvent, and "
+                "'fill box' packs copies of the systems read into a box."
+            )
+        },
+        "solvent": {
+            "default": "water",
+            "kind": "string",
+            "default_units": "",
+            "enumeration": ("water",),
+            "format_string": "s",
+            "description": "Solvent:",
+            "help_text": (
+                "The solvent molecule: rigid water, or a structure file "
+                "whose first frame is the molecule."
+            )
+        },
+        "number of molecules": {
+            "default": "from density",
+            "kind": "integer",
+            "default_units": "",
+            "enumeration": ("from density",),
+            "format_string": "d",
+            "description": "Number of molecules:",
+            "help_text": (
+                "The number of copies of the solvent, or of each system when "
+                "filling a box, or enough to give the density."
+            )
+        },
+        "density": {
+            "default": 1.0,
+            "kind": "float",
+            "default_units": "g/mL",
+            "enumeration": tuple(),
+            "format_string": ".3f",
+            "description": "Density:",
+            "help_text": (
+                "The density of the packed box, including any solute, used "
+                "for the number of molecules or the size of the box."
+            )
+        },
+        "box": {
+            "default": "from system",
+            "kind": "string",
+            "default_units": "",
+            "enumeration": ("from system",),
+            "format_string": "s",
+            "description": "Box (Å):",
+            "help_text": (
+                "The lengths of the orthorhombic box, as one number for a "
+                "cube or three. By default periodic systems use their cell, "
+                "molecules are padded, and a filled box is sized from the "
+                "density."
+            )
+        },
+        "padding": {
+            "default": 10.0,
+            "kind": "float",
+            "default_units": "Å",
+            "enumeration": tuple(),
+            "format_string": ".2f",
+            "description": "Padding:",
+            "help_text": (
+                "The distance from a molecular solute to the faces of the "
+                "box made around it."
+            )
+        },
+        "packing tolerance": {
+            "default": 1.6,
+            "kind": "float",
+            "default_units": "Å",
+            "enumeration": tuple(),
+            "format_string": ".2f",
+            "description": "Packing tolerance:",
+            "help_text": (
+                "The smallest distance between atoms of different molecules. "
+                "Random insertion cannot reach liquid densities with much "
+                "more than 1.6 Å."
+            )
+        },
+        "random seed": {
+            "default": "random",
+            "kind": "integer",
+            "default_units": "",
+            "enumeration": ("random",),
+            "format_string": "d",
+            "description": "Random seed:",
+            "help_text": (
+                "The seed for the random insertions. The same seed gives the "
+                "same packing. By default a seed is chosen and reported."
+            )
+        },
+        "memory map": {
+            "default": "no",
+            "kind": "boolean",
+            "default_units": "",
+            "enumeration": ("yes", "no"),
+            "format_string": "s",
+            "description": "Memory-map binary files:",
+            "help_text": (
+                "Map a file in the native binary format into memory, so that "
+                "only the parts of the system that are used are read. The "
+                "file is never modified."
+            )
+        },
+        "save as": {
+            "default": "",
+            "kind": "string",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "s",
+            "description": "Save as:",
+            "help_text": (
+                "A file to save the systems in, in the native binary format "
+                "(.sbin), which later flowcharts read much faster than text "
+                "formats. Add .gz, .bz2, .xz or .zst to compress it. Leave "
+                "blank to not save them."
+            )
+        },
+        "store": {
+            "default": "",
+            "kind": "string",
+            "default_units": "",
+            "enumeration": tuple(),
+            "format_string": "s",
+            "description": "Add to store:",
+            "help_text": (
+                "An SQLite file (.db) that keeps a library of systems across "
+                "jobs. The systems read are added to it, created if need be, "
+                "with frames that share atoms and bonds stored as "
+                "configurations of one system. Structures already in the "
+                "store are skipped. Leave blank to not store them."
+            )
+        },
+        "duplicates": {
+            "default": "keep",
+            "kind": "enumeration",
+            "default_units": "",
+            "enumeration": (
+                "keep",
+                "remove",
+            ),
+            "format_string": "s",
+            "description": "Duplicate systems:",
+            "help_text": (
+                "Whether to keep or remove systems identical to one read "
+                "earlier, as found from a hash of their elements, "
+                "coordinates, cell and bonds."
+            )
+        },
+        "keep in memory": {
+            "default": "all unless saved",
+            "kind": "integer",
+            "default_units": "",
+            "enumeration": ("all", "all unless saved"),
+            "format_string": "d",
+            "description": "Systems kept in memory:",
+            "help_text": (
+                "How many of the systems to keep in memory and pass to the "
+                "following steps. The systems are read, processed and saved "
+                "one at a time, so files larger than memory can be "
+                "converted if only a few are kept. 'all unless saved' keeps "
+                "only the first when the systems are saved to a file or a "
+                "store."
+            )
+        },
+        "workers": {
+            "default": "all cores",
+            "kind": "integer",
+            "default_units": "",
+            "enumeration": ("all cores",),
+            "format_string": "d",
+            "description": "Worker processes:",
+            "help_text": (
+                "The number of processes that read the files in parallel when "
+                "the filename is a directory or a wildcard pattern such as "
+                "'ligands/*.sdf'. By default all the available cores are "
+                "used."
+            )
         },
     }
 
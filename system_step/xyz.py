@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+"""Reading XYZ files, including extended and multi-frame XYZ files.
+
+The frames of a multi-frame file are read one at a time by a generator, so
+that files far larger than memory can be processed. Frames that are not
+wanted are skipped line by line without parsing their coordinates.
+
+Extended XYZ files carry key=value pairs on the comment line. The lattice
+vectors in 'Lattice' and the columns described by 'Properties' are used.
+"""
+
+import logging
+from pathlib import Path
+import re
+
+import numpy as np
+
+from system_step.atoms import AtomTable
+from system_step.cell import Cell
+from system_step import compression
+from system_step import elements
+from system_step.molecular_system import MolecularSystem
+
+logger = logging.getLogger(__name__)
+
+# key=value or key="quoted value" pairs on an extended XYZ comment line
+_extended_re = re.compile(r'([A-Za-z_][\w-]*)=("[^"]*"|\S+)')
+
+
+def read_xyz(path):
+    """Read the first frame of an XYZ file.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The XYZ file.
+
+    Returns
+    -------
+    MolecularSystem
+        The system in the file.
+    """
+    for system in iter_xyz(path, stop=1):
+        return system
+    raise ValueError("The XYZ file '{}' is empty.".format(path))
+
+
+def iter_xyz(path, start=0, stop=None, step=1, index=None):
+    """Read the frames of an XYZ file one at a time.
+
+    The frames are selected like a slice of a list, starting from 0. With an
+    index of the frames the reader seeks directly to each selected frame;
+    otherwise it reads through the file, skipping the unwanted frames.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        The XYZ file.
+    start : int = 0
+        The first frame to read.
+    stop : int = None
+        The frame to stop before, or None to read to the end.
+    step : int = 1
+        Read every `step`'th frame.
+    index : frame_index.FrameIndex = None
+        The index of the frames in the file, if available.
+
+    Yields
+    ------
+    MolecularSystem
+        The system in each selected frame.
+    """
+    if start < 0 or step < 1 or (stop is not None and stop < 0):
+        raise ValueError(
+            'Invalid frame selection {}:{}:{}'.format(start, stop, step)
+        )
+    path = Path(path)
+    with compression.open_file(path) as fd:
+        if index is not None:
+            for frame in range(len(index))[start:stop:step]:
+                fd.seek(index.offsets[frame])
+                fd.readline()
+                yield _read_frame(fd, int(index.n_atoms[frame]), path, frame)
+            return
+
+        frame = 0
+        while stop is None or frame < stop:
+            line = fd.readline()
+            if line == b'':
+                break
+            if line.strip() == b'':
+                continue
+            n_atoms = _atom_count(line, path, frame)
+            if frame >= start and (frame - start) % step == 0:
+                yield _read_frame(fd, n_atoms, path, frame)
+            else:
+                for i in range(n_atoms + 1):
+                    fd.readline()
+            frame += 1
+
+
+def _read_frame(fd, n_atoms, path, frame):
+    """Read the frame following its atom count line."""
+    comment = fd.readline().decode('utf-8', errors='replace')
+    lines = [fd.readline() for i in range(n_atoms)]
+    if n_atoms > 0 and lines[-1] == b'':
+        raise ValueError(
+            "Frame {} of the XYZ file '{}' is truncated.".format(frame, path)
+        )
+    return _frame_to_system(lines, comment, path, frame)
+
+
+def _atom_count(line, path, frame):
+    """The number of atoms from the first line of a frame."""
+    try:
+        return int(line.split()[0])
+    except (IndexError, ValueError):
+        raise ValueError(
+            "Frame {} of '{}' is not XYZ: the first line should be the number "
+            'of atoms, not "{}"'.format(
+                frame, path, line.strip().decode('utf-8', errors='replace')
+            )
+        )
+
+
+def _parse_comment(comment):
+    """The key=value pairs on an extended XYZ comment line, if any."""
+    result = {}
+    for key, value in _extended_re.findall(comment):
+        if value.startswith('"'):
+            value = value[1:-1]
+        result[key] = value
+    return result
+
+
+def _columns(properties):
+    """The columns of the species and positions from 'Properties'.
+
+    Parameters
+    ----------
+    properties : str
+        The extended XYZ property definition, e.g. 'species:S:1:pos:R:3'.
+
+    Returns
+    -------
+    (int, int)
+        The column of the species and of the first coordinate.
+    """
+    fields = properties.split(':')
+    species = position = None
+    column = 0
+    for name, _, count in zip(fields[0::3], fields[1::3], fields[2::3]):
+        if name == 'species':
+            species = column
+        elif name == 'pos':
+            position = column
+        column += int(count)
+    if species is None or position is None:
+        raise ValueError(
+            "Extended XYZ properties '{}' lack species or pos.".format(
+                properties
+            )
+        )
+    return species, position
+
+
+def _frame_to_system(lines, comment, path, frame):
+    """Create a system from the lines of one XYZ frame."""
+    info = _parse_comment(comment)
+    species, position = _columns(info.get('Properties', 'species:S:1:pos:R:3'))
+    if 'Lattice' in info or 'Properties' in info:
+        name = '{}:{}'.format(compression.strip_extension(path).stem, frame)
+    else:
+        name = comment.strip()
+
+    n_atoms = len(lines)
+    tokens = b''.join(lines).split()
+    width = len(lines[0].split()) if n_atoms > 0 else 4
+    if len(tokens) == n_atoms * width:
+        data = np.array(tokens).reshape(n_atoms, width)
+    else:
+        # Ragged lines, e.g. trailing comments; use the common columns.
+        fields = [line.split() for line in lines]
+        width = min(len(f) for f in fields)
+        data = np.array([f[0:width] for f in fields]).reshape(n_atoms, width)
+    atno = elements.to_atomic_numbers(data[:, species])
+    xyz = data[:, position:position + 3].astype(np.float64)
+
+    cell = None
+    if 'Lattice' in info:
+        vectors = np.array(info['Lattice'].split(), dtype=np.float64)
+        vectors = vectors.reshape(3, 3)
+        cell = Cell.from_vectors(vectors)
+        if not np.allclose(vectors, cell.vectors):
+            # Rotate the coordinates into the standard orientation
+            xyz = cell.to_cartesians(xyz @ np.linalg.inv(vectors))
+
+    return MolecularSystem(
+        name=name, atoms=AtomTable.from_arrays(atno, xyz), cell=cell
+    )
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark saving and loading systems in the binary and XYZ formats.
+
+Run from the top directory of the repository with
+
+    python -m tests.benchmark_binary
+
+The systems are random atoms with a chain of bonds, written to a temporary
+directory.
+"""
+
+import argparse
+from pathlib import Path
+import tempfile
+import time
+
+import numpy as np
+
+from system_step import (
+    AtomTable, BondTable, MolecularSystem, read_binary, read_file,
+    write_binary
+)
+
+
+def make_system(n_atoms):
+    rng = np.random.default_rng(17)
+    atoms = AtomTable.from_arrays(
+        rng.integers(1, 9, n_atoms), rng.uniform(0, 100, (n_atoms, 3))
+    )
+    bonds = BondTable.from_arrays(
+        np.arange(n_atoms - 1), np.arange(1, n_atoms)
+    )
+    return MolecularSystem(name='random', atoms=atoms, bonds=bonds)
+
+
+def write_xyz(path, system):
+    lines = ['{}'.format(system.n_atoms), system.name]
+    for symbol, (x, y, z) in zip(system.symbols, system.coordinates):
+        lines.append('{} {:.6f} {:.6f} {:.6f}'.format(symbol, x, y, z))
+    path.write_text('\n'.join(lines) + '\n')
+
+
+def _time(function, *args, repeat=3):
+    best = None
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        result = function(*args)
+        t = time.perf_counter() - t0
+        best = t if best is None else min(best, t)
+    return best, result
+
+
+def run(sizes):
+    print(
+        '{:>8s} {:>10s} {:>10s} {:>10s} {:>10s}'.format(
+            'atoms', 'XYZ w (s)', 'XYZ r (s)', 'bin w (s)', 'bin r (s)'
+        )
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for n in sizes:
+            system = make_system(n)
+            xyz_path = Path(directory) / 'system_{}.xyz'.format(n)
+            binary_path = Path(directory) / 'system_{}.sbin'.format(n)
+            t_xyz_write, _ = _time(write_xyz, xyz_path, system)
+            t_xyz_read, _ = _time(read_file, xyz_path)
+            t_write, _ = _time(write_binary, binary_path, system)
+            t_read, result = _time(read_binary, binary_path)
+            assert np.array_equal(result.coordinates, system.coordinates)
+            assert np.array_equal(result.bonds.j, system.bonds.j)
+            print(
+                '{:8d} {:10.3f} {:10.3f} {:10.3f} {:10.3f}'.format(
+                    n, t_xyz_write, t_xyz_read, t_write, t_read
+                )
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[10000, 100000, 1000000]
+    )
+    args = parser.parse_args()
+    run(args.sizes)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark the cell-list neighbor search against brute force.
+
+Run from the top directory of the repository with
+
+    python -m tests.benchmark_neighbors
+
+The systems are random atoms at the density of liquid water in periodic
+cubic and triclinic cells, with a cutoff of 3 Å.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from system_step import Cell
+from system_step.neighbors import brute_force_pairs, neighbor_pairs
+
+density = 0.1  # atoms / Å^3
+
+
+def _time(function, *args):
+    t0 = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - t0, result
+
+
+def run(sizes, cutoff, brute_force_limit):
+    rng = np.random.default_rng(12345)
+    print(
+        '{:>8s} {:>10s} {:>12s} {:>12s} {:>9s}'.format(
+            'atoms', 'cell', 'brute (s)', 'cells (s)', 'speedup'
+        )
+    )
+    for n in sizes:
+        length = (n / density)**(1 / 3)
+        for kind, cell in (
+            ('cubic', Cell(length, length, length)),
+            ('triclinic', Cell(length, length, length, 80.0, 85.0, 95.0)),
+        ):
+            xyz = cell.to_cartesians(rng.random((n, 3)))
+            t_cells, pairs = _time(neighbor_pairs, xyz, cutoff, cell)
+            if n <= brute_force_limit:
+                t_brute, reference = _time(
+                    brute_force_pairs, xyz, cutoff, cell
+                )
+                assert len(reference.i) == len(pairs.i)
+                print(
+                    '{:8d} {:>10s} {:12.3f} {:12.3f} {:9.1f}'.format(
+                        n, kind, t_brute, t_cells, t_brute / t_cells
+                    )
+                )
+            else:
+                print(
+                    '{:8d} {:>10s} {:>12s} {:12.3f} {:>9s}'.format(
+                        n, kind, '-', t_cells, '-'
+                    )
+                )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=[1000, 4000, 16000, 50000, 200000]
+    )
+    parser.add_argument('--cutoff', type=float, default=3.0)
+    parser.add_argument(
+        '--brute-force-limit',
+        type=int,
+        default=16000,
+        help='the largest system to run brute force on'
+    )
+    args = parser.parse_args()
+    run(args.sizes, args.cutoff, args.brute_force_limit)
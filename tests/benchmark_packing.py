@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark packing water against inserting molecules one at a time.
+
+Run from the top directory of the repository with
+
+    python -m tests.benchmark_packing
+
+The boxes are cubes filled with water at 1 g/mL, with the atoms of
+different molecules at least 1.6 Å apart. The loop inserts one molecule at a
+time, checking its atoms against every atom already in the box, as a
+script without the occupancy grid would, so its cost grows quadratically
+with the number of molecules.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from system_step.cell import Cell
+from system_step.packing import (
+    count_for_density, pack, random_rotations, water
+)
+
+tolerance = 1.6
+
+
+def loop_pack(molecule, n, cell, seed):
+    """Insert molecules one at a time, checking against all the atoms."""
+    rng = np.random.default_rng(seed)
+    shape = molecule.coordinates - molecule.coordinates.mean(axis=0)
+    lengths = np.array([cell.a, cell.b, cell.c])
+    placed = np.zeros((0, 3))
+    attempts = 0
+    while len(placed) < n * len(shape):
+        attempts += 1
+        rotation = random_rotations(1, rng)[0]
+        xyz = shape @ rotation + rng.random(3) * lengths
+        delta = placed[:, np.newaxis, :] - xyz[np.newaxis]
+        delta -= np.round(delta / lengths) * lengths
+        if np.any(np.einsum('ijk,ijk->ij', delta, delta) < tolerance**2):
+            continue
+        placed = np.concatenate((placed, xyz))
+    return placed, attempts
+
+
+def _time(function, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - t0, result
+
+
+def run(sizes, loop_limit):
+    molecule = water()
+    print(
+        '{:>8s} {:>8s} {:>10s} {:>10s} {:>10s} {:>9s}'.format(
+            'waters', 'box (Å)', 'acceptance', 'loop (s)', 'grid (s)',
+            'speedup'
+        )
+    )
+    for n in sizes:
+        length = (n * molecule.mass / 0.602214076)**(1 / 3)
+        cell = Cell(length, length, length)
+        n = count_for_density(molecule, cell, 1.0)
+        t_grid, (system, statistics) = _time(
+            pack, molecule, n, cell, tolerance=tolerance, seed=1
+        )
+        assert statistics.inserted == n
+        if n <= loop_limit:
+            t_loop, (placed, _) = _time(loop_pack, molecule, n, cell, 1)
+            assert len(placed) == system.n_atoms
+            loop = '{:10.2f}'.format(t_loop)
+            speedup = '{:9.0f}'.format(t_loop / t_grid)
+        else:
+            loop = '{:>10s}'.format('-')
+            speedup = '{:>9s}'.format('-')
+        print(
+            '{:8d} {:8.1f} {:10.1%} {} {:10.2f} {}'.format(
+                n, length, statistics.inserted / statistics.attempts, loop,
+                t_grid, speedup
+            )
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1000, 10000, 100000]
+    )
+    parser.add_argument(
+        '--loop-limit', type=int, default=3000,
+        help='the largest number of waters to pack with the loop'
+    )
+    args = parser.parse_args()
+    run(args.sizes, args.loop_limit)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark the bulk PDB reader against a naive line-by-line parser.
+
+Run from the top directory of the repository with
+
+    python -m tests.benchmark_pdb
+
+The files are synthetic proteins of alanine residues, written to a
+temporary directory.
+"""
+
+import argparse
+from pathlib import Path
+import tempfile
+import time
+
+import numpy as np
+
+from system_step import AtomTable, elements
+from system_step.pdb import iter_pdb
+
+residue = (
+    (' N  ', 'N'), (' CA ', 'C'), (' C  ', 'C'), (' O  ', 'O'), (' CB ', 'C'),
+    (' H  ', 'H'), (' HA ', 'H'), ('1HB ', 'H'), ('2HB ', 'H'), ('3HB ', 'H')
+)
+
+
+def write_pdb(path, n_atoms):
+    rng = np.random.default_rng(12345)
+    xyz = rng.uniform(-500.0, 500.0, size=(n_atoms, 3))
+    with open(path, 'w') as fd:
+        fd.write(
+            'CRYST1 1000.000 1000.000 1000.000  90.00  90.00  90.00 P 1\n'
+        )
+        for i in range(n_atoms):
+            name, element = residue[i % len(residue)]
+            chain = 'ABCDEFGHIJ'[(i // 100000) % 10]
+            fd.write(
+                'ATOM  {:5d} {:4s} ALA {}{:4d}    {:8.3f}{:8.3f}{:8.3f}'
+                '  1.00{:6.2f}          {:>2s}  \n'.format(
+                    i % 100000, name, chain, (i // len(residue)) % 10000,
+                    *xyz[i], 20.0, element
+                )
+            )
+        fd.write('END\n')
+
+
+def naive_pdb(path):
+    """Parse the atoms one line at a time, slicing the fixed columns."""
+    atno = []
+    xyz = []
+    names = []
+    residue_names = []
+    chains = []
+    residues = []
+    occupancies = []
+    b_factors = []
+    with open(path) as fd:
+        for line in fd:
+            if line.startswith(('ATOM  ', 'HETATM')):
+                names.append(line[12:16].strip())
+                residue_names.append(line[17:20].strip())
+                chains.append(line[21])
+                residues.append(int(line[22:26]))
+                xyz.append(
+                    (
+                        float(line[30:38]), float(line[38:46]),
+                        float(line[46:54])
+                    )
+                )
+                occupancies.append(float(line[54:60]))
+                b_factors.append(float(line[60:66]))
+                atno.append(elements.atomic_number(line[76:78]))
+    return AtomTable.from_arrays(
+        atno,
+        xyz,
+        name=np.array(names),
+        residue_name=np.array(residue_names),
+        chain=np.array(chains),
+        residue=np.array(residues, dtype=np.int32),
+        occupancy=np.array(occupancies),
+        b_factor=np.array(b_factors),
+    )
+
+
+def _time(function, *args, repeat=3):
+    best = None
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        result = function(*args)
+        t = time.perf_counter() - t0
+        best = t if best is None else min(best, t)
+    return best, result
+
+
+def run(sizes):
+    print(
+        '{:>8s} {:>12s} {:>12s} {:>9s}'.format(
+            'atoms', 'naive (s)', 'bulk (s)', 'speedup'
+        )
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for n in sizes:
+            path = Path(directory) / 'protein_{}.pdb'.format(n)
+            write_pdb(path, n)
+            t_naive, reference = _time(naive_pdb, path)
+            t_bulk, system = _time(lambda p: next(iter_pdb(p)), path)
+            assert np.array_equal(system.coordinates, reference.coordinates)
+            assert np.array_equal(system.atoms.atno, reference.atno)
+            print(
+                '{:8d} {:12.3f} {:12.3f} {:9.1f}'.format(
+                    n, t_naive, t_bulk, t_naive / t_bulk
+                )
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[10000, 100000, 1000000]
+    )
+    args = parser.parse_args()
+    run(args.sizes)
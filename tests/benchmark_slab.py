@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark cutting slabs against a loop over candidate lattice points.
+
+Run from the top directory of the repository with
+
+    python -m tests.benchmark_slab
+
+The bulk crystals are random atoms at the density of liquid water in a
+monoclinic cell, with bonds perceived from the distances, cut into (1 1 1)
+slabs 30 Å thick. The builder orients the crystal once and then builds the
+slab for each of the first few terminations. The loop places every atom of
+every lattice translation in a box around one slab, and keeps those inside
+it one at a time, as a script without the builder would, without any bonds.
+"""
+
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from system_step import AtomTable, Cell, MolecularSystem
+from system_step.slab import SlabBuilder
+
+density = 0.1  # atoms / Å^3
+
+
+def make_cell(n, rng):
+    length = (n / density)**(1 / 3)
+    cell = Cell(length, length, length, 90.0, 95.0, 90.0)
+    system = MolecularSystem(
+        name='random',
+        atoms=AtomTable.from_arrays(
+            rng.choice([1, 6, 8], size=n),
+            cell.to_cartesians(rng.random((n, 3)))
+        ),
+        cell=cell
+    )
+    system.perceive_bonds()
+    return system
+
+
+def loop_slab(builder, thickness, termination):
+    """The atoms of one slab found by testing each candidate in turn."""
+    bulk = builder.bulk
+    n_layers = builder.layers(thickness)
+    slab_vectors = builder.matrix.copy()
+    slab_vectors[2] *= n_layers
+    inverse = np.linalg.inv(slab_vectors)
+    shift = builder.terminations[termination] / builder.spacing / n_layers
+    fractionals = bulk.cell.to_fractionals(bulk.coordinates)
+    corners = np.array(list(itertools.product((0, 1), repeat=3)))
+    corners = corners @ slab_vectors
+    low = corners.min(axis=0) - 1
+    high = corners.max(axis=0) + 1
+    atno = []
+    kept = []
+    for t in itertools.product(*(range(x, y + 1) for x, y in zip(low, high))):
+        for number, uvw in zip(bulk.atoms.atno, fractionals):
+            u, v, w = (uvw + t) @ inverse
+            w -= shift
+            if 0 <= u < 1 and 0 <= v < 1 and -1.0e-6 <= w < 1 - 1.0e-6:
+                atno.append(number)
+                kept.append((u, v, w))
+    return atno, kept
+
+
+def _time(function, *args):
+    t0 = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - t0, result
+
+
+def run(sizes, thickness, terminations, loop_limit):
+    rng = np.random.default_rng(2024)
+    print(
+        '{:>8s} {:>8s} {:>10s} {:>10s} {:>9s} {:>10s} {:>9s}'.format(
+            'cell', 'atoms', 'loop (s)', 'setup (s)', 'slab (s)', 'slabs',
+            'speedup'
+        )
+    )
+    for n in sizes:
+        system = make_cell(n, rng)
+        t_setup, builder = _time(SlabBuilder, system, '1 1 1')
+        n_slabs = min(terminations, len(builder.terminations))
+        t0 = time.perf_counter()
+        for termination in range(n_slabs):
+            slab = builder.build(thickness, 10.0, termination)
+        t_slab = (time.perf_counter() - t0) / n_slabs
+        if n <= loop_limit:
+            t_loop, (atno, _) = _time(loop_slab, builder, thickness, 0)
+            assert len(atno) == slab.n_atoms
+            loop = '{:10.2f}'.format(t_loop)
+            speedup = '{:9.0f}'.format(t_loop / t_slab)
+        else:
+            loop = '{:>10s}'.format('-')
+            speedup = '{:>9s}'.format('-')
+        print(
+            '{:8d} {:8d} {} {:10.3f} {:9.4f} {:10d} {}'.format(
+                n, slab.n_atoms, loop, t_setup, t_slab, n_slabs, speedup
+            )
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[100, 1000, 10000]
+    )
+    parser.add_argument(
+        '--thickness', type=float, default=30.0,
+        help='The thickness of the slabs in Å.'
+    )
+    parser.add_argument(
+        '--terminations', type=int, default=10,
+        help='The number of terminations to build slabs for.'
+    )
+    parser.add_argument(
+        '--loop-limit', type=int, default=1000,
+        help='the largest cell to cut with the loop'
+    )
+    args = parser.parse_args()
+    run(args.sizes, args.thickness, args.terminations, args.loop_limit)
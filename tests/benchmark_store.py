@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark queries of the indexed store against scanning the library.
+
+Run from the top directory of the repository with
+
+    python -m tests.benchmark_store
+
+The libraries are synthetic: small molecules and crystals of random
+composition, a few of them large, written to a temporary directory. The
+scan reads the atomic numbers and volume of every configuration and
+checks them with NumPy, as a screening script without the indexes would.
+"""
+
+import argparse
+from pathlib import Path
+import tempfile
+import time
+
+import numpy as np
+
+from system_step import AtomTable, Cell, MolecularSystem, SystemStore
+from system_step import elements
+
+# The elements of the library, and how common each is
+pool = np.array([1, 6, 7, 8, 9, 13, 14, 15, 16, 17, 26, 29])
+weights = np.array([30, 20, 6, 12, 2, 3, 6, 1, 2, 2, 2, 1], dtype=float)
+weights /= weights.sum()
+
+queries = (
+    (
+        'Si and O, < 500 atoms',
+        dict(elements=['Si', 'O'], max_atoms=499),
+    ),
+    ('formula SiO2', dict(formula='SiO2')),
+    ('empirical formula CH', dict(empirical_formula='CH')),
+    ('only Al and O', dict(element_set=['Al', 'O'])),
+    ('volume 1000-1010 Å^3', dict(min_volume=1000, max_volume=1010)),
+)
+
+
+def make_systems(n, rng):
+    """Random systems, 5% of them large and 30% of them periodic."""
+    systems = []
+    for k in range(n):
+        if rng.random() < 0.05:
+            n_atoms = int(rng.integers(100, 2000))
+        else:
+            n_atoms = int(rng.integers(1, 30))
+        n_elements = int(rng.integers(1, 5))
+        kinds = rng.choice(pool, size=n_elements, replace=False, p=weights)
+        atno = rng.choice(kinds, size=n_atoms)
+        cell = None
+        if rng.random() < 0.3:
+            cell = Cell(*rng.uniform(5.0, 20.0, 3), 90.0, 90.0, 90.0)
+        systems.append(
+            MolecularSystem(
+                name='random {}'.format(k),
+                atoms=AtomTable.from_arrays(
+                    atno, rng.uniform(0.0, 10.0, (n_atoms, 3))
+                ),
+                cell=cell
+            )
+        )
+    return systems
+
+
+def scan(store, elements=None, formula=None, empirical_formula=None,
+         element_set=None, min_atoms=None, max_atoms=None, min_volume=None,
+         max_volume=None):
+    """Find the configurations by reading and checking every one."""
+    wanted = None
+    if formula is not None:
+        wanted = _counts(formula)
+    result = []
+    rows = store.connection.execute(
+        'SELECT c.id, c.volume, col.data FROM configurations c '
+        'JOIN columns col ON col.system = c.system '
+        "AND col.tbl = 'atoms' AND col.name = 'atno' ORDER BY c.id"
+    )
+    for configuration_id, volume, data in rows:
+        atno = np.frombuffer(data, dtype='<i2')
+        n_atoms = len(atno)
+        if max_atoms is not None and n_atoms > max_atoms:
+            continue
+        if min_atoms is not None and n_atoms < min_atoms:
+            continue
+        if min_volume is not None or max_volume is not None:
+            if volume is None:
+                continue
+            if min_volume is not None and volume < min_volume:
+                continue
+            if max_volume is not None and volume > max_volume:
+                continue
+        counts = np.bincount(atno, minlength=120)
+        if elements is not None and not all(
+            counts[_atno(x)] > 0 for x in elements
+        ):
+            continue
+        if element_set is not None and set(np.flatnonzero(counts)) != {
+            _atno(x) for x in element_set
+        }:
+            continue
+        if wanted is not None and not np.array_equal(counts, wanted):
+            continue
+        if empirical_formula is not None:
+            present = counts[counts > 0]
+            reduced = counts // np.gcd.reduce(present)
+            if not np.array_equal(reduced, _counts(empirical_formula)):
+                continue
+        result.append(configuration_id)
+    return result
+
+
+def _atno(symbol):
+    return elements.atomic_number(symbol)
+
+
+def _counts(formula):
+    counts = np.zeros(120, dtype=np.int64)
+    symbol = ''
+    number = ''
+    for char in formula + 'X':
+        if char.isupper():
+            if symbol != '':
+                counts[_atno(symbol)] += int(number or 1)
+            symbol, number = char, ''
+        elif char.islower():
+            symbol += char
+        else:
+            number += char
+    return counts
+
+
+def _time(function, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - t0, result
+
+
+def run(sizes, chunk):
+    rng = np.random.default_rng(7)
+    with tempfile.TemporaryDirectory() as directory:
+        for n in sizes:
+            path = Path(directory) / 'library_{}.db'.format(n)
+            t_add = 0.0
+            with SystemStore(path) as store:
+                for first in range(0, n, chunk):
+                    systems = make_systems(min(chunk, n - first), rng)
+                    t, _ = _time(store.add_systems, systems)
+                    t_add += t
+                store.connection.execute('ANALYZE')
+                print(
+                    '\n{} systems added in {:.1f} s, {:.0f} per second'.format(
+                        n, t_add, n / t_add
+                    )
+                )
+                print(
+                    '{:>24s} {:>8s} {:>11s} {:>10s}'.format(
+                        'query', 'found', 'index (ms)', 'scan (ms)'
+                    )
+                )
+                for title, query in queries:
+                    t_index, found = _time(store.find, **query)
+                    t_scan, expected = _time(scan, store, **query)
+                    assert found == expected
+                    print(
+                        '{:>24s} {:8d} {:11.2f} {:10.1f}'.format(
+                            title, len(found), 1000 * t_index, 1000 * t_scan
+                        )
+                    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[10000, 100000, 1000000]
+    )
+    parser.add_argument(
+        '--chunk', type=int, default=10000,
+        help='The number of systems to add in each transaction.'
+    )
+    args = parser.parse_args()
+    run(args.sizes, args.chunk)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark building supercells against loops over the cells and bonds.
+
+Run from the top directory of the repository with
+
+    python -m tests.benchmark_supercell
+
+The unit cells are random atoms at the density of liquid water in a
+monoclinic cell, with bonds perceived from the distances, replicated
+10 x 10 x 10. The loop copies the atoms of each cell in turn and re-links
+each bond in Python, as a script without the builder would.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from system_step import AtomTable, Cell, MolecularSystem
+from system_step.supercell import make_supercell
+
+density = 0.1  # atoms / Å^3
+
+
+def make_cell(n, rng):
+    length = (n / density)**(1 / 3)
+    cell = Cell(length, length, length, 90.0, 95.0, 90.0)
+    system = MolecularSystem(
+        name='random',
+        atoms=AtomTable.from_arrays(
+            rng.choice([1, 6, 8], size=n),
+            cell.to_cartesians(rng.random((n, 3)))
+        ),
+        cell=cell
+    )
+    system.perceive_bonds()
+    return system
+
+
+def loop_supercell(system, na, nb, nc):
+    """The supercell built cell by cell and bond by bond."""
+    n = system.n_atoms
+    vectors = system.cell.vectors
+    atno = []
+    coordinates = []
+    bonds = []
+    copies = {}
+    for a in range(na):
+        for b in range(nb):
+            for c in range(nc):
+                copies[(a, b, c)] = len(copies)
+                atno.extend(system.atoms.atno)
+                for xyz in system.coordinates:
+                    coordinates.append(xyz + np.array([a, b, c]) @ vectors)
+    size = (na, nb, nc)
+    for (a, b, c), k in copies.items():
+        for i, j, shift in zip(
+            system.bonds.i, system.bonds.j, system.bonds.shift
+        ):
+            image = [x + y for x, y in zip((a, b, c), shift)]
+            new_shift = [x // y for x, y in zip(image, size)]
+            image = tuple(x % y for x, y in zip(image, size))
+            bonds.append((k * n + i, copies[image] * n + j, new_shift))
+    return atno, coordinates, bonds
+
+
+def _time(function, *args):
+    t0 = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - t0, result
+
+
+def run(sizes, replicas, loop_limit):
+    rng = np.random.default_rng(2024)
+    print(
+        '{:>8s} {:>10s} {:>10s} {:>10s} {:>12s} {:>9s}'.format(
+            'cell', 'atoms', 'bonds', 'loop (s)', 'vector (s)', 'speedup'
+        )
+    )
+    for n in sizes:
+        system = make_cell(n, rng)
+        t_vector, expanded = _time(make_supercell, system, replicas)
+        if n <= loop_limit:
+            t_loop, (atno, _, bonds) = _time(
+                loop_supercell, system, *replicas
+            )
+            assert len(atno) == expanded.n_atoms
+            assert len(bonds) == expanded.n_bonds
+            loop = '{:10.2f}'.format(t_loop)
+            speedup = '{:9.0f}'.format(t_loop / t_vector)
+        else:
+            loop = '{:>10s}'.format('-')
+            speedup = '{:>9s}'.format('-')
+        print(
+            '{:8d} {:10d} {:10d} {} {:12.3f} {}'.format(
+                n, expanded.n_atoms, expanded.n_bonds, loop, t_vector, speedup
+            )
+        )
+        del expanded
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[100, 1000, 5000]
+    )
+    parser.add_argument(
+        '--replicas', type=int, nargs=3, default=[10, 10, 10],
+        help='The numbers of copies along a, b and c.'
+    )
+    parser.add_argument(
+        '--loop-limit', type=int, default=1000,
+        help='the largest cell to build with the loops'
+    )
+    args = parser.parse_args()
+    run(args.sizes, args.replicas, args.loop_limit)
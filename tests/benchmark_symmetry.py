@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmark expanding asymmetric units against loops over the operations.
+
+Run from the top directory of the repository with
+
+    python -m tests.benchmark_symmetry
+
+The asymmetric units are random atoms, with one atom at the origin, which
+is a special position, in cells sized for the density of liquid water once
+expanded. The loop applies each operation to each atom in turn and checks
+each image against the sites kept so far, as a script without the batched
+expansion would.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from system_step import AtomTable, Cell, MolecularSystem
+from system_step import symmetry
+
+density = 0.1  # atoms / Å^3
+
+groups = ('Fm-3m', 'Fd-3m', 'Ia-3d', 'Im-3m', 'R-3m', 'P63/mmc')
+
+
+def make_unit(n, group, rng):
+    rotations, _ = symmetry.operations(group)
+    volume = n * len(rotations) / density
+    if group[0] in 'RP' and group not in ('Pm-3m', 'Pa-3'):
+        length = (volume / np.sin(np.radians(120.0)))**(1 / 3)
+        cell = Cell(length, length, length, 90.0, 90.0, 120.0)
+    else:
+        length = volume**(1 / 3)
+        cell = Cell(length, length, length)
+    uvw = rng.random((n, 3))
+    uvw[0] = 0.0
+    return MolecularSystem(
+        name=group,
+        atoms=AtomTable.from_arrays(
+            rng.choice([1, 6, 8], size=n), cell.to_cartesians(uvw)
+        ),
+        cell=cell
+    )
+
+
+def loop_expand(system, group):
+    """The sites of the full cell, one operation and atom at a time."""
+    rotations, translations = symmetry.operations(group)
+    cell = system.cell
+    sites = []
+    for atno, uvw in zip(system.atoms.atno, cell.to_fractionals(
+        system.coordinates
+    )):  # yapf: disable
+        for rotation, translation in zip(rotations, translations):
+            image = rotation @ uvw + translation
+            image -= np.floor(image)
+            duplicate = False
+            for other_atno, other in sites:
+                delta = image - other
+                delta -= np.rint(delta)
+                if (
+                    other_atno == atno and
+                    np.linalg.norm(delta @ cell.vectors) < symmetry.tolerance
+                ):
+                    duplicate = True
+                    break
+            if not duplicate:
+                sites.append((atno, image))
+    return sites
+
+
+def _time(function, *args):
+    t0 = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - t0, result
+
+
+def run(sizes, loop_limit):
+    rng = np.random.default_rng(230)
+    print(
+        '{:>8s} {:>6s} {:>10s} {:>10s} {:>12s} {:>9s}'.format(
+            'group', 'unit', 'atoms', 'loop (s)', 'batched (s)', 'speedup'
+        )
+    )
+    for n in sizes:
+        for group in groups:
+            unit = make_unit(n, group, rng)
+            t_batch, expanded = _time(symmetry.expand, unit, group)
+            if n <= loop_limit:
+                t_loop, sites = _time(loop_expand, unit, group)
+                assert len(sites) == expanded.n_atoms
+                loop = '{:10.3f}'.format(t_loop)
+                speedup = '{:9.0f}'.format(t_loop / t_batch)
+            else:
+                loop = '{:>10s}'.format('-')
+                speedup = '{:>9s}'.format('-')
+            print(
+                '{:>8s} {:6d} {:10d} {} {:12.4f} {}'.format(
+                    group, n, expanded.n_atoms, loop, t_batch, speedup
+                )
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[10, 100, 1000]
+    )
+    parser.add_argument(
+        '--loop-limit', type=int, default=10,
+        help='the largest asymmetric unit to expand with the loops'
+    )
+    args = parser.parse_args()
+    run(args.sizes, args.loop_limit)
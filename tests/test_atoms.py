@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the columnar atom table and the systems built on it."""
+
+import numpy as np
+import pytest
+
+import system_step  # noqa: F401
+from system_step import AtomTable, Cell, MolecularSystem
+
+water = """3
+water
+O   0.000000   0.000000   0.117300
+H   0.000000   0.757200  -0.469200
+H   0.000000  -0.757200  -0.469200
+"""
+
+
+def test_append_and_columns():
+    """Append atoms in bulk and check the columns."""
+    table = AtomTable()
+    table.append([8, 1, 1], np.arange(9.0).reshape(3, 3))
+    table.append([6], [[1.0, 2.0, 3.0]], charge=[0.5])
+    assert len(table) == 4
+    assert list(table.atno) == [8, 1, 1, 6]
+    assert list(table.symbols) == ['O', 'H', 'H', 'C']
+    assert table['charge'][3] == 0.5
+    assert table.coordinates.shape == (4, 3)
+
+
+def test_coordinates_are_views():
+    """The coordinates are a contiguous, read-only view, not a copy."""
+    table = AtomTable.from_arrays([6, 6], np.zeros((2, 3)))
+    xyz = table.coordinates
+    assert xyz.flags.c_contiguous
+    with pytest.raises(ValueError):
+        xyz[1, 2] = 1.5
+    version = table.version('coordinates')
+    table.mutable('coordinates')[1, 2] = 1.5
+    assert table.coordinates[1, 2] == 1.5
+    assert xyz[1, 2] == 1.5
+    assert table.version('coordinates') > version
+
+
+def test_new_column_and_delete():
+    """Add a string column and delete atoms."""
+    table = AtomTable.from_arrays([6, 1, 1, 1, 1], np.zeros((5, 3)))
+    table['name'] = np.array(['C1', 'H1', 'H2', 'H3', 'H4'])
+    mapping = table.delete([1, 3])
+    assert len(table) == 3
+    assert list(table['name']) == ['C1', 'H2', 'H4']
+    assert list(mapping) == [0, -1, 1, -1, 2]
+
+
+def test_cell():
+    """Fractional and Cartesian conversions round trip."""
+    cell = Cell(5.0, 6.0, 7.0, 80.0, 95.0, 105.0)
+    uvw = np.array([[0.1, 0.2, 0.3], [0.9, 0.5, 0.25]])
+    assert np.allclose(cell.to_fractionals(cell.to_cartesians(uvw)), uvw)
+    assert Cell.from_vectors(cell.vectors) == cell
+    assert Cell(2.0, 3.0, 4.0).volume == pytest.approx(24.0)
+
+
+def test_read_xyz(tmp_path):
+    """Read a small XYZ file into a system."""
+    path = tmp_path / 'water.xyz'
+    path.write_text(water)
+    system = system_step.read_file(path)
+    assert isinstance(system, MolecularSystem)
+    assert system.n_atoms == 3
+    assert system.formula == 'H2O'
+    assert system.coordinates[1, 1] == pytest.approx(0.7572)
+
+
+def test_multiframe_xyz(tmp_path):
+    """Read selected frames of a multi-frame extended XYZ file."""
+    lines = []
+    for frame in range(10):
+        lines.append('2')
+        lines.append(
+            'Lattice="10.0 0.0 0.0 0.0 11.0 0.0 0.0 0.0 12.0" '
+            'Properties=species:S:1:pos:R:3:forces:R:3 step={}'.format(frame)
+        )
+        lines.append('C {} 0.0 0.0 0.1 0.2 0.3'.format(frame))
+        lines.append('O {} 0.0 1.2 0.1 0.2 0.3'.format(frame))
+    path = tmp_path / 'trajectory.xyz'
+    path.write_text('\n'.join(lines) + '\n')
+
+    systems = list(system_step.iter_file(path, start=1, stop=8, step=3))
+    assert [s.coordinates[0, 0] for s in systems] == [1.0, 4.0, 7.0]
+    assert systems[0].cell == Cell(10.0, 11.0, 12.0)
+    assert systems[0].formula == 'CO'
+    assert len(list(system_step.iter_file(path))) == 10
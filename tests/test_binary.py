@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the native binary format for systems."""
+
+import numpy as np
+import pytest
+
+import system_step  # noqa: F401
+from system_step import AtomTable, BondTable, Cell, MolecularSystem
+
+
+def _system(n, shift=0.0):
+    """A chain of atoms with extra columns and a cell."""
+    atoms = AtomTable.from_arrays(
+        np.full(n, 6),
+        np.arange(3.0 * n).reshape(n, 3) + shift,
+        name=np.array(['C{}'.format(k) for k in range(n)]),
+        residue=np.arange(n, dtype=np.int32),
+    )
+    bonds = BondTable.from_arrays(
+        np.arange(n - 1), np.arange(1, n), order=np.full(n - 1, 2)
+    )
+    return MolecularSystem(
+        name='chain', atoms=atoms, bonds=bonds, cell=Cell(5, 6, 7, 90, 95, 90)
+    )
+
+
+def test_round_trip(tmp_path):
+    """Write and read a system with all its columns."""
+    path = tmp_path / 'chain.sbin'
+    system = _system(10)
+    system.atoms.append([8], [[0.5, 0.5, 0.5]], name=['O'], residue=[99])
+    system_step.write_binary(path, system)
+
+    result = system_step.read_file(path)
+    assert result.name == 'chain'
+    assert result.cell == system.cell
+    assert result.atoms.columns == system.atoms.columns
+    for column in system.atoms.columns:
+        assert np.array_equal(result.atoms[column], system.atoms[column])
+    assert list(result.atoms['name'][-2:]) == ['C9', 'O']
+    assert np.array_equal(result.bonds.j, system.bonds.j)
+    assert list(result.bonds.order) == [2] * 9
+
+
+def test_frames(tmp_path):
+    """Select frames from a file of several systems."""
+    path = tmp_path / 'frames.sbin'
+    system_step.write_binary(path, [_system(4, shift=k) for k in range(6)])
+    frames = list(system_step.iter_file(path, start=1, stop=5, step=2))
+    assert [f.coordinates[0, 0] for f in frames] == [1.0, 3.0]
+
+
+def test_writer(tmp_path):
+    """Systems from a generator are written one at a time."""
+    path = tmp_path / 'frames.sbin.gz'
+    system_step.write_binary(path, (_system(4, shift=k) for k in range(3)))
+    frames = list(system_step.iter_file(path))
+    assert [f.coordinates[0, 0] for f in frames] == [0.0, 1.0, 2.0]
+
+    # Nothing is left behind if writing fails.
+    with pytest.raises(RuntimeError):
+        with system_step.BinaryWriter(tmp_path / 'failed.sbin') as writer:
+            writer.write(_system(4))
+            raise RuntimeError('stop')
+    assert sorted(x.name for x in tmp_path.iterdir()) == ['frames.sbin.gz']
+
+
+def test_shared_topology(tmp_path):
+    """Configurations are written with one copy of their topology."""
+    first = _system(100)
+    frames = [first] + [
+        first.new_configuration(first.coordinates + k) for k in range(1, 10)
+    ]
+    # A change in place is a new topology.
+    frames[5] = frames[5].copy()
+    frames[5].atoms.mutable('residue')[0] = 99
+    path = tmp_path / 'frames.sbin'
+    system_step.write_binary(path, frames)
+    copies = tmp_path / 'copies.sbin'
+    system_step.write_binary(copies, [x.copy() for x in frames])
+    assert path.stat().st_size < copies.stat().st_size / 1.5
+
+    for memory_map in (False, True):
+        result = list(
+            system_step.binary.iter_binary(path, memory_map=memory_map)
+        )
+        for frame, system in zip(frames, result):
+            assert system.same_topology(frame)
+            assert np.array_equal(system.coordinates, frame.coordinates)
+            assert system.cell == frame.cell
+        shared = set(result[1].atoms.shared_columns)
+        assert shared == set(result[1].atoms.columns) - {'coordinates'}
+        assert result[5].atoms['residue'][0] == 99
+        assert result[6].atoms['residue'][0] == 0
+        assert np.shares_memory(result[6].bonds.i, result[9].bonds.i)
+        assert not np.shares_memory(result[4].bonds.i, result[5].bonds.i)
+
+
+def test_not_binary(tmp_path):
+    """Other files are rejected."""
+    path = tmp_path / 'water.sbin'
+    path.write_text('3\nwater\n')
+    with pytest.raises(ValueError, match='not a binary system file'):
+        system_step.read_binary(path)
+
+
+def test_memory_map(tmp_path):
+    """Mapped systems are copy-on-write views of the file."""
+    path = tmp_path / 'chain.sbin'
+    system_step.write_binary(path, _system(1000))
+    before = path.read_bytes()
+
+    system = system_step.read_binary(path, memory_map=True)
+    base = system.coordinates
+    while not isinstance(base, np.memmap) and base.base is not None:
+        base = base.base
+    assert isinstance(base, np.memmap)
+
+    system.atoms.mutable('coordinates')[:] = -1.0
+    system.atoms.mutable('name')[0] = 'X'
+    assert path.read_bytes() == before
+    again = system_step.read_binary(path)
+    assert again.coordinates[1, 0] == 3.0
+    assert again.atoms['name'][0] == 'C0'
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the bond table and its CSR adjacency index."""
+
+import numpy as np
+import pytest
+
+from system_step import AtomTable, BondTable, MolecularSystem
+from system_step.bonds import connected_components
+
+
+def _neighbor_sets(bonds, n_atoms):
+    return [set(bonds.neighbors(k, n_atoms)) for k in range(n_atoms)]
+
+
+def test_neighbors():
+    """The CSR index gives the bonded neighbors of each atom."""
+    bonds = BondTable()
+    bonds.append([0, 0, 1], [1, 2, 3], order=[1, 2, 1])
+    assert _neighbor_sets(bonds, 5) == [{1, 2}, {0, 3}, {0}, {1}, set()]
+    assert list(bonds.degree(5)) == [2, 2, 1, 1, 0]
+    offsets, neighbors, index = bonds.adjacency(5)
+    assert list(bonds.order[index[offsets[0]:offsets[1]]]) == [1, 2]
+
+
+def test_incremental_update():
+    """Adding bonds updates the index to match a full rebuild."""
+    rng = np.random.default_rng(7)
+    n_atoms = 50
+    bonds = BondTable()
+    bonds.append(rng.integers(0, 40, 30), rng.integers(0, 40, 30))
+    bonds.adjacency(40)
+    bonds.append(rng.integers(0, 50, 20), rng.integers(0, 50, 20))
+    incremental = _neighbor_sets(bonds, n_atoms)
+    rebuilt = BondTable.from_arrays(bonds.i, bonds.j)
+    assert incremental == _neighbor_sets(rebuilt, n_atoms)
+
+
+def test_delete_invalidates():
+    """Deleting bonds rebuilds the index."""
+    bonds = BondTable.from_arrays([0, 1, 2], [1, 2, 3])
+    assert set(bonds.neighbors(1, 4)) == {0, 2}
+    bonds.delete([0])
+    assert set(bonds.neighbors(1, 4)) == {2}
+
+
+def test_mutable():
+    """The arrays are read-only, and changed in place only explicitly."""
+    bonds = BondTable.from_arrays([0, 1, 2], [1, 2, 3])
+    copy = BondTable.from_arrays(bonds.i, bonds.j)
+    with pytest.raises(ValueError):
+        bonds.order[0] = 2
+    version = bonds.version
+    bonds.mutable('order')[0] = 2
+    assert list(bonds.order) == [2, 1, 1]
+    assert bonds.version > version
+    # A table made from the read-only views copies them when changed.
+    copy.append(3, 4)
+    assert list(copy.j) == [1, 2, 3, 4]
+    assert list(bonds.j) == [1, 2, 3]
+
+
+def test_molecules():
+    """Find molecules, including a long chain, and remap after deletion."""
+    n = 10000
+    chain = np.arange(n - 1)
+    labels = connected_components(n + 2, chain, chain + 1)
+    assert labels.max() == 2
+    assert np.all(labels[0:n] == 0)
+
+    system = MolecularSystem(
+        atoms=AtomTable.from_arrays([8, 1, 1, 8, 1, 1], np.zeros((6, 3))),
+        bonds=BondTable.from_arrays([0, 0, 3, 3], [1, 2, 4, 5])
+    )
+    assert list(system.molecules()) == [0, 0, 0, 1, 1, 1]
+    system.delete_atoms([0])
+    assert system.n_bonds == 2
+    assert list(system.molecules()) == [0, 1, 2, 2, 2]
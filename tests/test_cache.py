@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the versions of systems and the cache of derived values."""
+
+import pickle
+
+import numpy as np
+import pytest
+
+from system_step import AtomTable, BondTable, Cell, MolecularSystem
+from system_step import cache as cache_module
+from system_step.cache import DerivedCache
+from system_step.readers import read_files
+
+
+def make_system():
+    atoms = AtomTable.from_arrays(
+        [8, 1, 1], [[0.0, 0.0, 0.0], [0.96, 0.0, 0.0], [-0.24, 0.93, 0.0]],
+        name=np.array(['O', 'H1', 'H2'])
+    )
+    return MolecularSystem(
+        name='water',
+        atoms=atoms,
+        bonds=BondTable.from_arrays([0, 0], [1, 2])
+    )
+
+
+def test_versions():
+    """Changes increase the versions of only the columns changed."""
+    system = make_system()
+    atoms = system.atoms
+    version = system.version
+    atno = atoms.version('atno')
+
+    atoms['coordinates'] = atoms.coordinates + 1.0
+    assert atoms.version('atno') == atno
+    assert atoms.version('coordinates') > atno
+    assert system.version > version
+
+    version = system.version
+    system.cell = Cell(10.0, 10.0, 10.0)
+    assert system.version > version
+
+    version = system.version
+    system.bonds.append(1, 2)
+    assert system.bonds.version == system.version > version
+
+    version = system.version
+    system.delete_atoms([2])
+    assert atoms.version('atno') == atoms.version('name') > version
+    assert system.bonds.version > version
+
+
+def test_cached_values():
+    """Derived values are computed once, until what they depend on changes."""
+    system = make_system()
+    cache = system.cache
+    assert system.formula == 'H2O'
+    mask = system.select('element H')
+    com = system.center_of_mass
+    misses = cache.misses
+    assert system.formula == 'H2O'
+    assert system.select('element H') is mask
+    assert system.center_of_mass is com
+    assert cache.misses == misses
+    with pytest.raises(ValueError):
+        mask[0] = True
+
+    # Moving the atoms changes the center of mass but not the formula.
+    with pytest.raises(ValueError):
+        system.atoms.coordinates[:] += 1.0
+    system.atoms.mutable('coordinates')[:] += 1.0
+    assert np.allclose(system.center_of_mass, com + 1.0)
+    assert system.select('element H') is mask
+    assert cache.misses == misses + 1
+
+    system.atoms['atno'] = [8, 1, 9]
+    assert system.formula == 'FHO'
+    assert list(np.flatnonzero(system.select('element H'))) == [1]
+
+
+def test_configurations_share_cache():
+    """Values that depend on the topology are shared by configurations."""
+    system = make_system()
+    molecules = system.molecules()
+    other = system.new_configuration(coordinates=system.coordinates + 2.0)
+    assert other.molecules() is molecules
+    assert other.formula == system.formula
+    assert not np.allclose(other.center_of_mass, system.center_of_mass)
+
+
+def test_lru():
+    """The least recently used entries are evicted."""
+    cache = DerivedCache(maxsize=2)
+    cache.get('a', (1,), lambda: 1)
+    cache.get('b', (1,), lambda: 2)
+    cache.get('a', (1,), lambda: 1)
+    cache.get('c', (1,), lambda: 3)
+    assert len(cache) == 2
+    assert cache.get('a', (1,), lambda: None) == 1
+    assert cache.get('b', (1,), lambda: None) is None
+    assert cache.get('a', (2,), lambda: 4) == 4
+
+
+def test_unpickled_versions(monkeypatch):
+    """Versions from another process are replaced by new local ones."""
+    system = make_system()
+    system.cell = Cell(10.0, 10.0, 10.0)
+    other = system.new_configuration(system.coordinates + 1.0)
+    system.formula
+    # Pickle as if in another process
+    with monkeypatch.context() as patch:
+        patch.setattr(cache_module, '_origin', (None, 'worker'))
+        data = pickle.dumps([system, other])
+    before = cache_module.tick()
+    system, other = pickle.loads(data)
+
+    assert len(system.cache) == 0 and system.cache is other.cache
+    assert system.atoms.version('atno') > before
+    assert system.bonds.version > before
+    assert system._cell_version > before
+    # The columns still shared have the same versions, so the cache is
+    # still shared by the configurations.
+    assert system.atoms.version('atno') == other.atoms.version('atno')
+    assert system.atoms.version('coordinates') != other.atoms.version(
+        'coordinates'
+    )
+    assert system.formula == other.formula
+    assert system.cache.hits == 1
+
+    # Pickling within the process keeps the versions.
+    again = pickle.loads(pickle.dumps(system))
+    assert again.version == system.version
+
+
+def test_worker_systems(tmp_path):
+    """Cached values of systems read by workers follow local changes."""
+    paths = []
+    for i in range(4):
+        path = tmp_path / 'water{}.xyz'.format(i)
+        path.write_text(
+            '3\nwater {}\nO 0 0 0\nH 0.96 0 0\nH -0.24 0.93 0\n'.format(i)
+        )
+        paths.append(path)
+    results = read_files(paths, workers=2)
+    for systems, _ in results:
+        system = systems[0]
+        center = system.center_of_mass
+        hydrogens = system.select('x > 0.5')
+        version = system.version
+        system.atoms['coordinates'] = system.coordinates + 1.0
+        assert system.version > version
+        assert np.allclose(system.center_of_mass, center + 1.0)
+        assert list(np.flatnonzero(system.select('x > 0.5'))) == [0, 1, 2]
+        assert list(np.flatnonzero(hydrogens)) == [1]
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for reading CIF and mmCIF files."""
+
+import numpy as np
+import pytest  # noqa: F401
+
+import system_step  # noqa: F401
+from system_step import Cell, cif
+
+quartz = """\
+# A comment before the first block
+data_quartz
+_chemical_name_mineral 'alpha quartz'
+_cell_length_a 4.9134(2)
+_cell_length_b 4.9134(2)
+_cell_length_c 5.4052(3)
+_cell_angle_alpha 90
+_cell_angle_beta 90
+_cell_angle_gamma 120
+_publ_section_comment
+;
+A text field, with a line that looks like a tag:
+_not_a_tag 1
+;
+loop_
+_symmetry_equiv_pos_as_xyz
+'x, y, z'
+'-y, x-y, z+1/3'
+'-x+y, -x, z+2/3'
+loop_
+_atom_site_label
+_atom_site_type_symbol
+_atom_site_fract_x
+_atom_site_fract_y
+_atom_site_fract_z
+_atom_site_occupancy
+Si1 Si4+ 0.4697(1) 0.0 0.0 1.0
+O1 O2- 0.4135(2) 0.2669(2) 0.1191(1) .
+"""
+
+mmcif = """\
+data_1ABC
+#
+_cell.length_a 1.000
+_cell.length_b 1.000
+_cell.length_c 1.000
+#
+loop_
+_atom_site.group_PDB
+_atom_site.id
+_atom_site.type_symbol
+_atom_site.label_atom_id
+_atom_site.label_comp_id
+_atom_site.label_asym_id
+_atom_site.label_seq_id
+_atom_site.Cartn_x
+_atom_site.Cartn_y
+_atom_site.Cartn_z
+_atom_site.occupancy
+_atom_site.B_iso_or_equiv
+_atom_site.pdbx_formal_charge
+_atom_site.auth_seq_id
+_atom_site.auth_asym_id
+_atom_site.pdbx_PDB_model_num
+ATOM   1 P  P     G A 1 10.000 1.000 2.000 1.00 20.00 ? 5 A 1
+ATOM   2 O  "O5'" G A 1 11.250 1.500 2.500 1.00 21.50 ? 5 A 1
+HETATM 3 ZN ZN    ZN B . 0.500 -1.000 3.000 0.50 30.00 2 101 B 1
+ATOM   4 P  P     G A 1 10.100 1.000 2.000 1.00 20.00 ? 5 A 2
+ATOM   5 O  "O5'" G A 1 11.350 1.500 2.500 1.00 21.50 ? 5 A 2
+HETATM 6 ZN ZN    ZN B . 0.600 -1.000 3.000 0.50 30.00 2 101 B 2
+#
+"""
+
+
+def test_read_crystal(tmp_path):
+    """Read a small-molecule CIF with uncertainties and a text field."""
+    path = tmp_path / 'quartz.cif'
+    path.write_text(quartz)
+    system = system_step.read_file(path)
+    assert system.name == 'quartz'
+    assert system.cell == Cell(4.9134, 4.9134, 5.4052, 90.0, 90.0, 120.0)
+    assert list(system.symbols) == ['Si', 'O']
+    assert list(system.atoms['name']) == ['Si1', 'O1']
+    assert list(system.atoms['occupancy']) == [1.0, 1.0]
+    uvw = system.cell.to_fractionals(system.coordinates)
+    assert np.allclose(uvw, [[0.4697, 0.0, 0.0], [0.4135, 0.2669, 0.1191]])
+
+    block = next(cif.iter_blocks(path))
+    assert block.items['_chemical_name_mineral'] == 'alpha quartz'
+    assert '_not_a_tag' not in block.items
+    assert cif.symmetry_operations(block)[1] == '-y, x-y, z+1/3'
+
+
+def test_read_mmcif(tmp_path):
+    """Read the models of an mmCIF file with quoted atom names."""
+    path = tmp_path / '1abc.cif'
+    path.write_text(mmcif)
+    systems = list(system_step.iter_file(path))
+    assert [s.name for s in systems] == ['1ABC:1', '1ABC:2']
+    system = systems[1]
+    assert system.cell is None
+    assert list(system.symbols) == ['P', 'O', 'Zn']
+    assert list(system.atoms['name']) == ['P', "O5'", 'ZN']
+    assert list(system.atoms['residue_name']) == ['G', 'G', 'ZN']
+    assert list(system.atoms['chain']) == ['A', 'A', 'B']
+    assert list(system.atoms['residue']) == [5, 5, 101]
+    assert list(system.atoms['formal_charge']) == [0, 0, 2]
+    assert list(system.atoms['b_factor']) == [20.0, 21.5, 30.0]
+    assert system.coordinates[0, 0] == 10.1
+
+
+def test_split_matches_tokens(tmp_path):
+    """Loops split with NumPy match loops read token by token."""
+    rng = np.random.default_rng(3)
+    rows = [
+        '{} "C{}\'" {:.4f} {:.4f}'.format(i, i % 7, *rng.normal(size=2))
+        for i in range(5000)
+    ]
+    body = '\n'.join(rows)
+    text = 'data_x\nloop_\n_a.id\n_a.name\n_a.x\n_a.y\n' + body + '\n#\n'
+    # A quoted value with a blank forces reading token by token.
+    slow = text.replace('"C0\'"', "'C 0'")
+    path = tmp_path / 'x.cif'
+
+    path.write_text(text)
+    fast = next(cif.iter_blocks(path)).loops
+    path.write_text(slow)
+    tokens = next(cif.iter_blocks(path)).loops
+    assert fast['_a.name'][1] == b"C1'"
+    assert tokens['_a.name'][0] == b'C 0'
+    for tag in ('_a.id', '_a.x', '_a.y'):
+        assert np.array_equal(fast[tag], tokens[tag])
+    assert np.array_equal(
+        cif._numbers(fast['_a.x']), [float(r.split()[2]) for r in rows]
+    )
+
+
+def test_blocks_are_lazy(tmp_path):
+    """Select systems from a multi-block file."""
+    blocks = []
+    for i in range(6):
+        blocks.append(
+            'data_b{0}\n_cell_length_a 5\n_cell_length_b 5\n_cell_length_c 5\n'
+            'loop_\n_atom_site_label\n_atom_site_fract_x\n'
+            '_atom_site_fract_y\n_atom_site_fract_z\n'
+            'Na1 0.{0} 0 0\nCl1 0.5 0.5 0.5\n'.format(i)
+        )
+    path = tmp_path / 'library.cif'
+    path.write_text(''.join(blocks))
+    systems = list(system_step.iter_file(path, start=1, step=2))
+    assert [s.name for s in systems] == ['b1', 'b3', 'b5']
+    assert systems[0].formula == 'ClNa'
+    assert systems[0].coordinates[0, 0] == pytest.approx(0.5)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for reading and writing compressed structure files."""
+
+import bz2
+import gzip
+import lzma
+
+import numpy as np
+import pytest  # noqa: F401
+
+import system_step
+from system_step import compression, readers
+
+from .test_cif import quartz
+from .test_pdb import pdb_text
+from .test_sdf import ethanol
+
+xyz_text = """\
+3
+water
+O 0.0 0.0 0.0
+H 0.9572 0.0 0.0
+H -0.2400 0.9266 0.0
+3
+water again
+O 0.1 0.0 0.0
+H 1.0572 0.0 0.0
+H -0.1400 0.9266 0.0
+"""
+
+
+@pytest.mark.parametrize(
+    'name, text, opener', [
+        ('water.xyz.gz', xyz_text, gzip.open),
+        ('test.pdb.bz2', pdb_text, bz2.open),
+        ('quartz.cif.xz', quartz, lzma.open),
+        ('small.sdf.gz', ethanol, gzip.open),
+    ],
+    ids=['XYZ', 'PDB', 'CIF', 'SDF']
+)
+def test_read_compressed(tmp_path, name, text, opener):
+    """Compressed files read the same as uncompressed ones."""
+    plain = tmp_path / compression.strip_extension(name)
+    plain.write_text(text)
+    path = tmp_path / name
+    with opener(path, 'wt') as fd:
+        fd.write(text)
+
+    expected = list(system_step.iter_file(plain))
+    systems = list(system_step.iter_file(path))
+    assert len(systems) == len(expected)
+    for system, other in zip(systems, expected):
+        assert system.name == other.name
+        assert np.array_equal(system.atoms.atno, other.atoms.atno)
+        assert np.array_equal(system.coordinates, other.coordinates)
+
+    second = list(system_step.iter_file(path, start=1))
+    assert [s.name for s in second] == [s.name for s in expected[1:]]
+
+
+def test_detect_from_contents(tmp_path):
+    """Compression and format are found from the contents of the file."""
+    path = tmp_path / 'water.dat'
+    with gzip.open(path, 'wt') as fd:
+        fd.write(xyz_text)
+    assert compression.compression_from_contents(path) == 'gzip'
+    assert readers.file_type_of(path) == 'XYZ'
+    assert system_step.read_file(path).name == 'water'
+
+    path = tmp_path / 'quartz.txt'
+    path.write_text(quartz)
+    assert readers.file_type_of(path) == 'CIF'
+
+
+def test_lzma_alone(tmp_path):
+    """'.lzma' files are written and read in the legacy LZMA-alone format."""
+    path = tmp_path / 'water.xyz.lzma'
+    with compression.open_file(path, 'wb') as fd:
+        fd.write(xyz_text.encode())
+    data = path.read_bytes()
+    assert lzma.decompress(data, format=lzma.FORMAT_ALONE) == xyz_text.encode()
+    assert compression.compression_from_contents(path) == 'lzma'
+
+    other = tmp_path / 'other.xyz.lzma'
+    other.write_bytes(
+        lzma.compress(xyz_text.encode(), format=lzma.FORMAT_ALONE)
+    )
+    systems = list(system_step.iter_file(other))
+    assert [s.name for s in systems] == ['water', 'water again']
+
+
+def test_write_compressed_binary(tmp_path):
+    """Binary files are compressed by extension and are read, not mapped."""
+    plain = tmp_path / 'water.xyz'
+    plain.write_text(xyz_text)
+    system = system_step.read_file(plain)
+    path = tmp_path / 'water.sbin.xz'
+    system_step.write_binary(path, system)
+    assert compression.compression_from_contents(path) == 'xz'
+    result = system_step.read_binary(path, memory_map=True)
+    assert not isinstance(result.coordinates.base, np.memmap)
+    assert np.array_equal(result.coordinates, system.coordinates)
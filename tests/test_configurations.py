@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for configurations sharing a topology, copy-on-write."""
+
+import numpy as np
+import pytest
+
+import system_step  # noqa: F401
+from system_step import AtomTable, BondTable, Cell, MolecularSystem
+
+
+def _system():
+    atoms = AtomTable.from_arrays(
+        [6, 6, 8, 1],
+        np.arange(12.0).reshape(4, 3),
+        name=np.array(['C1', 'C2', 'O', 'H']),
+        velocities=np.ones((4, 3)),
+    )
+    bonds = BondTable.from_arrays([0, 1, 2], [1, 2, 3])
+    return MolecularSystem(
+        name='ethanolish', atoms=atoms, bonds=bonds, cell=Cell(9, 9, 9)
+    )
+
+
+def test_shared_topology():
+    """Configurations share everything but their configuration."""
+    system = _system()
+    other = system.new_configuration(np.zeros((4, 3)), name='frame 2')
+    assert other.name == 'frame 2'
+    assert np.shares_memory(other.atoms.atno, system.atoms.atno)
+    assert np.shares_memory(other.atoms['name'], system.atoms['name'])
+    assert np.shares_memory(other.bonds.i, system.bonds.i)
+    assert not np.shares_memory(other.coordinates, system.coordinates)
+    assert not np.shares_memory(
+        other.atoms['velocities'], system.atoms['velocities']
+    )
+    assert other.cell == system.cell and other.cell is not system.cell
+    assert other.same_topology(system)
+
+    # Changing a shared column copies it, and views cannot be written.
+    other.atoms.mutable('coordinates')[0, 0] = 5.0
+    assert system.coordinates[0, 0] == 0.0
+    other.atoms.mutable('atno')[0] = 7
+    assert system.atoms.atno[0] != 7
+    with pytest.raises(ValueError):
+        other.atoms.atno[0] = 8
+
+
+def test_copy_on_write():
+    """Changing a shared column or the bonds copies them first."""
+    system = _system()
+    other = system.new_configuration()
+    other.atoms['name'] = ['Ca', 'Cb', 'Oa', 'Ha']
+    assert list(system.atoms['name']) == ['C1', 'C2', 'O', 'H']
+    assert other.atoms.shared_columns == ['atno', 'charge']
+
+    mapping = other.delete_atoms([0])
+    assert list(mapping) == [-1, 0, 1, 2]
+    assert other.n_atoms == 3 and other.n_bonds == 2
+    assert system.n_atoms == 4 and system.n_bonds == 3
+    assert list(system.bonds.i) == [0, 1, 2]
+
+    # The original copies too, when it changes first.
+    third = system.new_configuration()
+    system.atoms.append([1], [[0.0, 0.0, 1.0]], name=['H2'])
+    system.bonds.append([2], [4])
+    assert third.n_atoms == 4 and third.n_bonds == 3
+    assert list(third.atoms['name']) == ['C1', 'C2', 'O', 'H']
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the byte-offset index of frames in trajectory files."""
+
+import os
+
+import numpy as np
+import pytest  # noqa: F401
+
+import system_step
+from system_step import frame_index
+
+
+def _write_trajectory(path, n_frames, n_atoms=3):
+    lines = []
+    for frame in range(n_frames):
+        lines.append(' {}'.format(n_atoms))
+        lines.append('frame {}'.format(frame))
+        for atom in range(n_atoms):
+            lines.append('Ar {} {} 0.0'.format(frame, atom))
+        if frame % 7 == 0:
+            lines.append('')
+    path.write_text('\n'.join(lines) + '\n')
+
+
+def test_xyz_index(tmp_path):
+    """The offsets point at the start of each frame."""
+    path = tmp_path / 'traj.xyz'
+    _write_trajectory(path, 50)
+    # A small chunk size so frames straddle the chunks.
+    index = frame_index.index_xyz(path, chunk_size=64)
+    assert len(index) == 50
+    assert np.all(index.n_atoms == 3)
+    data = path.read_bytes()
+    for frame in (0, 13, 49):
+        offset = index.offsets[frame]
+        assert data[offset:].split(b'\n')[1] == 'frame {}'.format(
+            frame
+        ).encode()
+
+
+def test_seek_frames(tmp_path):
+    """Reading with the index gives the same frames as scanning."""
+    path = tmp_path / 'traj.xyz'
+    _write_trajectory(path, 40)
+    scanned = system_step.xyz.iter_xyz(path, 5, 35, 10)
+    seeked = system_step.iter_file(path, start=5, stop=35, step=10)
+    for a, b in zip(scanned, seeked):
+        assert a.name == b.name
+        assert np.array_equal(a.coordinates, b.coordinates)
+    assert frame_index.cache_path(path).exists()
+
+
+def test_stale_cache(tmp_path):
+    """The cached index is used until the file changes."""
+    path = tmp_path / 'traj.xyz'
+    _write_trajectory(path, 10)
+    assert len(frame_index.get_index(path, 'XYZ')) == 10
+    cached = frame_index.cache_path(path)
+    mtime = cached.stat().st_mtime_ns
+    assert len(frame_index.get_index(path, 'XYZ')) == 10
+    assert cached.stat().st_mtime_ns == mtime
+
+    _write_trajectory(path, 12)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert len(frame_index.get_index(path, 'XYZ')) == 12
+
+
+def test_truncated(tmp_path):
+    """A truncated last frame is not indexed."""
+    path = tmp_path / 'traj.xyz'
+    _write_trajectory(path, 5)
+    lines = path.read_text().splitlines(keepends=True)
+    path.write_text(''.join(lines[0:-1]))
+    assert len(frame_index.index_xyz(path)) == 4
+
+
+def test_pdb_models(tmp_path):
+    """Index the models of a multi-model PDB file."""
+    atom = 'ATOM      1  CA  ALA A   1       0.000   0.000   0.000'
+    lines = ['HEADER    TEST']
+    for model in range(4):
+        lines += ['MODEL     {:4d}'.format(model + 1)] + [atom] * (model + 1)
+        lines += ['ENDMDL']
+    path = tmp_path / 'models.pdb'
+    path.write_text('\n'.join(lines) + '\nEND\n')
+    index = frame_index.index_pdb(path)
+    assert list(index.n_atoms) == [1, 2, 3, 4]
+    data = path.read_bytes()
+    assert data[index.offsets[2]:].startswith(b'MODEL        3')
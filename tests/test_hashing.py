@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the content hashes of systems."""
+
+import numpy as np
+import pytest  # noqa: F401
+
+from system_step import AtomTable, BondTable, Cell, MolecularSystem
+from system_step import content_hash, content_hashes, topology_hash
+from system_step import graph_hashes, molecule_hashes
+
+
+def make_system(bonds=((0, 1), (1, 2)), shift=None, cell=None):
+    atoms = AtomTable.from_arrays(
+        [8, 1, 1], [[0.0, 0.0, 0.0], [0.96, 0.0, 0.0], [-0.24, 0.93, 0.0]],
+        name=np.array(['O', 'H1', 'H2'])
+    )
+    i, j = np.array(bonds).T
+    return MolecularSystem(
+        name='water',
+        atoms=atoms,
+        bonds=BondTable.from_arrays(i, j, shift=shift),
+        cell=cell
+    )
+
+
+def test_hash_is_stable():
+    """Noise, names and the order of the bonds do not change the hash."""
+    system = make_system()
+    reference = content_hash(system)
+    assert len(reference) == 40
+
+    other = make_system(bonds=((2, 1), (1, 0)))
+    other.name = 'renamed'
+    other.atoms.mutable('name')[:] = 'X'
+    other.atoms.mutable('coordinates')[:] += 1.0e-7
+    assert content_hash(other) == reference
+    assert topology_hash(other) == topology_hash(system)
+
+    moved = system.new_configuration(system.coordinates + 0.01)
+    assert content_hash(moved) != reference
+    assert topology_hash(moved) == topology_hash(system)
+    assert content_hash(system, precision=0.1) == content_hash(
+        moved, precision=0.1
+    )
+
+    periodic = make_system(cell=Cell(10, 10, 10))
+    assert content_hash(periodic) != reference
+    larger = make_system(cell=Cell(10, 10, 11))
+    assert content_hash(periodic) != content_hash(larger)
+
+    unbonded = make_system(bonds=((0, 1),))
+    assert content_hash(unbonded) != reference
+
+
+def test_periodic_bonds():
+    """Reversing a bond across the cell negates its lattice shift."""
+    cell = Cell(5, 5, 5)
+    system = make_system(shift=[[0, 0, 0], [1, 0, 0]], cell=cell)
+    reversed_ = make_system(
+        bonds=((1, 0), (2, 1)), shift=[[0, 0, 0], [-1, 0, 0]], cell=cell
+    )
+    assert content_hash(reversed_) == content_hash(system)
+    wrong = make_system(
+        bonds=((1, 0), (2, 1)), shift=[[0, 0, 0], [1, 0, 0]], cell=cell
+    )
+    assert content_hash(wrong) != content_hash(system)
+
+
+def test_hashes_of_frames():
+    """The hashes of frames sharing a topology match those computed alone."""
+    first = make_system()
+    frames = [first] + [
+        first.new_configuration(first.coordinates * (1 + 0.1 * i))
+        for i in range(1, 4)
+    ]
+    frames.append(make_system(bonds=((0, 1),)))
+    assert content_hashes(frames) == [content_hash(x) for x in frames]
+
+
+def make_molecule(atno, bonds, order=None, seed=0):
+    """A molecule with its atoms in a random order."""
+    rng = np.random.default_rng(seed)
+    permutation = rng.permutation(len(atno))
+    rank = np.argsort(permutation)
+    i, j = rank[np.array(bonds).T]
+    return MolecularSystem(
+        atoms=AtomTable.from_arrays(
+            np.array(atno)[permutation], rng.uniform(0, 5, (len(atno), 3))
+        ),
+        bonds=BondTable.from_arrays(j, i, order)
+    )
+
+
+ethanol = (
+    [6, 6, 8, 1, 1, 1, 1, 1, 1],
+    [(0, 1), (1, 2), (2, 8), (0, 3), (0, 4), (0, 5), (1, 6), (1, 7)],
+)
+ether = (
+    [6, 8, 6, 1, 1, 1, 1, 1, 1],
+    [(0, 1), (1, 2), (0, 3), (0, 4), (0, 5), (2, 6), (2, 7), (2, 8)],
+)
+
+
+def test_graph_hashes():
+    """Isomers differ, and the order of the atoms does not matter."""
+    systems = [
+        make_molecule(*ethanol),
+        make_molecule(*ether),
+        make_molecule(*ethanol, seed=1),
+        make_molecule(*ether, seed=2),
+        make_molecule([6, 6], [(0, 1)], order=[2]),
+        make_molecule([6, 6], [(0, 1)], order=[1]),
+    ]
+    hashes = graph_hashes(systems)
+    assert hashes[0] == hashes[2]
+    assert hashes[1] == hashes[3]
+    assert len(set(hashes)) == 4
+    # Hashing alone or in a batch gives the same result.
+    assert graph_hashes([make_molecule(*ethanol, seed=3)])[0] == hashes[0]
+
+
+def test_molecule_hashes_are_cached():
+    """Each molecule of a system is hashed, and the hashes are kept."""
+    atno = ethanol[0] + ether[0] + ethanol[0]
+    bonds = (
+        ethanol[1] + [(i + 9, j + 9) for i, j in ether[1]] +
+        [(i + 18, j + 18) for i, j in ethanol[1]]
+    )
+    system = make_molecule(atno, bonds)
+    hashes = molecule_hashes(system)
+    assert len(hashes) == 3
+    assert np.array_equal(
+        np.unique(system.molecules(), return_counts=True)[1], [9, 9, 9]
+    )
+    assert sorted(hashes) == sorted(
+        graph_hashes([make_molecule(*x) for x in (ethanol, ether, ethanol)])
+    )
+
+    frame = system.new_configuration(system.coordinates + 1)
+    assert molecule_hashes(frame) is hashes
+    # Changing the bonds discards the hashes.
+    frame.bonds.delete([0])
+    assert len(molecule_hashes(frame)) == 4
+    assert molecule_hashes(system) is hashes
+    # So does changing the elements.
+    other = system.new_configuration()
+    assert other.is_cached('molecule hashes', ('atno', 'bonds'))
+    atno = other.atoms.atno.copy()
+    atno[0] = 7
+    other.atoms['atno'] = atno
+    assert not other.is_cached('molecule hashes', ('atno', 'bonds'))
+    assert molecule_hashes(other)[0] != hashes[0]
+    assert list(molecule_hashes(other)[1:]) == list(hashes[1:])
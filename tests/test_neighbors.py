@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the cell-list neighbor search."""
+
+import numpy as np
+import pytest
+
+from system_step import Cell
+from system_step.neighbors import brute_force_pairs, neighbor_pairs
+
+
+def _as_set(pairs):
+    return {
+        (int(i), int(j), *map(int, shift))
+        for i, j, shift in zip(pairs.i, pairs.j, pairs.shifts)
+    }
+
+
+def test_molecular():
+    """The cell list matches brute force for a cluster of atoms."""
+    rng = np.random.default_rng(1)
+    xyz = rng.uniform(-10.0, 10.0, size=(500, 3))
+    pairs = neighbor_pairs(xyz, 2.5)
+    assert _as_set(pairs) == _as_set(brute_force_pairs(xyz, 2.5))
+    assert np.all(pairs.distances <= 2.5)
+
+
+def test_sparse():
+    """A few atoms spread over a huge box need only the occupied bins."""
+    rng = np.random.default_rng(4)
+    xyz = rng.uniform(0.0, 300.0, size=(1000, 3))
+    # Close pairs, and pairs in neighboring bins across a bin boundary.
+    xyz[1::50] = xyz[0::50] + [0.3, 0.0, 0.0]
+    xyz[2::50] = xyz[0::50] + [0.0, -0.2, 0.25]
+    pairs = neighbor_pairs(xyz, 0.5)
+    assert _as_set(pairs) == _as_set(brute_force_pairs(xyz, 0.5))
+    assert len(pairs.i) >= 60
+
+    cell = Cell(300.0, 300.0, 300.0)
+    pairs = neighbor_pairs(xyz - 150.0, 0.5, cell)
+    assert _as_set(pairs) == _as_set(brute_force_pairs(xyz - 150.0, 0.5, cell))
+
+
+@pytest.mark.parametrize(
+    'cell',
+    [Cell(15.0, 16.0, 17.0), Cell(15.0, 16.0, 17.0, 70.0, 100.0, 110.0)]
+)
+def test_periodic(cell):
+    """The cell list matches minimum image brute force in periodic cells."""
+    rng = np.random.default_rng(2)
+    # Some atoms are outside the cell to check the wrapping.
+    xyz = cell.to_cartesians(rng.uniform(-0.5, 1.5, size=(400, 3)))
+    pairs = neighbor_pairs(xyz, 3.0, cell)
+    assert _as_set(pairs) == _as_set(brute_force_pairs(xyz, 3.0, cell))
+    vectors = xyz[pairs.j] - xyz[pairs.i] + pairs.shifts @ cell.vectors
+    assert np.allclose(vectors, pairs.vectors)
+
+
+def test_small_cell():
+    """A cell smaller than the cutoff finds the atom's own images."""
+    cell = Cell(2.0, 2.0, 2.0)
+    pairs = neighbor_pairs([[0.5, 0.5, 0.5]], 3.0, cell)
+    # The 6 faces and 12 edges of the cube of images, counted once each.
+    assert len(pairs.i) == 9
+    assert np.allclose(np.sort(pairs.distances), [2.0] * 3 + [2.0**1.5] * 6)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for packing molecules into boxes."""
+
+import numpy as np
+import pytest
+
+from system_step import AtomTable, BondTable, Cell, MolecularSystem
+from system_step.neighbors import brute_force_pairs
+from system_step.packing import (
+    _OccupancyGrid, box_around, count_for_density, pack, water
+)
+
+
+def methane():
+    """A methane molecule."""
+    d = 1.09 / np.sqrt(3)
+    return MolecularSystem(
+        name='methane',
+        atoms=AtomTable.from_arrays(
+            [6, 1, 1, 1, 1],
+            [[0, 0, 0], [d, d, d], [-d, -d, d], [-d, d, -d], [d, -d, -d]]
+        ),
+        bonds=BondTable.from_arrays([0, 0, 0, 0], [1, 2, 3, 4])
+    )
+
+
+def clashes(system, molecules, tolerance):
+    """The pairs of atoms in different molecules closer than the tolerance."""
+    pairs = brute_force_pairs(system.coordinates, tolerance, system.cell)
+    different = molecules[pairs.i] != molecules[pairs.j]
+    return np.count_nonzero(different & (pairs.distances < tolerance))
+
+
+def test_grid_clashes():
+    """The occupancy grid finds the same clashes as checking every atom."""
+    rng = np.random.default_rng(3)
+    cell = Cell(10.0, 11.0, 12.0, 80.0, 100.0, 95.0)
+    grid = _OccupancyGrid(cell, 1.5, slots=1)
+    atoms = rng.random((300, 3))
+    grid.insert(atoms[:200])
+    grid.insert(atoms[200:] + 2.0)
+    points = rng.random((500, 3)) - 0.5
+    found = grid.clashes(points)
+
+    vectors = cell.vectors
+    delta = points[:, np.newaxis, :] - atoms[np.newaxis]
+    delta -= np.round(delta)
+    distances = np.linalg.norm(delta @ vectors, axis=2)
+    assert np.array_equal(found, np.any(distances < 1.5, axis=1))
+    assert grid.slots.shape[1] > 1
+
+
+def test_pack_water():
+    """Water packed into a box has no clashes, and is reproducible."""
+    cell = Cell(18.0, 18.0, 18.0)
+    n = count_for_density(water(), cell, 0.9)
+    assert n == int(0.9 * 0.602214076 * 18.0**3 / water().mass)
+    system, statistics = pack(water(), n, cell, tolerance=1.6, seed=11)
+    assert statistics.requested == statistics.inserted == n
+    assert statistics.attempts >= n
+    assert statistics.seed == 11
+    assert system.n_atoms == 3 * n
+    assert system.n_bonds == 2 * n
+    assert system.composition == {'H': 2 * n, 'O': n}
+    assert int(system.molecules().max()) + 1 == n
+    assert clashes(system, np.arange(3 * n) // 3, 1.6) == 0
+    # The molecules keep their shape.
+    oh = system.coordinates[1::3] - system.coordinates[0::3]
+    assert np.allclose(np.linalg.norm(oh, axis=1), 0.9572)
+
+    again, _ = pack(water(), n, cell, tolerance=1.6, seed=11)
+    assert np.array_equal(again.coordinates, system.coordinates)
+    other, _ = pack(water(), n, cell, tolerance=1.6, seed=12)
+    assert not np.array_equal(other.coordinates, system.coordinates)
+
+
+def test_solvate():
+    """The solute comes first, and the solvent keeps its distance."""
+    solute = methane()
+    cell, xyz = box_around(solute, 6.0)
+    assert np.allclose([cell.a, cell.b, cell.c], 2 * 6.0 + 2 * 1.09 / 3**0.5)
+    assert np.allclose(xyz.mean(axis=0), [cell.a / 2] * 3)
+    solute.atoms['coordinates'] = xyz
+    n = count_for_density(water(), cell, 1.0, solute)
+    assert n == int((0.602214076 * cell.volume - solute.mass) / water().mass)
+
+    system, statistics = pack(
+        water(), n, cell, solute=solute, tolerance=1.5, seed=5
+    )
+    assert statistics.inserted == n
+    assert system.n_atoms == 5 + 3 * n
+    assert np.array_equal(system.coordinates[:5], xyz)
+    assert list(system.atoms.atno[:5]) == [6, 1, 1, 1, 1]
+    molecules = np.concatenate(([0] * 5, 1 + np.arange(3 * n) // 3))
+    assert clashes(system, molecules, 1.5) == 0
+
+
+def test_mixture():
+    """Several kinds of molecule are grouped by kind."""
+    cell = Cell(15.0, 15.0, 15.0)
+    system, statistics = pack(
+        [water(), methane()], [40, 10], cell, tolerance=2.0, seed=1
+    )
+    assert statistics.inserted == 50
+    assert system.composition == {'C': 10, 'H': 120, 'O': 40}
+    assert np.all(system.atoms.atno[:120:3] == 8)
+    assert np.all(system.atoms.atno[120::5] == 6)
+    assert system.name == '40 water, 10 methane'
+    molecules = np.concatenate(
+        (np.arange(120) // 3, 40 + np.arange(50) // 5)
+    )
+    assert clashes(system, molecules, 2.0) == 0
+
+
+def test_full_box():
+    """A box that is too full gets as many molecules as fit."""
+    cell = Cell(8.0, 8.0, 8.0)
+    system, statistics = pack(
+        water(), 100, cell, tolerance=2.5, seed=2, max_attempts=5000
+    )
+    assert statistics.requested == 100
+    assert 0 < statistics.inserted < 100
+    assert statistics.attempts == 5000
+    assert system.n_atoms == 3 * statistics.inserted
+
+    with pytest.raises(ValueError, match='less than half the width'):
+        pack(water(), 1, cell, tolerance=4.0)
+    with pytest.raises(ValueError, match='2 molecules but 3 counts'):
+        pack([water(), methane()], [1, 2, 3], cell)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for reading PDB and PQR files."""
+
+import numpy as np
+import pytest
+
+import system_step
+from system_step import Cell
+
+pdb_text = '\n'.join(
+    [
+        'HEADER    TEST',
+        'CRYST1   10.000   11.000   12.000  90.00  90.00 120.00 P 1'
+        '           1',
+        'ATOM      1  N   ALA A   1      -1.234  12.500   0.001  1.00 10.00'
+        '           N',
+        'ATOM      2  CA  ALA A   1      11.104 -13.000-100.500  0.50  5.25'
+        '           C',
+        'TER',
+        'HETATM    3 CA    CA B  12       1.000   2.000   3.000  1.00 10.00'
+        '          CA2+',
+        'HETATM    4  O   HOH W1000       0.000   0.000   0.000',
+        'HETATM    5 HD21 ASN A   2       1.000   1.000   1.000',
+        'END',
+    ]
+) + '\n'
+
+pqr_text = """\
+REMARK   PQR file
+ATOM      1  N   ALA A   1      -1.234  12.500   0.001 -0.3000 1.8240
+ATOM      2  CA  ALA A   1      11.104 -13.000 -100.500 0.0337 1.9080
+ATOM      3  NA   NA B   2       1.000   2.000   3.000 1.0000 1.8680
+"""
+
+
+def test_read_pdb(tmp_path):
+    """The fields of ATOM and HETATM records, and the cell."""
+    path = tmp_path / 'test.pdb'
+    path.write_text(pdb_text)
+    system = system_step.read_file(path)
+    atoms = system.atoms
+    assert system.name == 'test'
+    assert list(atoms.atno) == [7, 6, 20, 8, 1]
+    assert atoms.coordinates[1].tolist() == [11.104, -13.0, -100.5]
+    assert list(atoms['name']) == ['N', 'CA', 'CA', 'O', 'HD21']
+    assert list(atoms['residue_name']) == ['ALA', 'ALA', 'CA', 'HOH', 'ASN']
+    assert list(atoms['chain']) == ['A', 'A', 'B', 'W', 'A']
+    assert list(atoms['residue']) == [1, 1, 12, 1000, 2]
+    # Blank occupancies default to 1
+    assert list(atoms['occupancy']) == [1.0, 0.5, 1.0, 1.0, 1.0]
+    assert list(atoms['formal_charge']) == [0, 0, 2, 0, 0]
+    assert system.cell == Cell(10.0, 11.0, 12.0, 90.0, 90.0, 120.0)
+
+
+def test_irregular_fields(tmp_path):
+    """Fields that are not right-justified and Windows line endings."""
+    lines = pdb_text.splitlines()
+    lines[2] = lines[2][0:30] + '-1.234  ' + lines[2][38:]
+    path = tmp_path / 'test.pdb'
+    path.write_bytes('\r\n'.join(lines).encode() + b'\r\n')
+    system = system_step.read_file(path)
+    assert system.coordinates[0].tolist() == [-1.234, 12.5, 0.001]
+    assert list(system.atoms['chain']) == ['A', 'A', 'B', 'W', 'A']
+
+
+def _hybrid36(value, width):
+    """Encode a number in the hybrid-36 form, for writing test files."""
+    if value < 10**width:
+        return str(value)
+    value -= 10**width - 10 * 36**(width - 1)
+    digits = ''
+    while value > 0:
+        value, digit = divmod(value, 36)
+        digits = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'[digit] + digits
+    return digits
+
+
+def test_hybrid36(tmp_path):
+    """Serial and residue numbers past the width of their fields."""
+    n = 100005
+    lines = [
+        'ATOM  {:>5s}  O   HOH W{:>4s}    {:8.3f}   0.000   0.000  1.00  0.00'
+        '           O'.format(
+            _hybrid36(k + 1, 5), _hybrid36(k // 3 + 1, 4), k * 0.001
+        ) for k in range(n)
+    ]
+    assert lines[99999][6:11] == 'A0000' and lines[29997][22:26] == 'A000'
+    path = tmp_path / 'big.pdb'
+    path.write_text('\n'.join(lines) + '\n')
+    system = system_step.read_file(path)
+    assert system.n_atoms == n
+    assert np.array_equal(system.atoms['residue'], np.arange(n) // 3 + 1)
+    assert system.coordinates[-1, 0] == (n - 1) * 0.001
+
+    lines[-1] = lines[-1][0:22] + 'A0b0' + lines[-1][26:]
+    path.write_text('\n'.join(lines) + '\n')
+    with pytest.raises(ValueError, match='hybrid-36'):
+        system_step.read_file(path)
+
+
+def test_bulk_matches_text(tmp_path):
+    """Parsing many records in bulk gives the values in the text."""
+    rng = np.random.default_rng(7)
+    xyz = np.round(rng.uniform(-999.0, 9999.0, size=(40000, 3)), 3)
+    with open(tmp_path / 'big.pdb', 'w') as fd:
+        for i, (x, y, z) in enumerate(xyz):
+            fd.write(
+                'ATOM  {:5d}  CA  GLY A{:4d}    {:8.3f}{:8.3f}{:8.3f}'
+                '  1.00{:6.2f}           C\n'.format(
+                    i % 100000, i % 10000, x, y, z, i % 100
+                )
+            )
+    system = system_step.read_file(tmp_path / 'big.pdb')
+    assert np.array_equal(system.coordinates, xyz)
+    assert np.array_equal(system.atoms['residue'], np.arange(40000) % 10000)
+    assert np.array_equal(system.atoms['b_factor'], np.arange(40000) % 100)
+
+
+def test_models(tmp_path):
+    """Each model in a file is a frame."""
+    atom = 'ATOM  {:5d}  C   MET A   1    {:8.3f}   0.000   0.000  1.00  0.00'
+    lines = []
+    for model in range(5):
+        lines.append('MODEL     {:4d}'.format(model + 1))
+        lines += [atom.format(i, model + i) for i in range(3)]
+        lines.append('ENDMDL')
+    path = tmp_path / 'models.pdb'
+    path.write_text('\n'.join(lines) + '\nEND\n')
+    systems = list(system_step.iter_file(path))
+    assert len(systems) == 5
+    assert systems[3].name == 'models:3'
+    # Seeking with the index of the models
+    systems = list(system_step.iter_file(path, start=1, step=2))
+    assert [s.coordinates[0, 0] for s in systems] == [1.0, 3.0]
+    assert systems[0].formula == 'C3'
+
+
+def test_read_pqr(tmp_path):
+    """Read the charges and radii from a PQR file."""
+    path = tmp_path / 'test.pqr'
+    path.write_text(pqr_text)
+    system = system_step.read_file(path)
+    atoms = system.atoms
+    assert list(atoms.atno) == [7, 6, 11]
+    assert atoms.coordinates[1].tolist() == [11.104, -13.0, -100.5]
+    assert list(atoms['charge']) == [-0.3, 0.0337, 1.0]
+    assert list(atoms['radius']) == [1.824, 1.908, 1.868]
+    assert list(atoms['chain']) == ['A', 'A', 'B']
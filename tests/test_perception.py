@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for perceiving bonds from distances."""
+
+import numpy as np
+import pytest  # noqa: F401
+
+from system_step import AtomTable, Cell, MolecularSystem
+
+water = np.array(
+    [[0.0, 0.0, 0.1173], [0.0, 0.7572, -0.4692], [0.0, -0.7572, -0.4692]]
+)
+hydrogen_sulfide = np.array(
+    [[0.0, 0.0, 0.1030], [0.0, 0.9616, -0.8239], [0.0, -0.9616, -0.8239]]
+)
+
+
+def water_box(n_side, spacing=3.1, cell=True):
+    """A cubic grid of water molecules, with the first one H2S."""
+    rng = np.random.default_rng(3)
+    grid = np.stack(np.meshgrid(*[np.arange(n_side)] * 3, indexing='ij'), -1)
+    centers = grid.reshape(-1, 3) * spacing
+    n = len(centers)
+    rotations, _ = np.linalg.qr(rng.normal(size=(n, 3, 3)))
+    molecules = np.broadcast_to(water, (n, 3, 3)).copy()
+    molecules[0] = hydrogen_sulfide
+    xyz = centers[:, None, :] + np.einsum('nij,nkj->nki', rotations, molecules)
+    atno = np.tile([8, 1, 1], n)
+    atno[0] = 16
+    return MolecularSystem(
+        atoms=AtomTable.from_arrays(atno, xyz.reshape(-1, 3)),
+        cell=Cell(*[n_side * spacing] * 3) if cell else None
+    )
+
+
+@pytest.mark.parametrize('periodic', [False, True])
+def test_water_box(periodic):
+    """Each molecule, including the larger H2S, has two bonds."""
+    # Shift the molecules so some straddle the periodic boundary.
+    system = water_box(6, cell=periodic)
+    system.atoms['coordinates'] = system.coordinates - 1.0
+    assert system.perceive_bonds() == 2 * 6**3
+    labels = system.molecules()
+    assert labels.max() + 1 == 6**3
+    assert np.all(np.bincount(labels) == 3)
+    assert set(system.bonded_neighbors(0)) == {1, 2}
+
+
+def test_diamond():
+    """Bonds to periodic images in a cell smaller than the cutoff."""
+    basis = np.array(
+        [
+            [0.0, 0.0, 0.0], [0.0, 0.5, 0.5], [0.5, 0.0, 0.5], [0.5, 0.5, 0.0],
+            [0.25, 0.25, 0.25], [0.25, 0.75, 0.75], [0.75, 0.25, 0.75],
+            [0.75, 0.75, 0.25]
+        ]
+    )
+    cell = Cell(3.567, 3.567, 3.567)
+    system = MolecularSystem(
+        atoms=AtomTable.from_arrays([6] * 8, cell.to_cartesians(basis)),
+        cell=cell
+    )
+    assert system.perceive_bonds() == 16
+    assert np.all(system.bonds.degree(8) == 4)
+    bonds = system.bonds
+    vectors = (
+        system.coordinates[bonds.j] - system.coordinates[bonds.i] +
+        bonds.shift @ cell.vectors
+    )
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 3.567 * 3**0.5 / 4)
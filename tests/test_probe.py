@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for probing structure files without reading them."""
+
+import pytest  # noqa: F401
+
+import system_step
+from system_step.probe import probe_file
+
+from .test_cif import quartz
+from .test_compression import xyz_text
+from .test_pdb import pdb_text
+from .test_sdf import ethanol
+
+
+@pytest.mark.parametrize(
+    'name, text', [
+        ('water.xyz', xyz_text),
+        ('test.pdb', pdb_text),
+        ('quartz.cif', quartz),
+        ('small.sdf', ethanol),
+    ],
+    ids=['XYZ', 'PDB', 'CIF', 'SDF']
+)
+def test_probe_matches_read(tmp_path, name, text):
+    """A probe finds what reading the whole file does."""
+    path = tmp_path / name
+    path.write_text(text)
+    systems = list(system_step.iter_file(path))
+    result = probe_file(path)
+    assert result.n_frames == len(systems)
+    assert result.n_atoms == systems[0].n_atoms
+    assert result.total_atoms == sum(x.n_atoms for x in systems)
+    assert result.cell == systems[0].cell
+    assert result.composition == systems[0].composition
+
+
+def test_probe_models_and_binary(tmp_path):
+    """Probe a multi-model PDB file, and the binary file it is saved as."""
+    lines = ['CRYST1   10.000   10.000   10.000  90.00  90.00  90.00 P 1']
+    for model in range(3):
+        lines.append('MODEL     {:4d}'.format(model + 1))
+        for i in range(model + 2):
+            lines.append(
+                'HETATM{:5d}  O   HOH W{:4d}    {:8.3f}   0.000   0.000'
+                '                      O'.format(i + 1, i + 1, 3.0 * i)
+            )
+        lines.append('ENDMDL')
+    path = tmp_path / 'water.pdb'
+    path.write_text('\n'.join(lines) + '\n')
+
+    result = probe_file(path)
+    assert result.n_frames == 3
+    assert result.n_atoms == 2
+    assert result.total_atoms == 9
+    assert result.cell.parameters[0] == 10.0
+    assert dict(result.composition) == {'O': 2}
+
+    binary_path = tmp_path / 'water.sbin'
+    system_step.write_binary(binary_path, list(system_step.iter_file(path)))
+    assert probe_file(binary_path) == result._replace(
+        file_type='SEAMM binary'
+    )
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for reading SD files and for reading many files in parallel."""
+
+import numpy as np
+import pytest  # noqa: F401
+
+import system_step
+from system_step import readers
+
+ethanol = """\
+ethanol
+  handwritten
+
+  3  2  0  0  0  0  0  0  0  0999 V2000
+   -0.0180    1.4584    0.0000 C   0  0  0  0  0  0  0  0  0  0  0  0
+    1.2990    0.7042    0.0000 C   0  0  0  0  0  0  0  0  0  0  0  0
+    1.2480   -0.6800    0.0000 O   0  5  0  0  0  0  0  0  0  0  0  0
+  1  2  1  0
+  2  3  1  0
+M  END
+> <ID>
+17
+
+$$$$
+acetate
+  handwritten
+
+  4  3  0  0  0  0  0  0  0  0999 V2000
+    0.0000    0.0000    0.0000 C   0  0  0  0  0  0  0  0  0  0  0  0
+    1.5000    0.0000    0.0000 C   0  0  0  0  0  0  0  0  0  0  0  0
+    2.1000    1.0800    0.0000 O   0  0  0  0  0  0  0  0  0  0  0  0
+    2.1000   -1.0800    0.0000 O   0  0  0  0  0  0  0  0  0  0  0  0
+  1  2  1  0
+  2  3  2  0
+  2  4  1  0
+M  CHG  1   4  -1
+M  END
+$$$$
+"""
+
+
+def test_read_sdf(tmp_path):
+    """Read the molecules, bonds and charges in an SD file."""
+    path = tmp_path / 'small.sdf'
+    path.write_text(ethanol)
+    systems = list(system_step.iter_file(path))
+    assert [s.name for s in systems] == ['ethanol', 'acetate']
+    assert list(systems[0].symbols) == ['C', 'C', 'O']
+    assert list(systems[0].atoms['formal_charge']) == [0, 0, -1]
+    acetate = systems[1]
+    assert list(acetate.bonds.order) == [1, 2, 1]
+    assert list(acetate.bonds.j) == [1, 2, 3]
+    assert list(acetate.atoms['formal_charge']) == [0, 0, 0, -1]
+    assert acetate.coordinates[2, 1] == 1.08
+
+    second = list(system_step.iter_file(path, start=1))
+    assert [s.name for s in second] == ['acetate']
+
+
+def test_read_files_in_order(tmp_path):
+    """Read a directory of files in parallel, keeping their order."""
+    rng = np.random.default_rng(5)
+    expected = []
+    for i in range(24):
+        xyz = rng.uniform(0, 3, (2, 3))
+        expected.append(xyz)
+        lines = ['2', 'molecule {}'.format(i)]
+        for x, y, z in xyz:
+            lines.append('H {:.6f} {:.6f} {:.6f}'.format(x, y, z))
+        (tmp_path / 'm{:02d}.xyz'.format(i)).write_text('\n'.join(lines))
+    (tmp_path / 'notes.txt').write_text('not a structure')
+
+    assert readers.is_batch(tmp_path)
+    assert readers.is_batch(tmp_path / '*.xyz')
+    paths = readers.find_files(tmp_path)
+    assert len(paths) == 24
+
+    results = readers.read_files(paths, workers=3)
+    names = [systems[0].name for systems, _ in results]
+    assert names == ['molecule {}'.format(i) for i in range(24)]
+    for (systems, _), xyz in zip(results, expected):
+        assert np.allclose(systems[0].coordinates, xyz, atol=1e-6)
+
+    frames = readers.iter_files(paths, workers=3)
+    names = [system.name for system, _ in frames]
+    assert names == ['molecule {}'.format(i) for i in range(24)]
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the atom selection language."""
+
+import numpy as np
+import pytest
+
+from system_step import AtomTable, Cell, MolecularSystem
+from system_step import compile_selection, select
+
+
+def make_system(cell=None):
+    """Two residues of alanine in chain A, a water and a ligand in chain B."""
+    atoms = AtomTable.from_arrays(
+        [7, 6, 6, 8, 1, 7, 6, 6, 8, 8, 1, 1, 7],
+        [[float(i), 0.0, 0.0] for i in range(13)],
+        name=np.array(
+            [
+                'N', 'CA', 'C', 'O', 'H', 'N', 'CA', 'C', 'O', 'OW', 'HW1',
+                'HW2', 'N1'
+            ]
+        ),
+        residue_name=np.array(['ALA'] * 9 + ['HOH'] * 3 + ['LIG']),
+        chain=np.array(['A'] * 9 + ['B'] * 4),
+        residue=np.array([1] * 5 + [2] * 4 + [3] * 3 + [4]),
+        b_factor=np.arange(13, dtype=float) * 10.0
+    )
+    return MolecularSystem(name='test', atoms=atoms, cell=cell)
+
+
+def selected(system, expression):
+    return list(np.flatnonzero(select(system, expression)))
+
+
+def test_terms():
+    """Each kind of term selects the expected atoms."""
+    system = make_system()
+    assert selected(system, 'element N') == [0, 5, 12]
+    assert selected(system, 'name CA C') == [1, 2, 6, 7]
+    assert selected(system, 'name H*') == [4, 10, 11]
+    assert selected(system, 'resname LIG') == [12]
+    assert selected(system, 'chain B') == [9, 10, 11, 12]
+    assert selected(system, 'resid 2 to 3') == list(range(5, 12))
+    assert selected(system, 'resid 1:1 4') == [0, 1, 2, 3, 4, 12]
+    assert selected(system, 'index 10 to 20') == [10, 11, 12]
+    assert selected(system, 'b_factor >= 110') == [11, 12]
+    assert selected(system, 'x < 1.5') == [0, 1]
+    assert selected(system, 'hydrogen') == [4, 10, 11]
+    assert len(selected(system, 'heavy')) == 10
+    assert selected(system, 'water') == [9, 10, 11]
+    assert selected(system, 'protein') == list(range(9))
+    assert len(selected(system, 'all')) == 13
+    assert selected(system, 'none') == []
+
+
+def test_combinations():
+    """Boolean operators follow the usual precedence."""
+    system = make_system()
+    assert selected(system, 'protein and name CA or resname LIG') == [
+        1, 6, 12
+    ]
+    assert selected(system, 'protein and (name CA or resname LIG)') == [1, 6]
+    assert selected(system, 'NOT heavy AND chain A') == [4]
+    assert selected(system, 'not not hydrogen') == [4, 10, 11]
+    assert selected(system, 'element O and within 3.5 of resname LIG') == [
+        9
+    ]
+
+
+def test_within_periodic():
+    """Periodic images are within the distance."""
+    system = make_system(cell=Cell(13.0, 20.0, 20.0, 90.0, 90.0, 90.0))
+    assert selected(system, 'within 1.5 of index 0') == [0, 1, 12]
+    assert system.select('within 1.5 of index 0').sum() == 3
+
+
+def test_errors():
+    """Mistakes are reported with what was expected."""
+    system = make_system()
+    with pytest.raises(ValueError, match=r"expected '\)'"):
+        select(system, '(protein and chain A')
+    with pytest.raises(ValueError, match="found 'foo'"):
+        select(system, 'foo')
+    with pytest.raises(ValueError, match='element symbols'):
+        select(system, 'element Xx')
+    with pytest.raises(ValueError, match="values after 'name'"):
+        select(system, 'name and chain A')
+    with pytest.raises(ValueError, match='not numeric'):
+        select(system, 'chain > 1')
+    with pytest.raises(ValueError, match="no 'occupancy' column"):
+        select(system, 'occupancy < 1')
+
+
+def test_cache():
+    """An expression is compiled once."""
+    compile_selection.cache_clear()
+    system = make_system()
+    for _ in range(3):
+        select(system, 'protein and name CA')
+    info = compile_selection.cache_info()
+    assert info.misses == 1
+    assert info.hits == 2
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for cutting surface slabs."""
+
+import numpy as np
+import pytest
+
+from system_step import AtomTable, Cell, MolecularSystem
+from system_step.slab import SlabBuilder, miller_indices, surface_basis
+
+
+def make_crystal(n=40, seed=2):
+    """Random atoms in a triclinic cell, bonded across its faces."""
+    rng = np.random.default_rng(seed)
+    cell = Cell(6.0, 7.0, 8.0, 85.0, 95.0, 105.0)
+    system = MolecularSystem(
+        name='crystal',
+        atoms=AtomTable.from_arrays(
+            rng.integers(6, 8, n), cell.to_cartesians(rng.random((n, 3)))
+        ),
+        cell=cell
+    )
+    system.perceive_bonds()
+    return system
+
+
+def rocksalt():
+    """The conventional cell of sodium chloride."""
+    corners = np.array(
+        [[0, 0, 0], [0, 0.5, 0.5], [0.5, 0, 0.5], [0.5, 0.5, 0]]
+    )
+    fractionals = np.concatenate((corners, corners + 0.5)) % 1.0
+    cell = Cell(5.64, 5.64, 5.64)
+    return MolecularSystem(
+        name='NaCl',
+        atoms=AtomTable.from_arrays(
+            [11] * 4 + [17] * 4, cell.to_cartesians(fractionals)
+        ),
+        cell=cell
+    )
+
+
+def bond_set(system):
+    """The bonds, in both directions, with their lattice shifts."""
+    result = set()
+    bonds = system.bonds
+    for i, j, shift in zip(bonds.i, bonds.j, bonds.shift):
+        result.add((i, j, tuple(shift)))
+        result.add((j, i, tuple(-shift)))
+    return result
+
+
+@pytest.mark.parametrize(
+    'miller', [(1, 0, 0), (0, 0, 1), (1, 1, 1), (2, -1, 0), (1, 2, 3)]
+)
+def test_surface_basis(miller):
+    """The new a and b are in the plane, and c steps to the next plane."""
+    matrix = surface_basis(Cell(6.0, 7.0, 8.0, 85.0, 95.0, 105.0), miller)
+    assert round(np.linalg.det(matrix)) == 1
+    assert np.all(matrix @ np.array(miller) == [0, 0, 1])
+
+
+@pytest.mark.parametrize('miller', ['1 0 0', '1 1 0', '1 -1 2'])
+def test_slab_bonds(miller):
+    """The bonds of the slabs are those perceived in them."""
+    bulk = make_crystal()
+    builder = SlabBuilder(bulk, miller)
+    for termination in range(len(builder.terminations)):
+        slab = builder.build(12.0, 10.0, termination)
+        n_layers = builder.layers(12.0)
+        assert slab.n_atoms == n_layers * bulk.n_atoms
+        assert slab.composition == {
+            x: n_layers * y for x, y in bulk.composition.items()
+        }
+        assert slab.cell.alpha == pytest.approx(90.0)
+        assert slab.cell.beta == pytest.approx(90.0)
+        z = slab.coordinates[:, 2]
+        assert z.min() == pytest.approx(5.0)
+        assert slab.cell.c - (z.max() - z.min()) == pytest.approx(10.0)
+        assert z.max() - z.min() >= (n_layers - 1) * builder.spacing
+
+        reference = slab.copy()
+        reference.perceive_bonds()
+        assert bond_set(slab) == bond_set(reference)
+
+
+def test_rocksalt_terminations():
+    """The polar (111) surface ends in a plane of Na or of Cl."""
+    builder = SlabBuilder(rocksalt(), '2 2 2')
+    assert builder.miller == (1, 1, 1)
+    assert builder.spacing == pytest.approx(5.64 / np.sqrt(3))
+    assert np.allclose(builder.terminations, [0.0, 5.64 / np.sqrt(12)])
+    bottoms = []
+    for termination in range(2):
+        slab = builder.build(10.0, 15.0, termination)
+        assert slab.composition == {'Cl': 16, 'Na': 16}
+        assert slab.name == 'NaCl (111) slab'
+        z = slab.coordinates[:, 2]
+        bottoms.append(set(np.asarray(slab.symbols)[z < z.min() + 0.01]))
+    assert sorted(bottoms, key=str) == [{'Cl'}, {'Na'}]
+
+    # Building is deterministic.
+    first = builder.build(10.0, 15.0, 1)
+    second = SlabBuilder(rocksalt(), (1, 1, 1)).build(10.0, 15.0, 1)
+    assert np.array_equal(first.coordinates, second.coordinates)
+
+
+def test_errors():
+    """Invalid indices, molecules and terminations are reported."""
+    assert miller_indices('1,-1 0') == (1, -1, 0)
+    with pytest.raises(ValueError, match='not three integers'):
+        miller_indices('0 0 0')
+    with pytest.raises(ValueError, match='not three integers'):
+        miller_indices('1 1')
+    molecule = MolecularSystem(
+        name='water',
+        atoms=AtomTable.from_arrays([8, 1, 1], np.zeros((3, 3)))
+    )
+    with pytest.raises(ValueError, match='not periodic'):
+        SlabBuilder(molecule, '1 1 1')
+    builder = SlabBuilder(rocksalt(), '1 0 0')
+    with pytest.raises(ValueError, match='no termination 3'):
+        builder.build(10.0, 10.0, 2)
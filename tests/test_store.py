@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the SQLite store of systems and configurations."""
+
+import numpy as np
+import pytest  # noqa: F401
+
+import system_step
+from system_step import AtomTable, BondTable, Cell, MolecularSystem
+from system_step import SystemStore
+from system_step.probe import probe_file
+
+
+def make_system(n_atoms, seed=0, cell=None):
+    rng = np.random.default_rng(seed)
+    atoms = AtomTable.from_arrays(
+        rng.integers(1, 9, n_atoms),
+        rng.uniform(0, 10, (n_atoms, 3)),
+        name=np.array(['A{}'.format(i) for i in range(n_atoms)]),
+    )
+    bonds = BondTable.from_arrays(
+        np.arange(n_atoms - 1), np.arange(1, n_atoms)
+    )
+    return MolecularSystem(name='chain', atoms=atoms, bonds=bonds, cell=cell)
+
+
+def test_round_trip(tmp_path):
+    """Frames are stored as configurations of one system."""
+    first = make_system(20, cell=Cell(10, 11, 12, 90, 90, 120))
+    frames = [first]
+    for i in range(1, 5):
+        frames.append(
+            first.new_configuration(
+                first.coordinates + i, name='frame {}'.format(i)
+            )
+        )
+    other = make_system(7, seed=1)
+    other.atoms['velocities'] = np.ones((7, 3))
+
+    path = tmp_path / 'library.db'
+    with SystemStore(path) as store:
+        ids = store.add_systems(frames + [other])
+        assert store.n_systems == 2
+        assert store.n_configurations == 6
+    assert [x for x, _ in ids] == [1, 1, 1, 1, 1, 2]
+    assert [x for _, x in ids] == [1, 2, 3, 4, 5, 6]
+
+    with SystemStore(path) as store:
+        result = store.get_configurations(1)
+        system = store.get_configuration(6)
+    assert len(result) == 5
+    assert result[3].name == 'frame 3'
+    assert result[3].cell == first.cell
+    assert np.array_equal(result[3].coordinates, frames[3].coordinates)
+    assert np.array_equal(result[0].atoms['name'], first.atoms['name'])
+    assert np.array_equal(result[0].bonds.j, first.bonds.j)
+    assert 'atno' in result[4].atoms.shared_columns
+    assert system.cell is None
+    assert np.array_equal(system.atoms['velocities'], np.ones((7, 3)))
+
+
+def test_read_and_probe_store(tmp_path):
+    """A store can be read like a structure file, and probed."""
+    first = make_system(10)
+    frames = [first] + [
+        first.new_configuration(first.coordinates * 2) for i in range(9)
+    ]
+    path = tmp_path / 'library.db'
+    with SystemStore(path) as store:
+        ids = store.add_systems(frames[0:4])
+        store.add_configurations(ids[0][0], frames[4:])
+        with pytest.raises(ValueError):
+            store.add_configurations(ids[0][0], [make_system(3)])
+
+    systems = list(system_step.iter_file(path, start=2, step=3))
+    assert len(systems) == 3
+    assert np.array_equal(systems[0].coordinates, frames[2].coordinates)
+
+    result = probe_file(path)
+    assert result.file_type == 'SEAMM store'
+    assert result.n_frames == 10
+    assert result.total_atoms == 100
+    assert result.composition == first.composition
+
+
+def test_find(tmp_path):
+    """Systems are found by formula, elements, size and volume."""
+    quartz = MolecularSystem(
+        name='quartz',
+        atoms=AtomTable.from_arrays([14, 8, 8], np.zeros((3, 3))),
+        cell=Cell(5, 5, 5, 90, 90, 90)
+    )
+    benzene = MolecularSystem(
+        name='benzene',
+        atoms=AtomTable.from_arrays([6] * 6 + [1] * 6, np.zeros((12, 3)))
+    )
+    silica = MolecularSystem(
+        name='silica',
+        atoms=AtomTable.from_arrays([14] * 200 + [8] * 400, np.zeros((600, 3)))
+    )
+    with SystemStore(tmp_path / 'library.db') as store:
+        store.add_systems([quartz, benzene, silica, quartz])
+        assert store.find(formula='SiO2') == [1, 4]
+        assert store.find(formula='O2Si') == [1, 4]
+        assert store.find(empirical_formula='SiO2') == [1, 3, 4]
+        assert store.find(empirical_formula='CH') == [2]
+        assert store.find(elements=['Si', 'O'], max_atoms=499) == [1, 4]
+        assert store.find(elements=['C']) == [2]
+        assert store.find(element_set=['O', 'Si']) == [1, 3, 4]
+        assert store.find(element_set=['O']) == []
+        assert store.find(min_atoms=12) == [2, 3]
+        assert store.find(min_volume=100, max_volume=130) == [1, 4]
+        assert store.find(max_volume=100) == []
+        assert store.find() == [1, 2, 3, 4]
+
+
+def test_deduplicate(tmp_path):
+    """Systems already in the store are skipped, and topologies shared."""
+    first = make_system(8)
+    moved = first.new_configuration(first.coordinates + 1)
+    other = make_system(5, seed=1)
+    path = tmp_path / 'library.db'
+    with SystemStore(path) as store:
+        ids = store.add_systems([first, other, first.copy()])
+        assert ids == [(1, 1), (2, 2), (3, 3)]
+        assert store.add_systems([first.copy()], deduplicate=True) == [(1, 1)]
+        # A new configuration of a stored topology joins its system.
+        ids = store.add_systems([moved, other, moved.copy()], deduplicate=True)
+        assert ids == [(1, 4), (2, 2), (1, 4)]
+        assert store.n_systems == 3
+        assert store.n_configurations == 4
+        ids = store.add_configurations(
+            2, [other, other.new_configuration(other.coordinates * 2)],
+            deduplicate=True
+        )
+        assert ids == [2, 5]
+        assert store.configuration_ids(2) == [2, 5]
+
+
+def test_deltas(tmp_path):
+    """Configurations in which few atoms move are stored as deltas."""
+    first = make_system(50, cell=Cell(10, 10, 10, 90, 90, 90))
+    first.atoms['velocities'] = np.zeros((50, 3))
+    frames = [first]
+    rng = np.random.default_rng(3)
+    for i in range(1, 12):
+        coordinates = frames[-1].coordinates.copy()
+        coordinates[rng.integers(0, 50, 3)] += 0.5
+        velocities = frames[-1].atoms['velocities'].copy()
+        velocities[i] = 1.0
+        frames.append(first.new_configuration(coordinates, velocities))
+    # Every atom moves
+    frames.append(first.new_configuration(first.coordinates + 1))
+
+    path = tmp_path / 'library.db'
+    with SystemStore(path, keyframe_interval=4) as store:
+        ids = store.add_systems(frames[0:7])
+        store.add_configurations(ids[0][0], frames[7:])
+        rows = store.connection.execute(
+            'SELECT base, depth FROM configurations ORDER BY id'
+        ).fetchall()
+        assert [x for _, x in rows] == [0, 1, 2, 3, 4, 0, 1, 2, 3, 4, 0, 1, 0]
+        assert [x for x, _ in rows][0:3] == [None, 1, 2]
+
+        result = store.get_configurations(ids[0][0])
+        assert len(result) == len(frames)
+        for system, frame in zip(result, frames):
+            assert np.array_equal(system.coordinates, frame.coordinates)
+            assert np.array_equal(
+                system.atoms['velocities'], frame.atoms['velocities']
+            )
+        system = store.get_configuration(9)
+        assert np.array_equal(system.coordinates, frames[8].coordinates)
+        systems = list(store.iter_configurations(start=3, step=4))
+        assert [x.n_atoms for x in systems] == [50, 50, 50]
+        assert np.array_equal(systems[2].coordinates, frames[11].coordinates)
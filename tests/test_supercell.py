@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for building supercells."""
+
+import numpy as np
+import pytest
+
+from system_step import AtomTable, Cell, MolecularSystem
+from system_step.supercell import make_supercell, transformation_matrix
+
+
+def make_crystal(n=60, seed=1):
+    """Random atoms in a triclinic cell, bonded across its faces."""
+    rng = np.random.default_rng(seed)
+    cell = Cell(7.0, 8.0, 9.0, 80.0, 95.0, 100.0)
+    system = MolecularSystem(
+        name='crystal',
+        atoms=AtomTable.from_arrays(
+            rng.integers(6, 8, n),
+            cell.to_cartesians(rng.random((n, 3))),
+            velocities=rng.normal(size=(n, 3))
+        ),
+        cell=cell
+    )
+    system.perceive_bonds()
+    return system
+
+
+def bond_set(system):
+    """The bonds, in both directions, with their lattice shifts."""
+    result = set()
+    bonds = system.bonds
+    for i, j, shift in zip(bonds.i, bonds.j, bonds.shift):
+        result.add((i, j, tuple(shift)))
+        result.add((j, i, tuple(-shift)))
+    return result
+
+
+@pytest.mark.parametrize(
+    'matrix', ['2 2 2', '3x1x1', '1 1 0  -1 1 0  0 0 2', '2 1 0 0 1 0 1 0 3']
+)
+def test_bonds_relinked(matrix):
+    """The bonds match those perceived in the supercell."""
+    system = make_crystal()
+    expanded = make_supercell(system, matrix)
+    n = round(np.linalg.det(transformation_matrix(matrix)))
+    assert expanded.n_atoms == n * system.n_atoms
+    assert expanded.n_bonds == n * system.n_bonds
+    assert expanded.cell.volume == pytest.approx(n * system.cell.volume)
+    assert np.all(expanded.atoms.atno[:system.n_atoms] == system.atoms.atno)
+
+    reference = expanded.copy()
+    reference.perceive_bonds()
+    assert bond_set(expanded) == bond_set(reference)
+
+    # The speeds are the same after any rotation.
+    assert np.allclose(
+        np.linalg.norm(expanded.atoms['velocities'][:system.n_atoms], axis=1),
+        np.linalg.norm(system.atoms['velocities'], axis=1)
+    )
+
+
+def test_template():
+    """Frames with the same topology share the atoms and bonds."""
+    system = make_crystal()
+    first = make_supercell(system, '2 2 1')
+    frame = system.new_configuration(coordinates=system.coordinates + 0.1)
+    second = make_supercell(frame, '2 2 1', template=first)
+    assert 'atno' in second.atoms.shared_columns
+    assert np.allclose(second.coordinates, first.coordinates + 0.1)
+    assert bond_set(second) == bond_set(first)
+
+
+def test_transformation_matrix():
+    """Transformations are given as 1, 3 or 9 integers."""
+    assert np.array_equal(transformation_matrix(2), 2 * np.identity(3))
+    assert np.array_equal(
+        transformation_matrix('2x3x1'), np.diag([2, 3, 1])
+    )
+    assert np.array_equal(
+        transformation_matrix('1 1 0, -1 1 0, 0 0 1'),
+        [[1, 1, 0], [-1, 1, 0], [0, 0, 1]]
+    )
+    with pytest.raises(ValueError, match='1, 3 or 9'):
+        transformation_matrix('2 2')
+    with pytest.raises(ValueError, match='integers'):
+        transformation_matrix('2 1.5 1')
+    with pytest.raises(ValueError, match='positive determinant'):
+        transformation_matrix('-1 1 1')
+    with pytest.raises(ValueError, match='not periodic'):
+        make_supercell(MolecularSystem(name='molecule'), 2)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for expanding asymmetric units with space-group symmetry."""
+
+import numpy as np
+import pytest
+
+from system_step import AtomTable, Cell, MolecularSystem, iter_file
+from system_step import symmetry
+
+# The number of general positions of each space group known
+orders = {
+    1: 1, 2: 2, 4: 2, 5: 4, 7: 2, 9: 4, 11: 4, 12: 8, 13: 4, 14: 4, 15: 8,
+    18: 4, 19: 4, 29: 4, 33: 4, 60: 8, 61: 8, 62: 8, 92: 8, 139: 32, 148: 18,
+    166: 36, 194: 24, 205: 24, 221: 48, 225: 192, 227: 192, 229: 96, 230: 96
+}
+
+perovskite = """\
+data_SrTiO3
+_cell_length_a 3.905
+_cell_length_b 3.905
+_cell_length_c 3.905
+_cell_angle_alpha 90
+_cell_angle_beta 90
+_cell_angle_gamma 90
+_space_group_IT_number 221
+loop_
+_atom_site_label
+_atom_site_type_symbol
+_atom_site_fract_x
+_atom_site_fract_y
+_atom_site_fract_z
+Sr1 Sr 0.5 0.5 0.5
+Ti1 Ti 0 0 0
+O1 O 0.5 0 0
+"""
+
+
+def crystal(cell, sites):
+    atno = [x for x, _ in sites]
+    uvw = np.array([x for _, x in sites], dtype=float)
+    return MolecularSystem(
+        name='crystal',
+        atoms=AtomTable.from_arrays(
+            atno, cell.to_cartesians(uvw), name=np.array(['A'] * len(atno))
+        ),
+        cell=cell
+    )
+
+
+def test_space_groups():
+    """The groups generated have the right numbers of operations."""
+    assert set(symmetry.space_groups()) == set(orders)
+    for number, symbol in symmetry.space_groups().items():
+        rotations, translations = symmetry.operations(symbol)
+        assert len(rotations) == orders[number]
+        assert np.array_equal(rotations[0], np.identity(3))
+        assert np.all((translations >= 0) & (translations < 1))
+    # Symbols are recognized with spaces and in their full forms.
+    for name in ('P 1 21/c 1', 'P 21/c', 'p21/c', '14', 14):
+        assert len(symmetry.operations(name)[0]) == 4
+
+
+def test_special_positions():
+    """Images on the same site are merged."""
+    cell = Cell(12.0, 12.0, 12.0)
+    for site, multiplicity in (
+        ((0.0, 0.0, 0.0), 16),
+        ((0.125, 0.0, 0.25), 24),
+        ((0.125, 0.125, 0.125), 16),
+        ((0.1, 0.2, 0.3), 96),
+    ):
+        expanded = symmetry.expand(crystal(cell, [(8, site)]), 'Ia-3d')
+        assert expanded.n_atoms == multiplicity
+        assert list(np.unique(expanded.atoms['name'])) == ['A']
+
+    # Diamond, with origin choice 2: each atom has four neighbors at 2.35 Å
+    silicon = crystal(Cell(5.431, 5.431, 5.431), [(14, (0.125,) * 3)])
+    diamond = symmetry.expand(silicon, 'F d -3 m')
+    assert diamond.n_atoms == 8
+    pairs = diamond.neighbors(2.5)
+    assert len(pairs.i) == 16
+    assert np.allclose(pairs.distances, 5.431 * np.sqrt(3) / 4)
+
+
+def test_operations_from_text():
+    """Operations in CIF files are parsed and closed into a group."""
+    rotations, translations = symmetry.operations(
+        ['x, y, z', '-x, y+1/2, -z+1/2', '-X,-Y,-Z']
+    )
+    assert len(rotations) == 4
+    assert np.allclose(
+        sorted(map(tuple, translations)),
+        [(0, 0, 0), (0, 0, 0), (0, 0.5, 0.5), (0, 0.5, 0.5)]
+    )
+    with pytest.raises(ValueError, match='not like'):
+        symmetry.operations(['x, y'])
+    with pytest.raises(ValueError, match='not like'):
+        symmetry.operations(['x, y, w'])
+    with pytest.raises(ValueError, match='not known'):
+        symmetry.operations('P 42/n')
+
+
+def test_cif(tmp_path):
+    """A CIF file is expanded with its space group."""
+    path = tmp_path / 'perovskite.cif'
+    path.write_text(perovskite)
+    system = next(iter_file(path))
+    assert system.formula == 'OSrTi'
+    assert system.n_atoms == 3
+    system = next(iter_file(path, symmetry='from file'))
+    assert system.formula == 'O3SrTi'
+    assert system.n_atoms == 5
+    system = next(iter_file(path, symmetry='Fm-3m'))
+    # Sr and O are on equivalent sites, but are not merged.
+    assert system.n_atoms == 12
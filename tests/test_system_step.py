@@ -3,8 +3,55 @@
 
 """Tests for `system_step` package."""
 
-import pytest  # noqa: F401
-import system_step  # noqa: F401
+import numpy as np
+import pytest
+import seamm
+
+import system_step
+from system_step import SystemStore, read_binary
+from system_step.binary import iter_binary
+
+# Water in a 10 Å box, moving along z, with the third frame a copy of the
+# first.
+shifts = (0.0, 1.0, 0.0, 2.0)
+
+
+@pytest.fixture
+def trajectory(tmp_path):
+    """A small multi-frame extended XYZ file."""
+    lines = []
+    for k, dz in enumerate(shifts):
+        lines += [
+            '3',
+            'Lattice="10 0 0 0 10 0 0 0 10" Properties=species:S:1:pos:R:3 '
+            'frame={}'.format(k),
+            'O 1.0 1.0 {:.4f}'.format(1.1173 + dz),
+            'H 1.0 1.7572 {:.4f}'.format(0.5308 + dz),
+            'H 1.0 0.2428 {:.4f}'.format(0.5308 + dz),
+        ]
+    path = tmp_path / 'water.xyz'
+    path.write_text('\n'.join(lines) + '\n')
+    return path
+
+
+def run_step(tmp_path, monkeypatch, **values):
+    """Run a System step with the given parameters.
+
+    Returns
+    -------
+    (System, str)
+        The step, and the text it printed to step.out.
+    """
+    monkeypatch.setattr(seamm, 'flowchart_variables', seamm.Variables())
+    flowchart = seamm.Flowchart(directory=str(tmp_path / 'job'))
+    step = system_step.System(flowchart=flowchart)
+    for key, value in values.items():
+        step.parameters[key].value = value
+    flowchart.add_node(step)
+    step.set_id(('1',))
+    step.run()
+    text = (tmp_path / 'job' / '1' / 'step.out').read_text()
+    return step, ' '.join(text.split())
 
 
 def test_construction():
@@ -13,3 +60,80 @@ def test_construction():
     assert str(type(result)) == (
         "<class 'system_step.system.System'>"  # noqa: E501
     )
+
+
+def test_read_frames(tmp_path, monkeypatch, trajectory):
+    """Read all the frames, keeping them in memory."""
+    step, text = run_step(
+        tmp_path, monkeypatch, filename=str(trajectory),
+        **{'perceive bonds': 'always'}
+    )
+    assert step.n_read == step.n_systems == 4
+    assert len(step.systems) == 4
+    assert step.perceived
+    assert step.n_duplicates == 1 and step.n_removed == 0
+    assert step.hashes[0] == step.hashes[2]
+    assert [x.coordinates[0, 2] for x in step.systems] == pytest.approx(
+        [1.1173 + dz for dz in shifts]
+    )
+    assert 'has 3 atoms with the formula H2O.' in text
+    assert 'There are 2 bonds and 1 molecule.' in text
+    assert 'It is the first of 4 frames read from the file.' in text
+    assert '1 of the systems is identical to one read earlier.' in text
+
+
+def test_save(tmp_path, monkeypatch, trajectory):
+    """Select atoms, build supercells and remove duplicates, then save."""
+    saved = tmp_path / 'water.sbin'
+    store = tmp_path / 'water.db'
+    step, text = run_step(
+        tmp_path,
+        monkeypatch,
+        filename=str(trajectory),
+        selection='element O',
+        supercell='2 1 1',
+        duplicates='remove',
+        **{
+            'save as': str(saved),
+            'store': str(store)
+        }
+    )
+    assert step.n_read == 4
+    assert step.n_systems == 3
+    assert step.n_duplicates == step.n_removed == 1
+    # Only the first is kept when the systems are saved.
+    assert len(step.systems) == 1
+
+    frames = list(iter_binary(saved))
+    assert len(frames) == 3
+    for frame, dz in zip(frames, (0.0, 1.0, 2.0)):
+        assert frame.n_atoms == 2
+        assert frame.cell.a == pytest.approx(20.0)
+        assert np.allclose(frame.coordinates[:, 2], 1.1173 + dz)
+    assert read_binary(saved).formula == step.system.formula == 'O2'
+
+    with SystemStore(store) as stored:
+        assert stored.n_systems == 1
+        assert stored.n_configurations == 3
+
+    assert "Kept 4 of the 12 atoms, matching 'element O'." in text
+    assert (
+        'Built the supercells of 4 periodic systems, each with 2 copies of '
+        'the cell.'
+    ) in text
+    assert 'Added 3 configurations of 1 systems to the store' in text
+    assert 'It is the first of 3 frames read from the file.' in text
+    assert 'Only it is kept in memory for the following steps.' in text
+    assert '1 system identical to one read earlier was removed.' in text
+
+    # Adding the same frames again skips them all.
+    step, text = run_step(
+        tmp_path,
+        monkeypatch,
+        filename=str(trajectory),
+        selection='element O',
+        supercell='2 1 1',
+        store=str(store)
+    )
+    assert 'Added 0 configurations of 1 systems' in text
+    assert 'The other 4 were already in the store.' in text